@@ -0,0 +1,57 @@
+-- One financial_metrics row per user, updated atomically by apply_metrics_delta
+
+-- Duplicate rows hold copies of the same running totals, so keep each user's most recent
+-- row and drop the others (summing them would count every upload more than once)
+DELETE FROM financial_metrics m
+USING (
+    SELECT user_id, (array_agg(id ORDER BY created_at DESC, id DESC))[1] AS keep_id
+    FROM financial_metrics
+    WHERE user_id IS NOT NULL
+    GROUP BY user_id
+    HAVING COUNT(*) > 1
+) d
+WHERE m.user_id = d.user_id AND m.id <> d.keep_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_financial_metrics_user_id_unique ON financial_metrics(user_id);
+
+-- Add an upload's metrics to the user's row (inserting it if missing) in one statement,
+-- recomputing net_profit and profit_margin from the new totals
+CREATE OR REPLACE FUNCTION apply_metrics_delta(p_user_id UUID, p_upload_id UUID, p_delta JSONB)
+RETURNS SETOF financial_metrics
+LANGUAGE sql AS $$
+    WITH d AS (
+        SELECT COALESCE((p_delta->>'total_revenue')::NUMERIC, 0) AS total_revenue,
+               COALESCE((p_delta->>'total_expenses')::NUMERIC, 0) AS total_expenses,
+               COALESCE((p_delta->>'cash_inflow')::NUMERIC, 0) AS cash_inflow,
+               COALESCE((p_delta->>'cash_outflow')::NUMERIC, 0) AS cash_outflow,
+               COALESCE((p_delta->>'total_receivables')::NUMERIC, 0) AS total_receivables,
+               COALESCE((p_delta->>'total_payables')::NUMERIC, 0) AS total_payables
+    )
+    INSERT INTO financial_metrics AS m (
+        user_id, upload_id, total_revenue, total_expenses, cash_inflow, cash_outflow,
+        total_receivables, total_payables, net_profit, profit_margin
+    )
+    SELECT p_user_id, p_upload_id, d.total_revenue, d.total_expenses, d.cash_inflow, d.cash_outflow,
+           d.total_receivables, d.total_payables,
+           d.total_revenue - d.total_expenses,
+           CASE WHEN d.total_revenue > 0
+                THEN (d.total_revenue - d.total_expenses) / d.total_revenue * 100
+                ELSE 0 END
+    FROM d
+    ON CONFLICT (user_id) DO UPDATE SET
+        upload_id = COALESCE(EXCLUDED.upload_id, m.upload_id),
+        total_revenue = COALESCE(m.total_revenue, 0) + EXCLUDED.total_revenue,
+        total_expenses = COALESCE(m.total_expenses, 0) + EXCLUDED.total_expenses,
+        cash_inflow = COALESCE(m.cash_inflow, 0) + EXCLUDED.cash_inflow,
+        cash_outflow = COALESCE(m.cash_outflow, 0) + EXCLUDED.cash_outflow,
+        total_receivables = COALESCE(m.total_receivables, 0) + EXCLUDED.total_receivables,
+        total_payables = COALESCE(m.total_payables, 0) + EXCLUDED.total_payables,
+        net_profit = (COALESCE(m.total_revenue, 0) + EXCLUDED.total_revenue)
+                   - (COALESCE(m.total_expenses, 0) + EXCLUDED.total_expenses),
+        profit_margin = CASE WHEN COALESCE(m.total_revenue, 0) + EXCLUDED.total_revenue > 0
+                             THEN ((COALESCE(m.total_revenue, 0) + EXCLUDED.total_revenue)
+                                   - (COALESCE(m.total_expenses, 0) + EXCLUDED.total_expenses))
+                                  / (COALESCE(m.total_revenue, 0) + EXCLUDED.total_revenue) * 100
+                             ELSE 0 END
+    RETURNING m.*;
+$$;
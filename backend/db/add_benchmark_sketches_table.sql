@@ -0,0 +1,42 @@
+-- Per-industry quantile sketches of profit margin, expense ratio and revenue growth
+-- One row per non-empty bucket: sign is -1 / 0 / 1, bucket the log-index of the value's magnitude
+CREATE TABLE IF NOT EXISTS benchmark_sketches (
+    industry TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    sign SMALLINT NOT NULL,
+    bucket INT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (industry, metric, sign, bucket)
+);
+
+-- Values each user currently contributes, so they can be retracted when their metrics change
+CREATE TABLE IF NOT EXISTS benchmark_members (
+    user_id UUID PRIMARY KEY,
+    industry TEXT NOT NULL,
+    profit_margin DOUBLE PRECISION,
+    expense_ratio DOUBLE PRECISION,
+    growth_rate DOUBLE PRECISION,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Add bucket count changes in one statement; buckets that reach zero are removed
+CREATE OR REPLACE FUNCTION apply_benchmark_sketch_delta(p_rows JSONB)
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO benchmark_sketches AS s (industry, metric, sign, bucket, count, updated_at)
+    SELECT d.industry, d.metric, d.sign, d.bucket, d.count, NOW()
+    FROM jsonb_to_recordset(p_rows) AS d(
+        industry TEXT, metric TEXT, sign SMALLINT, bucket INT, count BIGINT
+    )
+    ON CONFLICT (industry, metric, sign, bucket) DO UPDATE SET
+        count = s.count + EXCLUDED.count,
+        updated_at = NOW();
+
+    DELETE FROM benchmark_sketches s
+    USING jsonb_to_recordset(p_rows) AS d(industry TEXT, metric TEXT, sign SMALLINT, bucket INT)
+    WHERE s.industry = d.industry AND s.metric = d.metric AND s.sign = d.sign AND s.bucket = d.bucket
+      AND s.count <= 0;
+END;
+$$;
@@ -0,0 +1,12 @@
+-- Per-user expense categorization rules
+-- A description containing keyword is filed under category; lower priority wins (built-in rules start at 100)
+CREATE TABLE IF NOT EXISTS expense_rules (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL,
+    keyword TEXT NOT NULL,
+    category TEXT NOT NULL,
+    priority INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now())
+);
+
+CREATE INDEX IF NOT EXISTS idx_expense_rules_user_id ON expense_rules(user_id);
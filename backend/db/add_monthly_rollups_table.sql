@@ -0,0 +1,43 @@
+-- Per-user monthly totals maintained at ingest time
+-- One row per (month, file_type, direction, category, subcategory); month is 'YYYY-MM' or '' when undated
+CREATE TABLE IF NOT EXISTS monthly_rollups (
+    user_id UUID NOT NULL,
+    month TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    direction TEXT NOT NULL DEFAULT '',
+    category TEXT NOT NULL,
+    subcategory TEXT NOT NULL,
+    amount NUMERIC NOT NULL DEFAULT 0,
+    transaction_count BIGINT NOT NULL DEFAULT 0,
+    cash_in NUMERIC NOT NULL DEFAULT 0,
+    cash_out NUMERIC NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, month, file_type, direction, category, subcategory)
+);
+
+-- Add (p_sign = 1) or retract (p_sign = -1) an upload's rollup rows in one statement
+CREATE OR REPLACE FUNCTION apply_monthly_rollup_delta(p_user_id UUID, p_rows JSONB, p_sign INT DEFAULT 1)
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO monthly_rollups AS r (
+        user_id, month, file_type, direction, category, subcategory,
+        amount, transaction_count, cash_in, cash_out, updated_at
+    )
+    SELECT p_user_id, d.month, d.file_type, d.direction, d.category, d.subcategory,
+           p_sign * d.amount, p_sign * d.transaction_count, p_sign * d.cash_in, p_sign * d.cash_out, NOW()
+    FROM jsonb_to_recordset(p_rows) AS d(
+        month TEXT, file_type TEXT, direction TEXT, category TEXT, subcategory TEXT,
+        amount NUMERIC, transaction_count BIGINT, cash_in NUMERIC, cash_out NUMERIC
+    )
+    ON CONFLICT (user_id, month, file_type, direction, category, subcategory) DO UPDATE SET
+        amount = r.amount + EXCLUDED.amount,
+        transaction_count = r.transaction_count + EXCLUDED.transaction_count,
+        cash_in = r.cash_in + EXCLUDED.cash_in,
+        cash_out = r.cash_out + EXCLUDED.cash_out,
+        updated_at = NOW();
+
+    DELETE FROM monthly_rollups
+    WHERE user_id = p_user_id AND transaction_count <= 0;
+END;
+$$;
@@ -0,0 +1,4 @@
+-- Reference to parsed transactions kept in the columnar store (Parquet / Arrow IPC)
+-- When set, parsed_data is left empty and the rows are read from the referenced file
+ALTER TABLE financial_uploads
+ADD COLUMN IF NOT EXISTS parsed_data_ref TEXT;
@@ -0,0 +1,21 @@
+-- Per-user dedupe index of ingested transactions
+-- row_hash is a 64-bit hash of the upload type and normalized (date, amount, direction, description);
+-- rebuild_transaction_hashes.py recomputes it for hashes stored before the type was part of the key
+CREATE TABLE IF NOT EXISTS transaction_hashes (
+    user_id UUID NOT NULL,
+    row_hash BIGINT NOT NULL,
+    upload_id UUID REFERENCES financial_uploads(id) ON DELETE CASCADE,
+    PRIMARY KEY (user_id, row_hash)
+);
+
+CREATE INDEX IF NOT EXISTS idx_transaction_hashes_upload_id ON transaction_hashes(upload_id);
+
+-- Which of the given hashes the user already has (primary key lookups)
+CREATE OR REPLACE FUNCTION existing_transaction_hashes(p_user_id UUID, p_hashes BIGINT[])
+RETURNS TABLE (row_hash BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT h.row_hash
+    FROM transaction_hashes h
+    WHERE h.user_id = p_user_id
+      AND h.row_hash = ANY(p_hashes);
+$$;
@@ -0,0 +1,130 @@
+-- Link normalized transactions to their upload and index them for per-user date queries
+-- row_index is the row's position in the upload's parsed_data
+ALTER TABLE transactions
+ADD COLUMN IF NOT EXISTS upload_id UUID REFERENCES financial_uploads(id) ON DELETE CASCADE,
+ADD COLUMN IF NOT EXISTS file_type TEXT,
+ADD COLUMN IF NOT EXISTS status TEXT,
+ADD COLUMN IF NOT EXISTS row_index INT;
+
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions(user_id, transaction_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_upload_id ON transactions(upload_id);
+
+-- Per-month totals by file type and direction (called via supabase.rpc)
+CREATE OR REPLACE FUNCTION transaction_monthly_totals(p_user_id UUID)
+RETURNS TABLE (month TEXT, file_type TEXT, type TEXT, amount NUMERIC, count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT to_char(date_trunc('month', t.transaction_date), 'YYYY-MM') AS month,
+           t.file_type,
+           t.type,
+           SUM(t.amount) AS amount,
+           COUNT(*) AS count
+    FROM transactions t
+    WHERE t.user_id = p_user_id
+    GROUP BY 1, 2, 3
+    ORDER BY 1;
+$$;
+
+-- 'failed' when writing an upload's transactions failed; the backend rewrites those uploads
+ALTER TABLE financial_uploads
+ADD COLUMN IF NOT EXISTS transactions_status TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_financial_uploads_transactions_status
+ON financial_uploads(user_id) WHERE transactions_status = 'failed';
+
+-- Write all of an upload's transactions in one transaction (called via supabase.rpc);
+-- p_replace removes the rows already stored for the upload first
+CREATE OR REPLACE FUNCTION store_upload_transactions(p_upload_id UUID, p_rows JSONB, p_replace BOOLEAN DEFAULT FALSE)
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF p_replace THEN
+        DELETE FROM transactions WHERE upload_id = p_upload_id;
+    END IF;
+
+    INSERT INTO transactions (
+        user_id, upload_id, transaction_date, description, amount, type, category, file_type, status, row_index
+    )
+    SELECT d.user_id, p_upload_id, d.transaction_date, d.description, d.amount, d.type,
+           COALESCE(d.category, 'Other'), d.file_type, d.status, d.row_index
+    FROM jsonb_to_recordset(p_rows) AS d(
+        user_id UUID, transaction_date DATE, description TEXT, amount NUMERIC,
+        type TEXT, category TEXT, file_type TEXT, status TEXT, row_index INT
+    );
+END;
+$$;
+
+-- Totals per month or week (p_granularity 'month' / 'week') by file type and direction
+CREATE OR REPLACE FUNCTION transaction_period_totals(p_user_id UUID, p_granularity TEXT DEFAULT 'month')
+RETURNS TABLE (period TEXT, file_type TEXT, type TEXT, amount NUMERIC, count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT to_char(date_trunc(p_granularity, t.transaction_date), 'YYYY-MM-DD') AS period,
+           t.file_type,
+           t.type,
+           SUM(t.amount) AS amount,
+           COUNT(*) AS count
+    FROM transactions t
+    WHERE t.user_id = p_user_id
+    GROUP BY 1, 2, 3
+    ORDER BY 1;
+$$;
+
+-- Keyset pages of a user's transactions in (transaction_date, upload_id, row_index) order
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date_row
+ON transactions(user_id, transaction_date, upload_id, row_index);
+
+-- Rows written before row_index existed: the backend rewrites their uploads (repair_transactions)
+UPDATE financial_uploads SET transactions_status = 'failed'
+WHERE id IN (SELECT DISTINCT upload_id FROM transactions WHERE row_index IS NULL);
+
+-- Up to p_limit transactions after the (p_after_date, p_after_upload, p_after_row) key,
+-- newest first when p_descending (called via supabase.rpc)
+CREATE OR REPLACE FUNCTION transaction_page(
+    p_user_id UUID,
+    p_date_from DATE DEFAULT NULL,
+    p_date_to DATE DEFAULT NULL,
+    p_type TEXT DEFAULT NULL,
+    p_upload_id UUID DEFAULT NULL,
+    p_file_type TEXT DEFAULT NULL,
+    p_after_date DATE DEFAULT NULL,
+    p_after_upload UUID DEFAULT NULL,
+    p_after_row INT DEFAULT NULL,
+    p_descending BOOLEAN DEFAULT TRUE,
+    p_limit INT DEFAULT 50
+)
+RETURNS TABLE (
+    transaction_date DATE, upload_id UUID, row_index INT, description TEXT,
+    amount NUMERIC, type TEXT, file_type TEXT, status TEXT
+)
+LANGUAGE plpgsql STABLE AS $$
+BEGIN
+    IF p_descending THEN
+        RETURN QUERY
+        SELECT t.transaction_date, t.upload_id, t.row_index, t.description, t.amount, t.type, t.file_type, t.status
+        FROM transactions t
+        WHERE t.user_id = p_user_id
+          AND (p_date_from IS NULL OR t.transaction_date >= p_date_from)
+          AND (p_date_to IS NULL OR t.transaction_date <= p_date_to)
+          AND (p_type IS NULL OR t.type = p_type)
+          AND (p_upload_id IS NULL OR t.upload_id = p_upload_id)
+          AND (p_file_type IS NULL OR t.file_type = p_file_type)
+          AND (p_after_date IS NULL
+               OR (t.transaction_date, t.upload_id, t.row_index) < (p_after_date, p_after_upload, p_after_row))
+        ORDER BY t.transaction_date DESC, t.upload_id DESC, t.row_index DESC
+        LIMIT p_limit;
+    ELSE
+        RETURN QUERY
+        SELECT t.transaction_date, t.upload_id, t.row_index, t.description, t.amount, t.type, t.file_type, t.status
+        FROM transactions t
+        WHERE t.user_id = p_user_id
+          AND (p_date_from IS NULL OR t.transaction_date >= p_date_from)
+          AND (p_date_to IS NULL OR t.transaction_date <= p_date_to)
+          AND (p_type IS NULL OR t.type = p_type)
+          AND (p_upload_id IS NULL OR t.upload_id = p_upload_id)
+          AND (p_file_type IS NULL OR t.file_type = p_file_type)
+          AND (p_after_date IS NULL
+               OR (t.transaction_date, t.upload_id, t.row_index) > (p_after_date, p_after_upload, p_after_row))
+        ORDER BY t.transaction_date, t.upload_id, t.row_index
+        LIMIT p_limit;
+    END IF;
+END;
+$$;
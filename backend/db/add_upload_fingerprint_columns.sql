@@ -0,0 +1,27 @@
+-- Content fingerprint (SHA-256 of upload type + file content) and client Idempotency-Key
+-- Used to answer repeated uploads without parsing them or counting their metrics again
+ALTER TABLE financial_uploads
+ADD COLUMN IF NOT EXISTS content_hash TEXT,
+ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_financial_uploads_user_content_hash ON financial_uploads(user_id, content_hash);
+CREATE INDEX IF NOT EXISTS idx_financial_uploads_user_idempotency_key ON financial_uploads(user_id, idempotency_key);
+
+-- One live upload per fingerprint, so two concurrent uploads of the same file cannot both be counted;
+-- failed uploads are left out so the file can be uploaded again.
+-- Later copies that already exist keep their rows but drop the fingerprint, so the index can be built
+UPDATE financial_uploads u
+SET content_hash = NULL
+WHERE u.content_hash IS NOT NULL
+  AND u.processing_status <> 'failed'
+  AND EXISTS (
+      SELECT 1 FROM financial_uploads o
+      WHERE o.user_id = u.user_id
+        AND o.content_hash = u.content_hash
+        AND o.processing_status <> 'failed'
+        AND (o.created_at, o.id) < (u.created_at, u.id)
+  );
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_financial_uploads_user_content_hash_live
+ON financial_uploads(user_id, content_hash)
+WHERE content_hash IS NOT NULL AND processing_status <> 'failed';
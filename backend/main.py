@@ -1,11 +1,14 @@
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from typing import Literal, Dict, Any, List, Optional
 from pydantic import BaseModel
 import logging
 import json
 import os
+import asyncio
+import zipfile
 from dotenv import load_dotenv
 import uvicorn
 
@@ -54,7 +57,45 @@ if __name__ == "__main__":
 load_dotenv()
 
 from backend.db_client import supabase
-from backend.services.financial_analysis import process_financial_data
+from backend.services.upload_spool import spool_upload, is_zip_upload, extract_zip, parse_manifest, RowSpool
+from backend.services.financial_analysis import add_metrics, compute_metrics
+from backend.services.columnar_store import (
+    should_store_columnar, write_parsed_data, hydrate_uploads, delete_parsed_data, ParsedDataWriter
+)
+from backend.services.transaction_store import (
+    store_transactions, write_transactions, repair_transactions, monthly_totals, period_totals, STORE_TRANSACTIONS
+)
+from backend.services.transaction_dedupe import (
+    dedupe_parse_result, register_hashes, HashOccurrences, is_duplicate_row, response_rows,
+    fetch_upload_hashes, readmit_duplicates
+)
+from backend.services.analytics_engine import build_dashboard, analytics_cache
+from backend.services.monthly_rollups import (
+    rollup_delta, apply_rollup_delta, fetch_rollups, rebuild_rollups, merge_rollups
+)
+from backend.services.bookkeeping_service import bookkeeping_from_rollups
+from backend.services.forecasting_service import (
+    forecast_from_rollups, generate_period_forecast, monthly_series, monthly_series_from_rollups,
+    series_from_period_totals
+)
+from backend.services.transaction_frame import TransactionFrame, parse_date
+from backend.services.working_capital_service import calculate_working_capital
+from backend.services.inventory_loan_service import get_inventory_summary, INVENTORY_AGGREGATION
+from backend.services.loan_engine import build_loan_schedules
+from backend.services.transaction_index import TransactionIndex, transaction_index_cache, page_stored_transactions
+from backend.services.benchmarking_service import (
+    benchmark_values, update_user_benchmark, fetch_user_industry, fetch_sketches, compare_to_peers
+)
+from backend.services.cashflow_simulator import (
+    simulate_cash_flow, bank_flows_from_rollups, SIMULATION_DEFAULT_PATHS
+)
+from backend.services.expense_categorizer import fetch_user_rules, USER_RULE_PRIORITY
+from backend.services.parse_executor import parse_executor, ParseQueueFull, ParseTimeout
+from backend.services.upload_jobs import (
+    upload_job_queue, UploadJob, UploadQueueFull, IN_PROGRESS_STATUSES, is_stale_upload, stale_cutoff
+)
+from backend.services.upload_cache import upload_cache, upload_fingerprint, IDEMPOTENCY_KEY_MAX_LENGTH
+from backend.services.db_rpc import is_missing_function
 
 
 logging.basicConfig(level=logging.INFO)
@@ -113,127 +154,1074 @@ async def get_current_user(authorization: Optional[str] = Header(None)):
 async def health_check():
     return {"status": "ok", "message": "Financial Backend is running"}
 
+@app.on_event("shutdown")
+def shutdown_workers():
+    upload_job_queue.shutdown()
+    parse_executor.shutdown()
+
+def db_upload_identity(upload_type: str, filename: str) -> tuple:
+    """
+    DB CONSTRAINT WORKAROUND: Masquerade 'inventory' and 'loan' as 'bank'
+    but prepend specific tag to filename for downstream identification.
+    Returns (db_type, db_filename).
+    """
+    db_type = upload_type
+    db_filename = filename
+    
+    if upload_type in ['inventory', 'loan']:
+        db_type = 'bank' # Masquerade as allowed type
+        tag = f"[{upload_type.upper()}]"
+        if not db_filename.startswith(tag):
+            db_filename = f"{tag} {db_filename}"
+    
+    return db_type, db_filename
+
+
+def apply_metrics_delta(user_id: str, upload_id: str, metrics: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Add an upload's metrics to the user's financial_metrics row (insert if missing).
+    Runs as one atomic INSERT ... ON CONFLICT in the apply_metrics_delta function, so
+    concurrent uploads do not lose updates; falls back to read-modify-write only when the
+    function is not installed. Any other error may come after the delta was applied, so it
+    is raised rather than retried and the request fails instead of reporting success.
+    """
+    try:
+        res_metrics = supabase.rpc("apply_metrics_delta", {
+            "p_user_id": user_id,
+            "p_upload_id": upload_id,
+            "p_delta": metrics
+        }).execute()
+        metrics_payload = res_metrics.data[0] if isinstance(res_metrics.data, list) and res_metrics.data else res_metrics.data
+        logger.info(f"✅ Metrics delta applied: {metrics_payload}")
+        return metrics_payload or {}
+    except Exception as e:
+        if not is_missing_function(e):
+            logger.error(f"❌ Failed to apply metrics delta for user {user_id}: {e}")
+            raise
+        logger.warning(f"apply_metrics_delta RPC unavailable, updating metrics directly: {e}")
+    
+    return update_metrics_row(user_id, upload_id, metrics)
+
+
+def update_metrics_row(user_id: str, upload_id: str, metrics: Dict[str, float]) -> Dict[str, Any]:
+    """Read-modify-write version of apply_metrics_delta (not safe under concurrent uploads)."""
+    # Fetch existing metrics for this user
+    existing_metrics = supabase.table("financial_metrics").select("*").eq("user_id", user_id).execute()
+    
+    current = existing_metrics.data[0] if existing_metrics.data else {}
+    
+    new_total_revenue = current.get("total_revenue", 0) + metrics.get("total_revenue", 0)
+    new_total_expenses = current.get("total_expenses", 0) + metrics.get("total_expenses", 0)
+    new_cash_inflow = current.get("cash_inflow", 0) + metrics.get("cash_inflow", 0)
+    new_cash_outflow = current.get("cash_outflow", 0) + metrics.get("cash_outflow", 0)
+    new_receivables = current.get("total_receivables", 0) + metrics.get("total_receivables", 0)
+    new_payables = current.get("total_payables", 0) + metrics.get("total_payables", 0)
+    
+    new_net_profit = new_total_revenue - new_total_expenses
+    new_profit_margin = (new_net_profit / new_total_revenue * 100) if new_total_revenue > 0 else 0.0
+    
+    metrics_payload = {
+        "user_id": user_id,
+        "upload_id": upload_id,  # Use latest upload_id (required NOT NULL field)
+        "total_revenue": new_total_revenue,
+        "total_expenses": new_total_expenses,
+        "cash_inflow": new_cash_inflow,
+        "cash_outflow": new_cash_outflow,
+        "total_receivables": new_receivables,
+        "total_payables": new_payables,
+        "net_profit": new_net_profit,
+        "profit_margin": new_profit_margin
+    }
+    
+    logger.info(f"=== UPSERT METRICS ===")
+    logger.info(f"Previous: {current}")
+    logger.info(f"New values: {metrics_payload}")
+    
+    if existing_metrics.data:
+        # UPDATE existing record using user_id as key
+        res_metrics = supabase.table("financial_metrics").update(metrics_payload).eq("user_id", user_id).execute()
+        logger.info(f"✅ Metrics UPDATED: {res_metrics.data}")
+    else:
+        # INSERT new record
+        res_metrics = supabase.table("financial_metrics").insert(metrics_payload).execute()
+        logger.info(f"✅ Metrics INSERTED: {res_metrics.data}")
+    
+    return metrics_payload
+
+
+def record_upload_rollups(
+    user_id: str,
+    uploads: List[Dict[str, Any]],
+    delta: Optional[List[Dict[str, Any]]] = None
+) -> None:
+    """
+    Add newly saved uploads ({'file_type', 'parsed_data'}) to the user's monthly rollups,
+    or their precomputed rollup delta when given.
+    Users without rollup rows yet (data uploaded before the table existed) are rebuilt
+    from all their uploads, which already include the new ones.
+    """
+    try:
+        user_rules = fetch_user_rules(user_id)
+        if not fetch_rollups(user_id):
+            rebuild_rollups(user_id, fetch_user_uploads(user_id), user_rules)
+            return
+        apply_rollup_delta(user_id, delta if delta is not None else rollup_delta(uploads, user_rules))
+    except Exception as e:
+        logger.error(f"❌ Failed to update monthly rollups for user {user_id}: {e}")
+
+
+def load_user_rollups(user_id: str, uploads_data: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Monthly rollup rows of a user, rebuilt from their uploads if none are stored."""
+    rollups = fetch_rollups(user_id)
+    if not rollups:
+        if uploads_data is None:
+            uploads_data = fetch_user_uploads(user_id)
+        rollups = rebuild_rollups(user_id, uploads_data, fetch_user_rules(user_id))
+    return rollups
+
+
+def refresh_user_benchmark(user_id: str) -> None:
+    """Move the user's contribution to their industry's benchmark sketches to their current metrics."""
+    try:
+        revenue = monthly_series_from_rollups(load_user_rollups(user_id))['revenue']
+        values = benchmark_values(fetch_user_metrics(user_id), revenue)
+        update_user_benchmark(user_id, fetch_user_industry(user_id), values)
+    except Exception as e:
+        logger.error(f"❌ Failed to refresh benchmarks for user {user_id}: {e}")
+
+
+def parsed_data_fields(user_id: str, upload_type: str, parsed_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Upload row fields holding the parsed rows: inline JSON by default, or a reference
+    to a Parquet / Arrow file when PARSED_DATA_FORMAT enables the columnar store.
+    """
+    if parsed_data and should_store_columnar(upload_type):
+        return {"parsed_data": [], "parsed_data_ref": write_parsed_data(user_id, parsed_data)}
+    return {"parsed_data": parsed_data}
+
+
+def fetch_user_uploads(user_id: str) -> List[Dict[str, Any]]:
+    """
+    Completed uploads for a user, oldest first. Uploads kept in the columnar store
+    carry their rows as an Arrow table in parsed_table (see TransactionFrame.from_uploads).
+    """
+    result = supabase.table("financial_uploads") \
+        .select("id, file_type, parsed_data, parsed_data_ref, filename") \
+        .eq("user_id", user_id) \
+        .eq("processing_status", "completed") \
+        .order("created_at") \
+        .execute()
+    
+    return hydrate_uploads(result.data if result.data else [], as_table=True)
+
+
+def find_existing_upload(
+    user_id: str,
+    fingerprint: str,
+    idempotency_key: Optional[str] = None,
+    columns: str = "id, filename, file_type, processing_status, parsed_data, parsed_data_ref, content_hash, created_at"
+) -> Optional[Dict[str, Any]]:
+    """
+    Earlier upload with the same Idempotency-Key, or of the same content and type,
+    that completed or is still in progress. Failed uploads may be retried, and so
+    may uploads left in progress by a restarted process (see is_stale_upload).
+    columns must include processing_status and created_at.
+    Raises 409 when the Idempotency-Key was used for a different file.
+    """
+    if idempotency_key:
+        res = supabase.table("financial_uploads") \
+            .select(columns) \
+            .eq("user_id", user_id) \
+            .eq("idempotency_key", idempotency_key) \
+            .limit(1) \
+            .execute()
+        if res.data:
+            if res.data[0].get("content_hash") != fingerprint:
+                raise HTTPException(status_code=409, detail="Idempotency-Key was already used for a different file")
+            if is_stale_upload(res.data[0]):
+                expire_upload(res.data[0]["id"])
+            elif res.data[0].get("processing_status") != "failed":
+                return res.data[0]
+    
+    res = supabase.table("financial_uploads") \
+        .select(columns) \
+        .eq("user_id", user_id) \
+        .eq("content_hash", fingerprint) \
+        .in_("processing_status", ["pending", "processing", "completed"]) \
+        .execute()
+    for row in res.data or []:
+        if is_stale_upload(row):
+            expire_upload(row["id"])
+        else:
+            return row
+    return None
+
+
+INTERRUPTED_UPLOAD_ERROR = "Upload was interrupted before it finished; please upload the file again"
+
+
+def expire_upload(upload_id: str) -> None:
+    """Mark an upload lost with its process as failed, removing any rows it had stored."""
+    logger.warning(f"Upload {upload_id} was left in progress by an earlier process; marking it failed")
+    discard_streamed_rows(upload_id)
+    supabase.table("financial_uploads").update({
+        "processing_status": "failed",
+        "error_message": INTERRUPTED_UPLOAD_ERROR
+    }).eq("id", upload_id).in_("processing_status", list(IN_PROGRESS_STATUSES)).execute()
+
+
+@app.on_event("startup")
+def fail_interrupted_uploads():
+    """
+    Upload jobs live in process memory, so uploads still pending or processing from
+    before a restart would never finish. Those older than UPLOAD_JOB_STALE_SECONDS
+    (younger ones may belong to another server process) are marked failed.
+    """
+    try:
+        res = supabase.table("financial_uploads") \
+            .select("id") \
+            .in_("processing_status", list(IN_PROGRESS_STATUSES)) \
+            .lt("created_at", stale_cutoff()) \
+            .execute()
+        for row in res.data or []:
+            expire_upload(row["id"])
+    except Exception as e:
+        logger.error(f"❌ Failed to clean up interrupted uploads: {e}")
+
+
+def duplicate_upload_response(
+    user_id: str,
+    upload_type: str,
+    fingerprint: str,
+    idempotency_key: Optional[str]
+) -> Optional[Any]:
+    """
+    Response for a repeated upload without parsing it again or re-applying metrics,
+    or None when the file has not been uploaded before. It carries the stored upload's
+    id, row counts and metrics but not its parsed rows (parsed_data is empty).
+    """
+    if idempotency_key:
+        known = upload_cache.fingerprint_for_key(user_id, idempotency_key)
+        if known is not None and known != fingerprint:
+            raise HTTPException(status_code=409, detail="Idempotency-Key was already used for a different file")
+    
+    cached = upload_cache.get(user_id, fingerprint)
+    if cached is not None:
+        logger.info(f"Duplicate upload answered from cache: {cached['upload_id']}")
+        if idempotency_key:
+            upload_cache.remember_key(user_id, idempotency_key, fingerprint)
+        return {**cached, "parsed_data": [], "duplicate": True}
+    
+    row = find_existing_upload(user_id, fingerprint, idempotency_key)
+    if row is None:
+        return None
+    
+    logger.info(f"Duplicate upload of {row['id']} ({row.get('processing_status')})")
+    if row.get("processing_status") in ("pending", "processing"):
+        return JSONResponse(status_code=202, content={
+            "message": "File is already being processed",
+            "job_id": row["id"],
+            "upload_id": row["id"],
+            "status": row["processing_status"],
+            "status_url": f"/upload/jobs/{row['id']}",
+            "duplicate": True
+        })
+    
+    parsed_data = hydrate_uploads([row])[0].get("parsed_data") or []
+    # Rows flagged as duplicates were not counted when the file was first uploaded
+    counted = [r for r in parsed_data if not is_duplicate_row(r)]
+    response = upload_response(row["id"], {
+        "streamed_rows": len(response_rows(parsed_data)),
+        "duplicate_rows": len(parsed_data) - len(counted),
+        "metrics": compute_metrics(counted, upload_type)
+    })
+    response["message"] = "File was already uploaded; returning the stored result"
+    upload_cache.put(user_id, fingerprint, response, idempotency_key)
+    return {**response, "duplicate": True}
+
+
+def is_unique_violation(error: Exception) -> bool:
+    """True when a write hit a unique index (Postgres 23505)."""
+    text = str(error)
+    return "23505" in text or "duplicate key value violates unique constraint" in text
+
+
+def insert_upload_rows(rows: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """
+    Insert financial_uploads rows in one batch and return their ids. The unique index on
+    (user_id, content_hash) rejects a file another request stored meanwhile: the rows are
+    then inserted one at a time and the rejected ones get None.
+    """
+    try:
+        res = supabase.table("financial_uploads").insert(rows).execute()
+    except Exception as e:
+        if not is_unique_violation(e):
+            raise
+        if len(rows) == 1:
+            logger.info(f"Upload {rows[0].get('content_hash')} was stored concurrently by another request")
+            return [None]
+        return [insert_upload_rows([row])[0] for row in rows]
+    if not res.data or len(res.data) != len(rows):
+        raise HTTPException(status_code=500, detail="Failed to save upload record")
+    return [row["id"] for row in res.data]
+
+
+def concurrent_upload_response(
+    user_id: str,
+    upload_type: str,
+    fingerprint: str,
+    idempotency_key: Optional[str]
+) -> Any:
+    """Response for an upload whose row lost the race to store the same file."""
+    duplicate = duplicate_upload_response(user_id, upload_type, fingerprint, idempotency_key)
+    if duplicate is None:
+        raise HTTPException(status_code=409, detail="The same file is being uploaded concurrently; please retry")
+    return duplicate
+
+
+def upload_response(upload_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    parsed_data = response_rows(result.get("parsed_data", []))
+    return {
+        "message": "File processed and saved successfully", 
+        "upload_id": upload_id,
+        "rows_parsed": result.get("streamed_rows", len(parsed_data)),
+        "parsed_data": parsed_data,
+        "metrics": result.get("metrics", {}),
+        "column_mapping": result.get("column_mapping"),
+        "confidence": result.get("confidence", 100),
+        "amount_parse_errors": result.get("amount_parse_errors"),
+        "duplicate_rows": result.get("duplicate_rows", 0),
+        "streaming": result.get("streaming")
+    }
+
+
+async def parse_spooled_upload(spooled, upload_type: str, stream: bool, chunk_rows: Optional[int]) -> Dict[str, Any]:
+    """Parse a spooled upload in the process pool, mapping pool limits to HTTP errors."""
+    try:
+        result = await parse_executor.parse(
+            spooled.path, spooled.filename, upload_type, stream=stream, chunk_rows=chunk_rows
+        )
+    except ParseQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ParseTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    
+    if result.get("streaming"):
+        logger.info(f"✅ Streaming stats: {result['streaming']}")
+    
+    parsed_data = result.get("parsed_data", [])
+    rows_parsed = result.get("rows_parsed", len(parsed_data)) if result.get("row_spool") else len(parsed_data)
+    logger.info(f"✅ Parsed {rows_parsed} rows")
+    logger.info(f"✅ Metrics: {result.get('metrics', {})}")
+    
+    if not rows_parsed:
+        raise HTTPException(status_code=400, detail="No data could be parsed from the file")
+    
+    # Log first few rows for debugging
+    for i, row in enumerate(parsed_data[:3]):
+        logger.info(f"Row {i}: {row}")
+    
+    return result
+
+
+# Rows of a streamed upload returned in its upload response
+STREAM_PREVIEW_ROWS = 100
+
+
+def ingest_row_spool(
+    user_id: str,
+    upload_id: str,
+    upload_type: str,
+    result: Dict[str, Any],
+    seen: Optional[set] = None
+) -> Dict[str, Any]:
+    """
+    Store a streamed parse's rows one spooled chunk at a time: each chunk is deduped and
+    written to the transactions table, the dedupe index and the columnar store before the
+    next is read, while metrics and the rollup delta are summed. Inline JSON parsed_data
+    is one column value, so without the columnar store the kept rows are still collected.
+    Returns result with the summed metrics and rollups, the upload row's parsed data
+    fields, and the first STREAM_PREVIEW_ROWS rows as parsed_data for the response.
+    """
+    spool = RowSpool(result["row_spool"])
+    writer = ParsedDataWriter(user_id) if should_store_columnar(upload_type) else None
+    user_rules = fetch_user_rules(user_id)
+    occurrences = HashOccurrences()
+    metrics: Dict[str, float] = {}
+    rollups: List[Dict[str, Any]] = []
+    inline: List[Dict[str, Any]] = []
+    preview: List[Dict[str, Any]] = []
+    stored = duplicate_rows = offset = 0
+    
+    try:
+        for rows in spool.chunks():
+            chunk = dedupe_parse_result(
+                user_id, upload_type,
+                {"parsed_data": rows, "metrics": compute_metrics(rows, upload_type)},
+                seen, occurrences
+            )
+            rows = chunk["parsed_data"]
+            register_hashes(user_id, upload_id, chunk.get("row_hashes", []))
+            write_transactions(user_id, upload_id, upload_type, rows, first_row=offset)
+            offset += len(rows)
+            metrics = add_metrics(metrics, chunk["metrics"])
+            rollups = merge_rollups(rollups, rollup_delta([{"file_type": upload_type, "parsed_data": rows}], user_rules))
+            if writer is not None:
+                writer.write(rows)
+            else:
+                inline.extend(rows)
+            shown = response_rows(rows)
+            preview.extend(shown[:STREAM_PREVIEW_ROWS - len(preview)])
+            stored += len(shown)
+            duplicate_rows += chunk.get("duplicate_rows", 0)
+        
+        fields = {"parsed_data": [], "parsed_data_ref": writer.close()} if writer is not None else {"parsed_data": inline}
+    except Exception:
+        if writer is not None:
+            writer.abort()
+        raise
+    finally:
+        spool.remove()
+    
+    logger.info(f"✅ Stored {stored} streamed rows for upload {upload_id}")
+    return {
+        **result,
+        "parsed_data": preview,
+        "streamed_rows": stored,
+        "duplicate_rows": duplicate_rows,
+        "metrics": metrics,
+        "rollups": rollups,
+        "upload_fields": fields
+    }
+
+
+def discard_streamed_rows(upload_id: str) -> None:
+    """Remove what a failed streamed ingest wrote for an upload before it stopped."""
+    for table in ("transactions", "transaction_hashes"):
+        try:
+            supabase.table(table).delete().eq("upload_id", upload_id).execute()
+        except Exception as e:
+            logger.error(f"❌ Failed to clear {table} of upload {upload_id}: {e}")
+
+
+def complete_streamed_upload(user_id: str, upload_id: str, upload_type: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ingest a streamed parse into its already created upload row and mark it completed,
+    then apply its metrics and rollups. On failure the rows written so far are removed
+    and the upload is marked failed, so it can be retried.
+    """
+    try:
+        result = ingest_row_spool(user_id, upload_id, upload_type, result)
+    except Exception as e:
+        discard_streamed_rows(upload_id)
+        supabase.table("financial_uploads").update({
+            "processing_status": "failed",
+            "error_message": str(e)
+        }).eq("id", upload_id).execute()
+        raise
+    
+    supabase.table("financial_uploads").update({
+        "processing_status": "completed",
+        **result["upload_fields"]
+    }).eq("id", upload_id).execute()
+    apply_metrics_delta(user_id, upload_id, result["metrics"])
+    record_upload_rollups(user_id, [], result["rollups"])
+    refresh_user_benchmark(user_id)
+    analytics_cache.invalidate(user_id)
+    transaction_index_cache.invalidate(user_id)
+    return result
+
+
 @app.post("/upload/financials")
 async def upload_financials(
     file: UploadFile = File(...),
     type: Literal['bank', 'sales', 'purchase', 'inventory', 'loan'] = Form(...),
+    stream: bool = Form(False),
+    chunk_rows: Optional[int] = Form(None),
+    async_processing: bool = Form(False),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     user_id: str = Depends(get_current_user)
 ):
     """
     Upload a financial file (CSV/XLSX) - PREVIEW AND STORE.
     Returns parsed data for frontend display, then stores to database.
+    The request body is spooled to a temp file and parsed through a memory map
+    in the parse process pool; with stream=true it is parsed in chunks of chunk_rows rows.
+    With async_processing=true the file is queued and 202 is returned with a job id
+    to poll at /upload/jobs/{job_id}.
+    Re-uploading the same file as the same type, or retrying with the same Idempotency-Key
+    header, returns the stored result (duplicate=true) without parsing or counting it again.
     """
+    spooled = None
     try:
-        content = await file.read()
         logger.info(f"Received upload: {file.filename} of type {type} for user {user_id}")
         
-        logger.info(f"Received upload: {file.filename} of type {type} for user {user_id}")
+        if idempotency_key is not None and not 0 < len(idempotency_key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise HTTPException(status_code=400, detail="Invalid Idempotency-Key header")
+        
+        spooled = await spool_upload(file)
+        await file.close()
+        
+        fingerprint = upload_fingerprint(spooled.sha256, type)
+        duplicate = duplicate_upload_response(user_id, type, fingerprint, idempotency_key)
+        if duplicate is not None:
+            return duplicate
+        
+        if async_processing:
+            job = enqueue_upload_job(spooled, type, stream, chunk_rows, user_id, fingerprint, idempotency_key)
+            if job is None:
+                return concurrent_upload_response(user_id, type, fingerprint, idempotency_key)
+            spooled = None  # now owned by the job
+            if idempotency_key:
+                upload_cache.remember_key(user_id, idempotency_key, fingerprint)
+            return JSONResponse(status_code=202, content={
+                "message": "File accepted for processing",
+                "job_id": job.job_id,
+                "upload_id": job.job_id,
+                "status": job.status,
+                "status_url": f"/upload/jobs/{job.job_id}"
+            })
+        
+        result = await parse_spooled_upload(spooled, type, stream, chunk_rows)
+        db_type, db_filename = db_upload_identity(type, spooled.filename)
+        
+        if result.get("row_spool"):
+            upload_id = insert_upload_rows([{
+                "user_id": user_id,
+                "filename": db_filename,
+                "file_type": db_type,
+                "processing_status": "processing",
+                "content_hash": fingerprint,
+                "idempotency_key": idempotency_key,
+                "parsed_data": []
+            }])[0]
+            if upload_id is None:
+                return concurrent_upload_response(user_id, type, fingerprint, idempotency_key)
+            result = complete_streamed_upload(user_id, upload_id, type, result)
+            
+            response = upload_response(upload_id, result)
+            upload_cache.put(user_id, fingerprint, response, idempotency_key)
+            return response
         
-        result = await process_financial_data(content, file.filename, type)
+        result = dedupe_parse_result(user_id, type, result)
         metrics = result.get("metrics", {})
         parsed_data = result.get("parsed_data", [])
         
-        logger.info(f"✅ Parsed {len(parsed_data)} rows")
-        logger.info(f"✅ Metrics: {metrics}")
-        
-        if not parsed_data:
-            raise HTTPException(status_code=400, detail="No data could be parsed from the file")
-        
-        # Log first few rows for debugging
-        for i, row in enumerate(parsed_data[:3]):
-            logger.info(f"Row {i}: {row}")
-        
-        filename = file.filename or "uploaded_file.csv"
-        
-        filename = file.filename or "uploaded_file.csv"
-        
-        # DB CONSTRAINT WORKAROUND: Masquerade 'inventory' and 'loan' as 'bank'
-        # but prepend specific tag to filename for downstream identification.
-        
-        db_type = type
-        db_filename = filename
-        
-        if type in ['inventory', 'loan']:
-            db_type = 'bank' # Masquerade as allowed type
-            tag = f"[{type.upper()}]"
-            if not db_filename.startswith(tag):
-                db_filename = f"{tag} {db_filename}"
-                
         upload_data = {
             "user_id": user_id,
             "filename": db_filename,
             "file_type": db_type,
             "processing_status": "completed",
-            "parsed_data": parsed_data
+            "content_hash": fingerprint,
+            "idempotency_key": idempotency_key,
+            **parsed_data_fields(user_id, type, parsed_data)
         }
         
         logger.info(f"=== STORING TO DATABASE ===")
         logger.info(f"Storing {len(parsed_data)} rows to financial_uploads")
         
-        res_upload = supabase.table("financial_uploads").insert(upload_data).execute()
-        if not res_upload.data:
-            raise HTTPException(status_code=500, detail="Failed to save upload record")
-            
-        upload_id = res_upload.data[0]['id']
+        upload_id = insert_upload_rows([upload_data])[0]
+        if upload_id is None:
+            if upload_data.get("parsed_data_ref"):
+                delete_parsed_data(upload_data["parsed_data_ref"])
+            return concurrent_upload_response(user_id, type, fingerprint, idempotency_key)
         logger.info(f"✅ Upload saved with ID: {upload_id}")
         
-        # Fetch existing metrics for this user
-        existing_metrics = supabase.table("financial_metrics").select("*").eq("user_id", user_id).execute()
-        
-        current = existing_metrics.data[0] if existing_metrics.data else {}
-        
-        new_total_revenue = current.get("total_revenue", 0) + metrics.get("total_revenue", 0)
-        new_total_expenses = current.get("total_expenses", 0) + metrics.get("total_expenses", 0)
-        new_cash_inflow = current.get("cash_inflow", 0) + metrics.get("cash_inflow", 0)
-        new_cash_outflow = current.get("cash_outflow", 0) + metrics.get("cash_outflow", 0)
-        new_receivables = current.get("total_receivables", 0) + metrics.get("total_receivables", 0)
-        new_payables = current.get("total_payables", 0) + metrics.get("total_payables", 0)
+        register_hashes(user_id, upload_id, result.get("row_hashes", []))
+        store_transactions(user_id, upload_id, type, parsed_data)
+        apply_metrics_delta(user_id, upload_id, metrics)
+        record_upload_rollups(user_id, [{"file_type": type, "parsed_data": parsed_data}])
+        refresh_user_benchmark(user_id)
+        analytics_cache.invalidate(user_id)
+        transaction_index_cache.invalidate(user_id)
+        
+        response = upload_response(upload_id, result)
+        upload_cache.put(user_id, fingerprint, response, idempotency_key)
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error processing upload: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if spooled is not None:
+            spooled.remove()
+
+
+def enqueue_upload_job(
+    spooled,
+    upload_type: str,
+    stream: bool,
+    chunk_rows: Optional[int],
+    user_id: str,
+    fingerprint: Optional[str] = None,
+    idempotency_key: Optional[str] = None
+) -> Optional[UploadJob]:
+    """
+    Record a pending financial_uploads row and queue the spooled file for parsing.
+    The upload row id doubles as the job id. Returns None, queuing nothing, when a
+    concurrent request already recorded the same file.
+    """
+    db_type, db_filename = db_upload_identity(upload_type, spooled.filename)
+    
+    upload_id = insert_upload_rows([{
+        "user_id": user_id,
+        "filename": db_filename,
+        "file_type": db_type,
+        "processing_status": "pending",
+        "content_hash": fingerprint,
+        "idempotency_key": idempotency_key,
+        "parsed_data": []
+    }])[0]
+    if upload_id is None:
+        return None
+    
+    async def process(job: UploadJob) -> Dict[str, Any]:
+        try:
+            supabase.table("financial_uploads").update({"processing_status": "processing"}).eq("id", upload_id).execute()
+            result = await parse_spooled_upload(spooled, upload_type, stream, chunk_rows)
+            if result.get("row_spool"):
+                result = complete_streamed_upload(user_id, upload_id, upload_type, result)
+                return {
+                    "rows_parsed": result["streamed_rows"],
+                    "duplicate_rows": result.get("duplicate_rows", 0),
+                    "metrics": result.get("metrics", {}),
+                    "confidence": result.get("confidence", 100),
+                    "amount_parse_errors": result.get("amount_parse_errors")
+                }
+            result = dedupe_parse_result(user_id, upload_type, result)
+            parsed_data = result.get("parsed_data", [])
+            
+            supabase.table("financial_uploads").update({
+                "processing_status": "completed",
+                **parsed_data_fields(user_id, upload_type, parsed_data)
+            }).eq("id", upload_id).execute()
+            register_hashes(user_id, upload_id, result.get("row_hashes", []))
+            store_transactions(user_id, upload_id, upload_type, parsed_data)
+            apply_metrics_delta(user_id, upload_id, result.get("metrics", {}))
+            record_upload_rollups(user_id, [{"file_type": upload_type, "parsed_data": parsed_data}])
+            refresh_user_benchmark(user_id)
+            analytics_cache.invalidate(user_id)
+            transaction_index_cache.invalidate(user_id)
+            
+            return {
+                "rows_parsed": len(response_rows(parsed_data)),
+                "duplicate_rows": result.get("duplicate_rows", 0),
+                "metrics": result.get("metrics", {}),
+                "confidence": result.get("confidence", 100),
+                "amount_parse_errors": result.get("amount_parse_errors")
+            }
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            supabase.table("financial_uploads").update({
+                "processing_status": "failed",
+                "error_message": error
+            }).eq("id", upload_id).execute()
+            raise ValueError(error) from e
+        finally:
+            spooled.remove()
+    
+    job = UploadJob(upload_id, user_id, spooled.filename, upload_type)
+    try:
+        return upload_job_queue.submit(job, process)
+    except UploadQueueFull as e:
+        supabase.table("financial_uploads").update({
+            "processing_status": "failed",
+            "error_message": str(e)
+        }).eq("id", upload_id).execute()
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+UPLOAD_TYPES = ('bank', 'sales', 'purchase', 'inventory', 'loan')
+
+
+@app.post("/upload/financials/bulk")
+async def upload_financials_bulk(
+    files: List[UploadFile] = File(...),
+    manifest: Optional[str] = Form(None),
+    stream: bool = Form(False),
+    chunk_rows: Optional[int] = Form(None),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Upload many financial files at once - separate files and/or ZIP archives.
+    manifest maps each file name to its type, e.g. {"jan.csv": "bank", "sales.xlsx": "sales"};
+    a manifest.json inside a ZIP is used for that archive's files.
+    Files are parsed in parallel, all upload rows are written in one batch and a single
+    combined metrics delta is applied. Files that fail are reported and skipped;
+    files already uploaded are listed under duplicates and not counted again.
+    """
+    spooled_files = []
+    try:
+        try:
+            file_types = parse_manifest(manifest or "")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid manifest: {e}")
+        
+        for file in files:
+            spooled = await spool_upload(file)
+            await file.close()
+            if is_zip_upload(spooled):
+                try:
+                    members, archive_types = extract_zip(spooled)
+                except (ValueError, zipfile.BadZipFile) as e:
+                    raise HTTPException(status_code=400, detail=f"{spooled.filename}: {e}")
+                finally:
+                    spooled.remove()
+                spooled_files.extend(members)
+                file_types = {**archive_types, **file_types}
+            else:
+                spooled_files.append(spooled)
+        
+        logger.info(f"Bulk upload: {len(spooled_files)} files for user {user_id}")
+        
+        if not spooled_files:
+            raise HTTPException(status_code=400, detail="No files found in upload")
+        
+        untyped = [s.filename for s in spooled_files if file_types.get(s.filename) not in UPLOAD_TYPES]
+        if untyped:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Manifest needs a type ({', '.join(UPLOAD_TYPES)}) for: {', '.join(untyped)}"
+            )
         
-        new_payables = current.get("total_payables", 0) + metrics.get("total_payables", 0)
+        # Skip files uploaded before, or repeated within this request
+        first_seen: Dict[str, str] = {}
+        duplicates = []
+        to_parse = []
+        for spooled in spooled_files:
+            file_type = file_types[spooled.filename]
+            fingerprint = upload_fingerprint(spooled.sha256, file_type)
+            if fingerprint in first_seen:
+                duplicates.append({"filename": spooled.filename, "type": file_type, "duplicate_of": first_seen[fingerprint]})
+                continue
+            first_seen[fingerprint] = spooled.filename
+            
+            cached = upload_cache.get(user_id, fingerprint)
+            existing = {"id": cached["upload_id"]} if cached else \
+                find_existing_upload(user_id, fingerprint, columns="id, content_hash, processing_status, created_at")
+            if existing:
+                duplicates.append({"filename": spooled.filename, "type": file_type, "upload_id": existing["id"]})
+                continue
+            to_parse.append((spooled, fingerprint))
+        
+        # Parse in parallel, at most one file per pool worker at a time
+        limit = asyncio.Semaphore(max(1, parse_executor.workers))
+        
+        async def parse_one(spooled):
+            async with limit:
+                try:
+                    return await parse_spooled_upload(spooled, file_types[spooled.filename], stream, chunk_rows)
+                except HTTPException as e:
+                    return e
+                except Exception as e:
+                    logger.error(f"❌ Bulk parse failed for {spooled.filename}: {e}")
+                    return e
+        
+        results = await asyncio.gather(*(parse_one(spooled) for spooled, _ in to_parse))
+        
+        upload_rows = []
+        parsed = []
+        errors = []
+        seen_hashes = set()  # rows of earlier files in this request count as already ingested
+        for (spooled, fingerprint), result in zip(to_parse, results):
+            if isinstance(result, Exception):
+                detail = result.detail if isinstance(result, HTTPException) else str(result)
+                errors.append({"filename": spooled.filename, "error": detail})
+                continue
+            
+            file_type = file_types[spooled.filename]
+            db_type, db_filename = db_upload_identity(file_type, spooled.filename)
+            if result.get("row_spool"):
+                # Streamed files are stored chunk by chunk once their upload row exists
+                fields = {"processing_status": "processing", "parsed_data": []}
+            else:
+                result = dedupe_parse_result(user_id, file_type, result, seen_hashes)
+                fields = {
+                    "processing_status": "completed",
+                    **parsed_data_fields(user_id, file_type, result.get("parsed_data", []))
+                }
+            upload_rows.append({
+                "user_id": user_id,
+                "filename": db_filename,
+                "file_type": db_type,
+                "content_hash": fingerprint,
+                **fields
+            })
+            parsed.append((spooled.filename, file_type, result))
+        
+        if not upload_rows and not duplicates:
+            raise HTTPException(status_code=400, detail={"message": "No file could be parsed", "errors": errors})
+        
+        if not upload_rows:
+            return {
+                "message": f"0 of {len(spooled_files)} files processed; the rest were already uploaded",
+                "metrics": {},
+                "files": [],
+                "duplicates": duplicates,
+                "errors": errors
+            }
         
-        new_net_profit = new_total_revenue - new_total_expenses
-        new_profit_margin = (new_net_profit / new_total_revenue * 100) if new_total_revenue > 0 else 0.0
+        logger.info(f"=== STORING {len(upload_rows)} UPLOADS IN ONE BATCH ===")
+        upload_ids = insert_upload_rows(upload_rows)
+        
+        user_rules = fetch_user_rules(user_id)
+        saved = []
+        rollups: List[Dict[str, Any]] = []
+        for upload_id, row, (filename, file_type, result) in zip(upload_ids, upload_rows, parsed):
+            if upload_id is None:
+                # Stored by a concurrent request since the duplicate check above
+                if row.get("parsed_data_ref"):
+                    delete_parsed_data(row["parsed_data_ref"])
+                existing = find_existing_upload(
+                    user_id, row["content_hash"], columns="id, content_hash, processing_status, created_at"
+                )
+                duplicates.append({"filename": filename, "type": file_type, "upload_id": existing and existing["id"]})
+                continue
+            if result.get("row_spool"):
+                try:
+                    result = ingest_row_spool(user_id, upload_id, file_type, result, seen_hashes)
+                except Exception as e:
+                    logger.error(f"❌ Bulk ingest failed for {filename}: {e}")
+                    discard_streamed_rows(upload_id)
+                    supabase.table("financial_uploads").update({
+                        "processing_status": "failed",
+                        "error_message": str(e)
+                    }).eq("id", upload_id).execute()
+                    errors.append({"filename": filename, "error": str(e)})
+                    continue
+                supabase.table("financial_uploads").update({
+                    "processing_status": "completed",
+                    **result["upload_fields"]
+                }).eq("id", upload_id).execute()
+                rollups = merge_rollups(rollups, result["rollups"])
+            else:
+                register_hashes(user_id, upload_id, result.get("row_hashes", []))
+                store_transactions(user_id, upload_id, file_type, result.get("parsed_data", []))
+                rollups = merge_rollups(rollups, rollup_delta(
+                    [{"file_type": file_type, "parsed_data": result.get("parsed_data", [])}], user_rules
+                ))
+            saved.append((upload_id, filename, file_type, result))
+        
+        combined_metrics: Dict[str, float] = {}
+        for _, _, _, result in saved:
+            combined_metrics = add_metrics(combined_metrics, result.get("metrics", {}))
+        
+        if saved:
+            apply_metrics_delta(user_id, saved[-1][0], combined_metrics)
+            record_upload_rollups(user_id, [], rollups)
+            refresh_user_benchmark(user_id)
+        analytics_cache.invalidate(user_id)
+        transaction_index_cache.invalidate(user_id)
         
-        metrics_payload = {
-            "user_id": user_id,
-            "upload_id": upload_id,  # Use latest upload_id (required NOT NULL field)
-            "total_revenue": new_total_revenue,
-            "total_expenses": new_total_expenses,
-            "cash_inflow": new_cash_inflow,
-            "cash_outflow": new_cash_outflow,
-            "total_receivables": new_receivables,
-            "total_payables": new_payables,
-            "net_profit": new_net_profit,
-            "profit_margin": new_profit_margin
+        return {
+            "message": f"{len(saved)} of {len(spooled_files)} files processed and saved",
+            "metrics": combined_metrics,
+            "files": [
+                {
+                    "filename": filename,
+                    "type": file_type,
+                    "upload_id": upload_id,
+                    "rows_parsed": result.get("streamed_rows", len(response_rows(result.get("parsed_data", [])))),
+                    "duplicate_rows": result.get("duplicate_rows", 0),
+                    "metrics": result.get("metrics", {}),
+                    "amount_parse_errors": result.get("amount_parse_errors")
+                }
+                for upload_id, filename, file_type, result in saved
+            ],
+            "duplicates": duplicates,
+            "errors": errors
         }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error processing bulk upload: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for spooled in spooled_files:
+            spooled.remove()
+
+
+@app.get("/upload/jobs/{job_id}")
+async def get_upload_job(job_id: str, user_id: str = Depends(get_current_user)):
+    """
+    Status of an asynchronous upload: pending, processing, completed or failed.
+    Falls back to the financial_uploads row when the job is no longer in memory.
+    """
+    job = upload_job_queue.get(job_id)
+    if job is not None and job.user_id == user_id:
+        return job.to_dict()
+    
+    try:
+        res = supabase.table("financial_uploads") \
+            .select("id, filename, file_type, processing_status, error_message, created_at") \
+            .eq("id", job_id) \
+            .eq("user_id", user_id) \
+            .limit(1) \
+            .execute()
+        if res.data and is_stale_upload(res.data[0]):
+            expire_upload(job_id)
+            res.data[0].update(processing_status="failed", error_message=INTERRUPTED_UPLOAD_ERROR)
+    except Exception as e:
+        logger.error(f"Upload job lookup error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if not res.data:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    
+    row = res.data[0]
+    return {
+        "job_id": row["id"],
+        "filename": row.get("filename"),
+        "type": row.get("file_type"),
+        "status": row.get("processing_status"),
+        "rows_parsed": None,
+        "result": {},
+        "error": row.get("error_message")
+    }
+
+
+def logical_upload_type(upload: Dict[str, Any]) -> str:
+    """Upload type as sent by the client, undoing the db_upload_identity masquerade."""
+    filename = str(upload.get("filename", ""))
+    for upload_type in ('inventory', 'loan'):
+        if filename.startswith(f"[{upload_type.upper()}]"):
+            return upload_type
+    return upload.get("file_type", "bank")
+
+
+def readmit_released_rows(user_id: str, released: set, since: str) -> int:
+    """
+    Count the rows that uploads stored since a deleted upload skipped as duplicates of
+    its rows: their flag is cleared and they are added to the dedupe index, transactions,
+    metrics and rollups. Returns the number of rows readmitted. Failures before the rows
+    are stored are logged and the rows stay flagged and uncounted; a failed metrics delta
+    is raised, since the rows are counted everywhere else by then.
+    """
+    if not released:
+        return 0
+    try:
+        res = supabase.table("financial_uploads") \
+            .select("id, filename, file_type, parsed_data, parsed_data_ref, created_at") \
+            .eq("user_id", user_id) \
+            .eq("processing_status", "completed") \
+            .gte("created_at", since) \
+            .order("created_at") \
+            .execute()
+        uploads = hydrate_uploads(res.data or [])
+        upload_types = [logical_upload_type(upload) for upload in uploads]
+        readmitted = readmit_duplicates(
+            released, [(t, upload.get("parsed_data") or []) for t, upload in zip(upload_types, uploads)]
+        )
+        if not readmitted:
+            return 0
+        
+        user_rules = fetch_user_rules(user_id)
+        metrics: Dict[str, float] = {}
+        rollups: List[Dict[str, Any]] = []
+        for index, rows, hashes in readmitted:
+            upload, upload_type = uploads[index], upload_types[index]
+            supabase.table("financial_uploads") \
+                .update(parsed_data_fields(user_id, upload_type, upload["parsed_data"])) \
+                .eq("id", upload["id"]) \
+                .execute()
+            if upload.get("parsed_data_ref"):
+                delete_parsed_data(upload["parsed_data_ref"])
+            register_hashes(user_id, upload["id"], hashes)
+            store_transactions(user_id, upload["id"], upload_type, rows)
+            upload_cache.discard_upload(user_id, upload["id"])
+            metrics = add_metrics(metrics, compute_metrics(rows, upload_type))
+            rollups = merge_rollups(rollups, rollup_delta([{"file_type": upload_type, "parsed_data": rows}], user_rules))
+            logger.info(f"Readmitted {len(rows)} rows of upload {upload['id']}")
+        
+        apply_rollup_delta(user_id, rollups)
+    except Exception as e:
+        logger.error(f"❌ Failed to readmit rows released by a deleted upload for user {user_id}: {e}")
+        return 0
+    
+    apply_metrics_delta(user_id, uploads[readmitted[-1][0]]["id"], metrics)
+    return sum(len(rows) for _, rows, _ in readmitted)
+
+
+@app.delete("/upload/{upload_id}")
+async def delete_upload(upload_id: str, user_id: str = Depends(get_current_user)):
+    """
+    Remove an upload and retract everything it contributed: metrics, monthly rollups,
+    normalized transactions, dedupe hashes and the stored parsed rows.
+    Rows that later uploads skipped as duplicates of its rows are counted from them instead.
+    """
+    try:
+        res = supabase.table("financial_uploads") \
+            .select("id, filename, file_type, processing_status, parsed_data, parsed_data_ref, created_at") \
+            .eq("id", upload_id) \
+            .eq("user_id", user_id) \
+            .limit(1) \
+            .execute()
+        if not res.data:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        
+        upload = res.data[0]
+        if is_stale_upload(upload):
+            expire_upload(upload_id)
+            upload["processing_status"] = "failed"
+        if upload.get("processing_status") in IN_PROGRESS_STATUSES:
+            raise HTTPException(status_code=409, detail="Upload is still being processed")
+        
+        upload_type = logical_upload_type(upload)
+        parsed_data = hydrate_uploads([upload])[0].get("parsed_data") or []
+        released = set()
+        
+        if upload.get("processing_status") == "completed":
+            released = fetch_upload_hashes(upload_id)
+            # Rows flagged as duplicates were never counted
+            counted = [row for row in parsed_data if not is_duplicate_row(row)]
+            remaining = supabase.table("financial_uploads") \
+                .select("id") \
+                .eq("user_id", user_id) \
+                .eq("processing_status", "completed") \
+                .execute()
+            other_ids = [row["id"] for row in remaining.data or [] if row["id"] != upload_id]
+            if other_ids:
+                # financial_metrics.upload_id must point at an upload that still exists
+                negated = {k: -v for k, v in compute_metrics(counted, upload_type).items()}
+                apply_metrics_delta(user_id, other_ids[-1], negated)
+            else:
+                supabase.table("financial_metrics").delete().eq("user_id", user_id).execute()
+            apply_rollup_delta(
+                user_id,
+                rollup_delta([{"file_type": upload_type, "parsed_data": counted}], fetch_user_rules(user_id)),
+                sign=-1
+            )
         
-        logger.info(f"=== UPSERT METRICS ===")
-        logger.info(f"Previous: {current}")
-        logger.info(f"New values: {metrics_payload}")
+        # transactions and transaction_hashes rows go with it (ON DELETE CASCADE)
+        supabase.table("financial_uploads").delete().eq("id", upload_id).eq("user_id", user_id).execute()
+        if upload.get("parsed_data_ref"):
+            delete_parsed_data(upload["parsed_data_ref"])
+        readmitted = readmit_released_rows(user_id, released, upload["created_at"])
         
-        if existing_metrics.data:
-            # UPDATE existing record using user_id as key
-            res_metrics = supabase.table("financial_metrics").update(metrics_payload).eq("user_id", user_id).execute()
-            logger.info(f"✅ Metrics UPDATED: {res_metrics.data}")
-        else:
-            # INSERT new record
-            res_metrics = supabase.table("financial_metrics").insert(metrics_payload).execute()
-            logger.info(f"✅ Metrics INSERTED: {res_metrics.data}")
+        refresh_user_benchmark(user_id)
+        analytics_cache.invalidate(user_id)
+        transaction_index_cache.invalidate(user_id)
+        upload_cache.discard_upload(user_id, upload_id)
+        logger.info(f"✅ Upload {upload_id} deleted ({len(parsed_data)} rows retracted)")
         
         return {
-            "message": "File processed and saved successfully", 
+            "message": "Upload deleted",
             "upload_id": upload_id,
-            "rows_parsed": len(parsed_data),
-            "parsed_data": parsed_data,
-            "metrics": metrics,
-            "column_mapping": result.get("column_mapping"),
-            "confidence": result.get("confidence", 100)
+            "rows_removed": len(parsed_data),
+            "rows_readmitted": readmitted
         }
-
+    
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"❌ Error processing upload: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.error(f"Delete upload error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/metrics/overview", response_model=MetricsResponse)
@@ -415,7 +1403,76 @@ async def get_gst_overview_endpoint(user_id: str = Depends(get_current_user)):
 
 
 
-from backend.services.bookkeeping_service import generate_bookkeeping_summary
+def fetch_user_metrics(user_id: str) -> Dict[str, Any]:
+    """Numeric financial_metrics fields of a user, summed across rows."""
+    metrics_result = supabase.table("financial_metrics") \
+        .select("*") \
+        .eq("user_id", user_id) \
+        .execute()
+    
+    metrics = {}
+    if metrics_result.data:
+        for row in metrics_result.data:
+            for key, val in row.items():
+                if isinstance(val, (int, float)) and key not in ['id', 'user_id']:
+                    metrics[key] = metrics.get(key, 0) + val
+    return metrics
+
+
+def get_user_dashboard(user_id: str) -> Dict[str, Any]:
+    """
+    All dashboard sections for a user from one scan of their uploads.
+    Served from the per-user cache until it expires or the user uploads again.
+    """
+    dashboard = analytics_cache.get(user_id)
+    if dashboard is not None:
+        return dashboard
+    
+    uploads_data = fetch_user_uploads(user_id)
+    dashboard = build_dashboard(uploads_data, fetch_user_metrics(user_id), load_user_rollups(user_id, uploads_data))
+    analytics_cache.put(user_id, dashboard)
+    logger.info(f"✅ Dashboard computed: {dashboard['transactions_scanned']} transactions scanned")
+    return dashboard
+
+
+def get_transaction_index(user_id: str) -> TransactionIndex:
+    """
+    The user's date-sorted transaction index, rebuilt after uploads or when it expires.
+    Only used when the transactions table is not kept (STORE_TRANSACTIONS off) or
+    its transaction_page function is not installed.
+    """
+    index = transaction_index_cache.get(user_id)
+    if index is None:
+        index = TransactionIndex(TransactionFrame.from_uploads(fetch_user_uploads(user_id)), fetch_user_rules(user_id))
+        transaction_index_cache.put(user_id, index)
+        logger.info(f"✅ Transaction index built: {len(index)} transactions")
+    return index
+
+
+def dashboard_section(user_id: str, name: str) -> Dict[str, Any]:
+    """One section of the user's dashboard; raises if it could not be computed."""
+    dashboard = get_user_dashboard(user_id)
+    if dashboard.get(name) is None:
+        raise ValueError(dashboard['errors'].get(name, f"{name} unavailable"))
+    return dashboard[name]
+
+
+@app.get("/api/analytics/dashboard")
+async def get_analytics_dashboard(user_id: str = Depends(get_current_user)):
+    """
+    Bookkeeping, forecast, working capital, inventory and loan sections in one response,
+    computed from a single scan of the user's data. Failed sections are null and listed in errors.
+    """
+    try:
+        logger.info(f"Dashboard request from user: {user_id}")
+        return get_user_dashboard(user_id)
+        
+    except Exception as e:
+        logger.error(f"Dashboard error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+
 
 class BookkeepingSummaryResponse(BaseModel):
     total_income: float
@@ -438,30 +1495,7 @@ async def get_bookkeeping_summary(user_id: str = Depends(get_current_user)):
     try:
         logger.info(f"Bookkeeping summary request from user: {user_id}")
         
-        # Fetch all user uploads with parsed_data
-        result = supabase.table("financial_uploads") \
-            .select("file_type, parsed_data, filename") \
-            .eq("user_id", user_id) \
-            .eq("processing_status", "completed") \
-            .execute()
-        
-        uploads_data = result.data if result.data else []
-        
-        if not uploads_data:
-            return BookkeepingSummaryResponse(
-                total_income=0,
-                total_expenses=0,
-                net_balance=0,
-                monthly_income=[],
-                monthly_expenses=[],
-                expense_categories=[],
-                cash_transactions=0,
-                non_cash_transactions=0,
-                total_transactions=0,
-                has_sufficient_data=False
-            )
-        
-        summary = generate_bookkeeping_summary(uploads_data)
+        summary = bookkeeping_from_rollups(load_user_rollups(user_id))
         logger.info(f"✅ Bookkeeping summary generated: {summary['total_transactions']} transactions")
         
         return BookkeepingSummaryResponse(**summary)
@@ -473,8 +1507,6 @@ async def get_bookkeeping_summary(user_id: str = Depends(get_current_user)):
 
 
 
-from backend.services.forecasting_service import generate_forecast
-
 class ForecastResponse(BaseModel):
     has_sufficient_data: bool
     message: Optional[str] = None
@@ -492,41 +1524,81 @@ async def get_financial_forecast(user_id: str = Depends(get_current_user)):
     try:
         logger.info(f"Forecast request from user: {user_id}")
         
-        # Fetch all user uploads with parsed_data
-        uploads_result = supabase.table("financial_uploads") \
-            .select("file_type, parsed_data, filename") \
-            .eq("user_id", user_id) \
-            .eq("processing_status", "completed") \
-            .execute()
-        
-        uploads_data = uploads_result.data if uploads_result.data else []
+        forecast = forecast_from_rollups(load_user_rollups(user_id), fetch_user_metrics(user_id))
+        logger.info(f"✅ Forecast generated: {forecast.get('has_sufficient_data')}")
         
-        # Fetch current metrics for fallback
-        metrics_result = supabase.table("financial_metrics") \
-            .select("*") \
-            .eq("user_id", user_id) \
-            .execute()
+        return ForecastResponse(**forecast)
         
-        current_metrics = {}
-        if metrics_result.data:
-            for row in metrics_result.data:
-                for key, val in row.items():
-                    if isinstance(val, (int, float)) and key not in ['id', 'user_id']:
-                        current_metrics[key] = current_metrics.get(key, 0) + val
+    except Exception as e:
+        logger.error(f"Forecast error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/forecast")
+async def get_custom_forecast(
+    horizon: int = 3,
+    granularity: Literal['month', 'week'] = 'month',
+    model: Literal['moving_average', 'exponential_smoothing', 'seasonal_naive'] = 'moving_average',
+    evaluate: bool = False,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Forecast revenue, expenses and cash flow for `horizon` months or weeks after the latest data
+    with a deterministic model. evaluate=true adds each metric's backtest error.
+    """
+    try:
+        logger.info(f"Forecast request from user: {user_id} ({model}, {horizon} x {granularity})")
         
-        forecast = generate_forecast(uploads_data, current_metrics)
-        logger.info(f"✅ Forecast generated: {forecast.get('has_sufficient_data')}")
+        if granularity == 'month':
+            series = monthly_series_from_rollups(load_user_rollups(user_id))
+        elif STORE_TRANSACTIONS:
+            repair_transactions(user_id)
+            series = series_from_period_totals(period_totals(user_id, granularity), granularity)
+        else:
+            series = monthly_series(TransactionFrame.from_uploads(fetch_user_uploads(user_id)), granularity)
         
-        return ForecastResponse(**forecast)
+        return generate_period_forecast(series, model, horizon, granularity, evaluate)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Forecast error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/forecast/scenarios")
+async def get_cash_flow_scenarios(
+    months: int = 12,
+    paths: int = SIMULATION_DEFAULT_PATHS,
+    method: Literal['bootstrap', 'parametric'] = 'bootstrap',
+    starting_cash: Optional[float] = None,
+    seed: Optional[int] = None,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Monte Carlo cash balance scenarios from the user's monthly bank inflow / outflow history.
+    Returns percentile bands per month and the probability of cash going below zero.
+    starting_cash defaults to the net cash flow recorded in the uploaded bank statements.
+    """
+    try:
+        logger.info(f"Cash flow scenarios request from user: {user_id} ({method}, {paths} paths x {months} months)")
+        
+        cash_in, cash_out = bank_flows_from_rollups(load_user_rollups(user_id))
+        if starting_cash is None:
+            metrics = fetch_user_metrics(user_id)
+            starting_cash = metrics.get("cash_inflow", 0) - metrics.get("cash_outflow", 0)
+        
+        return simulate_cash_flow(
+            cash_in, cash_out, starting_cash,
+            months=months, paths=paths, method=method, seed=seed
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Cash flow scenarios error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 
-from backend.services.working_capital_service import calculate_working_capital
 
 class WorkingCapitalResponse(BaseModel):
     receivables: float
@@ -535,41 +1607,40 @@ class WorkingCapitalResponse(BaseModel):
     risk_level: str
     key_observations: List[str]
     has_sufficient_data: bool
+    as_of: Optional[str] = None
+    receivables_aging: Optional[Dict[str, Any]] = None
+    payables_aging: Optional[Dict[str, Any]] = None
+    dso: Optional[float] = None
+    dpo: Optional[float] = None
+    cash_conversion_cycle: Optional[float] = None
+    turnover_period_days: Optional[int] = None
 
 @app.get("/api/working-capital/health", response_model=WorkingCapitalResponse)
-async def get_working_capital_health(user_id: str = Depends(get_current_user)):
+async def get_working_capital_health(
+    as_of: Optional[str] = None,
+    user_id: str = Depends(get_current_user)
+):
     """
     Calculate working capital health metrics.
+    Unpaid invoices are aged as of the given date (default: latest sales / purchase date).
     """
     try:
         logger.info(f"Working capital request from user: {user_id}")
         
-        # Fetch uploads
-        uploads_result = supabase.table("financial_uploads") \
-            .select("file_type, parsed_data, filename") \
-            .eq("user_id", user_id) \
-            .eq("processing_status", "completed") \
-            .execute()
-        uploads_data = uploads_result.data if uploads_result.data else []
-        
-        # Fetch metrics
-        metrics_result = supabase.table("financial_metrics") \
-            .select("*") \
-            .eq("user_id", user_id) \
-            .execute()
-        
-        metrics = {}
-        if metrics_result.data:
-            for row in metrics_result.data:
-                for key, val in row.items():
-                    if isinstance(val, (int, float)) and key not in ['id', 'user_id']:
-                        metrics[key] = metrics.get(key, 0) + val
-        
-        result = calculate_working_capital(uploads_data, metrics)
+        if as_of is None:
+            result = dashboard_section(user_id, 'working_capital')
+        else:
+            as_of_date = parse_date(as_of)
+            if as_of_date is None:
+                raise HTTPException(status_code=400, detail=f"Invalid as_of date: {as_of}")
+            frame = TransactionFrame.from_uploads(fetch_user_uploads(user_id))
+            result = calculate_working_capital(frame, fetch_user_metrics(user_id), as_of_date)
         logger.info(f"✅ Working capital calculated: risk={result['risk_level']}")
         
         return WorkingCapitalResponse(**result)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Working capital error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -577,31 +1648,32 @@ async def get_working_capital_health(user_id: str = Depends(get_current_user)):
 
 
 
-from backend.services.inventory_loan_service import get_inventory_summary, get_loan_summary
-
 class InventorySummaryResponse(BaseModel):
     total_items: int
     total_quantity: Optional[int] = 0
     total_value: float
     top_items: Optional[List[Dict[str, Any]]] = []
+    aggregation: Optional[str] = None
+    snapshots: Optional[int] = None
     has_data: bool
 
 @app.get("/api/inventory/summary", response_model=InventorySummaryResponse)
-async def get_inventory_data(user_id: str = Depends(get_current_user)):
+async def get_inventory_data(
+    aggregation: Optional[Literal['latest', 'sum']] = None,
+    user_id: str = Depends(get_current_user)
+):
     """
     Get inventory snapshot from uploaded inventory data.
+    'latest' reports the most recent upload as the full stock count; 'sum' adds up every
+    upload's figures per SKU / item name (default: INVENTORY_AGGREGATION).
     """
     try:
         logger.info(f"Inventory summary request from user: {user_id}")
         
-        uploads_result = supabase.table("financial_uploads") \
-            .select("file_type, parsed_data, filename") \
-            .eq("user_id", user_id) \
-            .eq("processing_status", "completed") \
-            .execute()
-        uploads_data = uploads_result.data if uploads_result.data else []
-        
-        result = get_inventory_summary(uploads_data)
+        if aggregation is None or aggregation == INVENTORY_AGGREGATION:
+            result = dashboard_section(user_id, 'inventory')
+        else:
+            result = get_inventory_summary(fetch_user_uploads(user_id), aggregation)
         logger.info(f"✅ Inventory summary: {result['total_items']} items")
         
         return InventorySummaryResponse(**result)
@@ -628,14 +1700,7 @@ async def get_loan_data(user_id: str = Depends(get_current_user)):
     try:
         logger.info(f"Loan summary request from user: {user_id}")
         
-        uploads_result = supabase.table("financial_uploads") \
-            .select("file_type, parsed_data, filename") \
-            .eq("user_id", user_id) \
-            .eq("processing_status", "completed") \
-            .execute()
-        uploads_data = uploads_result.data if uploads_result.data else []
-        
-        result = get_loan_summary(uploads_data)
+        result = dashboard_section(user_id, 'loans')
         logger.info(f"✅ Loan summary: {result['loan_count']} loans")
         
         return LoanSummaryResponse(**result)
@@ -643,3 +1708,209 @@ async def get_loan_data(user_id: str = Depends(get_current_user)):
     except Exception as e:
         logger.error(f"Loan error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/loans/schedule")
+async def get_loan_schedule(
+    months: Optional[int] = None,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Month-by-month amortization of every uploaded loan starting next month: outstanding balance,
+    interest vs principal, and EMI as a percentage of the average monthly bank cash outflow.
+    """
+    try:
+        logger.info(f"Loan schedule request from user: {user_id}")
+        
+        loans = dashboard_section(user_id, 'loans').get('loans', [])
+        cash_in, cash_out = bank_flows_from_rollups(load_user_rollups(user_id))
+        bank_months = set(cash_in) | set(cash_out)
+        avg_outflow = sum(cash_out.values()) / len(bank_months) if bank_months else None
+        
+        return build_loan_schedules(loans, avg_outflow, months)
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Loan schedule error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/transactions")
+async def get_transactions(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    direction: Optional[Literal['credit', 'debit']] = None,
+    category: Optional[str] = None,
+    upload_id: Optional[str] = None,
+    file_type: Optional[Literal['bank', 'sales', 'purchase']] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    order: Literal['desc', 'asc'] = 'desc',
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Page through the user's dated transactions, newest first by default.
+    date_from / date_to are inclusive; category matches the bookkeeping category or subcategory.
+    Pass next_cursor from the previous page as cursor to get the next one.
+    Pages are read from the transactions table when it is kept, else from the in-memory index.
+    """
+    try:
+        bounds = {}
+        for name, value in (('date_from', date_from), ('date_to', date_to)):
+            if value is not None:
+                bounds[name] = parse_date(value)
+                if bounds[name] is None:
+                    raise HTTPException(status_code=400, detail=f"Invalid {name}: {value}")
+        
+        if STORE_TRANSACTIONS:
+            repair_transactions(user_id)
+            try:
+                return page_stored_transactions(
+                    user_id, fetch_user_rules(user_id), bounds.get('date_from'), bounds.get('date_to'),
+                    direction=direction, category=category, upload_id=upload_id, file_type=file_type,
+                    cursor=cursor, limit=limit, descending=order == 'desc'
+                )
+            except Exception as e:
+                if not is_missing_function(e):
+                    raise
+                logger.warning(f"transaction_page RPC unavailable, paging the in-memory index: {e}")
+        
+        return get_transaction_index(user_id).page(
+            bounds.get('date_from'), bounds.get('date_to'),
+            direction=direction, category=category, upload_id=upload_id, file_type=file_type,
+            cursor=cursor, limit=limit, descending=order == 'desc'
+        )
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Transactions query error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/benchmarks")
+async def get_benchmarks(
+    industry: Optional[str] = None,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Percentile rank of the user's profit margin, expense ratio and revenue growth among
+    businesses of their industry (or the given one), with the peers' quartiles.
+    Percentiles are withheld until an industry has BENCHMARK_MIN_PEERS businesses.
+    """
+    try:
+        logger.info(f"Benchmarks request from user: {user_id}")
+        
+        industry = industry or fetch_user_industry(user_id)
+        revenue = monthly_series_from_rollups(load_user_rollups(user_id))['revenue']
+        values = benchmark_values(fetch_user_metrics(user_id), revenue)
+        
+        return compare_to_peers(industry, values, fetch_sketches(industry))
+        
+    except Exception as e:
+        logger.error(f"Benchmarks error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+
+
+class MonthlyTransactionTotalsResponse(BaseModel):
+    months: List[Dict[str, Any]]
+    has_data: bool
+
+@app.get("/api/transactions/monthly", response_model=MonthlyTransactionTotalsResponse)
+async def get_monthly_transaction_totals(user_id: str = Depends(get_current_user)):
+    """
+    Monthly totals by file type and direction, aggregated in the database
+    from the normalized transactions table.
+    """
+    try:
+        logger.info(f"Monthly transaction totals request from user: {user_id}")
+        
+        repair_transactions(user_id)
+        months = monthly_totals(user_id)
+        
+        return MonthlyTransactionTotalsResponse(months=months, has_data=len(months) > 0)
+        
+    except Exception as e:
+        logger.error(f"Monthly transaction totals error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+
+
+class ExpenseRuleRequest(BaseModel):
+    keyword: str
+    category: str
+    priority: Optional[int] = None
+
+def refresh_user_categories(user_id: str) -> None:
+    """Re-categorize a user's stored rollups after their expense rules changed."""
+    rebuild_rollups(user_id, fetch_user_uploads(user_id), fetch_user_rules(user_id))
+    analytics_cache.invalidate(user_id)
+    transaction_index_cache.invalidate(user_id)
+
+@app.get("/api/expense-rules")
+async def list_expense_rules(user_id: str = Depends(get_current_user)):
+    """
+    The user's expense categorization rules. A description containing keyword is filed under
+    category; lower priority wins, and user rules (default priority 0) override the built-in ones.
+    """
+    try:
+        res = supabase.table("expense_rules") \
+            .select("id, keyword, category, priority") \
+            .eq("user_id", user_id) \
+            .order("priority") \
+            .execute()
+        return {"rules": res.data or []}
+        
+    except Exception as e:
+        logger.error(f"Expense rules error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/expense-rules")
+async def create_expense_rule(request: ExpenseRuleRequest, user_id: str = Depends(get_current_user)):
+    """Add an expense categorization rule and re-categorize the user's existing transactions."""
+    try:
+        keyword = request.keyword.strip().lower()
+        category = request.category.strip()
+        if not keyword or not category:
+            raise HTTPException(status_code=400, detail="keyword and category are required")
+        
+        res = supabase.table("expense_rules").insert({
+            "user_id": user_id,
+            "keyword": keyword,
+            "category": category,
+            "priority": request.priority if request.priority is not None else USER_RULE_PRIORITY
+        }).execute()
+        if not res.data:
+            raise HTTPException(status_code=500, detail="Failed to save expense rule")
+        
+        refresh_user_categories(user_id)
+        logger.info(f"✅ Expense rule added for user {user_id}: {keyword} -> {category}")
+        return res.data[0]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Expense rule create error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/expense-rules/{rule_id}")
+async def delete_expense_rule(rule_id: str, user_id: str = Depends(get_current_user)):
+    """Remove an expense categorization rule and re-categorize the user's existing transactions."""
+    try:
+        res = supabase.table("expense_rules").delete().eq("id", rule_id).eq("user_id", user_id).execute()
+        if not res.data:
+            raise HTTPException(status_code=404, detail="Expense rule not found")
+        
+        refresh_user_categories(user_id)
+        return {"message": "Expense rule deleted", "rule_id": rule_id}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Expense rule delete error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
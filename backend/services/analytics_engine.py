@@ -0,0 +1,100 @@
+"""
+Analytics Engine - Compute every dashboard section from one scan of a user's data
+Bookkeeping, forecast, working capital, inventory and loans share one TransactionFrame;
+results are cached per user for a short TTL and dropped when the user uploads
+"""
+
+import os
+import time
+import logging
+from typing import Dict, Any, List, Optional, Callable, Sequence
+
+from backend.services.transaction_frame import TransactionFrame
+from backend.services.bookkeeping_service import generate_bookkeeping_summary, bookkeeping_from_rollups
+from backend.services.forecasting_service import generate_forecast, forecast_from_rollups
+from backend.services.working_capital_service import calculate_working_capital
+from backend.services.inventory_loan_service import get_inventory_summary, get_loan_summary
+from backend.services.expense_categorizer import Rule
+
+logger = logging.getLogger(__name__)
+
+# Seconds a computed dashboard is reused (0 disables caching)
+ANALYTICS_CACHE_TTL = float(os.environ.get("ANALYTICS_CACHE_TTL", "60"))
+
+# Users whose dashboards are kept in memory
+ANALYTICS_CACHE_USERS = int(os.environ.get("ANALYTICS_CACHE_USERS", "1000"))
+
+DASHBOARD_SECTIONS = ('bookkeeping', 'forecast', 'working_capital', 'inventory', 'loans')
+
+
+def build_dashboard(
+    uploads_data: List[Dict[str, Any]],
+    metrics: Dict[str, Any],
+    rollups: Optional[List[Dict[str, Any]]] = None,
+    user_rules: Optional[Sequence[Rule]] = None
+) -> Dict[str, Any]:
+    """
+    Compute all dashboard sections from the user's uploads and aggregated metrics.
+    With monthly rollups given, bookkeeping and forecast are read from them instead;
+    otherwise expenses are categorized with user_rules.
+    A section that fails is left out and its error recorded under "errors",
+    so one broken section does not take the others down.
+    """
+    frame = TransactionFrame.from_uploads(uploads_data)
+
+    sections: Dict[str, Callable[[], Dict[str, Any]]] = {
+        'bookkeeping': lambda: (
+            bookkeeping_from_rollups(rollups) if rollups is not None else generate_bookkeeping_summary(frame, user_rules)
+        ),
+        'forecast': lambda: (
+            forecast_from_rollups(rollups, metrics) if rollups is not None else generate_forecast(frame, metrics)
+        ),
+        'working_capital': lambda: calculate_working_capital(frame, metrics),
+        'inventory': lambda: get_inventory_summary(frame),
+        'loans': lambda: get_loan_summary(frame),
+    }
+
+    dashboard: Dict[str, Any] = {'errors': {}}
+    for name, compute in sections.items():
+        try:
+            dashboard[name] = compute()
+        except Exception as e:
+            logger.error(f"Dashboard section {name} failed: {e}")
+            dashboard[name] = None
+            dashboard['errors'][name] = str(e)
+
+    dashboard['transactions_scanned'] = len(frame)
+    return dashboard
+
+
+class AnalyticsCache:
+    """Per-user dashboard results with a time-to-live, evicting the oldest user when full."""
+
+    def __init__(self, ttl: float = ANALYTICS_CACHE_TTL, max_users: int = ANALYTICS_CACHE_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries: Dict[str, tuple] = {}
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, dashboard = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[user_id]
+            return None
+        return dashboard
+
+    def put(self, user_id: str, dashboard: Dict[str, Any]) -> None:
+        if self.ttl <= 0:
+            return
+        self._entries.pop(user_id, None)
+        self._entries[user_id] = (time.monotonic() + self.ttl, dashboard)
+        while len(self._entries) > self.max_users:
+            del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, user_id: str) -> None:
+        self._entries.pop(user_id, None)
+
+
+analytics_cache = AnalyticsCache()
@@ -0,0 +1,266 @@
+"""
+Benchmarking Service - Peer percentiles per industry from mergeable quantile sketches
+Every user's profit margin, expense ratio and revenue growth is counted in a log-bucket
+sketch of their industry; a user's old values are retracted when their metrics change,
+so percentiles are read from a few hundred bucket counts, never from all users' metrics
+"""
+
+import os
+import math
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from backend.services.db_rpc import is_missing_function
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_METRICS = ('profit_margin', 'expense_ratio', 'growth_rate')
+
+# Relative error of the reported percentiles' values (bucket width)
+BENCHMARK_RELATIVE_ACCURACY = float(os.environ.get("BENCHMARK_RELATIVE_ACCURACY", "0.01"))
+
+# Peers an industry needs before its percentiles are shown
+BENCHMARK_MIN_PEERS = int(os.environ.get("BENCHMARK_MIN_PEERS", "5"))
+
+# Values closer to zero than this share the zero bucket
+BENCHMARK_MIN_VALUE = 1e-3
+
+# Industry used for users without a profile
+DEFAULT_INDUSTRY = 'Other'
+
+# Months per window compared for growth_rate
+GROWTH_WINDOW_MONTHS = 3
+
+SKETCH_KEYS = ['industry', 'metric', 'sign', 'bucket']
+
+# (sign, bucket): sign is -1 / 0 / 1, bucket the log-index of the magnitude
+BucketKey = Tuple[int, int]
+
+
+class QuantileSketch:
+    """
+    DDSketch-style quantile sketch: values are counted in buckets whose bounds grow
+    geometrically (gamma^(i-1), gamma^i], so any quantile is answered within the
+    relative accuracy. Sketches merge by adding counts, and unlike KLL or t-digest a
+    value can be removed exactly, which is what lets users' metrics be updated in place.
+    """
+
+    def __init__(self, relative_accuracy: float = BENCHMARK_RELATIVE_ACCURACY):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.counts: Dict[BucketKey, int] = {}
+
+    def key(self, value: float) -> BucketKey:
+        if abs(value) < BENCHMARK_MIN_VALUE:
+            return (0, 0)
+        return (1 if value > 0 else -1, math.ceil(math.log(abs(value)) / self._log_gamma))
+
+    def value(self, key: BucketKey) -> float:
+        """Representative value of a bucket (within the relative accuracy of all its values)."""
+        sign, bucket = key
+        return sign * 2 * self.gamma ** bucket / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1) -> None:
+        """Count a value; a negative count removes it."""
+        key = self.key(value)
+        total = self.counts.get(key, 0) + count
+        if total:
+            self.counts[key] = total
+        else:
+            self.counts.pop(key, None)
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for key, count in other.counts.items():
+            total = self.counts.get(key, 0) + count
+            if total:
+                self.counts[key] = total
+            else:
+                self.counts.pop(key, None)
+
+    @property
+    def count(self) -> int:
+        return sum(c for c in self.counts.values() if c > 0)
+
+    def _ordered(self) -> Tuple[List[BucketKey], np.ndarray]:
+        # Negative buckets from the largest magnitude down, then zero, then positives up
+        keys = sorted((k for k, c in self.counts.items() if c > 0), key=lambda k: (k[0], k[0] * k[1]))
+        return keys, np.array([self.counts[k] for k in keys], dtype=np.int64)
+
+    def quantile(self, q: float) -> Optional[float]:
+        keys, counts = self._ordered()
+        if not keys:
+            return None
+        position = int(np.searchsorted(np.cumsum(counts), q * (counts.sum() - 1), side='right'))
+        return self.value(keys[min(position, len(keys) - 1)])
+
+    def percentile_rank(self, value: float) -> Optional[float]:
+        """Share of values below `value` (values in its bucket count half), in percent."""
+        keys, counts = self._ordered()
+        if not keys:
+            return None
+        target = self.key(value)
+        order = (target[0], target[0] * target[1])
+        below = sum(c for k, c in zip(keys, counts) if (k[0], k[0] * k[1]) < order)
+        same = self.counts.get(target, 0)
+        return round(float((below + 0.5 * max(same, 0)) / counts.sum() * 100), 1)
+
+
+def benchmark_values(metrics: Dict[str, Any], monthly_revenue: Dict[int, float]) -> Dict[str, Optional[float]]:
+    """
+    A user's benchmarked metrics (percentages); None when they cannot be computed.
+    growth_rate compares revenue of the latest GROWTH_WINDOW_MONTHS months with the
+    same number of months before them.
+    """
+    revenue = float(metrics.get('total_revenue', 0) or 0)
+    expenses = float(metrics.get('total_expenses', 0) or 0)
+    values: Dict[str, Optional[float]] = {metric: None for metric in BENCHMARK_METRICS}
+    if revenue > 0:
+        values['profit_margin'] = (revenue - expenses) / revenue * 100
+        values['expense_ratio'] = expenses / revenue * 100
+
+    if monthly_revenue:
+        latest = max(monthly_revenue)
+        recent = sum(v for m, v in monthly_revenue.items() if latest - GROWTH_WINDOW_MONTHS < m <= latest)
+        earlier = sum(
+            v for m, v in monthly_revenue.items()
+            if latest - 2 * GROWTH_WINDOW_MONTHS < m <= latest - GROWTH_WINDOW_MONTHS
+        )
+        if earlier > 0:
+            values['growth_rate'] = (recent / earlier - 1) * 100
+    return values
+
+
+def sketch_delta(
+    old: Optional[Dict[str, Any]],
+    industry: str,
+    values: Dict[str, Optional[float]]
+) -> List[Dict[str, Any]]:
+    """Bucket count changes that retract a user's old contribution and add the new one."""
+    sketch = QuantileSketch()
+    delta: Dict[tuple, int] = {}
+    contributions = [(industry, values, 1)]
+    if old:
+        contributions.append((old.get('industry') or DEFAULT_INDUSTRY, old, -1))
+    for member_industry, member_values, sign in contributions:
+        for metric in BENCHMARK_METRICS:
+            value = member_values.get(metric)
+            if value is None:
+                continue
+            key = (member_industry, metric) + sketch.key(float(value))
+            delta[key] = delta.get(key, 0) + sign
+    return [
+        {**dict(zip(SKETCH_KEYS, key)), 'count': count}
+        for key, count in delta.items() if count
+    ]
+
+
+def apply_sketch_delta(rows: List[Dict[str, Any]]) -> None:
+    """
+    Add bucket count changes through the apply_benchmark_sketch_delta RPC (one atomic upsert);
+    falls back to read-modify-write through the table API when the function is not installed.
+    Any other failure is raised, so the caller does not record values the sketches may lack.
+    """
+    if not rows:
+        return
+    from backend.db_client import supabase
+    try:
+        supabase.rpc("apply_benchmark_sketch_delta", {"p_rows": rows}).execute()
+        return
+    except Exception as e:
+        if not is_missing_function(e):
+            raise
+        logger.warning(f"apply_benchmark_sketch_delta RPC unavailable, updating sketches directly: {e}")
+
+    for row in rows:
+        query = supabase.table("benchmark_sketches").select("count")
+        for k in SKETCH_KEYS:
+            query = query.eq(k, row[k])
+        existing = query.execute().data
+        count = ((existing[0].get('count') or 0) if existing else 0) + row['count']
+        if count <= 0:
+            query = supabase.table("benchmark_sketches").delete()
+            for k in SKETCH_KEYS:
+                query = query.eq(k, row[k])
+            query.execute()
+        else:
+            supabase.table("benchmark_sketches").upsert(
+                {**{k: row[k] for k in SKETCH_KEYS}, 'count': count},
+                on_conflict=",".join(SKETCH_KEYS)
+            ).execute()
+
+
+def update_user_benchmark(user_id: str, industry: str, values: Dict[str, Optional[float]]) -> None:
+    """
+    Move a user's contribution to their industry's sketches to their current values.
+    Failures are logged: benchmarks are advisory and catch up on the next metrics change.
+    """
+    from backend.db_client import supabase
+    try:
+        res = supabase.table("benchmark_members") \
+            .select("industry, " + ", ".join(BENCHMARK_METRICS)) \
+            .eq("user_id", user_id) \
+            .limit(1) \
+            .execute()
+        old = res.data[0] if res.data else None
+        apply_sketch_delta(sketch_delta(old, industry, values))
+        supabase.table("benchmark_members").upsert(
+            {"user_id": user_id, "industry": industry, **values},
+            on_conflict="user_id"
+        ).execute()
+    except Exception as e:
+        logger.error(f"❌ Failed to update benchmarks for user {user_id}: {e}")
+
+
+def fetch_user_industry(user_id: str) -> str:
+    """industry_type from the user's profile, DEFAULT_INDUSTRY when there is none."""
+    from backend.db_client import supabase
+    try:
+        res = supabase.table("profiles").select("industry_type").eq("id", user_id).limit(1).execute()
+    except Exception as e:
+        logger.warning(f"Could not load profile for user {user_id}: {e}")
+        return DEFAULT_INDUSTRY
+    return (res.data[0].get("industry_type") if res.data else None) or DEFAULT_INDUSTRY
+
+
+def fetch_sketches(industry: str) -> Dict[str, QuantileSketch]:
+    """The industry's sketch of every benchmarked metric."""
+    from backend.db_client import supabase
+    result = supabase.table("benchmark_sketches") \
+        .select("metric, sign, bucket, count") \
+        .eq("industry", industry) \
+        .execute()
+    sketches = {metric: QuantileSketch() for metric in BENCHMARK_METRICS}
+    for row in result.data or []:
+        sketch = sketches.get(row.get('metric'))
+        if sketch is not None and (row.get('count') or 0) > 0:
+            sketch.counts[(int(row['sign']), int(row['bucket']))] = int(row['count'])
+    return sketches
+
+
+def compare_to_peers(
+    industry: str,
+    values: Dict[str, Optional[float]],
+    sketches: Dict[str, QuantileSketch]
+) -> Dict[str, Any]:
+    """Percentile rank of each of the user's values among their industry, with peer quartiles."""
+    metrics = {}
+    for metric in BENCHMARK_METRICS:
+        sketch = sketches[metric]
+        peers = sketch.count
+        value = values.get(metric)
+        enough = peers >= BENCHMARK_MIN_PEERS
+        metrics[metric] = {
+            'value': round(value, 2) if value is not None else None,
+            'peer_count': peers,
+            'percentile_rank': sketch.percentile_rank(value) if enough and value is not None else None,
+            'peer_quartiles': {
+                f'p{int(q * 100)}': round(sketch.quantile(q), 2) for q in (0.25, 0.5, 0.75)
+            } if enough else None
+        }
+    return {
+        'industry': industry,
+        'min_peers': BENCHMARK_MIN_PEERS,
+        'metrics': metrics
+    }
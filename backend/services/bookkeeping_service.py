@@ -4,9 +4,15 @@ This is bookkeeping assistance ONLY, NOT double-entry accounting.
 """
 
 import logging
-from typing import Dict, Any, List, Optional
-from datetime import datetime
-from collections import defaultdict
+from typing import Dict, Any, List, Optional, Union, Sequence
+
+import numpy as np
+import pandas as pd
+
+from backend.services.transaction_frame import (
+    TransactionFrame, as_transaction_frame, first_nonzero, month_label, month_index, parse_date
+)
+from backend.services.expense_categorizer import get_categorizer, Rule
 
 logger = logging.getLogger(__name__)
 
@@ -72,142 +78,171 @@ def classify_transaction(transaction: Dict[str, Any], upload_type: str) -> Dict[
 
 def categorize_expense(description: str) -> str:
     """
-    Categorize expense based on description keywords.
+    Categorize expense based on description keywords (built-in rules).
     """
-    description = description.lower() if description else ''
-    
-    description = description.lower() if description else ''
-    
-    categories = {
-        'Salary & Wages': ['salary', 'wages', 'payroll', 'employee', 'staff'],
-        'Rent & Utilities': ['rent', 'lease', 'electricity', 'water', 'utility', 'power', 'gas'],
-        'Office Supplies': ['office', 'stationery', 'supplies', 'printer', 'paper'],
-        'Marketing & Advertising': ['marketing', 'advertising', 'promotion', 'ads', 'campaign'],
-        'Travel & Transport': ['travel', 'transport', 'fuel', 'petrol', 'diesel', 'cab', 'taxi', 'flight'],
-        'Professional Services': ['consulting', 'legal', 'accounting', 'professional', 'advisory'],
-        'Raw Materials': ['material', 'raw', 'goods', 'inventory', 'stock', 'purchase'],
-        'Equipment & Maintenance': ['equipment', 'machinery', 'repair', 'maintenance', 'service'],
-        'Insurance': ['insurance', 'premium', 'policy'],
-        'Bank Charges': ['bank', 'charge', 'fee', 'interest', 'commission'],
-        'Taxes': ['tax', 'gst', 'vat', 'tds', 'duty'],
-    }
-    
-    for category, keywords in categories.items():
-        if any(keyword in description for keyword in keywords):
-            return category
-    
-    return 'General Expenses'
+    return get_categorizer().categorize(description)
 
 
 def parse_date_month(date_str: Any) -> Optional[str]:
     """Extract month-year from date string for grouping."""
-    if not date_str:
-        return None
-    
-    try:
-        # Try common date formats
-        date_str = str(date_str)
-        for fmt in ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d', '%m/%d/%Y']:
-            try:
-                dt = datetime.strptime(date_str[:10], fmt)
-                return dt.strftime('%b %Y')  # e.g., "Jan 2026"
-            except ValueError:
-                continue
-        return None
-    except Exception:
+    day = parse_date(date_str)
+    if day is None:
         return None
+    return month_label(int(day.astype('datetime64[M]').astype(np.int64)))  # e.g., "Jan 2026"
 
 
-def generate_bookkeeping_summary(uploads_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+def classify_frame(frame: TransactionFrame, user_rules: Optional[Sequence[Rule]] = None) -> Dict[str, np.ndarray]:
     """
-    Generate a bookkeeping summary from all uploaded financial data.
+    classify_transaction applied to whole columns, with the user's expense rules if given.
+    Returns per-row arrays: category, subcategory, amount and is_cash.
+    """
+    sales = frame.type_mask('sales')
+    purchase = frame.type_mask('purchase')
+    bank = frame.type_mask('bank')
+    
+    bank_credit = bank & (frame.credit > 0)
+    bank_debit = bank & ~bank_credit & (frame.debit > 0)
+    is_income = sales | bank_credit
+    is_expense = purchase | bank_debit
+    
+    amounts = np.where(
+        sales, first_nonzero(frame.amount, frame.credit),
+        np.where(purchase, first_nonzero(frame.amount, frame.debit),
+                 np.where(bank_credit, frame.credit,
+                          np.where(bank_debit, frame.debit,
+                                   first_nonzero(frame.amount, frame.credit, frame.debit))))
+    )
     
-    Args:
-        uploads_data: List of upload records with parsed_data and file_type
+    category = np.full(len(frame), 'Uncategorized', dtype=object)
+    category[is_income] = 'Income'
+    category[is_expense] = 'Expense'
     
-    Returns:
-        Structured bookkeeping summary
-    """
-    all_transactions = []
-    monthly_income = defaultdict(float)
-    monthly_expenses = defaultdict(float)
-    expense_categories = defaultdict(float)
-    cash_transactions = 0
-    non_cash_transactions = 0
-    total_income = 0
-    total_expenses = 0
-    
-    for upload in uploads_data:
-        upload_type = upload.get('file_type', 'bank')
-        filename = str(upload.get('filename', ''))
-        
-        # Skip masqueraded auxiliary files
-        if filename.startswith('[INVENTORY]') or filename.startswith('[LOAN]'):
-            continue
-            
-        parsed_data = upload.get('parsed_data', [])
-        
-        if not parsed_data or not isinstance(parsed_data, list):
-            continue
-        
-        for transaction in parsed_data:
-            if not isinstance(transaction, dict):
-                continue
-            
-            classified = classify_transaction(transaction, upload_type)
-            all_transactions.append(classified)
-            
-            amount = classified.get('amount', 0) or 0
-            month = parse_date_month(classified.get('date'))
-            
-            if classified['category'] == 'Income':
-                total_income += amount
-                if month:
-                    monthly_income[month] += amount
-            elif classified['category'] == 'Expense':
-                total_expenses += amount
-                expense_categories[classified['subcategory']] += amount
-                if month:
-                    monthly_expenses[month] += amount
-            
-            # Track cash vs non-cash
-            if classified.get('is_cash'):
-                cash_transactions += 1
-            else:
-                non_cash_transactions += 1
-    
-                non_cash_transactions += 1
+    subcategory = np.full(len(frame), 'Other', dtype=object)
+    subcategory[sales] = 'Sales Revenue'
+    subcategory[bank_credit] = 'Bank Credit'
+    subcategory[is_expense] = get_categorizer(user_rules).categorize_many(frame.description[is_expense])
     
+    return {
+        'category': category,
+        'subcategory': subcategory,
+        'amount': amounts,
+        'is_cash': bank_credit | bank_debit
+    }
+
+
+def format_bookkeeping_summary(
+    total_income: float,
+    total_expenses: float,
+    monthly_income: Dict[int, float],
+    monthly_expenses: Dict[int, float],
+    expense_categories: Dict[str, float],
+    cash_transactions: int,
+    total_transactions: int
+) -> Dict[str, Any]:
+    """Shape bookkeeping totals into the summary response (months keyed by month index)."""
     sorted_categories = sorted(
         expense_categories.items(),
         key=lambda x: x[1],
         reverse=True
     )
     
-    def month_sort_key(month_str):
-        try:
-            return datetime.strptime(month_str, '%b %Y')
-        except:
-            return datetime.min
-    
-    sorted_monthly_income = sorted(monthly_income.items(), key=lambda x: month_sort_key(x[0]))
-    sorted_monthly_expenses = sorted(monthly_expenses.items(), key=lambda x: month_sort_key(x[0]))
-    
     return {
         'total_income': round(total_income, 2),
         'total_expenses': round(total_expenses, 2),
         'net_balance': round(total_income - total_expenses, 2),
         'monthly_income': [
-            {'month': m, 'amount': round(a, 2)} for m, a in sorted_monthly_income
+            {'month': month_label(m), 'amount': round(a, 2)} for m, a in sorted(monthly_income.items())
         ],
         'monthly_expenses': [
-            {'month': m, 'amount': round(a, 2)} for m, a in sorted_monthly_expenses
+            {'month': month_label(m), 'amount': round(a, 2)} for m, a in sorted(monthly_expenses.items())
         ],
         'expense_categories': [
             {'category': cat, 'amount': round(amt, 2)} for cat, amt in sorted_categories[:10]
         ],
         'cash_transactions': cash_transactions,
-        'non_cash_transactions': non_cash_transactions,
-        'total_transactions': len(all_transactions),
-        'has_sufficient_data': len(all_transactions) >= 3
+        'non_cash_transactions': total_transactions - cash_transactions,
+        'total_transactions': total_transactions,
+        'has_sufficient_data': total_transactions >= 3
     }
+
+
+def generate_bookkeeping_summary(
+    uploads_data: Union[List[Dict[str, Any]], TransactionFrame],
+    user_rules: Optional[Sequence[Rule]] = None
+) -> Dict[str, Any]:
+    """
+    Generate a bookkeeping summary from all uploaded financial data.
+    
+    Args:
+        uploads_data: List of upload records with parsed_data and file_type,
+            or a TransactionFrame built from them
+        user_rules: The user's expense categorization rules
+    
+    Returns:
+        Structured bookkeeping summary
+    """
+    frame = as_transaction_frame(uploads_data)
+    classified = classify_frame(frame, user_rules)
+    
+    return summarize_bookkeeping(pd.DataFrame({
+        'month': frame.months(),
+        'category': classified['category'],
+        'subcategory': classified['subcategory'],
+        'amount': classified['amount'],
+        'transaction_count': 1,
+        'cash_count': classified['is_cash'].astype(np.int64)
+    }))
+
+
+def summarize_bookkeeping(classified: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Bookkeeping summary from classified rows with columns month (index, -1 when undated),
+    category, subcategory, amount, transaction_count and cash_count.
+    Each row may stand for one transaction or for a pre-aggregated group of them.
+    """
+    totals = classified.groupby('category', sort=False)['amount'].sum()
+    
+    dated = classified[classified['month'] >= 0]
+    monthly = dated.groupby(['category', 'month'])['amount'].sum()
+    
+    def monthly_for(category: str) -> Dict[int, float]:
+        if category not in monthly.index.get_level_values(0):
+            return {}
+        return {int(m): float(a) for m, a in monthly.xs(category, level=0).items()}
+    
+    # sort=False keeps first-seen order so equal totals sort as before
+    expenses = classified[classified['category'] == 'Expense']
+    expense_categories = expenses.groupby('subcategory', sort=False)['amount'].sum()
+    
+    return format_bookkeeping_summary(
+        total_income=float(totals.get('Income', 0.0)),
+        total_expenses=float(totals.get('Expense', 0.0)),
+        monthly_income=monthly_for('Income'),
+        monthly_expenses=monthly_for('Expense'),
+        expense_categories={k: float(v) for k, v in expense_categories.items()},
+        cash_transactions=int(classified['cash_count'].sum()),
+        total_transactions=int(classified['transaction_count'].sum())
+    )
+
+
+def bookkeeping_from_rollups(rollups: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Bookkeeping summary from monthly_rollups rows instead of raw transactions.
+    Rows carry month ("YYYY-MM", "" when undated), file_type, category, subcategory,
+    amount and transaction_count.
+    """
+    rows = pd.DataFrame.from_records(
+        rollups, columns=['month', 'file_type', 'category', 'subcategory', 'amount', 'transaction_count']
+    )
+    counts = pd.to_numeric(rows['transaction_count'], errors='coerce').fillna(0).astype(np.int64)
+    # Bank rows classified as income or expense are the cash transactions
+    is_cash = (rows['file_type'] == 'bank') & rows['category'].isin(['Income', 'Expense'])
+    
+    return summarize_bookkeeping(pd.DataFrame({
+        'month': [-1 if m is None else m for m in map(month_index, rows['month'])],
+        'category': rows['category'],
+        'subcategory': rows['subcategory'],
+        'amount': pd.to_numeric(rows['amount'], errors='coerce').fillna(0.0),
+        'transaction_count': counts,
+        'cash_count': counts.where(is_cash, 0)
+    }))
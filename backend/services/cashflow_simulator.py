@@ -0,0 +1,148 @@
+"""
+Cash Flow Simulator - Monte Carlo cash balance scenarios from monthly inflow / outflow history
+All paths are simulated at once as a (paths x months) NumPy matrix
+"""
+
+import os
+import logging
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.services.transaction_frame import month_label, month_index
+
+logger = logging.getLogger(__name__)
+
+# Paths simulated when the caller does not ask for a number, and the most allowed
+SIMULATION_DEFAULT_PATHS = int(os.environ.get("SIMULATION_DEFAULT_PATHS", "10000"))
+SIMULATION_MAX_PATHS = int(os.environ.get("SIMULATION_MAX_PATHS", "50000"))
+
+# Longest horizon in months
+SIMULATION_MAX_MONTHS = int(os.environ.get("SIMULATION_MAX_MONTHS", "36"))
+
+# Months of history needed before simulating
+SIMULATION_MIN_MONTHS = 2
+
+SIMULATION_METHODS = ('bootstrap', 'parametric')
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Months counted as "90 days" for the headline shortfall probability
+SHORTFALL_WINDOW_MONTHS = 3
+
+
+def bank_flows_from_rollups(rollups: List[Dict[str, Any]]) -> Tuple[Dict[int, float], Dict[int, float]]:
+    """
+    Monthly bank inflows and outflows (keyed by month index) from monthly_rollups rows.
+    Parsed bank rows carry an amount and a direction, so flows are split on direction.
+    """
+    inflows: Dict[int, float] = {}
+    outflows: Dict[int, float] = {}
+    for row in rollups:
+        month = month_index(row.get('month'))
+        if month is None or row.get('file_type') != 'bank':
+            continue
+        target = {'credit': inflows, 'debit': outflows}.get(row.get('direction'))
+        if target is not None:
+            target[month] = target.get(month, 0.0) + float(row.get('amount') or 0)
+    return inflows, outflows
+
+
+def simulate_net_flows(
+    inflows: np.ndarray,
+    outflows: np.ndarray,
+    months: int,
+    paths: int,
+    method: str,
+    rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Net cash flow per simulated month, shape (paths, months).
+    bootstrap resamples whole historical months, keeping each month's inflow and outflow together;
+    parametric draws (inflow, outflow) from a bivariate normal fitted to the history,
+    floored at zero.
+    """
+    if method == 'bootstrap':
+        picks = rng.integers(0, len(inflows), size=(paths, months))
+        return inflows[picks] - outflows[picks]
+
+    if method == 'parametric':
+        mean = np.array([inflows.mean(), outflows.mean()])
+        cov = np.cov(np.vstack([inflows, outflows]))
+        draws = rng.multivariate_normal(mean, cov, size=(paths, months), method='eigh')
+        draws = np.maximum(draws, 0.0)
+        return draws[..., 0] - draws[..., 1]
+
+    raise ValueError(f"method must be one of: {', '.join(SIMULATION_METHODS)}")
+
+
+def simulate_cash_flow(
+    cash_in: Dict[int, float],
+    cash_out: Dict[int, float],
+    starting_cash: float = 0.0,
+    months: int = 12,
+    paths: int = SIMULATION_DEFAULT_PATHS,
+    method: str = 'bootstrap',
+    seed: Optional[int] = None,
+    percentiles: Sequence[int] = PERCENTILES
+) -> Dict[str, Any]:
+    """
+    Simulate cash balance paths from monthly cash in / cash out history (keyed by month index).
+
+    Args:
+        cash_in, cash_out: Monthly inflow and outflow series; months present in either are history
+        starting_cash: Cash position the paths start from
+        months: Months to simulate
+        paths: Number of simulated paths
+        method: 'bootstrap' or 'parametric'
+        seed: Random seed for reproducible results
+
+    Returns:
+        Percentile bands of the balance per month and the probability of it going below zero
+    """
+    if method not in SIMULATION_METHODS:
+        raise ValueError(f"method must be one of: {', '.join(SIMULATION_METHODS)}")
+    if not 1 <= months <= SIMULATION_MAX_MONTHS:
+        raise ValueError(f"months must be between 1 and {SIMULATION_MAX_MONTHS}")
+    if not 1 <= paths <= SIMULATION_MAX_PATHS:
+        raise ValueError(f"paths must be between 1 and {SIMULATION_MAX_PATHS}")
+
+    history = sorted(set(cash_in) | set(cash_out))
+    if len(history) < SIMULATION_MIN_MONTHS:
+        return {
+            'has_sufficient_data': False,
+            'message': f'At least {SIMULATION_MIN_MONTHS} months of bank transactions are needed to simulate cash flow',
+            'months_of_history': len(history),
+            'bands': []
+        }
+
+    inflows = np.array([cash_in.get(m, 0.0) for m in history], dtype=np.float64)
+    outflows = np.array([cash_out.get(m, 0.0) for m in history], dtype=np.float64)
+
+    rng = np.random.default_rng(seed)
+    net = simulate_net_flows(inflows, outflows, months, paths, method, rng)
+    balance = starting_cash + np.cumsum(net, axis=1)
+
+    bands = np.percentile(balance, percentiles, axis=0)
+    # A path has run short by month t if its balance went below zero at any month up to t
+    short_by_month = (np.minimum.accumulate(balance, axis=1) < 0).mean(axis=0)
+    window = min(SHORTFALL_WINDOW_MONTHS, months)
+
+    return {
+        'has_sufficient_data': True,
+        'method': method,
+        'paths': paths,
+        'months_of_history': len(history),
+        'starting_cash': round(float(starting_cash), 2),
+        'avg_monthly_net_flow': round(float((inflows - outflows).mean()), 2),
+        'bands': [
+            {
+                'month': month_label(history[-1] + step + 1),
+                **{f'p{p}': round(float(bands[i, step]), 2) for i, p in enumerate(percentiles)},
+                'shortfall_probability': round(float(short_by_month[step]), 4)
+            }
+            for step in range(months)
+        ],
+        'shortfall_probability': round(float(short_by_month[-1]), 4),
+        'shortfall_probability_90d': round(float(short_by_month[window - 1]), 4),
+        'expected_ending_cash': round(float(balance[:, -1].mean()), 2)
+    }
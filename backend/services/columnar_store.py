@@ -0,0 +1,221 @@
+"""
+Columnar Store Service - Keep parsed transactions as compressed Parquet / Arrow IPC files
+Optional alternative to the parsed_data JSONB list-of-dicts; the upload row stores a reference
+"""
+
+import os
+import uuid
+import logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# "json" keeps parsed_data inline; "parquet" or "arrow" writes it to the local object store
+PARSED_DATA_FORMAT = os.environ.get("PARSED_DATA_FORMAT", "json").lower()
+
+# Root directory of the local object store
+PARSED_DATA_STORE_DIR = os.environ.get(
+    "PARSED_DATA_STORE_DIR",
+    str(Path(__file__).resolve().parent.parent / "data" / "parsed")
+)
+
+# Only standard transaction uploads have a fixed schema worth storing columnar
+COLUMNAR_UPLOAD_TYPES = ('bank', 'sales', 'purchase')
+
+TRANSACTION_SCHEMA = {
+    "date": "string",
+    "amount": "float64",
+    "direction": "string",
+    "status": "string",
+    "description": "string",
+    "duplicate": "bool_",
+}
+
+# Columns stored even when the first row lacks them, with the value of rows that do.
+# In "drop" dedupe mode only duplicate rows carry the flag, and row 0 is often new.
+TRANSACTION_DEFAULTS = {"duplicate": False}
+
+
+def columnar_format() -> Optional[str]:
+    """Configured columnar format, or None when parsed_data should stay inline JSON."""
+    if PARSED_DATA_FORMAT not in ("parquet", "arrow"):
+        return None
+    if pa is None:
+        logger.warning("PARSED_DATA_FORMAT is set but pyarrow is not installed; storing JSON")
+        return None
+    return PARSED_DATA_FORMAT
+
+
+def should_store_columnar(upload_type: str) -> bool:
+    return upload_type in COLUMNAR_UPLOAD_TYPES and columnar_format() is not None
+
+
+def ref_path(ref: str) -> Path:
+    """Resolve a stored reference ("parquet:<user>/<file>") to a path inside the store."""
+    _, _, relative = ref.partition(":")
+    root = Path(PARSED_DATA_STORE_DIR).resolve()
+    path = (root / relative).resolve()
+    if root not in path.parents:
+        raise ValueError(f"Invalid parsed data reference: {ref}")
+    return path
+
+
+def records_to_table(parsed_data: List[Dict[str, Any]], schema: Optional["pa.Schema"] = None) -> "pa.Table":
+    """Arrow table of parsed rows; the schema is taken from the first row unless given."""
+    if schema is None:
+        columns = [
+            c for c in TRANSACTION_SCHEMA
+            if c in TRANSACTION_DEFAULTS or (parsed_data and c in parsed_data[0])
+        ]
+        schema = pa.schema([(c, getattr(pa, TRANSACTION_SCHEMA[c])()) for c in columns])
+    arrays = {
+        c: [row.get(c, TRANSACTION_DEFAULTS.get(c)) for row in parsed_data] for c in schema.names
+    }
+    return pa.table(arrays, schema=schema)
+
+
+class ParsedDataWriter:
+    """
+    Writes one upload's parsed transactions to the store a chunk at a time, so streamed
+    uploads never hold all their rows. The columns are fixed by the first chunk written
+    (see records_to_table).
+    close() returns the reference to save in financial_uploads.parsed_data_ref.
+    """
+
+    def __init__(self, user_id: str, fmt: Optional[str] = None):
+        self.fmt = fmt or columnar_format()
+        if self.fmt is None:
+            raise ValueError("Columnar storage is not enabled")
+        ext = "parquet" if self.fmt == "parquet" else "arrow"
+        self.ref = f"{self.fmt}:{user_id}/{uuid.uuid4().hex}.{ext}"
+        self.path = ref_path(self.ref)
+        self.tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        self.rows = 0
+        self._schema = None
+        self._writer = None
+        self._sink = None
+
+    def write(self, parsed_data: List[Dict[str, Any]]) -> None:
+        if not parsed_data:
+            return
+        table = records_to_table(parsed_data, self._schema)
+        if self._writer is None:
+            self._open(table.schema)
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self) -> str:
+        if self._writer is None:
+            self._open(records_to_table([]).schema)
+        self._finish()
+        os.replace(self.tmp, self.path)
+        logger.info(f"Stored {self.rows} rows as {self.ref} ({self.path.stat().st_size} bytes)")
+        return self.ref
+
+    def _open(self, schema: "pa.Schema") -> None:
+        self._schema = schema
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.fmt == "parquet":
+            self._writer = pq.ParquetWriter(self.tmp, schema, compression="zstd")
+        else:
+            options = pa.ipc.IpcWriteOptions(compression="zstd")
+            self._sink = pa.OSFile(str(self.tmp), "wb")
+            self._writer = pa.ipc.new_file(self._sink, schema, options=options)
+
+    def abort(self) -> None:
+        """Drop a partly written file."""
+        self._finish()
+        for path in (self.tmp, self.path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _finish(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+
+def write_parsed_data(user_id: str, parsed_data: List[Dict[str, Any]], fmt: Optional[str] = None) -> str:
+    """
+    Write parsed transactions to the store as one zstd-compressed file.
+    Returns the reference to save in financial_uploads.parsed_data_ref.
+    """
+    writer = ParsedDataWriter(user_id, fmt)
+    try:
+        writer.write(parsed_data)
+        return writer.close()
+    except Exception:
+        writer.abort()
+        raise
+
+
+def read_parsed_table(ref: str, columns: Optional[List[str]] = None) -> "pa.Table":
+    """Load a stored upload, reading only the requested columns."""
+    if pa is None:
+        raise RuntimeError("pyarrow is required to read columnar parsed data")
+
+    fmt = ref.partition(":")[0]
+    path = ref_path(ref)
+
+    if fmt == "parquet":
+        available = pq.read_schema(path).names
+        wanted = [c for c in columns if c in available] if columns else None
+        return pq.read_table(path, columns=wanted)
+
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns:
+        table = table.select([c for c in columns if c in table.column_names])
+    return table
+
+
+def read_parsed_data(ref: str, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Load a stored upload back into the list-of-dicts shape services expect."""
+    return read_parsed_table(ref, columns).to_pylist()
+
+
+def hydrate_uploads(
+    uploads_data: List[Dict[str, Any]],
+    columns: Optional[List[str]] = None,
+    as_table: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Load the rows of upload rows that reference the columnar store (in place): into
+    parsed_data, or with as_table into parsed_table as the Arrow table itself.
+    An upload whose file cannot be read keeps its inline parsed_data.
+    """
+    for upload in uploads_data:
+        ref = upload.get('parsed_data_ref')
+        if not ref or upload.get('parsed_data'):
+            continue
+        try:
+            table = read_parsed_table(ref, columns)
+        except Exception as e:
+            logger.error(f"Failed to load parsed data {ref} of upload {upload.get('id')}: {e}")
+            upload['parsed_data'] = upload.get('parsed_data') or []
+            continue
+        if as_table:
+            upload['parsed_table'] = table
+        else:
+            upload['parsed_data'] = table.to_pylist()
+    return uploads_data
+
+
+def delete_parsed_data(ref: str) -> None:
+    try:
+        ref_path(ref).unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,19 @@
+"""
+DB RPC - Helpers for calling Postgres functions through the Supabase client
+"""
+
+# Error text of a call to a function that is not installed: PostgREST's schema cache
+# miss (PGRST202) or Postgres' undefined_function (42883)
+MISSING_FUNCTION_MARKERS = ("PGRST202", "Could not find the function", "42883")
+
+
+def is_missing_function(error: Exception) -> bool:
+    """
+    True when an RPC failed because the database function is not installed.
+    Any other error may have come after the function ran, so callers must not
+    fall back to repeating its work through the table API.
+    """
+    text = str(error)
+    if any(marker in text for marker in MISSING_FUNCTION_MARKERS):
+        return True
+    return "function" in text and "does not exist" in text
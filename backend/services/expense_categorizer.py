@@ -0,0 +1,130 @@
+"""
+Expense Categorizer - Keyword rules compiled into one regex, applied to whole description columns
+Built-in rules can be overridden per user with prioritized keyword rules (expense_rules table);
+each distinct rule set is compiled once and cached
+"""
+
+import os
+import re
+import logging
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Compiled rule sets kept in memory (one per distinct set of user rules)
+EXPENSE_RULESET_CACHE = int(os.environ.get("EXPENSE_RULESET_CACHE", "256"))
+
+DEFAULT_CATEGORY = 'General Expenses'
+
+# Built-in keyword rules, earlier categories win when several match
+DEFAULT_CATEGORY_KEYWORDS = [
+    ('Salary & Wages', ['salary', 'wages', 'payroll', 'employee', 'staff']),
+    ('Rent & Utilities', ['rent', 'lease', 'electricity', 'water', 'utility', 'power', 'gas']),
+    ('Office Supplies', ['office', 'stationery', 'supplies', 'printer', 'paper']),
+    ('Marketing & Advertising', ['marketing', 'advertising', 'promotion', 'ads', 'campaign']),
+    ('Travel & Transport', ['travel', 'transport', 'fuel', 'petrol', 'diesel', 'cab', 'taxi', 'flight']),
+    ('Professional Services', ['consulting', 'legal', 'accounting', 'professional', 'advisory']),
+    ('Raw Materials', ['material', 'raw', 'goods', 'inventory', 'stock', 'purchase']),
+    ('Equipment & Maintenance', ['equipment', 'machinery', 'repair', 'maintenance', 'service']),
+    ('Insurance', ['insurance', 'premium', 'policy']),
+    ('Bank Charges', ['bank', 'charge', 'fee', 'interest', 'commission']),
+    ('Taxes', ['tax', 'gst', 'vat', 'tds', 'duty']),
+]
+
+# Priority of the first built-in category; user rules default to 0 so they override built-ins
+DEFAULT_RULE_PRIORITY = 100
+USER_RULE_PRIORITY = 0
+
+# (priority, category, keyword) - lower priority wins
+Rule = Tuple[int, str, str]
+
+DEFAULT_RULES: Tuple[Rule, ...] = tuple(
+    (DEFAULT_RULE_PRIORITY + rank, category, keyword)
+    for rank, (category, keywords) in enumerate(DEFAULT_CATEGORY_KEYWORDS)
+    for keyword in keywords
+)
+
+
+class ExpenseCategorizer:
+    """
+    Substring keyword rules compiled into a single regex.
+
+    The pattern is a lookahead alternation (?=(kw1|kw2|...)) with keywords ordered by
+    priority, so scanning a description reports, at every position, the best rule whose
+    keyword starts there; the best of those is the best rule matching anywhere.
+    """
+
+    def __init__(self, rules: Sequence[Rule]):
+        ordered = sorted(
+            ((priority, index, category, keyword.lower())
+             for index, (priority, category, keyword) in enumerate(rules)
+             if keyword),
+            key=lambda rule: (rule[0], rule[1])
+        )
+        self.categories: List[str] = []
+        self._rank: Dict[str, int] = {}
+        for _, _, category, keyword in ordered:
+            # A keyword repeated at lower precedence can never win
+            if keyword not in self._rank:
+                self._rank[keyword] = len(self.categories)
+                self.categories.append(category)
+
+        keywords = sorted(self._rank, key=self._rank.get)
+        self.pattern = re.compile("(?=(" + "|".join(map(re.escape, keywords)) + "))") if keywords else None
+
+    def categorize(self, description: Optional[str]) -> str:
+        """Category of one description, DEFAULT_CATEGORY when no rule matches."""
+        if not description or self.pattern is None:
+            return DEFAULT_CATEGORY
+        best = min((self._rank[m.group(1)] for m in self.pattern.finditer(description.lower())), default=None)
+        return DEFAULT_CATEGORY if best is None else self.categories[best]
+
+    def categorize_many(self, descriptions: Sequence[Any]) -> np.ndarray:
+        """Categories for a column of descriptions, matching each distinct text once."""
+        if len(descriptions) == 0:
+            return np.empty(0, dtype=object)
+        texts = pd.Series(descriptions, dtype=object).fillna('').astype(str).str.lower()
+        codes, uniques = pd.factorize(texts)
+        labels = np.array([self.categorize(text) for text in uniques], dtype=object)
+        return labels[codes]
+
+
+@lru_cache(maxsize=EXPENSE_RULESET_CACHE)
+def _compile(user_rules: Tuple[Rule, ...]) -> ExpenseCategorizer:
+    return ExpenseCategorizer(user_rules + DEFAULT_RULES)
+
+
+def get_categorizer(user_rules: Optional[Sequence[Rule]] = None) -> ExpenseCategorizer:
+    """Compiled categorizer for the built-in rules plus the given user rules (cached per rule set)."""
+    return _compile(tuple(user_rules or ()))
+
+
+def rules_from_rows(rows: List[Dict[str, Any]]) -> Tuple[Rule, ...]:
+    """expense_rules rows to (priority, category, keyword) tuples in a stable order."""
+    rules = []
+    for row in rows:
+        keyword = str(row.get('keyword') or '').strip().lower()
+        category = str(row.get('category') or '').strip()
+        if not keyword or not category:
+            continue
+        priority = row.get('priority')
+        rules.append((USER_RULE_PRIORITY if priority is None else int(priority), category, keyword))
+    return tuple(sorted(rules))
+
+
+def fetch_user_rules(user_id: str) -> Tuple[Rule, ...]:
+    """A user's categorization rules; empty when they have none or the table is missing."""
+    from backend.db_client import supabase
+    try:
+        result = supabase.table("expense_rules") \
+            .select("keyword, category, priority") \
+            .eq("user_id", user_id) \
+            .execute()
+    except Exception as e:
+        logger.warning(f"Could not load expense rules for user {user_id}: {e}")
+        return ()
+    return rules_from_rows(result.data or [])
@@ -1,10 +1,14 @@
 
 import pandas as pd
 import io
+import os
 import re
+import sys
 import numpy as np
 import logging
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Iterator, Callable, BinaryIO, Union
+
+from backend.services.transaction_frame import DATE_FORMATS, parse_date
 
 logger = logging.getLogger(__name__)
 
@@ -155,115 +159,258 @@ def sanitize_value(val: Any) -> Any:
     return str(val)
 
 def clean_amount(val: Any) -> float:
-    """Clean any value to a float amount."""
-    if pd.isna(val) or val is None:
-        return 0.0
-    if isinstance(val, (int, float, np.integer, np.floating)):
-        return float(val)
-    
-    s = str(val).strip()
-    if not s:
-        return 0.0
-    
-    # Remove currency symbols and commas
-    s = re.sub(r'[$₹€£,\s]', '', s)
-    # Handle brackets for negative
-    if s.startswith('(') and s.endswith(')'):
-        s = '-' + s[1:-1]
-        
-    try:
-        return float(s)
-    except ValueError:
-        return 0.0
+    """Clean any value to a float amount (see normalize_amounts for the accepted formats)."""
+    amounts, _ = normalize_amounts(pd.Series([val], dtype=object))
+    return float(amounts.iloc[0])
 
-def parse_with_mapping(df: pd.DataFrame, mapping: Dict, upload_type: str) -> List[Dict[str, Any]]:
-    """
-    Parse DataFrame rows using the validated column mapping.
-    Returns list of standardized record objects.
-    """
-    # Create reverse mapping: standard_field -> original_column
+DEBIT_TYPE_PATTERN = r"debit|dr|expense|payment"
+UNPAID_STATUS_PATTERN = r"unpaid|pending|due|overdue"
+
+
+def standard_to_original(mapping: Dict) -> Dict[str, str]:
+    """Reverse a column mapping: standard_field -> first original column mapped to it."""
     std_to_orig = {}
     for orig_col, info in mapping.items():
         std = info["standard"]
         if std not in std_to_orig:  # Keep first match
             std_to_orig[std] = orig_col
+    return std_to_orig
+
+# Amount text after currency symbols, commas and whitespace are stripped, e.g.
+# "(1,00,000.00)", "500.00dr", "2.5l", "1200-"
+AMOUNT_PATTERN = re.compile(
+    r"^(?P<open>\()?(?P<sign>[+-])?(?P<number>\d*\.?\d+(?:e[+-]?\d+)?)"
+    r"(?P<unit>lakhs?|lacs?|l|crores?)?(?P<close>\))?(?P<trailing>-)?(?P<drcr>cr|dr)?\.?$"
+)
+AMOUNT_UNIT_MULTIPLIERS = {
+    "l": 1e5, "lac": 1e5, "lacs": 1e5, "lakh": 1e5, "lakhs": 1e5,
+    "crore": 1e7, "crores": 1e7,
+}
+CURRENCY_PATTERN = r"rs\.?|inr|[$₹€£]"
+BLANK_AMOUNT_PATTERN = r"^[-–—]*$|^(?:nil|n/?a)$"
+
+def normalize_amounts(col: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    Normalize a whole amount column to floats in a few vectorized string passes.
+    Understands Indian digit grouping ("1,00,000"), Cr/Dr suffixes (Dr is negative),
+    bracket and trailing-minus negatives, currency symbols/Rs/INR and lakh/crore units.
+    Returns (amounts, failed) where failed flags non-blank cells that could not be parsed;
+    those cells (and blanks) get 0.0.
+    """
+    if pd.api.types.is_numeric_dtype(col):
+        return col.astype(float).fillna(0.0), pd.Series(False, index=col.index)
+    
+    # Amount columns repeat heavily, so normalize each distinct value once.
+    # Slot -1 (missing cells) maps to the trailing 0.0 / False.
+    codes, uniques = pd.factorize(col)
+    values = pd.Series(uniques, dtype=object)
+    amounts = np.full(len(values) + 1, np.nan)
+    failed = np.zeros(len(values) + 1, dtype=bool)
     
+    is_text = np.append(values.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool), False)
+    is_other = ~is_text
+    is_other[-1] = False
+    if is_other.any():
+        amounts[is_other] = pd.to_numeric(values[is_other[:-1]], errors="coerce").to_numpy(dtype=float)
+        failed[is_other] = np.isnan(amounts[is_other])
+    if is_text.any():
+        s = values[is_text[:-1]].str.lower()
+        s = s.str.replace(CURRENCY_PATTERN, "", regex=True)
+        s = s.str.replace(r"[,\s]", "", regex=True)
+        
+        parts = s.str.extract(AMOUNT_PATTERN)
+        number = pd.to_numeric(parts["number"], errors="coerce")
+        multiplier = parts["unit"].map(AMOUNT_UNIT_MULTIPLIERS).fillna(1.0)
+        negative = (
+            parts["open"].notna()
+            | (parts["sign"] == "-")
+            | parts["trailing"].notna()
+            | (parts["drcr"] == "dr")
+        )
+        unbalanced = parts["open"].notna() != parts["close"].notna()
+        parsed = number.notna() & ~unbalanced
+        
+        value = number * multiplier
+        amounts[is_text] = value.where(~negative, -value).where(parsed).to_numpy(dtype=float)
+        failed[is_text] = (~parsed & ~s.str.match(BLANK_AMOUNT_PATTERN)).to_numpy(dtype=bool)
+    
+    amounts = np.nan_to_num(amounts, nan=0.0)
+    return (
+        pd.Series(amounts[codes], index=col.index),
+        pd.Series(failed[codes], index=col.index),
+    )
+
+def column_contains(col: pd.Series, pattern: str) -> np.ndarray:
+    """Boolean mask of cells whose lowercased str() contains any of the pattern's keywords."""
+    codes, uniques = pd.factorize(col)
+    matches = pd.Series(uniques, dtype=object).astype(str).str.lower().str.contains(pattern, regex=True)
+    # Slot -1 (missing cells) maps to the trailing False
+    return np.append(matches.to_numpy(dtype=bool), False)[codes]
+
+def text_column(col: pd.Series) -> pd.Series:
+    """str() every non-null cell, None elsewhere."""
+    return col.astype(object).map(str).where(col.notna(), None)
+
+def detect_date_format(col: pd.Series) -> Optional[str]:
+    """
+    The DATE_FORMATS entry that parses the most distinct values of a date column.
+    Deciding on the whole column settles day-first vs month-first: one value with a day
+    above 12 rules out the other order. Ties go to the earlier format, as per-value
+    parsing did.
+    """
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return None
+    values = pd.Series(col.dropna().unique()).astype(str).str.strip().str[:10]
+    best, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = int(pd.to_datetime(values, format=fmt, errors='coerce').notna().sum())
+        if count > best_count:
+            best, best_count = fmt, count
+    return best
+
+def mapped_date_format(df: pd.DataFrame, mapping: Dict) -> Optional[str]:
+    """Date format of the mapped date column, None when there is none."""
+    std_to_orig = standard_to_original(mapping)
+    if "date" not in std_to_orig:
+        return None
+    return detect_date_format(df[std_to_orig["date"]])
+
+def normalize_dates(col: pd.Series, date_format: Optional[str]) -> pd.Series:
+    """
+    Canonical ISO (YYYY-MM-DD) text for a date column parsed with the upload's format.
+    Values in another format fall back to per-value parsing; values no format
+    accepts are kept as given and count as undated downstream.
+    """
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col.dt.strftime('%Y-%m-%d').astype(object).where(col.notna(), None)
+    
+    text = text_column(col)
+    head = text.str.strip().str[:10]
+    if date_format:
+        parsed = pd.to_datetime(head, format=date_format, errors='coerce')
+        iso = parsed.dt.strftime('%Y-%m-%d').astype(object).where(parsed.notna(), None)
+    else:
+        iso = pd.Series(None, index=col.index, dtype=object)
+    
+    unresolved = iso.isna() & head.notna()
+    if unresolved.any():
+        days = {value: parse_date(value) for value in head[unresolved].unique()}
+        iso[unresolved] = head[unresolved].map(lambda value: None if days[value] is None else str(days[value]))
+    
+    return iso.where(iso.notna(), text)
+
+def parse_frame(
+    df: pd.DataFrame,
+    mapping: Dict,
+    upload_type: str,
+    date_format: Optional[str] = None
+) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Columnar parse of a whole DataFrame using the validated column mapping.
+    Resolves direction, amount, status and description with column masks instead of
+    a per-row loop. Zero-amount rows are dropped. Dates are stored as ISO text, read
+    with date_format (detected from this frame's date column when not given).
+    Returns (frame, failed): frame has columns date, amount, direction, status
+    (+ description if mapped); failed flags input rows with an unparseable amount cell
+    or with both a credit and a debit amount (only the credit is kept).
+    """
+    std_to_orig = standard_to_original(mapping)
     logger.info(f"Standard to original mapping: {std_to_orig}")
     
-    parsed_rows = []
+    n = len(df)
+    amount = np.zeros(n)
+    is_debit = np.zeros(n, dtype=bool)
+    failed = pd.Series(False, index=df.index)
     
-    for idx, row in df.iterrows():
-        try:
-            record = {}
-            
-            # Date
-            if "date" in std_to_orig:
-                date_val = row[std_to_orig["date"]]
-                record["date"] = str(date_val) if pd.notna(date_val) else None
-            else:
-                record["date"] = str(idx)
-            
-            # Amount - try different approaches based on available columns
-            amount = 0.0
-            direction = "credit"  # Default
-            
-            if "credit" in std_to_orig and "debit" in std_to_orig:
-                # Separate credit/debit columns
-                credit_val = clean_amount(row[std_to_orig["credit"]])
-                debit_val = clean_amount(row[std_to_orig["debit"]])
-                if credit_val > 0:
-                    amount = credit_val
-                    direction = "credit"
-                elif debit_val > 0:
-                    amount = debit_val
-                    direction = "debit"
-            elif "amount" in std_to_orig:
-                # Single amount column
-                amount = clean_amount(row[std_to_orig["amount"]])
-                if "type" in std_to_orig:
-                    type_val = str(row[std_to_orig["type"]]).lower()
-                    if any(x in type_val for x in ["debit", "dr", "expense", "payment"]):
-                        direction = "debit"
-                    else:
-                        direction = "credit"
-                elif amount < 0:
-                    direction = "debit"
-                    amount = abs(amount)
-            elif "credit" in std_to_orig:
-                amount = clean_amount(row[std_to_orig["credit"]])
-                direction = "credit"
-            elif "debit" in std_to_orig:
-                amount = clean_amount(row[std_to_orig["debit"]])
-                direction = "debit"
-            
-            if amount == 0:
-                continue  # Skip zero-amount rows
-            
-            record["amount"] = float(amount)
-            record["direction"] = direction
-            
-            # Status
-            if "status" in std_to_orig:
-                status_val = str(row[std_to_orig["status"]]).lower()
-                if any(x in status_val for x in ["unpaid", "pending", "due", "overdue"]):
-                    record["status"] = "unpaid"
-                else:
-                    record["status"] = "paid"
-            else:
-                record["status"] = "paid"
-            
-            # Description
-            if "description" in std_to_orig:
-                desc_val = row[std_to_orig["description"]]
-                record["description"] = str(desc_val) if pd.notna(desc_val) else ""
-            
-            parsed_rows.append(record)
-            
-        except Exception as e:
-            logger.warning(f"Row {idx} parse error: {e}")
-            continue
+    def amounts_from(field: str) -> np.ndarray:
+        values, bad = normalize_amounts(df[std_to_orig[field]])
+        failed[bad] = True
+        return values.to_numpy()
+    
+    # Amount - precedence: credit+debit columns, then amount (+type), then credit or debit alone.
+    # Where the column or the type already gives the direction, a Dr / bracketed / minus
+    # sign only restates it, so the magnitude is used.
+    if "credit" in std_to_orig and "debit" in std_to_orig:
+        credit_val = np.abs(amounts_from("credit"))
+        debit_val = np.abs(amounts_from("debit"))
+        is_credit = credit_val > 0
+        is_debit = ~is_credit & (debit_val > 0)
+        amount = np.where(is_credit, credit_val, np.where(is_debit, debit_val, 0.0))
+        # A row with both columns filled keeps its credit; the debit it drops is reported
+        failed[is_credit & (debit_val > 0)] = True
+    elif "amount" in std_to_orig:
+        amount = amounts_from("amount")
+        if "type" in std_to_orig:
+            is_debit = column_contains(df[std_to_orig["type"]], DEBIT_TYPE_PATTERN)
+        else:
+            is_debit = amount < 0
+        amount = np.abs(amount)
+    elif "credit" in std_to_orig:
+        amount = np.abs(amounts_from("credit"))
+    elif "debit" in std_to_orig:
+        amount = np.abs(amounts_from("debit"))
+        is_debit = np.ones(n, dtype=bool)
+    
+    keep = amount != 0  # Skip zero-amount rows
     
-    return parsed_rows
+    # Date
+    if "date" in std_to_orig:
+        date_col = df[std_to_orig["date"]]
+        if date_format is None:
+            date_format = detect_date_format(date_col)
+            logger.info(f"Detected date format: {date_format}")
+        date = normalize_dates(date_col, date_format)
+    else:
+        date = pd.Series(df.index.map(str), index=df.index, dtype=object)
+    
+    # Status
+    if "status" in std_to_orig:
+        is_unpaid = column_contains(df[std_to_orig["status"]], UNPAID_STATUS_PATTERN)
+    else:
+        is_unpaid = np.zeros(n, dtype=bool)
+    
+    columns = {
+        "date": date.to_numpy()[keep],
+        "amount": amount[keep].astype(float),
+        "direction": np.where(is_debit, "debit", "credit")[keep].astype(object),
+        "status": np.where(is_unpaid, "unpaid", "paid")[keep].astype(object),
+    }
+    
+    # Description
+    if "description" in std_to_orig:
+        description = text_column(df[std_to_orig["description"]]).fillna("")
+        columns["description"] = description.to_numpy()[keep]
+    
+    return pd.DataFrame(columns, index=df.index[keep]), failed
+
+def frame_to_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert a parsed frame to the list-of-dicts stored as parsed_data."""
+    keys = frame.columns.tolist()
+    values = [frame[key].tolist() for key in keys]
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
+def parse_with_mapping(df: pd.DataFrame, mapping: Dict, upload_type: str) -> List[Dict[str, Any]]:
+    """
+    Parse DataFrame rows using the validated column mapping.
+    Returns list of standardized record objects.
+    """
+    frame, _ = parse_frame(df, mapping, upload_type)
+    return frame_to_records(frame)
+
+def summarize_amount_failures(df: pd.DataFrame, mapping: Dict, failed: pd.Series, limit: int = 20) -> Dict[str, Any]:
+    """Report rows whose amount cells could not be parsed (row numbers are 1-based data rows)."""
+    std_to_orig = standard_to_original(mapping)
+    amount_cols = [std_to_orig[f] for f in ("amount", "credit", "debit") if f in std_to_orig]
+    failed_rows = failed.index[failed.to_numpy()]
+    
+    samples = []
+    for idx in failed_rows[:limit]:
+        samples.append({
+            "row": int(idx) + 1 if isinstance(idx, (int, np.integer)) else str(idx),
+            "values": {str(col): sanitize_value(df.at[idx, col]) for col in amount_cols}
+        })
+    
+    return {"count": int(len(failed_rows)), "rows": samples}
 
 def compute_metrics(parsed_rows: List[Dict], upload_type: str) -> Dict[str, float]:
     """Compute financial metrics from parsed rows."""
@@ -274,6 +421,23 @@ def compute_metrics(parsed_rows: List[Dict], upload_type: str) -> Dict[str, floa
     total_debit = sum(r["amount"] for r in parsed_rows if r.get("direction") == "debit")
     total_unpaid = sum(r["amount"] for r in parsed_rows if r.get("status") == "unpaid")
     
+    return metrics_from_totals(total_credit, total_debit, total_unpaid, upload_type)
+
+def compute_frame_metrics(frame: pd.DataFrame, upload_type: str) -> Dict[str, float]:
+    """Compute financial metrics from a parsed frame (same result as compute_metrics)."""
+    if frame.empty:
+        return {}
+    
+    amount = frame["amount"].to_numpy()
+    direction = frame["direction"].to_numpy()
+    total_credit = float(amount[direction == "credit"].sum())
+    total_debit = float(amount[direction == "debit"].sum())
+    total_unpaid = float(amount[frame["status"].to_numpy() == "unpaid"].sum())
+    
+    return metrics_from_totals(total_credit, total_debit, total_unpaid, upload_type)
+
+def metrics_from_totals(total_credit: float, total_debit: float, total_unpaid: float, upload_type: str) -> Dict[str, float]:
+    """Map credit/debit/unpaid totals to the metrics each upload type contributes."""
     if upload_type == "bank":
         return {
             "cash_inflow": total_credit,
@@ -292,27 +456,178 @@ def compute_metrics(parsed_rows: List[Dict], upload_type: str) -> Dict[str, floa
     
     return {}
 
+def add_metrics(total: Dict[str, float], delta: Dict[str, float]) -> Dict[str, float]:
+    """Sum two metrics dicts key by key."""
+    result = dict(total)
+    for key, value in delta.items():
+        result[key] = result.get(key, 0) + value
+    return result
+
+
+
+# Rows per chunk for streaming ingestion
+DEFAULT_CHUNK_ROWS = int(os.environ.get("UPLOAD_CHUNK_ROWS", "50000"))
+
+
+FileSource = Union[bytes, str, BinaryIO]
+
+
+def is_path(source: FileSource) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+def rewind(source: FileSource) -> None:
+    if not is_path(source):
+        source.seek(0)
+
+def read_dataframe(source: FileSource, filename: str) -> pd.DataFrame:
+    """
+    Read a whole CSV/XLSX upload into a DataFrame.
+    source may be raw bytes, a file object or a path; CSV paths are memory-mapped.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    
+    if filename.lower().endswith('.csv'):
+        try:
+            return pd.read_csv(source, memory_map=is_path(source))
+        except UnicodeDecodeError:
+            rewind(source)
+            return pd.read_csv(source, encoding='latin1', memory_map=is_path(source))
+    elif filename.lower().endswith(('.xlsx', '.xls')):
+        return pd.read_excel(source, sheet_name=0)
+    
+    raise ValueError("Unsupported file format. Please upload CSV or XLSX.")
+
+def iter_dataframe_chunks(source: FileSource, filename: str, chunk_rows: int, encoding: str = 'utf-8') -> Iterator[pd.DataFrame]:
+    """
+    Yield an upload as DataFrames of at most chunk_rows rows, keeping the row index
+    continuous across chunks. Only one chunk is held in memory at a time.
+    """
+    name = filename.lower()
+    if name.endswith('.csv'):
+        with pd.read_csv(source, chunksize=chunk_rows, encoding=encoding, memory_map=is_path(source)) as reader:
+            yield from reader
+    elif name.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [c if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+            
+            start = 0
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == chunk_rows:
+                    yield pd.DataFrame(batch, columns=columns, index=range(start, start + len(batch)))
+                    start += len(batch)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=columns, index=range(start, start + len(batch)))
+        finally:
+            workbook.close()
+    elif name.endswith('.xls'):
+        # Legacy .xls has no streaming reader; slice the sheet instead
+        df = pd.read_excel(source, sheet_name=0)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+    else:
+        raise ValueError("Unsupported file format. Please upload CSV or XLSX.")
+
+def map_columns(df: pd.DataFrame, upload_type: str) -> Tuple[Dict[str, Any], Dict, int]:
+    """
+    Build the column mapping for an upload from its header.
+    Returns (mapping_result, mapping, confidence); raises ValueError on missing fields.
+    """
+    if upload_type in ['inventory', 'loan']:
+        # Bypass standard mapping for these types
+        logger.info(f"Using direct parsing for {upload_type}")
+
+        # Create a 1:1 mapping for UI display purposes (so user sees what they uploaded)
+        mapping = {col: {"standard": col, "confidence": 100} for col in df.columns}
+        mapping_result = {
+            "mapping": mapping,
+            "min_confidence": 100,
+            "missing": []
+        }
+        return mapping_result, mapping, 100
+
+    # Standard financial parsing
+    mapping_result = analyze_column_mapping(df)
+    mapping = mapping_result["mapping"]
+    confidence = mapping_result["min_confidence"]
+
+    is_valid, missing = validate_required_fields(mapping, upload_type)
+
+    if not is_valid:
+        error_msg = f"Missing required fields for {upload_type}: {', '.join(missing)}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    
+    return mapping_result, mapping, confidence
+
+def parse_rows(
+    df: pd.DataFrame,
+    mapping: Dict,
+    upload_type: str,
+    date_format: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Dict[str, float], Dict[str, Any]]:
+    """
+    Parse one DataFrame (whole file or chunk) with an established mapping.
+    date_format is the upload's date format (detected from df when not given).
+    Returns (parsed_rows, metrics, amount_parse_errors).
+    """
+    if upload_type in ['inventory', 'loan']:
+        # Convert DF directly to record list
+        # Handle NaN values explicitly
+        df_filled = df.astype(object).where(pd.notnull(df), None)
+        parsed_rows = df_filled.to_dict(orient='records')
+
+        # No financial metrics for these auxiliary types
+        # The downstream specific services (inventory_loan_service) handle the specific field validation
+        return parsed_rows, {}, {"count": 0, "rows": []}
+
+    frame, failed = parse_frame(df, mapping, upload_type, date_format)
+    amount_errors = summarize_amount_failures(df, mapping, failed)
+    if amount_errors["count"]:
+        logger.warning(f"⚠️ {amount_errors['count']} rows with unparseable amounts: {amount_errors['rows'][:5]}")
+    
+    return frame_to_records(frame), compute_frame_metrics(frame, upload_type), amount_errors
+
+def peak_rss_mb() -> Optional[float]:
+    """Process peak resident set size in MB (None where the platform doesn't report it)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
 
 
-async def process_financial_data(file_contents: bytes, filename: str, upload_type: str) -> Dict[str, Any]:
+
+async def process_financial_data(file_contents: FileSource, filename: str, upload_type: str) -> Dict[str, Any]:
     """
     Process uploaded file with smart column mapping.
+    Runs inline; use parse_executor to keep large files off the event loop.
+    """
+    return parse_financial_file(file_contents, filename, upload_type)
+
+def parse_financial_file(file_contents: FileSource, filename: str, upload_type: str) -> Dict[str, Any]:
+    """
+    Process uploaded file with smart column mapping.
+    file_contents may be raw bytes or the path of a spooled upload (read via memory map).
     Returns parsed_data, metrics, and mapping info for UI confirmation.
     """
     logger.info(f"=== PROCESSING: {filename} (type: {upload_type}) ===")
     
     try:
         # Read the file into DataFrame
-        df = None
-        if filename.lower().endswith('.csv'):
-            try:
-                df = pd.read_csv(io.BytesIO(file_contents))
-            except:
-                df = pd.read_csv(io.BytesIO(file_contents), encoding='latin1')
-        elif filename.lower().endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(io.BytesIO(file_contents), sheet_name=0)
-        else:
-            raise ValueError("Unsupported file format. Please upload CSV or XLSX.")
+        df = read_dataframe(file_contents, filename)
         
         if df.empty:
             raise ValueError("Uploaded file has no rows")
@@ -323,47 +638,8 @@ async def process_financial_data(file_contents: bytes, filename: str, upload_typ
 
         logger.info(f"Loaded {len(df)} rows with columns: {df.columns.tolist()}")
 
-        if upload_type in ['inventory', 'loan']:
-            # Bypass standard mapping for these types
-            logger.info(f"Using direct parsing for {upload_type}")
-
-            # Create a 1:1 mapping for UI display purposes (so user sees what they uploaded)
-            mapping = {col: {"standard": col, "confidence": 100} for col in df.columns}
-            confidence = 100
-            
-            mapping_result = {
-                "mapping": mapping,
-                "min_confidence": 100,
-                "missing": []
-            }
-
-            # Convert DF directly to record list
-            # Handle NaN values explicitly
-            df_filled = df.where(pd.notnull(df), None)
-            parsed_data = df_filled.to_dict(orient='records')
-
-            # No financial metrics for these auxiliary types
-            metrics = {}
-
-            # Map specific fields if needed for downstream services, but generally pass raw
-            # The downstream specific services (inventory_loan_service) handle the specific field validation
-
-        else:
-            # Standard financial parsing
-            
-            mapping_result = analyze_column_mapping(df)
-            mapping = mapping_result["mapping"]
-            confidence = mapping_result["min_confidence"]
-
-            is_valid, missing = validate_required_fields(mapping, upload_type)
-
-            if not is_valid:
-                error_msg = f"Missing required fields for {upload_type}: {', '.join(missing)}"
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-
-            parsed_data = parse_with_mapping(df, mapping, upload_type)
-            metrics = compute_metrics(parsed_data, upload_type)
+        mapping_result, mapping, confidence = map_columns(df, upload_type)
+        parsed_data, metrics, amount_errors = parse_rows(df, mapping, upload_type)
 
         if not parsed_data:
             raise ValueError("No valid data rows could be parsed. Check column names and data format.")
@@ -376,7 +652,8 @@ async def process_financial_data(file_contents: bytes, filename: str, upload_typ
             "parsed_data": parsed_data,
             "column_mapping": mapping_result,
             "confidence": confidence,
-            "rows_parsed": len(parsed_data)
+            "rows_parsed": len(parsed_data),
+            "amount_parse_errors": amount_errors
         }
         
     except ValueError as e:
@@ -387,3 +664,122 @@ async def process_financial_data(file_contents: bytes, filename: str, upload_typ
         import traceback
         logger.error(traceback.format_exc())
         raise ValueError(f"Failed to process file: {str(e)}")
+
+def process_financial_stream(
+    source: FileSource,
+    filename: str,
+    upload_type: str,
+    chunk_rows: Optional[int] = None,
+    on_chunk: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    keep_rows: bool = True
+) -> Dict[str, Any]:
+    """
+    Streaming variant of process_financial_data for very large statements.
+    Reads the upload chunk_rows rows at a time, maps columns once from the header and
+    accumulates metrics chunk by chunk, so memory stays bounded by the chunk size.
+    Parsed rows are handed to on_chunk and only retained when keep_rows is set.
+    Returns the same shape as process_financial_data plus chunk/memory stats.
+    """
+    chunk_rows = chunk_rows or DEFAULT_CHUNK_ROWS
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    if chunk_rows < 1:
+        raise ValueError("chunk_rows must be a positive integer")
+    
+    logger.info(f"=== STREAMING: {filename} (type: {upload_type}, chunk_rows: {chunk_rows}) ===")
+    
+    try:
+        try:
+            return _process_chunks(source, filename, upload_type, chunk_rows, on_chunk, keep_rows, 'utf-8')
+        except UnicodeDecodeError:
+            if not filename.lower().endswith('.csv'):
+                raise
+            logger.info("Retrying stream with latin1 encoding")
+            rewind(source)
+            return _process_chunks(source, filename, upload_type, chunk_rows, on_chunk, keep_rows, 'latin1')
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise
+    except Exception as e:
+        logger.error(f"Processing error: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise ValueError(f"Failed to process file: {str(e)}")
+
+def _process_chunks(
+    source: FileSource,
+    filename: str,
+    upload_type: str,
+    chunk_rows: int,
+    on_chunk: Optional[Callable[[List[Dict[str, Any]]], None]],
+    keep_rows: bool,
+    encoding: str
+) -> Dict[str, Any]:
+    mapping_result = mapping = confidence = date_format = None
+    parsed_data: List[Dict[str, Any]] = []
+    metrics: Dict[str, float] = {}
+    amount_errors = {"count": 0, "rows": []}
+    rows_read = 0
+    rows_parsed = 0
+    chunks = 0
+    peak_chunk_bytes = 0
+    
+    for chunk in iter_dataframe_chunks(source, filename, chunk_rows, encoding):
+        chunks += 1
+        rows_read += len(chunk)
+        
+        if mapping is None:
+            # Columns are mapped once, from the header
+            logger.info(f"Streaming columns: {chunk.columns.tolist()}")
+            mapping_result, mapping, confidence = map_columns(chunk, upload_type)
+        
+        # Drop completely empty rows
+        chunk = chunk.dropna(how='all')
+        if chunk.empty:
+            continue
+        
+        if date_format is None and upload_type not in ['inventory', 'loan']:
+            # The date format is detected once, from the first chunk, and used for the rest
+            date_format = mapped_date_format(chunk, mapping)
+            logger.info(f"Streaming date format: {date_format}")
+        
+        chunk_bytes = int(chunk.memory_usage(deep=True).sum())
+        rows, chunk_metrics, chunk_errors = parse_rows(chunk, mapping, upload_type, date_format)
+        peak_chunk_bytes = max(peak_chunk_bytes, chunk_bytes)
+        
+        metrics = add_metrics(metrics, chunk_metrics)
+        amount_errors["count"] += chunk_errors["count"]
+        amount_errors["rows"] = (amount_errors["rows"] + chunk_errors["rows"])[:20]
+        rows_parsed += len(rows)
+        
+        if on_chunk is not None:
+            on_chunk(rows)
+        if keep_rows:
+            parsed_data.extend(rows)
+        del chunk, rows
+    
+    if rows_read == 0:
+        raise ValueError("Uploaded file has no rows")
+    if rows_parsed == 0:
+        raise ValueError("No valid data rows could be parsed. Check column names and data format.")
+    
+    logger.info(f"✅ Streamed {rows_parsed} rows in {chunks} chunks")
+    logger.info(f"✅ Metrics: {metrics}")
+    
+    result = {
+        "metrics": metrics,
+        "column_mapping": mapping_result,
+        "confidence": confidence,
+        "rows_parsed": rows_parsed,
+        "amount_parse_errors": amount_errors,
+        "streaming": {
+            "chunk_rows": chunk_rows,
+            "chunks": chunks,
+            "rows_read": rows_read,
+            "peak_chunk_memory_mb": round(peak_chunk_bytes / (1024 * 1024), 2),
+            "peak_rss_mb": peak_rss_mb()
+        }
+    }
+    if keep_rows:
+        result["parsed_data"] = parsed_data
+    return result
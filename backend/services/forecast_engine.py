@@ -0,0 +1,223 @@
+"""
+Forecast Engine - Deterministic forecasting models evaluated over many series at once
+Series are stacked into a (series x periods) matrix so one call forecasts every user of a batch;
+periods with no transactions are treated as missing, as in the 3-month forecast
+"""
+
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from backend.services.transaction_frame import month_label, WEEK_OFFSET_DAYS
+
+logger = logging.getLogger(__name__)
+
+# Longest horizon accepted, in periods
+FORECAST_MAX_HORIZON = int(os.environ.get("FORECAST_MAX_HORIZON", "52"))
+
+# Default model parameters
+FORECAST_WINDOW = int(os.environ.get("FORECAST_WINDOW", "3"))
+FORECAST_ALPHA = float(os.environ.get("FORECAST_ALPHA", "0.5"))
+
+FORECAST_MODELS = ('moving_average', 'exponential_smoothing', 'seasonal_naive')
+GRANULARITIES = ('month', 'week')
+
+# Periods per seasonal cycle
+SEASON_LENGTH = {'month': 12, 'week': 52}
+
+
+def period_label(period: int, granularity: str) -> str:
+    """"Jan 2026" for months, ISO date of the Monday for weeks."""
+    if granularity == 'week':
+        return (datetime(1970, 1, 1) + timedelta(days=period * 7 - WEEK_OFFSET_DAYS)).strftime('%Y-%m-%d')
+    return month_label(period)
+
+
+def stack_series(
+    series: Sequence[Dict[int, float]],
+    observed: Optional[Sequence[Set[int]]] = None
+) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    Align {period: value} series on one period axis.
+    observed lists, per series, the periods that have data (default: the series' keys);
+    a period can be observed with value 0 when another metric of the same user had data.
+    Returns (first_period, values, observed_mask), both arrays of shape (len(series), periods).
+    """
+    if observed is None:
+        observed = [set(s) for s in series]
+    periods = [p for obs in observed for p in obs]
+    if not periods:
+        return 0, np.zeros((len(series), 0)), np.zeros((len(series), 0), dtype=bool)
+
+    first = min(periods)
+    width = max(periods) - first + 1
+    values = np.zeros((len(series), width))
+    mask = np.zeros((len(series), width), dtype=bool)
+    for row, (values_by_period, obs) in enumerate(zip(series, observed)):
+        if obs:
+            mask[row, np.fromiter(obs, dtype=np.int64, count=len(obs)) - first] = True
+        for period, value in values_by_period.items():
+            values[row, period - first] = value
+    return first, values, mask
+
+
+def last_observed(mask: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Column indexes of each row's last `count` observed periods, latest first.
+    Returns (index, valid): index is (rows, count); valid is False past a row's observations.
+    """
+    rank = np.cumsum(mask[:, ::-1], axis=1)[:, ::-1]  # 1 for the latest observed period
+    index = np.zeros((mask.shape[0], count), dtype=np.int64)
+    valid = np.zeros((mask.shape[0], count), dtype=bool)
+    for r in range(count):
+        hit = mask & (rank == r + 1)
+        valid[:, r] = hit.any(axis=1)
+        index[:, r] = hit.argmax(axis=1)
+    return index, valid
+
+
+def moving_average(values: np.ndarray, mask: np.ndarray, horizon: int, window: int = FORECAST_WINDOW) -> np.ndarray:
+    """Mean of each row's last `window` observed periods, held flat over the horizon."""
+    if values.shape[1] == 0:
+        return np.full((values.shape[0], horizon), np.nan)
+    index, valid = last_observed(mask, window)
+    picked = np.where(valid, np.take_along_axis(values, index, axis=1), 0.0)
+    # Summed latest first, one column at a time, for the same rounding as a running sum
+    total = np.zeros(values.shape[0])
+    for r in range(window):
+        total = total + picked[:, r]
+    counts = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        level = np.where(counts > 0, total / np.maximum(counts, 1), np.nan)
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+def exponential_smoothing(values: np.ndarray, mask: np.ndarray, horizon: int, alpha: float = FORECAST_ALPHA) -> np.ndarray:
+    """Simple exponential smoothing over observed periods, held flat over the horizon."""
+    level = np.full(values.shape[0], np.nan)
+    for t in range(values.shape[1]):
+        x = values[:, t]
+        smoothed = np.where(np.isnan(level), x, alpha * x + (1 - alpha) * level)
+        level = np.where(mask[:, t], smoothed, level)
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+def seasonal_naive(values: np.ndarray, mask: np.ndarray, horizon: int, season: int = 12) -> np.ndarray:
+    """
+    Value of the same period one season earlier than each forecast step.
+    Steps whose seasonal period has no data fall back to the moving average.
+    """
+    rows, width = values.shape
+    forecast = moving_average(values, mask, horizon)
+    if width == 0:
+        return forecast
+    last = np.where(mask.any(axis=1), width - 1 - mask[:, ::-1].argmax(axis=1), -1)
+    for h in range(1, horizon + 1):
+        source = last + h - season * int(np.ceil(h / season))
+        ok = (last >= 0) & (source >= 0)
+        column = np.clip(source, 0, width - 1)
+        seen = ok & mask[np.arange(rows), column]
+        forecast[:, h - 1] = np.where(seen, values[np.arange(rows), column], forecast[:, h - 1])
+    return forecast
+
+
+def run_model(
+    model: str,
+    values: np.ndarray,
+    mask: np.ndarray,
+    horizon: int,
+    granularity: str = 'month',
+    window: int = FORECAST_WINDOW,
+    alpha: float = FORECAST_ALPHA
+) -> np.ndarray:
+    """Forecast matrix (rows, horizon) of one model; NaN for rows without data."""
+    if model == 'moving_average':
+        return moving_average(values, mask, horizon, window)
+    if model == 'exponential_smoothing':
+        return exponential_smoothing(values, mask, horizon, alpha)
+    if model == 'seasonal_naive':
+        return seasonal_naive(values, mask, horizon, SEASON_LENGTH[granularity])
+    raise ValueError(f"Unknown forecast model: {model}")
+
+
+def validate_request(model: str, horizon: int, granularity: str) -> None:
+    if model not in FORECAST_MODELS:
+        raise ValueError(f"model must be one of: {', '.join(FORECAST_MODELS)}")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    if not 1 <= horizon <= FORECAST_MAX_HORIZON:
+        raise ValueError(f"horizon must be between 1 and {FORECAST_MAX_HORIZON}")
+
+
+def backtest_error(
+    model: str,
+    values: np.ndarray,
+    mask: np.ndarray,
+    horizon: int,
+    granularity: str = 'month',
+    **params
+) -> np.ndarray:
+    """
+    Mean absolute error per row when each row's last `horizon` observed periods are held out
+    and forecast from the periods before them. NaN where a row has too little history.
+    """
+    index, valid = last_observed(mask, horizon)
+    cutoff = np.where(valid[:, -1], index[:, -1], values.shape[1])
+    columns = np.arange(values.shape[1])
+    train = mask & (columns[None, :] < cutoff[:, None])
+    forecast = run_model(model, values, train, values.shape[1], granularity, **params)
+
+    test = mask & ~train
+    last_train = values.shape[1] - 1 - train[:, ::-1].argmax(axis=1)
+    step = np.clip(columns[None, :] - last_train[:, None] - 1, 0, values.shape[1] - 1)
+    errors = np.abs(np.take_along_axis(forecast, step, axis=1) - values)
+    errors = np.where(test, errors, 0.0)
+    counts = test.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(train.any(axis=1) & (counts > 0), errors.sum(axis=1) / np.maximum(counts, 1), np.nan)
+
+
+def forecast_batch(
+    user_series: Dict[str, Dict[str, Dict[int, float]]],
+    model: str = 'moving_average',
+    horizon: int = 3,
+    granularity: str = 'month',
+    evaluate: bool = False,
+    **params
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Forecast every metric of every user in one vectorized call.
+    user_series maps user -> metric -> {period: value}; a user's periods with data in any metric
+    are observed for all of them. Returns user -> {'start_period', 'forecast': {metric: [values]}}
+    plus 'backtest_mae' per metric with evaluate=True.
+    """
+    validate_request(model, horizon, granularity)
+
+    keys: List[Tuple[str, str]] = []
+    series: List[Dict[int, float]] = []
+    observed: List[Set[int]] = []
+    for user, metrics in user_series.items():
+        user_periods = set().union(*(set(s) for s in metrics.values())) if metrics else set()
+        for metric, values_by_period in metrics.items():
+            keys.append((user, metric))
+            series.append(values_by_period)
+            observed.append(user_periods)
+
+    first, values, mask = stack_series(series, observed)
+    forecast = run_model(model, values, mask, horizon, granularity, **params)
+    errors = backtest_error(model, values, mask, horizon, granularity, **params) if evaluate else None
+    last = np.where(mask.any(axis=1), first + mask.shape[1] - 1 - mask[:, ::-1].argmax(axis=1), -1) \
+        if mask.shape[1] else np.full(len(keys), -1)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for row, (user, metric) in enumerate(keys):
+        entry = results.setdefault(user, {'start_period': None, 'forecast': {}})
+        if last[row] >= 0:
+            entry['start_period'] = int(last[row]) + 1
+        entry['forecast'][metric] = [None if np.isnan(v) else float(v) for v in forecast[row]]
+        if errors is not None:
+            entry.setdefault('backtest_mae', {})[metric] = None if np.isnan(errors[row]) else float(errors[row])
+    return results
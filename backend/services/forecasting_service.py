@@ -4,29 +4,28 @@ NO AI/ML - purely deterministic calculations
 """
 
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
 from datetime import datetime
-from collections import defaultdict
+
+import numpy as np
+
+from backend.services.forecast_engine import (
+    stack_series, moving_average, forecast_batch, period_label
+)
+from backend.services.transaction_frame import (
+    TransactionFrame, as_transaction_frame, sum_by_month, first_nonzero, month_index, month_year, parse_date,
+    WEEK_OFFSET_DAYS
+)
 
 logger = logging.getLogger(__name__)
 
 
 def parse_date_month_year(date_str: Any) -> Optional[tuple]:
     """Extract (year, month) tuple from date string for ordering."""
-    if not date_str:
-        return None
-    
-    try:
-        date_str = str(date_str)
-        for fmt in ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d', '%m/%d/%Y']:
-            try:
-                dt = datetime.strptime(date_str[:10], fmt)
-                return (dt.year, dt.month)
-            except ValueError:
-                continue
-        return None
-    except Exception:
+    day = parse_date(date_str)
+    if day is None:
         return None
+    return month_year(int(day.astype('datetime64[M]').astype(np.int64)))
 
 
 def get_month_label(year: int, month: int) -> str:
@@ -37,59 +36,109 @@ def get_month_label(year: int, month: int) -> str:
         return f"{month}/{year}"
 
 
-def generate_forecast(uploads_data: List[Dict[str, Any]], current_metrics: Dict[str, Any]) -> Dict[str, Any]:
+def monthly_series(frame: TransactionFrame, granularity: str = 'month') -> Dict[str, Dict[int, float]]:
+    """
+    Monthly revenue, expenses, cash in and cash out (keyed by month index) from transactions.
+    With granularity='week' the series are weekly, keyed by week index.
+    """
+    months = frame.periods(granularity)
+    dated = months >= 0
+    
+    sales = dated & frame.type_mask('sales')
+    purchase = dated & frame.type_mask('purchase')
+    bank = dated & frame.type_mask('bank')
+    cash_in = bank & (frame.credit > 0)
+    cash_out = bank & (frame.debit > 0)
+    
+    return {
+        'revenue': sum_by_month(months[sales], first_nonzero(frame.amount, frame.credit)[sales]),
+        'expenses': sum_by_month(months[purchase], first_nonzero(frame.amount, frame.debit)[purchase]),
+        'cash_in': sum_by_month(months[cash_in], frame.credit[cash_in]),
+        'cash_out': sum_by_month(months[cash_out], frame.debit[cash_out])
+    }
+
+
+def series_from_period_totals(totals: List[Dict[str, Any]], granularity: str = 'month') -> Dict[str, Dict[int, float]]:
+    """
+    Same series as monthly_series, from the per-period totals the database aggregates
+    over the transactions table (transaction_store.period_totals). Bank cash flows are
+    split on direction, since stored transactions carry an amount and a type.
+    """
+    series = {'revenue': {}, 'expenses': {}, 'cash_in': {}, 'cash_out': {}}
+    keys = {
+        ('sales', 'credit'): 'revenue', ('sales', 'debit'): 'revenue',
+        ('purchase', 'credit'): 'expenses', ('purchase', 'debit'): 'expenses',
+        ('bank', 'credit'): 'cash_in', ('bank', 'debit'): 'cash_out',
+    }
+    for row in totals:
+        key = keys.get((row.get('file_type'), row.get('type')))
+        day = parse_date(row.get('period'))
+        if key is None or day is None:
+            continue
+        if granularity == 'week':
+            period = (int(day.astype(np.int64)) + WEEK_OFFSET_DAYS) // 7
+        else:
+            period = int(day.astype('datetime64[M]').astype(np.int64))
+        series[key][period] = series[key].get(period, 0) + float(row.get('amount') or 0)
+    return series
+
+
+def monthly_series_from_rollups(rollups: List[Dict[str, Any]]) -> Dict[str, Dict[int, float]]:
+    """Same series as monthly_series, read from monthly_rollups rows."""
+    series = {'revenue': {}, 'expenses': {}, 'cash_in': {}, 'cash_out': {}}
+    
+    for row in rollups:
+        month = month_index(row.get('month'))
+        if month is None:
+            continue
+        file_type = row.get('file_type')
+        if file_type == 'sales':
+            series['revenue'][month] = series['revenue'].get(month, 0) + float(row.get('amount') or 0)
+        elif file_type == 'purchase':
+            series['expenses'][month] = series['expenses'].get(month, 0) + float(row.get('amount') or 0)
+        elif file_type == 'bank':
+            # Sums of positive amounts: a month has cash flow exactly when its sum is > 0
+            for key, column in (('cash_in', 'cash_in'), ('cash_out', 'cash_out')):
+                value = float(row.get(column) or 0)
+                if value > 0:
+                    series[key][month] = series[key].get(month, 0) + value
+    
+    return series
+
+
+def generate_forecast(
+    uploads_data: Union[List[Dict[str, Any]], TransactionFrame],
+    current_metrics: Dict[str, Any]
+) -> Dict[str, Any]:
     """
     Generate 3-month financial forecast based on historical averages.
     
     Args:
-        uploads_data: List of upload records with parsed_data and file_type
+        uploads_data: List of upload records with parsed_data and file_type,
+            or a TransactionFrame built from them
         current_metrics: Current aggregated metrics
     
     Returns:
         3-month forecast with projections
     """
-    monthly_revenue = defaultdict(float)
-    monthly_expenses = defaultdict(float)
-    monthly_cash_in = defaultdict(float)
-    monthly_cash_out = defaultdict(float)
-    
-    for upload in uploads_data:
-        upload_type = upload.get('file_type', 'bank')
-        filename = str(upload.get('filename', ''))
-        
-        # Skip masqueraded auxiliary files
-        if filename.startswith('[INVENTORY]') or filename.startswith('[LOAN]'):
-            continue
-            
-        parsed_data = upload.get('parsed_data', [])
-        
-        if not parsed_data or not isinstance(parsed_data, list):
-            continue
-        
-        for transaction in parsed_data:
-            if not isinstance(transaction, dict):
-                continue
-            
-            month_key = parse_date_month_year(transaction.get('date'))
-            if not month_key:
-                continue
-            
-            amount = float(transaction.get('amount', 0) or 0)
-            credit = float(transaction.get('credit', 0) or 0)
-            debit = float(transaction.get('debit', 0) or 0)
-            
-            if upload_type == 'sales':
-                monthly_revenue[month_key] += amount or credit
-            elif upload_type == 'purchase':
-                monthly_expenses[month_key] += amount or debit
-            elif upload_type == 'bank':
-                if credit > 0:
-                    monthly_cash_in[month_key] += credit
-                if debit > 0:
-                    monthly_cash_out[month_key] += debit
+    return project_forecast(monthly_series(as_transaction_frame(uploads_data)), current_metrics)
+
+
+def forecast_from_rollups(rollups: List[Dict[str, Any]], current_metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """generate_forecast over monthly_rollups rows instead of raw transactions."""
+    return project_forecast(monthly_series_from_rollups(rollups), current_metrics)
+
+
+def project_forecast(series: Dict[str, Dict[int, float]], current_metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """Project the next 3 months from monthly series (see monthly_series)."""
+    monthly_revenue = series['revenue']
+    monthly_expenses = series['expenses']
+    monthly_cash_in = series['cash_in']
+    monthly_cash_out = series['cash_out']
     
     all_months = set(monthly_revenue.keys()) | set(monthly_expenses.keys()) | \
                  set(monthly_cash_in.keys()) | set(monthly_cash_out.keys())
+    metric_series = [monthly_revenue, monthly_expenses, monthly_cash_in, monthly_cash_out]
     
     sorted_months = sorted(all_months, reverse=True)[:3]
     
@@ -108,11 +157,10 @@ def generate_forecast(uploads_data: List[Dict[str, Any]], current_metrics: Dict[
                 'summary': {}
             }
     else:
-        n = len(sorted_months)
-        avg_revenue = sum(monthly_revenue.get(m, 0) for m in sorted_months) / n
-        avg_expenses = sum(monthly_expenses.get(m, 0) for m in sorted_months) / n
-        avg_cash_in = sum(monthly_cash_in.get(m, 0) for m in sorted_months) / n
-        avg_cash_out = sum(monthly_cash_out.get(m, 0) for m in sorted_months) / n
+        # Average of the latest 3 months with any data
+        _, values, mask = stack_series(metric_series, [all_months] * len(metric_series))
+        averages = moving_average(values, mask, horizon=1, window=3)[:, 0]
+        avg_revenue, avg_expenses, avg_cash_in, avg_cash_out = (float(a) for a in averages)
     
     # If averages are zero, try to use current metrics
     if avg_revenue == 0 and current_metrics:
@@ -171,3 +219,73 @@ def generate_forecast(uploads_data: List[Dict[str, Any]], current_metrics: Dict[
         },
         'disclaimer': 'Rule-based estimate for planning purposes. Based on historical averages only.'
     }
+
+
+def generate_period_forecast(
+    series: Dict[str, Dict[int, float]],
+    model: str = 'moving_average',
+    horizon: int = 3,
+    granularity: str = 'month',
+    evaluate: bool = False
+) -> Dict[str, Any]:
+    """
+    Forecast revenue, expenses and cash flow for `horizon` periods after the latest data.
+    
+    Args:
+        series: Series from monthly_series / monthly_series_from_rollups (matching granularity)
+        model: One of FORECAST_MODELS
+        horizon: Number of periods to project
+        granularity: 'month' or 'week'
+        evaluate: Also report each metric's backtest mean absolute error
+    
+    Returns:
+        Per-period projections with cumulative cash movement
+    """
+    result = forecast_batch({'user': series}, model, horizon, granularity, evaluate)['user']
+    periods_used = len(set().union(*(set(s) for s in series.values())))
+    
+    if result['start_period'] is None:
+        return {
+            'has_sufficient_data': False,
+            'message': 'Not enough historical data to forecast',
+            'model': model,
+            'granularity': granularity,
+            'horizon': horizon,
+            'periods_used': 0,
+            'projections': []
+        }
+    
+    forecast = result['forecast']
+    projections = []
+    cumulative_cash = 0
+    for step in range(horizon):
+        revenue = round(forecast['revenue'][step], 2)
+        expenses = round(forecast['expenses'][step], 2)
+        cash_in = round(forecast['cash_in'][step], 2)
+        cash_out = round(forecast['cash_out'][step], 2)
+        net_cash = round(cash_in - cash_out, 2)
+        cumulative_cash += net_cash
+        
+        projections.append({
+            'period': period_label(result['start_period'] + step, granularity),
+            'projected_revenue': revenue,
+            'projected_expenses': expenses,
+            'projected_profit': round(revenue - expenses, 2),
+            'projected_cash_inflow': cash_in,
+            'projected_cash_outflow': cash_out,
+            'net_cash_movement': net_cash,
+            'cumulative_cash_movement': round(cumulative_cash, 2)
+        })
+    
+    response = {
+        'has_sufficient_data': True,
+        'model': model,
+        'granularity': granularity,
+        'horizon': horizon,
+        'periods_used': periods_used,
+        'projections': projections,
+        'disclaimer': 'Rule-based estimate for planning purposes. Deterministic model, no AI/ML.'
+    }
+    if evaluate:
+        response['backtest_mae'] = result.get('backtest_mae', {})
+    return response
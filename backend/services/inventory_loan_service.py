@@ -3,77 +3,145 @@ Inventory & Loan Service - Process inventory and loan data uploads
 Optional data extensions for SME financial tracking
 """
 
+import os
+import heapq
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
+
+from backend.services.transaction_frame import TransactionFrame
 
 logger = logging.getLogger(__name__)
 
+# How several inventory uploads are combined: 'latest' treats each upload as a full stock
+# count and reports the most recent one only, 'sum' adds every upload's figures per SKU
+INVENTORY_AGGREGATIONS = ('latest', 'sum')
+INVENTORY_AGGREGATION = os.environ.get("INVENTORY_AGGREGATION", "latest")
 
+# Items listed in top_items
+INVENTORY_TOP_ITEMS = int(os.environ.get("INVENTORY_TOP_ITEMS", "10"))
 
 
-def process_inventory_data(parsed_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+def normalize_columns(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Record with column names lower-cased and spaces turned to underscores ("Item Name" -> item_name)."""
+    return {'_'.join(str(column).lower().split()): value for column, value in record.items()}
+
+
+def inventory_item(record: Dict[str, Any]) -> Tuple[str, str, float, float]:
     """
-    Process inventory upload data.
+    (key, item_name, quantity, unit_value) of one inventory row.
+    key is the SKU / item code when present, else the item name, lower-cased with
+    whitespace collapsed so the same item matches across uploads.
+    Column names are matched case-insensitively (see normalize_columns).
+    """
+    record = normalize_columns(record)
+    item_name = str(record.get('item_name', '') or 
+                   record.get('name', '') or 
+                   record.get('product', '') or 
+                   record.get('description', '') or 'Unknown')
     
-    Expected fields: item_name, quantity, unit_value
+    sku = str(record.get('sku', '') or 
+             record.get('item_code', '') or 
+             record.get('code', '') or '')
     
-    Returns:
-        Inventory summary with total items and value
-    """
-    if not parsed_data or not isinstance(parsed_data, list):
-        return {
-            'total_items': 0,
-            'total_value': 0,
-            'items': [],
-            'has_data': False
-        }
+    quantity = float(record.get('quantity', 0) or 
+                    record.get('qty', 0) or 
+                    record.get('stock', 0) or 0)
     
-    items = []
-    total_value = 0.0
-    total_quantity = 0
+    unit_value = float(record.get('unit_value', 0) or 
+                      record.get('value', 0) or 
+                      record.get('price', 0) or 
+                      record.get('rate', 0) or 0)
     
-    for record in parsed_data:
-        if not isinstance(record, dict):
+    key = ' '.join((sku or item_name).lower().split())
+    return key, item_name, quantity, unit_value
+
+
+def aggregate_inventory(
+    snapshots: Iterable[List[Dict[str, Any]]],
+    aggregation: str = INVENTORY_AGGREGATION
+) -> Dict[str, List[Any]]:
+    """
+    Combine inventory snapshots (parsed_data of each upload, oldest first) per item key.
+    Rows of one key within a snapshot are added together (e.g. several locations).
+    With 'latest' the newest non-empty snapshot replaces everything before it, so an item
+    missing from it is no longer in stock; with 'sum' each key's figures are added up.
+    Returns key -> [item_name, quantity, total_value].
+    """
+    if aggregation not in INVENTORY_AGGREGATIONS:
+        raise ValueError(f"aggregation must be one of: {', '.join(INVENTORY_AGGREGATIONS)}")
+    
+    items: Dict[str, List[Any]] = {}
+    for parsed_data in snapshots:
+        if not parsed_data or not isinstance(parsed_data, list):
             continue
+        snapshot: Dict[str, List[Any]] = {}
+        for record in parsed_data:
+            if not isinstance(record, dict):
+                continue
+            key, item_name, quantity, unit_value = inventory_item(record)
+            entry = snapshot.setdefault(key, [item_name, 0.0, 0.0])
+            entry[1] += quantity
+            entry[2] += quantity * unit_value
         
-        item_name = str(record.get('item_name', '') or 
-                       record.get('name', '') or 
-                       record.get('product', '') or 
-                       record.get('description', '') or 'Unknown')
-        
-        quantity = float(record.get('quantity', 0) or 
-                        record.get('qty', 0) or 
-                        record.get('stock', 0) or 0)
-        
-        unit_value = float(record.get('unit_value', 0) or 
-                          record.get('value', 0) or 
-                          record.get('price', 0) or 
-                          record.get('rate', 0) or 0)
-        
-        item_total = quantity * unit_value
-        total_value += item_total
-        total_quantity += int(quantity)
-        
-        items.append({
-            'item_name': item_name,
-            'quantity': int(quantity),
-            'unit_value': round(unit_value, 2),
-            'total_value': round(item_total, 2)
-        })
+        if aggregation == 'latest':
+            items = snapshot
+            continue
+        for key, entry in snapshot.items():
+            current = items.get(key)
+            if current is None:
+                items[key] = entry
+            else:
+                current[0] = entry[0]
+                current[1] += entry[1]
+                current[2] += entry[2]
+    return items
+
+
+def summarize_inventory(items: Dict[str, List[Any]], top: Optional[int] = INVENTORY_TOP_ITEMS) -> Dict[str, Any]:
+    """Totals over aggregated items and the `top` items by value (all items when top is None)."""
+    ranked = heapq.nlargest(top, items.values(), key=lambda entry: entry[2]) if top is not None \
+        else sorted(items.values(), key=lambda entry: entry[2], reverse=True)
     
     return {
         'total_items': len(items),
-        'total_quantity': total_quantity,
-        'total_value': round(total_value, 2),
-        'items': items[:20],  # Limit to top 20 items
+        'total_quantity': int(sum(entry[1] for entry in items.values())),
+        'total_value': round(sum(entry[2] for entry in items.values()), 2),
+        'items': [
+            {
+                'item_name': item_name,
+                'quantity': int(quantity),
+                'unit_value': round(value / quantity, 2) if quantity else 0.0,
+                'total_value': round(value, 2)
+            }
+            for item_name, quantity, value in ranked
+        ],
         'has_data': len(items) > 0
     }
 
 
-def get_inventory_summary(uploads_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+def process_inventory_data(parsed_data: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    Get inventory summary from all inventory uploads.
+    Process inventory upload data.
+    
+    Expected fields: item_name (or sku), quantity, unit_value
+    
+    Returns:
+        Inventory summary with total items and value, items sorted by value
+    """
+    return summarize_inventory(aggregate_inventory([parsed_data]), top=None)
+
+
+def get_inventory_summary(
+    uploads_data: Union[List[Dict[str, Any]], TransactionFrame],
+    aggregation: str = INVENTORY_AGGREGATION
+) -> Dict[str, Any]:
+    """
+    Get inventory summary from all inventory uploads, combined per item (see aggregate_inventory).
+    Accepts upload records (oldest first) or a TransactionFrame (which keeps these uploads in aux_uploads).
     """
+    if isinstance(uploads_data, TransactionFrame):
+        uploads_data = uploads_data.aux_uploads
+    
     inventory_uploads = [
         u for u in uploads_data 
         if u.get('file_type') == 'inventory' or 
@@ -87,24 +155,17 @@ def get_inventory_summary(uploads_data: List[Dict[str, Any]]) -> Dict[str, Any]:
             'has_data': False
         }
     
-    # Aggregate from all inventory uploads
-    all_items = []
-    total_value = 0.0
-    total_quantity = 0
-    
-    for upload in inventory_uploads:
-        parsed_data = upload.get('parsed_data', [])
-        result = process_inventory_data(parsed_data)
-        all_items.extend(result.get('items', []))
-        total_value += result.get('total_value', 0)
-        total_quantity += result.get('total_quantity', 0)
+    items = aggregate_inventory((u.get('parsed_data', []) for u in inventory_uploads), aggregation)
+    summary = summarize_inventory(items)
     
     return {
-        'total_items': len(all_items),
-        'total_quantity': total_quantity,
-        'total_value': round(total_value, 2),
-        'top_items': sorted(all_items, key=lambda x: x['total_value'], reverse=True)[:10],
-        'has_data': len(all_items) > 0
+        'total_items': summary['total_items'],
+        'total_quantity': summary['total_quantity'],
+        'total_value': summary['total_value'],
+        'top_items': summary['items'],
+        'aggregation': aggregation,
+        'snapshots': len(inventory_uploads),
+        'has_data': summary['has_data']
     }
 
 
@@ -114,7 +175,8 @@ def process_loan_data(parsed_data: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Process loan obligations data.
     
-    Expected fields: lender, outstanding_amount, monthly_emi, interest_rate (optional)
+    Expected fields: lender, outstanding_amount, monthly_emi, interest_rate (optional),
+    tenure_months (optional, remaining months)
     
     Returns:
         Loan summary with total outstanding and EMI
@@ -134,6 +196,7 @@ def process_loan_data(parsed_data: List[Dict[str, Any]]) -> Dict[str, Any]:
     for record in parsed_data:
         if not isinstance(record, dict):
             continue
+        record = normalize_columns(record)
         
         lender = str(record.get('lender', '') or 
                     record.get('bank', '') or 
@@ -153,6 +216,10 @@ def process_loan_data(parsed_data: List[Dict[str, Any]]) -> Dict[str, Any]:
                              record.get('rate', 0) or 
                              record.get('interest', 0) or 0)
         
+        tenure = float(record.get('tenure_months', 0) or 
+                      record.get('tenure', 0) or 
+                      record.get('remaining_months', 0) or 0)
+        
         total_outstanding += outstanding
         total_emi += emi
         
@@ -160,7 +227,8 @@ def process_loan_data(parsed_data: List[Dict[str, Any]]) -> Dict[str, Any]:
             'lender': lender,
             'outstanding_amount': round(outstanding, 2),
             'monthly_emi': round(emi, 2),
-            'interest_rate': round(interest_rate, 2) if interest_rate > 0 else None
+            'interest_rate': round(interest_rate, 2) if interest_rate > 0 else None,
+            'tenure_months': int(tenure) if tenure > 0 else None
         })
     
     return {
@@ -172,10 +240,14 @@ def process_loan_data(parsed_data: List[Dict[str, Any]]) -> Dict[str, Any]:
     }
 
 
-def get_loan_summary(uploads_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+def get_loan_summary(uploads_data: Union[List[Dict[str, Any]], TransactionFrame]) -> Dict[str, Any]:
     """
     Get loan obligations summary from all loan uploads.
+    Accepts upload records or a TransactionFrame (which keeps these uploads in aux_uploads).
     """
+    if isinstance(uploads_data, TransactionFrame):
+        uploads_data = uploads_data.aux_uploads
+    
     loan_uploads = [
         u for u in uploads_data 
         if u.get('file_type') == 'loan' or 
@@ -0,0 +1,184 @@
+"""
+Loan Engine - Amortization schedules for all of a user's loans at once
+Balances come from the closed-form annuity formula over a (loans x months) matrix,
+so no loan is stepped through month by month in Python
+"""
+
+import os
+import logging
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from backend.services.transaction_frame import month_label
+
+logger = logging.getLogger(__name__)
+
+# Longest schedule built, in months
+LOAN_MAX_MONTHS = int(os.environ.get("LOAN_MAX_MONTHS", "360"))
+
+# Balances below half a paisa are treated as paid off
+BALANCE_EPSILON = 0.005
+
+
+def loan_arrays(loans: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    principal, monthly rate, EMI and payoff months per loan (process_loan_data records).
+    A missing EMI is derived from the tenure; a missing tenure from the EMI.
+    Payoff is inf for loans whose EMI does not cover the interest, and for loans
+    with neither EMI nor tenure (those are not scheduled).
+    """
+    principal = np.array([float(l.get('outstanding_amount') or 0) for l in loans], dtype=np.float64)
+    rate = np.array([float(l.get('interest_rate') or 0) for l in loans], dtype=np.float64) / 1200
+    emi = np.array([float(l.get('monthly_emi') or 0) for l in loans], dtype=np.float64)
+    tenure = np.array([float(l.get('tenure_months') or 0) for l in loans], dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        annuity = np.where(
+            rate > 0,
+            principal * rate / (1 - np.power(1 + rate, -tenure)),
+            principal / tenure
+        )
+        emi = np.where((emi <= 0) & (tenure > 0), annuity, emi)
+
+        covered = emi > principal * rate
+        months = np.where(
+            rate > 0,
+            -np.log1p(-principal * rate / emi) / np.log1p(rate),
+            principal / emi
+        )
+        payoff = np.where(
+            (principal > 0) & (emi > 0) & covered,
+            np.ceil(np.nan_to_num(months) - 1e-9),
+            np.inf
+        )
+    return {'principal': principal, 'rate': rate, 'emi': np.nan_to_num(emi), 'payoff': payoff}
+
+
+def amortize(
+    principal: np.ndarray,
+    rate: np.ndarray,
+    emi: np.ndarray,
+    horizon: int
+) -> Dict[str, np.ndarray]:
+    """
+    Month-by-month payment, interest, principal repaid and closing balance, each (loans, horizon).
+    Balance after t payments: P(1+r)^t - EMI((1+r)^t - 1)/r, or P - EMI*t without interest.
+    """
+    t = np.arange(horizon + 1, dtype=np.float64)[None, :]
+    r = rate[:, None]
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        growth = np.power(1 + r, t)
+        balance = np.where(
+            r > 0,
+            principal[:, None] * growth - emi[:, None] * (growth - 1) / np.where(r > 0, r, 1),
+            principal[:, None] - emi[:, None] * t
+        )
+    balance = np.where(balance < BALANCE_EPSILON, 0.0, balance)
+
+    opening = balance[:, :-1]
+    interest = opening * r
+    payment = np.where(opening > 0, np.minimum(emi[:, None], opening + interest), 0.0)
+    return {
+        'payment': payment,
+        'interest': interest,
+        'principal': payment - interest,
+        'balance': balance[:, 1:]
+    }
+
+
+def build_loan_schedules(
+    loans: List[Dict[str, Any]],
+    avg_monthly_outflow: Optional[float] = None,
+    months: Optional[int] = None,
+    start_month: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Amortization schedules of every loan plus their month-by-month total.
+
+    Args:
+        loans: Loan records from process_loan_data (outstanding_amount, monthly_emi,
+            interest_rate as annual %, tenure_months)
+        avg_monthly_outflow: Average monthly bank cash outflow, for the EMI burden
+        months: Months to schedule (default: until the last loan is paid off)
+        start_month: Month index of the first payment (default: next month)
+
+    Returns:
+        Per-loan schedules and a combined schedule with EMI as a share of cash outflow
+    """
+    if months is not None and not 1 <= months <= LOAN_MAX_MONTHS:
+        raise ValueError(f"months must be between 1 and {LOAN_MAX_MONTHS}")
+    if not loans:
+        return {'has_data': False, 'loan_count': 0, 'loans': [], 'combined': []}
+
+    if start_month is None:
+        start_month = int(np.datetime64('today', 'M').astype(np.int64)) + 1
+
+    terms = loan_arrays(loans)
+    payoff = terms['payoff']
+    scheduled = (terms['principal'] > 0) & (terms['emi'] > 0)
+    finite = payoff[np.isfinite(payoff)]
+    if months is None:
+        months = int(finite.max()) if len(finite) else LOAN_MAX_MONTHS
+    horizon = max(1, min(months, LOAN_MAX_MONTHS))
+
+    schedule = amortize(
+        np.where(scheduled, terms['principal'], 0.0), terms['rate'], np.where(scheduled, terms['emi'], 0.0), horizon
+    )
+    labels = [month_label(start_month + step) for step in range(horizon)]
+
+    def burden(payment: float) -> Optional[float]:
+        if not avg_monthly_outflow or avg_monthly_outflow <= 0:
+            return None
+        return round(payment / avg_monthly_outflow * 100, 2)
+
+    loan_results = []
+    for i, loan in enumerate(loans):
+        length = int(min(payoff[i], horizon)) if scheduled[i] else 0
+        loan_results.append({
+            'lender': loan.get('lender', 'Unknown'),
+            'principal': round(float(terms['principal'][i]), 2),
+            'annual_interest_rate': round(float(terms['rate'][i] * 1200), 2),
+            'monthly_emi': round(float(terms['emi'][i]), 2),
+            'scheduled': bool(scheduled[i]),
+            'amortizes': bool(np.isfinite(payoff[i])),
+            'payoff_months': int(payoff[i]) if np.isfinite(payoff[i]) else None,
+            'payoff_month': month_label(start_month + int(payoff[i]) - 1) if np.isfinite(payoff[i]) else None,
+            'total_interest': round(float(schedule['interest'][i, :length].sum()), 2),
+            'schedule': [
+                {
+                    'month': labels[step],
+                    'payment': round(float(schedule['payment'][i, step]), 2),
+                    'interest': round(float(schedule['interest'][i, step]), 2),
+                    'principal': round(float(schedule['principal'][i, step]), 2),
+                    'balance': round(float(schedule['balance'][i, step]), 2)
+                }
+                for step in range(length)
+            ]
+        })
+
+    totals = {key: values.sum(axis=0) for key, values in schedule.items()}
+    current_emi = float(terms['emi'][scheduled].sum())
+
+    return {
+        'has_data': True,
+        'loan_count': len(loans),
+        'months': horizon,
+        'total_outstanding': round(float(terms['principal'].sum()), 2),
+        'total_monthly_emi': round(current_emi, 2),
+        'total_interest': round(float(totals['interest'].sum()), 2),
+        'avg_monthly_cash_outflow': round(avg_monthly_outflow, 2) if avg_monthly_outflow else None,
+        'emi_burden_pct': burden(current_emi),
+        'loans': loan_results,
+        'combined': [
+            {
+                'month': labels[step],
+                'payment': round(float(totals['payment'][step]), 2),
+                'interest': round(float(totals['interest'][step]), 2),
+                'principal': round(float(totals['principal'][step]), 2),
+                'outstanding': round(float(totals['balance'][step]), 2),
+                'emi_burden_pct': burden(float(totals['payment'][step]))
+            }
+            for step in range(horizon)
+        ]
+    }
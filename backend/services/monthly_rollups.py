@@ -0,0 +1,150 @@
+"""
+Monthly Rollups Service - Per-user monthly totals maintained at ingest time
+Each upload adds its delta to monthly_rollups and removing it retracts the same delta,
+so bookkeeping and forecast read O(months) rows instead of every transaction
+"""
+
+import logging
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from backend.services.transaction_frame import TransactionFrame, month_key
+from backend.services.bookkeeping_service import classify_frame
+from backend.services.expense_categorizer import Rule
+from backend.services.db_rpc import is_missing_function
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_KEYS = ['month', 'file_type', 'direction', 'category', 'subcategory']
+ROLLUP_MEASURES = ['amount', 'transaction_count', 'cash_in', 'cash_out']
+
+
+def frame_rollups(frame: TransactionFrame, user_rules: Optional[Sequence[Rule]] = None) -> List[Dict[str, Any]]:
+    """
+    Group classified transactions by (month, file_type, direction, category, subcategory).
+    month is "YYYY-MM", or "" for rows without a parseable date.
+    Expense subcategories follow the user's categorization rules at the time of ingest.
+    """
+    if len(frame) == 0:
+        return []
+
+    classified = classify_frame(frame, user_rules)
+    months = frame.months()
+    month_keys = {m: month_key(m) for m in np.unique(months[months >= 0]).tolist()}
+    bank = frame.type_mask('bank')
+
+    df = pd.DataFrame({
+        'month': [month_keys.get(m, '') for m in months.tolist()],
+        'file_type': np.array(frame.file_types, dtype=object)[frame.upload],
+        'direction': np.select([frame.direction > 0, frame.direction < 0], ['credit', 'debit'], ''),
+        'category': classified['category'],
+        'subcategory': classified['subcategory'],
+        'amount': classified['amount'],
+        'transaction_count': 1,
+        'cash_in': np.where(bank & (frame.credit > 0), frame.credit, 0.0),
+        'cash_out': np.where(bank & (frame.debit > 0), frame.debit, 0.0),
+    })
+    grouped = df.groupby(ROLLUP_KEYS, sort=False, as_index=False)[ROLLUP_MEASURES].sum()
+    grouped['transaction_count'] = grouped['transaction_count'].astype(int)
+    return grouped.to_dict('records')
+
+
+def rollup_delta(uploads: List[Dict[str, Any]], user_rules: Optional[Sequence[Rule]] = None) -> List[Dict[str, Any]]:
+    """
+    Rollup rows contributed by uploads given as {'file_type', 'parsed_data'} dicts.
+    Rows of several uploads are merged so each key appears once; inventory / loan
+    uploads contribute nothing.
+    """
+    return frame_rollups(TransactionFrame.from_uploads(uploads), user_rules)
+
+
+def merge_rollups(rows: List[Dict[str, Any]], more: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sum two lists of rollup rows key by key (e.g. the deltas of an upload's chunks)."""
+    merged = {tuple(r[k] for k in ROLLUP_KEYS): dict(r) for r in rows}
+    for row in more:
+        key = tuple(row[k] for k in ROLLUP_KEYS)
+        if key in merged:
+            for measure in ROLLUP_MEASURES:
+                merged[key][measure] += row[measure]
+        else:
+            merged[key] = dict(row)
+    return list(merged.values())
+
+
+def apply_rollup_delta(user_id: str, rows: List[Dict[str, Any]], sign: int = 1) -> None:
+    """
+    Add (sign=1) or retract (sign=-1) rollup rows for a user.
+    Uses the apply_monthly_rollup_delta RPC (one atomic upsert); falls back to
+    read-modify-write through the table API only when the function is not installed,
+    since any other error may come after the delta was applied.
+    Failures are logged: rollups can be rebuilt from the uploads.
+    """
+    if not rows:
+        return
+    from backend.db_client import supabase
+    try:
+        supabase.rpc("apply_monthly_rollup_delta", {
+            "p_user_id": user_id,
+            "p_rows": rows,
+            "p_sign": sign
+        }).execute()
+        return
+    except Exception as e:
+        if not is_missing_function(e):
+            logger.error(f"❌ Failed to update monthly rollups for user {user_id}: {e}")
+            return
+        logger.warning(f"apply_monthly_rollup_delta RPC unavailable, updating rollups directly: {e}")
+
+    try:
+        existing = {
+            tuple(r.get(k) for k in ROLLUP_KEYS): r
+            for r in fetch_rollups(user_id)
+        }
+        for row in rows:
+            key = tuple(row[k] for k in ROLLUP_KEYS)
+            current = existing.get(key, {})
+            updated = {k: row[k] for k in ROLLUP_KEYS}
+            for measure in ROLLUP_MEASURES:
+                updated[measure] = (current.get(measure) or 0) + sign * row[measure]
+
+            if updated['transaction_count'] <= 0:
+                query = supabase.table("monthly_rollups").delete().eq("user_id", user_id)
+                for k in ROLLUP_KEYS:
+                    query = query.eq(k, row[k])
+                query.execute()
+            else:
+                supabase.table("monthly_rollups").upsert(
+                    {"user_id": user_id, **updated},
+                    on_conflict="user_id," + ",".join(ROLLUP_KEYS)
+                ).execute()
+    except Exception as e:
+        logger.error(f"❌ Failed to update monthly rollups for user {user_id}: {e}")
+
+
+def fetch_rollups(user_id: str) -> List[Dict[str, Any]]:
+    from backend.db_client import supabase
+    result = supabase.table("monthly_rollups") \
+        .select(", ".join(ROLLUP_KEYS + ROLLUP_MEASURES)) \
+        .eq("user_id", user_id) \
+        .execute()
+    return result.data or []
+
+
+def rebuild_rollups(
+    user_id: str,
+    uploads_data: List[Dict[str, Any]],
+    user_rules: Optional[Sequence[Rule]] = None
+) -> List[Dict[str, Any]]:
+    """Recompute a user's rollups from all of their uploads and replace the stored rows."""
+    from backend.db_client import supabase
+    rows = frame_rollups(TransactionFrame.from_uploads(uploads_data), user_rules)
+    try:
+        supabase.table("monthly_rollups").delete().eq("user_id", user_id).execute()
+        if rows:
+            supabase.table("monthly_rollups").insert([{"user_id": user_id, **row} for row in rows]).execute()
+        logger.info(f"Rebuilt {len(rows)} monthly rollup rows for user {user_id}")
+    except Exception as e:
+        logger.error(f"❌ Failed to store rebuilt rollups for user {user_id}: {e}")
+    return rows
@@ -0,0 +1,170 @@
+"""
+Parse Executor Service - Run CPU-bound upload parsing in a managed process pool
+Keeps pandas parsing, column mapping and metric computation off the event loop
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Executor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional
+
+from backend.services.financial_analysis import parse_financial_file, process_financial_stream
+from backend.services.upload_spool import RowSpool, row_spool_path
+
+logger = logging.getLogger(__name__)
+
+# Worker processes (0 = parse in a thread of this process instead)
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Jobs allowed to be running or waiting before new uploads are rejected
+PARSE_MAX_QUEUE = int(os.environ.get("PARSE_MAX_QUEUE", "32"))
+
+# Seconds a single parse may take
+PARSE_JOB_TIMEOUT = float(os.environ.get("PARSE_JOB_TIMEOUT", "300"))
+
+# Recycle workers after this many jobs to return pandas memory to the OS
+# (needs Python 3.11+; older interpreters keep workers for the pool's lifetime)
+PARSE_MAX_TASKS_PER_CHILD = int(os.environ.get("PARSE_MAX_TASKS_PER_CHILD", "50"))
+
+
+class ParseQueueFull(Exception):
+    """Raised when PARSE_MAX_QUEUE jobs are already pending."""
+
+
+class ParseTimeout(Exception):
+    """Raised when a parse job exceeds its timeout."""
+
+
+def parse_upload_file(
+    path: str,
+    filename: str,
+    upload_type: str,
+    stream: bool = False,
+    chunk_rows: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Worker entry point: parse a spooled upload from disk.
+    A streamed parse appends each chunk's rows to the upload's row spool instead of
+    returning them; the result's row_spool names the file to read them back from.
+    """
+    if stream:
+        spool = RowSpool(row_spool_path(path))
+        spool.remove()
+        try:
+            result = process_financial_stream(
+                path, filename, upload_type, chunk_rows=chunk_rows, on_chunk=spool.append, keep_rows=False
+            )
+        except Exception:
+            spool.remove()
+            raise
+        return {**result, "row_spool": spool.path}
+    return parse_financial_file(path, filename, upload_type)
+
+
+class ParseExecutor:
+    """
+    Bounded async front-end for a ProcessPoolExecutor.
+    The pool is created lazily on first use and rebuilt if a worker dies.
+    """
+
+    def __init__(
+        self,
+        workers: int = PARSE_WORKERS,
+        max_queue: int = PARSE_MAX_QUEUE,
+        timeout: float = PARSE_JOB_TIMEOUT,
+        max_tasks_per_child: int = PARSE_MAX_TASKS_PER_CHILD
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self._pool: Optional[Executor] = None
+        self._pending = 0
+
+    def _get_pool(self) -> Optional[Executor]:
+        if self.workers <= 0:
+            return None  # loop's default thread pool
+        if self._pool is None:
+            # spawn: forking a threaded server process is unsafe
+            options = {}
+            if self.max_tasks_per_child and sys.version_info >= (3, 11):
+                options["max_tasks_per_child"] = self.max_tasks_per_child
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                **options
+            )
+            logger.info(f"Started parse pool with {self.workers} workers")
+        return self._pool
+
+    async def parse(
+        self,
+        path: str,
+        filename: str,
+        upload_type: str,
+        stream: bool = False,
+        chunk_rows: Optional[int] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Parse a spooled upload in the pool.
+        Raises ParseQueueFull, ParseTimeout, or the parser's own ValueError.
+        """
+        if self._pending >= self.max_queue:
+            raise ParseQueueFull(f"Parse queue is full ({self.max_queue} jobs pending)")
+
+        self._pending += 1
+        pool = None
+        try:
+            loop = asyncio.get_running_loop()
+            pool = self._get_pool()
+            future = loop.run_in_executor(
+                pool, parse_upload_file, path, filename, upload_type, stream, chunk_rows
+            )
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Parse of {filename} timed out after {timeout or self.timeout}s")
+            self.recycle(pool)
+            raise ParseTimeout(f"Parsing {filename} took longer than {timeout or self.timeout:g}s")
+        except BrokenProcessPool:
+            logger.error("Parse pool broke (worker died); it will be recreated")
+            if pool is self._pool:
+                self.shutdown()
+            raise ValueError(f"Failed to process file: parser worker crashed on {filename}")
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_queue": self.max_queue,
+            "timeout": self.timeout
+        }
+
+    def recycle(self, pool: Optional[Executor]) -> None:
+        """
+        Kill a pool's workers so the next parse starts a fresh pool. A timed-out job
+        cannot be cancelled once it runs, so its worker is terminated instead; other
+        jobs in flight on that pool fail with BrokenProcessPool and are reported as crashed.
+        """
+        if not isinstance(pool, ProcessPoolExecutor):
+            return  # thread-mode parses cannot be interrupted
+        if pool is self._pool:
+            self._pool = None
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+        logger.warning("Parse pool recycled after a timeout")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+parse_executor = ParseExecutor()
@@ -0,0 +1,245 @@
+"""
+Transaction Dedupe Service - Detect rows already ingested from overlapping statement uploads
+Each row is keyed by a 64-bit hash of its upload type and normalized (date, amount, direction,
+description) and stored per user in transaction_hashes; new uploads are checked against it in bulk.
+Rows already ingested are kept in the upload flagged duplicate=true, so they can be counted
+again when the upload that first brought them in is deleted
+"""
+
+import os
+import logging
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backend.services.financial_analysis import compute_metrics
+from backend.services.transaction_frame import parse_date
+
+logger = logging.getLogger(__name__)
+
+# "drop" leaves overlapping rows out of upload responses, "flag" shows them with duplicate=true,
+# "off" disables; either way they are stored flagged and never counted
+DEDUPE_MODE = os.environ.get("DEDUPE_MODE", "drop").lower()
+
+# Hashes sent per lookup / insert call
+DEDUPE_BATCH = int(os.environ.get("DEDUPE_BATCH", "5000"))
+
+# Upload types whose rows are transactions
+DEDUPE_UPLOAD_TYPES = ('bank', 'sales', 'purchase')
+
+
+class HashOccurrences:
+    """
+    How often each row has occurred so far in one upload, so an upload hashed chunk by
+    chunk numbers repeated rows exactly as hashing it whole would.
+    Holds one (hash, count) pair per distinct row, not the rows.
+    """
+
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def advance(self, row_hash: np.ndarray) -> np.ndarray:
+        """Earlier occurrences of each row hash, then count this chunk's rows."""
+        earlier = np.zeros(len(row_hash), dtype=np.int64)
+        if len(self.hashes):
+            position = np.minimum(np.searchsorted(self.hashes, row_hash), len(self.hashes) - 1)
+            known = self.hashes[position] == row_hash
+            earlier[known] = self.counts[position[known]]
+
+        hashes, inverse = np.unique(np.concatenate([self.hashes, row_hash]), return_inverse=True)
+        weights = np.concatenate([self.counts, np.ones(len(row_hash), dtype=np.int64)])
+        self.hashes = hashes
+        self.counts = np.bincount(inverse, weights=weights, minlength=len(hashes)).astype(np.int64)
+        return earlier
+
+
+def transaction_hashes(
+    parsed_data: List[Dict[str, Any]],
+    upload_type: str,
+    occurrences: Optional[HashOccurrences] = None
+) -> np.ndarray:
+    """
+    int64 hash per row of the upload type and normalized (date, amount, direction, description).
+    The type keeps a sales invoice and the bank receipt that paid it apart when both
+    come without descriptions.
+    Repeats of an identical row within one upload get distinct hashes (an occurrence
+    number is part of the key), so genuine same-day duplicates in a statement survive
+    while the same rows arriving again in an overlapping statement match.
+    occurrences carries the numbering across the chunks of one streamed upload.
+    """
+    if not parsed_data:
+        return np.empty(0, dtype=np.int64)
+
+    df = pd.DataFrame.from_records(parsed_data, columns=["date", "amount", "direction", "description"])
+
+    dates = {}
+    for value in df["date"].unique():
+        day = parse_date(value)
+        dates[value] = str(day) if day is not None else str(value if value is not None else "").strip()
+
+    key = pd.DataFrame({
+        "file_type": upload_type,
+        "date": df["date"].map(dates),
+        "amount": pd.to_numeric(df["amount"], errors="coerce").abs().round(2).fillna(0.0),
+        "direction": df["direction"].fillna("").astype(str).str.lower(),
+        "description": df["description"].fillna("").astype(str).str.lower()
+                                        .str.replace(r"\s+", " ", regex=True).str.strip()
+    })
+    row_hash = pd.util.hash_pandas_object(key, index=False)
+    occurrence = row_hash.groupby(row_hash).cumcount().to_numpy()
+    if occurrences is not None:
+        occurrence = occurrence + occurrences.advance(row_hash.to_numpy())
+    key["occurrence"] = occurrence
+
+    return pd.util.hash_pandas_object(key, index=False).to_numpy().view(np.int64)
+
+
+def find_known_hashes(user_id: str, hashes: np.ndarray) -> Set[int]:
+    """Hashes already in the user's index (one indexed lookup per hash, in batches)."""
+    from backend.db_client import supabase
+    known: Set[int] = set()
+    values = [int(h) for h in hashes]
+    for start in range(0, len(values), DEDUPE_BATCH):
+        result = supabase.rpc("existing_transaction_hashes", {
+            "p_user_id": user_id,
+            "p_hashes": values[start:start + DEDUPE_BATCH]
+        }).execute()
+        known.update(int(row["row_hash"] if isinstance(row, dict) else row) for row in result.data or [])
+    return known
+
+
+def register_hashes(user_id: str, upload_id: str, hashes: List[int]) -> None:
+    """Add an upload's row hashes to the user's index."""
+    if DEDUPE_MODE == "off" or not hashes:
+        return
+    from backend.db_client import supabase
+    try:
+        for start in range(0, len(hashes), DEDUPE_BATCH):
+            rows = [
+                {"user_id": user_id, "row_hash": h, "upload_id": upload_id}
+                for h in hashes[start:start + DEDUPE_BATCH]
+            ]
+            supabase.table("transaction_hashes").upsert(
+                rows, on_conflict="user_id,row_hash", ignore_duplicates=True
+            ).execute()
+    except Exception as e:
+        logger.error(f"❌ Failed to index transactions of upload {upload_id}: {e}")
+
+
+def dedupe_parse_result(
+    user_id: str,
+    upload_type: str,
+    result: Dict[str, Any],
+    seen: Optional[Set[int]] = None,
+    occurrences: Optional[HashOccurrences] = None
+) -> Dict[str, Any]:
+    """
+    Flag parsed rows that earlier uploads already contain and recompute metrics
+    from the remaining rows. seen carries hashes of other files in the same request,
+    occurrences the row numbering of earlier chunks of the same upload.
+    The returned result has row_hashes (to register once the upload is saved)
+    and duplicate_rows; in "flag" mode every row carries its duplicate flag,
+    otherwise only the duplicates do (see response_rows).
+    """
+    parsed_data = result.get("parsed_data", [])
+    if DEDUPE_MODE == "off" or upload_type not in DEDUPE_UPLOAD_TYPES or not parsed_data:
+        return result
+
+    hashes = transaction_hashes(parsed_data, upload_type, occurrences)
+    try:
+        known = find_known_hashes(user_id, hashes)
+    except Exception as e:
+        logger.error(f"❌ Dedupe lookup failed, keeping all rows: {e}")
+        known = set()
+    if seen is not None:
+        known |= seen
+
+    duplicate = np.fromiter((int(h) in known for h in hashes), dtype=bool, count=len(hashes))
+    new_hashes = [int(h) for h in hashes[~duplicate]]
+    if seen is not None:
+        seen.update(new_hashes)
+
+    count = int(duplicate.sum())
+    result = {**result, "row_hashes": new_hashes, "duplicate_rows": count}
+    if DEDUPE_MODE == "flag":
+        result["parsed_data"] = [{**row, "duplicate": bool(dup)} for row, dup in zip(parsed_data, duplicate)]
+    if not count:
+        return result
+
+    logger.info(f"Dedupe: {count} of {len(parsed_data)} rows already ingested ({DEDUPE_MODE})")
+    kept = [row for row, dup in zip(parsed_data, duplicate) if not dup]
+    if DEDUPE_MODE != "flag":
+        result["parsed_data"] = [{**row, "duplicate": True} if dup else row for row, dup in zip(parsed_data, duplicate)]
+    result["metrics"] = compute_metrics(kept, upload_type)
+    return result
+
+
+def is_duplicate_row(row: Any) -> bool:
+    return isinstance(row, dict) and bool(row.get("duplicate"))
+
+
+def response_rows(parsed_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rows shown in an upload response: in "drop" mode, rows flagged as duplicates are left out."""
+    if DEDUPE_MODE == "flag":
+        return parsed_data
+    return [row for row in parsed_data if not is_duplicate_row(row)]
+
+
+def fetch_upload_hashes(upload_id: str) -> Set[int]:
+    """Hashes of the rows an upload brought into the user's index."""
+    from backend.db_client import supabase
+    result = supabase.table("transaction_hashes").select("row_hash").eq("upload_id", upload_id).execute()
+    return {int(row["row_hash"]) for row in result.data or []}
+
+
+def readmit_duplicates(
+    released: Set[int],
+    uploads: List[Tuple[str, List[Dict[str, Any]]]]
+) -> List[Tuple[int, List[Dict[str, Any]], List[int]]]:
+    """
+    Clear the duplicate flag of rows whose hash was released by a deleted upload.
+    uploads are (upload type, parsed_data) pairs of the later uploads, oldest first;
+    each released hash is taken back by the first upload holding it. parsed_data is
+    updated in place. Returns (index into uploads, readmitted rows, their hashes).
+    """
+    readmitted = []
+    released = set(released)
+    for index, (upload_type, parsed_data) in enumerate(uploads):
+        if not released:
+            break
+        if upload_type not in DEDUPE_UPLOAD_TYPES or not any(is_duplicate_row(row) for row in parsed_data):
+            continue
+        rows, hashes = [], []
+        for position, row_hash in enumerate(transaction_hashes(parsed_data, upload_type).tolist()):
+            row = parsed_data[position]
+            if is_duplicate_row(row) and row_hash in released:
+                released.discard(row_hash)
+                row["duplicate"] = False
+                rows.append(row)
+                hashes.append(row_hash)
+        if rows:
+            readmitted.append((index, rows, hashes))
+    return readmitted
+
+
+def rebuild_hash_index(user_id: str, uploads: List[Tuple[str, str, List[Dict[str, Any]]]]) -> int:
+    """
+    Replace a user's dedupe index with the hashes of the counted rows of their uploads,
+    given as (upload_id, upload type, parsed_data). Needed once for hashes stored before
+    the upload type was part of the key. Returns the number of hashes registered.
+    """
+    from backend.db_client import supabase
+    supabase.table("transaction_hashes").delete().eq("user_id", user_id).execute()
+    registered = 0
+    for upload_id, upload_type, parsed_data in uploads:
+        if upload_type not in DEDUPE_UPLOAD_TYPES or not parsed_data:
+            continue
+        hashes = [
+            row_hash for row_hash, row in zip(transaction_hashes(parsed_data, upload_type).tolist(), parsed_data)
+            if not is_duplicate_row(row)
+        ]
+        register_hashes(user_id, upload_id, hashes)
+        registered += len(hashes)
+    return registered
@@ -0,0 +1,321 @@
+"""
+Transaction Frame - Compact array-backed view of a user's parsed transactions
+Built once per request from the upload rows and shared by all analytics services
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Date formats accepted in parsed_data (first 10 characters of the value)
+DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d', '%m/%d/%Y']
+
+# Day 0 (1970-01-01) is a Thursday; week indexes count from Monday 1969-12-29
+WEEK_OFFSET_DAYS = 3
+
+# Upload type codes stored per row
+FILE_TYPE_CODES = {'bank': 0, 'sales': 1, 'purchase': 2}
+OTHER_FILE_TYPE = -1
+
+# Direction codes stored per row
+DIRECTION_CODES = {'credit': 1, 'debit': -1}
+
+# Filename prefixes of inventory / loan uploads stored with file_type 'bank'
+AUX_FILENAME_PREFIXES = ('[INVENTORY]', '[LOAN]')
+AUX_FILE_TYPES = ('inventory', 'loan')
+
+# Per-row arrays of a frame and their dtypes
+FRAME_FIELDS = {
+    'amount': np.float64,
+    'credit': np.float64,
+    'debit': np.float64,
+    'date': 'datetime64[D]',
+    'direction': np.int8,
+    'file_type': np.int8,
+    'status': np.int32,
+    'upload': np.int32,
+    'row': np.int32,
+    'description': object,
+}
+
+
+def parse_date(value: Any) -> Optional[np.datetime64]:
+    """Parse a parsed_data date value with the accepted formats. Returns None if none match."""
+    if not value:
+        return None
+    text = str(value)[:10]
+    if len(text) == 10 and text[4] == '-' and text[7] == '-':
+        # Canonical ISO dates, as stored since ingest normalizes them
+        try:
+            return np.datetime64(text, 'D')
+        except ValueError:
+            pass
+    for fmt in DATE_FORMATS:
+        try:
+            return np.datetime64(datetime.strptime(text, fmt).date(), 'D')
+        except ValueError:
+            continue
+    return None
+
+
+def to_float(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def is_aux_upload(upload: Dict[str, Any]) -> bool:
+    """True for inventory / loan uploads, including ones masqueraded as bank files."""
+    filename = str(upload.get('filename', ''))
+    return upload.get('file_type') in AUX_FILE_TYPES or filename.startswith(AUX_FILENAME_PREFIXES)
+
+
+def month_label(month: int) -> str:
+    """Label ("Jan 2026") for a month index counted from Jan 1970."""
+    return datetime(1970 + month // 12, month % 12 + 1, 1).strftime('%b %Y')
+
+
+def month_key(month: int) -> str:
+    """"YYYY-MM" key for a month index counted from Jan 1970."""
+    return f"{1970 + month // 12:04d}-{month % 12 + 1:02d}"
+
+
+def month_index(key: Optional[str]) -> Optional[int]:
+    """Month index for a "YYYY-MM" key; None for an empty key (undated rows)."""
+    if not key:
+        return None
+    year, month = str(key)[:7].split('-')
+    return (int(year) - 1970) * 12 + int(month) - 1
+
+
+def month_year(month: int) -> tuple:
+    """(year, month) for a month index counted from Jan 1970."""
+    return (1970 + month // 12, month % 12 + 1)
+
+
+class TransactionFrame:
+    """
+    Columnar transactions of one user, one NumPy array per field.
+
+    amount / credit / debit   float64
+    date                      datetime64[D], NaT when the date could not be parsed
+    direction                 int8 (1 credit, -1 debit, 0 unknown)
+    file_type                 int8 (FILE_TYPE_CODES, -1 for anything else)
+    status                    int32 codes into status_labels (lower-cased status text)
+    upload                    int32 index into file_types / filenames / upload_ids
+    row                       int32 position of the row in its upload's parsed_data
+    description               object (str)
+
+    Inventory and loan uploads have free-form rows and are kept as-is in aux_uploads.
+    """
+
+    __slots__ = (
+        'amount', 'credit', 'debit', 'date', 'direction', 'file_type', 'status',
+        'status_labels', 'upload', 'row', 'description', 'file_types', 'filenames', 'upload_ids',
+        'aux_uploads'
+    )
+
+    def __init__(self):
+        self.amount = np.empty(0, dtype=np.float64)
+        self.credit = np.empty(0, dtype=np.float64)
+        self.debit = np.empty(0, dtype=np.float64)
+        self.date = np.empty(0, dtype='datetime64[D]')
+        self.direction = np.empty(0, dtype=np.int8)
+        self.file_type = np.empty(0, dtype=np.int8)
+        self.status = np.empty(0, dtype=np.int32)
+        self.status_labels: List[str] = []
+        self.upload = np.empty(0, dtype=np.int32)
+        self.row = np.empty(0, dtype=np.int32)
+        self.description = np.empty(0, dtype=object)
+        self.file_types: List[str] = []
+        self.filenames: List[str] = []
+        self.upload_ids: List[str] = []
+        self.aux_uploads: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_uploads(cls, uploads_data: List[Dict[str, Any]]) -> "TransactionFrame":
+        """
+        Build the frame from financial_uploads rows (file_type, filename, parsed_data).
+        Uploads read from the columnar store may carry their rows as an Arrow table in
+        parsed_table instead; its columns are converted whole, never row by row.
+        """
+        frame = cls()
+        parts: Dict[str, List[np.ndarray]] = {field: [] for field in FRAME_FIELDS}
+        status_codes: Dict[str, int] = {}
+
+        for upload in uploads_data or []:
+            if is_aux_upload(upload):
+                frame.aux_uploads.append(upload)
+                continue
+
+            table = upload.get('parsed_table')
+            parsed_data = upload.get('parsed_data', [])
+            if table is not None and table.num_rows:
+                columns = table_columns(table)
+            elif parsed_data and isinstance(parsed_data, list):
+                columns = record_columns(parsed_data)
+            else:
+                continue
+
+            upload_index = len(frame.file_types)
+            upload_type = upload.get('file_type', 'bank')
+            frame.file_types.append(upload_type)
+            frame.filenames.append(str(upload.get('filename', '')))
+            frame.upload_ids.append(str(upload.get('id', '')))
+
+            labels, inverse = np.unique(columns.pop('status'), return_inverse=True)
+            codes = np.array([status_codes.setdefault(label, len(status_codes)) for label in labels], dtype=np.int32)
+            parts['status'].append(codes[inverse.reshape(-1)])
+            for field, values in columns.items():
+                parts[field].append(values)
+            count = len(columns['amount'])
+            parts['file_type'].append(np.full(count, FILE_TYPE_CODES.get(upload_type, OTHER_FILE_TYPE), dtype=np.int8))
+            parts['upload'].append(np.full(count, upload_index, dtype=np.int32))
+
+        for field, dtype in FRAME_FIELDS.items():
+            if parts[field]:
+                setattr(frame, field, np.concatenate(parts[field]).astype(dtype, copy=False))
+        frame.status_labels = list(status_codes)
+        return frame
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    def type_mask(self, upload_type: str) -> np.ndarray:
+        """Rows that came from uploads of the given type."""
+        code = FILE_TYPE_CODES.get(upload_type)
+        if code is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.file_type == code
+
+    def status_mask(self, statuses) -> np.ndarray:
+        """Rows whose lower-cased status is one of statuses."""
+        wanted = [i for i, label in enumerate(self.status_labels) if label in statuses]
+        return np.isin(self.status, wanted)
+
+    def months(self) -> np.ndarray:
+        """Month index per row (months since Jan 1970), -1 where the date is unknown."""
+        months = self.date.astype('datetime64[M]').astype(np.int64)
+        return np.where(np.isnat(self.date), -1, months)
+
+    def weeks(self) -> np.ndarray:
+        """Monday-based week index per row (weeks since 1969-12-29), -1 where the date is unknown."""
+        weeks = (self.date.astype(np.int64) + WEEK_OFFSET_DAYS) // 7
+        return np.where(np.isnat(self.date), -1, weeks)
+
+    def periods(self, granularity: str = 'month') -> np.ndarray:
+        """Month or week index per row, -1 where the date is unknown."""
+        return self.weeks() if granularity == 'week' else self.months()
+
+
+def parse_dates(values: List[Any]) -> np.ndarray:
+    """
+    Parse date values into datetime64[D]. ISO dates are converted in one vectorized pass;
+    anything else (uploads stored before dates were normalized) is parsed once per distinct value.
+    """
+    if len(values) == 0:
+        return np.empty(0, dtype='datetime64[D]')
+    text = pd.Series(values, dtype=object).astype(str).str[:10]
+    iso = pd.to_datetime(text, format='%Y-%m-%d', errors='coerce')
+    dates = iso.to_numpy().astype('datetime64[D]')
+    
+    rest = np.flatnonzero(iso.isna().to_numpy())
+    if len(rest):
+        dates[rest] = parse_distinct_dates([values[i] for i in rest])
+    return dates
+
+
+def parse_distinct_dates(values: List[Any]) -> np.ndarray:
+    """Parse date values into datetime64[D], converting each distinct value only once."""
+    cache: Dict[Any, Optional[np.datetime64]] = {}
+    nat = np.datetime64('NaT', 'D')
+    parsed = []
+    for value in values:
+        try:
+            day = cache[value]
+        except KeyError:
+            day = cache[value] = parse_date(value)
+        except TypeError:  # unhashable value
+            day = parse_date(value)
+        parsed.append(nat if day is None else day)
+    return np.array(parsed, dtype='datetime64[D]')
+
+
+def sum_by_month(months: np.ndarray, values: np.ndarray) -> Dict[int, float]:
+    """Sum values per month index (rows with month -1 must already be excluded)."""
+    if len(months) == 0:
+        return {}
+    keys, inverse = np.unique(months, return_inverse=True)
+    totals = np.bincount(inverse, weights=values, minlength=len(keys))
+    return {int(k): float(t) for k, t in zip(keys, totals)}
+
+
+def first_nonzero(*columns: np.ndarray) -> np.ndarray:
+    """Element-wise `a or b or ...` over float columns."""
+    result = columns[-1]
+    for column in reversed(columns[:-1]):
+        result = np.where(column != 0, column, result)
+    return result
+
+
+def record_columns(parsed_data: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Frame columns of a parsed_data list, skipping rows the dedupe index flagged as duplicates."""
+    # Rows flagged by the dedupe index were already counted from an earlier upload
+    positions = [
+        position for position, transaction in enumerate(parsed_data)
+        if isinstance(transaction, dict) and not transaction.get('duplicate')
+    ]
+    rows = [parsed_data[position] for position in positions]
+    return {
+        'amount': np.array([to_float(t.get('amount', 0)) for t in rows], dtype=np.float64),
+        'credit': np.array([to_float(t.get('credit', 0)) for t in rows], dtype=np.float64),
+        'debit': np.array([to_float(t.get('debit', 0)) for t in rows], dtype=np.float64),
+        'date': parse_dates([t.get('date') for t in rows]),
+        'direction': np.array([DIRECTION_CODES.get(t.get('direction'), 0) for t in rows], dtype=np.int8),
+        'status': np.array([str(t.get('status', '')).lower() for t in rows], dtype=object),
+        'row': np.array(positions, dtype=np.int32),
+        'description': np.array([str(t.get('description', '') or '') for t in rows], dtype=object),
+    }
+
+
+def table_columns(table: Any) -> Dict[str, np.ndarray]:
+    """Frame columns of an Arrow table from the columnar store, skipping duplicate-flagged rows."""
+    if 'duplicate' in table.column_names:
+        positions = np.flatnonzero(~table.column('duplicate').fill_null(False).to_numpy().astype(bool))
+        table = table.take(positions)
+    else:
+        positions = np.arange(table.num_rows)
+    count = len(positions)
+
+    def column(name: str, fill: Any, dtype: Any) -> np.ndarray:
+        if name not in table.column_names:
+            return np.full(count, fill, dtype=dtype)
+        return table.column(name).fill_null(fill).to_numpy().astype(dtype, copy=False)
+
+    direction = column('direction', '', object)
+    direction_codes = np.zeros(count, dtype=np.int8)
+    for label, code in DIRECTION_CODES.items():
+        direction_codes[direction == label] = code
+    return {
+        'amount': column('amount', 0.0, np.float64),
+        'credit': np.zeros(count, dtype=np.float64),
+        'debit': np.zeros(count, dtype=np.float64),
+        'date': parse_dates(column('date', '', object)),
+        'direction': direction_codes,
+        'status': pd.Series(column('status', '', object), dtype=object).str.lower().to_numpy(dtype=object),
+        'row': positions.astype(np.int32),
+        'description': column('description', '', object),
+    }
+
+
+def as_transaction_frame(data: Union[List[Dict[str, Any]], TransactionFrame]) -> TransactionFrame:
+    """Accept either upload rows or an already built frame."""
+    if isinstance(data, TransactionFrame):
+        return data
+    return TransactionFrame.from_uploads(data)
@@ -0,0 +1,317 @@
+"""
+Transaction Index - Per-user transactions sorted by (date, upload, row) for paged queries
+Pages are read from the transactions table by keyset when it is kept (STORE_TRANSACTIONS);
+otherwise each row's sort position is packed into one int64 key, so a date range or a
+cursor is located with searchsorted and a page reads only the rows it returns
+"""
+
+import os
+import base64
+import bisect
+import logging
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+from backend.services.transaction_frame import TransactionFrame, FILE_TYPE_CODES, DIRECTION_CODES
+from backend.services.bookkeeping_service import classify_frame
+from backend.services.analytics_engine import AnalyticsCache
+from backend.services.expense_categorizer import Rule
+from backend.services.transaction_store import page_transactions, TRANSACTION_PAGE_MAX
+
+logger = logging.getLogger(__name__)
+
+# Seconds a user's index is reused (uploads and deletes drop it sooner)
+TRANSACTION_INDEX_TTL = float(os.environ.get("TRANSACTION_INDEX_TTL", "300"))
+
+# Users whose indexes are kept in memory
+TRANSACTION_INDEX_USERS = int(os.environ.get("TRANSACTION_INDEX_USERS", "200"))
+
+# Largest page a client may ask for
+TRANSACTIONS_MAX_PAGE = int(os.environ.get("TRANSACTIONS_MAX_PAGE", "500"))
+
+# Key layout: biased day number (19 bits) | upload rank (20 bits) | row in upload (24 bits)
+ROW_BITS = 24
+RANK_BITS = 20
+DATE_SHIFT = ROW_BITS + RANK_BITS
+DATE_BIAS = 1 << (62 - DATE_SHIFT)
+
+# Days since 1970-01-01 a key can hold (years 1252 to 2687); rows dated outside are not indexed
+MIN_DAY = -DATE_BIAS
+MAX_DAY = DATE_BIAS - 1
+
+DIRECTION_LABELS = {code: label for label, code in DIRECTION_CODES.items()}
+FILE_TYPE_LABELS = {code: label for label, code in FILE_TYPE_CODES.items()}
+
+
+def encode_cursor(date: str, upload_id: str, row: int) -> str:
+    token = f"{date}|{upload_id}|{row}".encode()
+    return base64.urlsafe_b64encode(token).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """(day number, upload_id, row) of a cursor from encode_cursor; ValueError when malformed."""
+    try:
+        token = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, upload_id, row = token.split('|')
+        return int(np.datetime64(date, 'D').astype(np.int64)), upload_id, int(row)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+class TransactionIndex:
+    """
+    A user's dated transactions in (date, upload_id, row) order.
+
+    Rows without a parseable date are left out, as in the transactions table, and so
+    are rows dated outside MIN_DAY..MAX_DAY, which the int64 keys cannot hold.
+    Keys sort exactly like (date, upload_id, row), so a cursor stays valid after
+    other uploads are added or removed and the index is rebuilt.
+    """
+
+    def __init__(self, frame: TransactionFrame, user_rules: Optional[Sequence[Rule]] = None):
+        classified = classify_frame(frame, user_rules)
+        # NaT is the smallest int64, so undated rows fall below MIN_DAY too
+        days = frame.date.astype(np.int64)
+        dated = (days >= MIN_DAY) & (days <= MAX_DAY)
+        out_of_range = int((~np.isnat(frame.date) & ~dated).sum())
+        if out_of_range:
+            logger.warning(f"Left {out_of_range} transactions dated outside the indexable range out of the index")
+
+        self.upload_ids = sorted(set(frame.upload_ids))
+        if len(self.upload_ids) >= 1 << RANK_BITS or (len(frame) and frame.row.max() >= 1 << ROW_BITS):
+            raise ValueError("Too many uploads or rows to index")
+        rank = np.array([bisect.bisect_left(self.upload_ids, u) for u in frame.upload_ids], dtype=np.int64)
+
+        keys = self.encode(days[dated], rank[frame.upload[dated]], frame.row[dated])
+        order = np.argsort(keys, kind='stable')
+        rows = np.flatnonzero(dated)[order]
+
+        self.keys = keys[order]
+        self.date = frame.date[rows]
+        self.amount = classified['amount'][rows]
+        self.direction = frame.direction[rows]
+        self.file_type = frame.file_type[rows]
+        self.upload = frame.upload[rows]
+        self.row = frame.row[rows]
+        self.status = frame.status[rows]
+        self.description = frame.description[rows]
+        self.category = classified['category'][rows]
+        self.subcategory = classified['subcategory'][rows]
+        self.frame_upload_ids = frame.upload_ids
+        self.status_labels = frame.status_labels
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]], user_rules: Optional[Sequence[Rule]] = None) -> "TransactionIndex":
+        """Index over transactions table rows, as returned by transaction_store.page_transactions."""
+        uploads: Dict[str, Dict[str, Any]] = {}
+        positions: Dict[str, List[int]] = {}
+        for row in rows:
+            upload_id = str(row['upload_id'])
+            upload = uploads.setdefault(upload_id, {'id': upload_id, 'file_type': row.get('file_type'), 'parsed_data': []})
+            upload['parsed_data'].append({
+                'date': row['transaction_date'],
+                'amount': row.get('amount'),
+                'direction': row.get('type'),
+                'description': row.get('description'),
+                'status': row.get('status') or ''
+            })
+            positions.setdefault(upload_id, []).append(int(row.get('row_index') or 0))
+
+        frame = TransactionFrame.from_uploads(list(uploads.values()))
+        # from_uploads numbers rows within this batch; keep their positions in the upload
+        frame.row = np.array([p for upload_id in uploads for p in positions[upload_id]], dtype=np.int32)
+        return cls(frame, user_rules)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def encode(days, rank, row):
+        return ((np.asarray(days, dtype=np.int64) + DATE_BIAS) << DATE_SHIFT) \
+            | (np.asarray(rank, dtype=np.int64) << ROW_BITS) | np.asarray(row, dtype=np.int64)
+
+    def day_bound(self, day: int) -> int:
+        """Position of the first row dated on or after day."""
+        if day <= MIN_DAY:
+            return 0
+        if day > MAX_DAY:
+            return len(self)
+        return int(np.searchsorted(self.keys, self.encode(day, 0, 0), side='left'))
+
+    def cursor_bounds(self, cursor: str) -> tuple:
+        """(first position after the cursor row, first position at or after it)."""
+        day, upload_id, row = decode_cursor(cursor)
+        if not MIN_DAY <= day <= MAX_DAY:
+            position = self.day_bound(day)
+            return position, position
+        rank = bisect.bisect_left(self.upload_ids, upload_id)
+        if rank < len(self.upload_ids) and self.upload_ids[rank] == upload_id:
+            key = self.encode(day, rank, row)
+            return int(np.searchsorted(self.keys, key, 'right')), int(np.searchsorted(self.keys, key, 'left'))
+        # Upload since removed: its rows would sit just before the next upload id's rows
+        position = int(np.searchsorted(self.keys, self.encode(day, rank, 0), 'left'))
+        return position, position
+
+    def filter_mask(
+        self,
+        positions: slice,
+        direction: Optional[str],
+        category: Optional[str],
+        upload_id: Optional[str],
+        file_type: Optional[str]
+    ) -> np.ndarray:
+        mask = np.ones(positions.stop - positions.start, dtype=bool)
+        if direction is not None:
+            mask &= self.direction[positions] == DIRECTION_CODES.get(direction, 0)
+        if file_type is not None:
+            mask &= self.file_type[positions] == FILE_TYPE_CODES.get(file_type, -2)
+        if upload_id is not None:
+            wanted = [i for i, u in enumerate(self.frame_upload_ids) if u == upload_id]
+            mask &= np.isin(self.upload[positions], wanted)
+        if category is not None:
+            name = category.strip().lower()
+            labels = np.char.lower(self.category[positions].astype(str))
+            sublabels = np.char.lower(self.subcategory[positions].astype(str))
+            mask &= (labels == name) | (sublabels == name)
+        return mask
+
+    def page(
+        self,
+        date_from: Optional[np.datetime64] = None,
+        date_to: Optional[np.datetime64] = None,
+        direction: Optional[str] = None,
+        category: Optional[str] = None,
+        upload_id: Optional[str] = None,
+        file_type: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        descending: bool = True
+    ) -> Dict[str, Any]:
+        """
+        One page of transactions in date order (newest first by default) after the cursor.
+        Filtered pages scan forward from the cursor in growing chunks until the page is full.
+        """
+        if not 1 <= limit <= TRANSACTIONS_MAX_PAGE:
+            raise ValueError(f"limit must be between 1 and {TRANSACTIONS_MAX_PAGE}")
+
+        lo = self.day_bound(int(date_from.astype(np.int64))) if date_from is not None else 0
+        hi = self.day_bound(int(date_to.astype(np.int64)) + 1) if date_to is not None else len(self)
+        if cursor:
+            after, before = self.cursor_bounds(cursor)
+            if descending:
+                hi = min(hi, before)
+            else:
+                lo = max(lo, after)
+
+        filtered = any(f is not None for f in (direction, category, upload_id, file_type))
+        picked: List[int] = []
+        chunk = max(limit * 4, 256) if filtered else limit + 1
+        start, stop = lo, hi
+        while len(picked) <= limit and start < stop:
+            if descending:
+                positions = slice(max(start, stop - chunk), stop)
+                stop = positions.start
+            else:
+                positions = slice(start, min(stop, start + chunk))
+                start = positions.stop
+            found = np.arange(positions.start, positions.stop)
+            if filtered:
+                found = found[self.filter_mask(positions, direction, category, upload_id, file_type)]
+            picked.extend((found[::-1] if descending else found).tolist())
+            chunk *= 2
+
+        has_more = len(picked) > limit
+        picked = picked[:limit]
+        transactions = [self.record(p) for p in picked]
+        next_cursor = None
+        if has_more and transactions:
+            last = transactions[-1]
+            next_cursor = encode_cursor(last['date'], last['upload_id'], int(self.row[picked[-1]]))
+
+        return {
+            'transactions': transactions,
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+            'limit': limit,
+            'total_indexed': len(self)
+        }
+
+    def record(self, position: int) -> Dict[str, Any]:
+        upload_id = self.frame_upload_ids[self.upload[position]]
+        return {
+            'id': f"{upload_id}:{int(self.row[position])}",
+            'date': str(self.date[position]),
+            'description': self.description[position],
+            'amount': round(float(self.amount[position]), 2),
+            'direction': DIRECTION_LABELS.get(int(self.direction[position])),
+            'category': self.category[position],
+            'subcategory': self.subcategory[position],
+            'status': self.status_labels[self.status[position]] or None,
+            'file_type': FILE_TYPE_LABELS.get(int(self.file_type[position])),
+            'upload_id': upload_id
+        }
+
+
+def page_stored_transactions(
+    user_id: str,
+    user_rules: Optional[Sequence[Rule]] = None,
+    date_from: Optional[np.datetime64] = None,
+    date_to: Optional[np.datetime64] = None,
+    direction: Optional[str] = None,
+    category: Optional[str] = None,
+    upload_id: Optional[str] = None,
+    file_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    descending: bool = True
+) -> Dict[str, Any]:
+    """
+    TransactionIndex.page read from the transactions table, without building the user's index.
+    Date, direction, upload and file type filters run in the database; rows are classified
+    a batch at a time, so category-filtered pages read ahead in growing batches until full.
+    Cursors are interchangeable with the in-memory index's.
+    """
+    if not 1 <= limit <= TRANSACTIONS_MAX_PAGE:
+        raise ValueError(f"limit must be between 1 and {TRANSACTIONS_MAX_PAGE}")
+
+    after = None
+    if cursor:
+        day, cursor_upload, row = decode_cursor(cursor)
+        after = (str(np.datetime64(day, 'D')), cursor_upload, row)
+    bounds = [None if value is None else str(value) for value in (date_from, date_to)]
+
+    picked: List[tuple] = []
+    batch = max(limit * 4, 256) if category is not None else limit + 1
+    while len(picked) <= limit:
+        batch = min(batch, TRANSACTION_PAGE_MAX)
+        rows = page_transactions(user_id, *bounds, direction, upload_id, file_type, after, descending, batch)
+        if rows:
+            index = TransactionIndex.from_rows(rows, user_rules)
+            positions = np.arange(len(index))
+            if category is not None:
+                positions = positions[index.filter_mask(slice(0, len(index)), None, category, None, None)]
+            for position in (positions[::-1] if descending else positions):
+                picked.append((index.record(position), int(index.row[position])))
+            last = rows[-1]
+            after = (str(last['transaction_date']), str(last['upload_id']), int(last['row_index']))
+        if len(rows) < batch:
+            break
+        batch *= 2
+
+    has_more = len(picked) > limit
+    picked = picked[:limit]
+    next_cursor = None
+    if has_more and picked:
+        last, row = picked[-1]
+        next_cursor = encode_cursor(last['date'], last['upload_id'], row)
+
+    return {
+        'transactions': [record for record, _ in picked],
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'limit': limit
+    }
+
+
+transaction_index_cache = AnalyticsCache(ttl=TRANSACTION_INDEX_TTL, max_users=TRANSACTION_INDEX_USERS)
@@ -0,0 +1,445 @@
+"""
+Transaction Store Service - Bulk-load parsed rows into the normalized transactions table
+Writes an upload's rows in one transaction: through the store_upload_transactions RPC on
+Supabase, or straight to Postgres with COPY when DATABASE_URL is set (any other SQLAlchemy
+URL, e.g. SQLite, uses executemany). Uploads whose write failed are marked and rewritten.
+"""
+
+import io
+import os
+import csv
+import uuid
+import logging
+from typing import Dict, Any, List, Optional
+
+from backend.services.transaction_frame import parse_date, is_aux_upload
+from backend.services.db_rpc import is_missing_function
+
+logger = logging.getLogger(__name__)
+
+# Set to "false" to keep transactions only in financial_uploads.parsed_data
+STORE_TRANSACTIONS = os.environ.get("STORE_TRANSACTIONS", "true").lower() in ("1", "true", "yes")
+
+# Rows per INSERT statement on the Supabase path
+TRANSACTION_INSERT_BATCH = int(os.environ.get("TRANSACTION_INSERT_BATCH", "1000"))
+
+# Direct database connection (postgresql://... or sqlite:///...); Supabase REST when unset
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+# Longest page read by page_transactions
+TRANSACTION_PAGE_MAX = int(os.environ.get("TRANSACTION_PAGE_MAX", "5000"))
+
+# Period of the aggregates read for each forecast granularity
+PERIOD_GRANULARITIES = ('month', 'week')
+
+# Upload types whose rows are transactions (inventory / loan rows are not)
+TRANSACTION_UPLOAD_TYPES = ('bank', 'sales', 'purchase')
+
+# Direction used when a row has none
+DEFAULT_DIRECTION = {'bank': 'debit', 'sales': 'credit', 'purchase': 'debit'}
+
+TRANSACTION_COLUMNS = [
+    "user_id", "upload_id", "transaction_date", "description",
+    "amount", "type", "category", "file_type", "status", "row_index"
+]
+
+_engine = None
+_table = None
+
+
+def transaction_rows(
+    user_id: str,
+    upload_id: str,
+    upload_type: str,
+    parsed_data: List[Dict[str, Any]],
+    first_row: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Convert parsed_data rows to transactions table rows.
+    Rows without a usable date are skipped (transaction_date is NOT NULL).
+    row_index is the row's position in the upload's parsed_data; first_row is the
+    position of parsed_data[0] when it is one chunk of a streamed upload.
+    """
+    rows = []
+    dates: Dict[Any, Optional[str]] = {}
+    skipped = 0
+
+    for position, record in enumerate(parsed_data):
+        if not isinstance(record, dict) or record.get("duplicate"):
+            continue
+
+        value = record.get("date")
+        if value not in dates:
+            day = parse_date(value)
+            dates[value] = str(day) if day is not None else None
+        transaction_date = dates[value]
+        if transaction_date is None:
+            skipped += 1
+            continue
+
+        direction = record.get("direction")
+        rows.append({
+            "user_id": user_id,
+            "upload_id": upload_id,
+            "transaction_date": transaction_date,
+            "description": str(record.get("description") or ""),
+            "amount": float(record.get("amount") or 0),
+            "type": direction if direction in ("credit", "debit") else DEFAULT_DIRECTION[upload_type],
+            "category": "Other",
+            "file_type": upload_type,
+            "status": record.get("status"),
+            "row_index": first_row + position
+        })
+
+    if skipped:
+        logger.warning(f"Skipped {skipped} rows without a valid date for upload {upload_id}")
+    return rows
+
+
+def get_engine():
+    """SQLAlchemy engine for DATABASE_URL, or None to write through Supabase."""
+    global _engine
+    if _engine is None and DATABASE_URL:
+        from sqlalchemy import create_engine
+        _engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    return _engine
+
+
+def transactions_table():
+    """SQLAlchemy Core definition of the transactions table (columns the backend writes)."""
+    global _table
+    if _table is None:
+        from sqlalchemy import MetaData, Table, Column, String, Text, Date, Numeric, Integer, DateTime, func
+        _table = Table(
+            "transactions", MetaData(),
+            Column("id", String(36), primary_key=True),
+            Column("user_id", String(36), nullable=False),
+            Column("upload_id", String(36)),
+            Column("transaction_date", Date, nullable=False),
+            Column("description", Text, nullable=False),
+            Column("amount", Numeric, nullable=False),
+            Column("type", Text, nullable=False),
+            Column("category", Text, nullable=False, server_default="Other"),
+            Column("file_type", Text),
+            Column("status", Text),
+            Column("row_index", Integer),
+            Column("created_at", DateTime(timezone=True), server_default=func.now())
+        )
+    return _table
+
+
+def copy_rows(engine, rows: List[Dict[str, Any]], replace_upload: Optional[str] = None) -> None:
+    """
+    Postgres COPY ... FROM STDIN of all rows in one round trip and one transaction,
+    after deleting the rows already stored for replace_upload.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([r"\N" if row[c] is None else row[c] for c in TRANSACTION_COLUMNS])
+    buffer.seek(0)
+
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            if replace_upload is not None:
+                cursor.execute("DELETE FROM transactions WHERE upload_id = %s", (replace_upload,))
+            cursor.copy_expert(
+                f"COPY transactions ({', '.join(TRANSACTION_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer
+            )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def insert_sql_rows(engine, rows: List[Dict[str, Any]], replace_upload: Optional[str] = None) -> None:
+    """Batched executemany INSERTs in one transaction for non-Postgres databases (SQLite stand-in)."""
+    from datetime import date
+    table = transactions_table()
+    values = [
+        {**row, "id": str(uuid.uuid4()), "transaction_date": date.fromisoformat(row["transaction_date"])}
+        for row in rows
+    ]
+    with engine.begin() as conn:
+        if replace_upload is not None:
+            conn.execute(table.delete().where(table.c.upload_id == replace_upload))
+        for start in range(0, len(values), TRANSACTION_INSERT_BATCH):
+            conn.execute(table.insert(), values[start:start + TRANSACTION_INSERT_BATCH])
+
+
+def insert_supabase_rows(upload_id: str, rows: List[Dict[str, Any]], replace: bool = False) -> None:
+    """
+    All rows in one call of the store_upload_transactions RPC, which runs as one transaction.
+    Without the function, falls back to multi-row INSERTs of TRANSACTION_INSERT_BATCH rows
+    and deletes what was written if a batch fails.
+    """
+    from backend.db_client import supabase
+    try:
+        supabase.rpc("store_upload_transactions", {
+            "p_upload_id": upload_id,
+            "p_rows": rows,
+            "p_replace": replace
+        }).execute()
+        return
+    except Exception as e:
+        if not is_missing_function(e):
+            raise
+        logger.warning(f"store_upload_transactions RPC unavailable, inserting in batches: {e}")
+
+    if replace:
+        supabase.table("transactions").delete().eq("upload_id", upload_id).execute()
+    try:
+        for start in range(0, len(rows), TRANSACTION_INSERT_BATCH):
+            supabase.table("transactions").insert(rows[start:start + TRANSACTION_INSERT_BATCH]).execute()
+    except Exception:
+        supabase.table("transactions").delete().eq("upload_id", upload_id).execute()
+        raise
+
+
+def write_transactions(
+    user_id: str,
+    upload_id: str,
+    upload_type: str,
+    parsed_data: List[Dict[str, Any]],
+    replace: bool = False,
+    first_row: int = 0
+) -> int:
+    """
+    Write an upload's parsed rows to the transactions table in one transaction.
+    replace=True first removes the rows already stored for the upload; first_row is
+    where parsed_data starts in the upload when it is one chunk of a streamed upload.
+    Returns the number of rows written; raises when the write fails.
+    """
+    if not STORE_TRANSACTIONS or upload_type not in TRANSACTION_UPLOAD_TYPES:
+        return 0
+
+    rows = transaction_rows(user_id, upload_id, upload_type, parsed_data or [], first_row)
+    if not rows and not replace:
+        return 0
+
+    engine = get_engine()
+    if engine is None:
+        insert_supabase_rows(upload_id, rows, replace)
+    elif engine.dialect.name == "postgresql":
+        copy_rows(engine, rows, upload_id if replace else None)
+    else:
+        insert_sql_rows(engine, rows, upload_id if replace else None)
+
+    logger.info(f"✅ Stored {len(rows)} transactions for upload {upload_id}")
+    return len(rows)
+
+
+def set_transactions_status(upload_id: str, status: str) -> None:
+    from backend.db_client import supabase
+    supabase.table("financial_uploads").update({"transactions_status": status}).eq("id", upload_id).execute()
+
+
+def store_transactions(
+    user_id: str,
+    upload_id: str,
+    upload_type: str,
+    parsed_data: List[Dict[str, Any]]
+) -> int:
+    """
+    Write an upload's parsed rows to the transactions table.
+    Returns the number of rows written. A failed write does not fail the upload
+    (financial_uploads.parsed_data stays the source of truth): it is logged and the
+    upload is marked with transactions_status 'failed' so repair_transactions rewrites it.
+    """
+    try:
+        return write_transactions(user_id, upload_id, upload_type, parsed_data)
+    except Exception as e:
+        logger.error(f"❌ Failed to store transactions for upload {upload_id}: {e}")
+        try:
+            set_transactions_status(upload_id, "failed")
+        except Exception as mark_error:
+            logger.error(f"❌ Could not mark upload {upload_id} for a transactions rebuild: {mark_error}")
+        return 0
+
+
+def repair_transactions(user_id: str) -> int:
+    """
+    Rewrite the transactions of a user's uploads whose earlier write failed.
+    Returns the number of uploads repaired; an upload that fails again stays marked.
+    """
+    if not STORE_TRANSACTIONS:
+        return 0
+    from backend.db_client import supabase
+    from backend.services.columnar_store import hydrate_uploads
+
+    result = supabase.table("financial_uploads") \
+        .select("id, file_type, filename, parsed_data, parsed_data_ref") \
+        .eq("user_id", user_id) \
+        .eq("processing_status", "completed") \
+        .eq("transactions_status", "failed") \
+        .execute()
+
+    repaired = 0
+    for upload in hydrate_uploads(result.data or []):
+        if is_aux_upload(upload):
+            continue
+        try:
+            write_transactions(user_id, upload["id"], upload.get("file_type", "bank"), upload.get("parsed_data"), replace=True)
+            set_transactions_status(upload["id"], "stored")
+            repaired += 1
+        except Exception as e:
+            logger.error(f"❌ Failed to rebuild transactions for upload {upload['id']}: {e}")
+    return repaired
+
+
+def monthly_totals(user_id: str) -> List[Dict[str, Any]]:
+    """
+    Per-month totals by file type and direction, aggregated in the database
+    over the (user_id, transaction_date) index.
+    """
+    engine = get_engine()
+    if engine is None:
+        from backend.db_client import supabase
+        result = supabase.rpc("transaction_monthly_totals", {"p_user_id": user_id}).execute()
+        return result.data or []
+
+    from sqlalchemy import select, func
+    table = transactions_table()
+    if engine.dialect.name == "postgresql":
+        month = func.to_char(func.date_trunc("month", table.c.transaction_date), "YYYY-MM")
+    else:
+        month = func.strftime("%Y-%m", table.c.transaction_date)
+
+    query = (
+        select(
+            month.label("month"),
+            table.c.file_type,
+            table.c.type,
+            func.sum(table.c.amount).label("amount"),
+            func.count().label("count")
+        )
+        .where(table.c.user_id == user_id)
+        .group_by(month, table.c.file_type, table.c.type)
+        .order_by(month)
+    )
+    with engine.connect() as conn:
+        return [
+            {**row._asdict(), "amount": float(row.amount or 0)}
+            for row in conn.execute(query)
+        ]
+
+
+def period_totals(user_id: str, granularity: str = 'month') -> List[Dict[str, Any]]:
+    """
+    Totals per period (first day of the month or Monday of the week, ISO date) by
+    file type and direction, aggregated in the database over the (user_id, transaction_date) index.
+    """
+    if granularity not in PERIOD_GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(PERIOD_GRANULARITIES)}")
+
+    engine = get_engine()
+    if engine is None:
+        from backend.db_client import supabase
+        result = supabase.rpc("transaction_period_totals", {
+            "p_user_id": user_id,
+            "p_granularity": granularity
+        }).execute()
+        return result.data or []
+
+    from sqlalchemy import select, func, cast, Integer, String
+    table = transactions_table()
+    if engine.dialect.name == "postgresql":
+        period = func.to_char(func.date_trunc(granularity, table.c.transaction_date), "YYYY-MM-DD")
+    elif granularity == 'month':
+        period = func.strftime("%Y-%m-01", table.c.transaction_date)
+    else:
+        # SQLite: back up to Monday (%w is 0 on Sunday)
+        weekday = (cast(func.strftime("%w", table.c.transaction_date), Integer) + 6) % 7
+        period = func.date(table.c.transaction_date, "-" + cast(weekday, String) + " days")
+
+    query = (
+        select(
+            period.label("period"),
+            table.c.file_type,
+            table.c.type,
+            func.sum(table.c.amount).label("amount"),
+            func.count().label("count")
+        )
+        .where(table.c.user_id == user_id)
+        .group_by(period, table.c.file_type, table.c.type)
+        .order_by(period)
+    )
+    with engine.connect() as conn:
+        return [
+            {**row._asdict(), "amount": float(row.amount or 0)}
+            for row in conn.execute(query)
+        ]
+
+
+def page_transactions(
+    user_id: str,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    direction: Optional[str] = None,
+    upload_id: Optional[str] = None,
+    file_type: Optional[str] = None,
+    after: Optional[tuple] = None,
+    descending: bool = True,
+    limit: int = 50
+) -> List[Dict[str, Any]]:
+    """
+    Up to `limit` of a user's transactions in (transaction_date, upload_id, row_index) order,
+    newest first when descending, starting after the (ISO date, upload_id, row_index) key `after`.
+    A keyset scan of the (user_id, transaction_date, upload_id, row_index) index: each page
+    reads only the rows it returns, however deep it is.
+    """
+    if not 1 <= limit <= TRANSACTION_PAGE_MAX:
+        raise ValueError(f"limit must be between 1 and {TRANSACTION_PAGE_MAX}")
+
+    engine = get_engine()
+    if engine is None:
+        from backend.db_client import supabase
+        after_date, after_upload, after_row = after or (None, None, None)
+        result = supabase.rpc("transaction_page", {
+            "p_user_id": user_id,
+            "p_date_from": date_from,
+            "p_date_to": date_to,
+            "p_type": direction,
+            "p_upload_id": upload_id,
+            "p_file_type": file_type,
+            "p_after_date": after_date,
+            "p_after_upload": after_upload,
+            "p_after_row": after_row,
+            "p_descending": descending,
+            "p_limit": limit
+        }).execute()
+        return result.data or []
+
+    from datetime import date
+    from sqlalchemy import select, tuple_, literal
+    table = transactions_table()
+    key = (table.c.transaction_date, table.c.upload_id, table.c.row_index)
+    query = select(
+        table.c.transaction_date, table.c.upload_id, table.c.row_index, table.c.description,
+        table.c.amount, table.c.type, table.c.file_type, table.c.status
+    ).where(table.c.user_id == user_id)
+    if date_from is not None:
+        query = query.where(table.c.transaction_date >= date.fromisoformat(date_from))
+    if date_to is not None:
+        query = query.where(table.c.transaction_date <= date.fromisoformat(date_to))
+    for column, value in ((table.c.type, direction), (table.c.upload_id, upload_id), (table.c.file_type, file_type)):
+        if value is not None:
+            query = query.where(column == value)
+    if after is not None:
+        bound = tuple_(
+            literal(date.fromisoformat(after[0]), table.c.transaction_date.type),
+            literal(after[1], table.c.upload_id.type),
+            literal(int(after[2]), table.c.row_index.type)
+        )
+        query = query.where(tuple_(*key) < bound if descending else tuple_(*key) > bound)
+    query = query.order_by(*(column.desc() if descending else column for column in key)).limit(limit)
+
+    with engine.connect() as conn:
+        return [
+            {**row._asdict(), "transaction_date": str(row.transaction_date), "amount": float(row.amount or 0)}
+            for row in conn.execute(query)
+        ]
@@ -0,0 +1,78 @@
+"""
+Upload Cache Service - Content-addressed results of processed uploads
+Repeat uploads (same bytes and type) or retried requests (same Idempotency-Key)
+are answered from here instead of being parsed and counted again
+"""
+
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upload responses kept in memory (LRU)
+UPLOAD_CACHE_SIZE = int(os.environ.get("UPLOAD_CACHE_SIZE", "128"))
+
+# Longest accepted Idempotency-Key header
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Response fields kept per cached upload: ids and metrics, never the parsed rows
+CACHED_RESPONSE_FIELDS = (
+    "message", "upload_id", "rows_parsed", "metrics", "column_mapping",
+    "confidence", "amount_parse_errors", "duplicate_rows"
+)
+
+
+def upload_fingerprint(content_sha256: str, upload_type: str) -> str:
+    """SHA-256 over the upload type and the content digest: same file as another type is a new upload."""
+    return hashlib.sha256(f"{upload_type}:{content_sha256}".encode("utf-8")).hexdigest()
+
+
+class UploadResultCache:
+    """
+    LRU of upload responses keyed by (user_id, fingerprint), plus the
+    fingerprint each (user_id, Idempotency-Key) was first used with.
+    Only CACHED_RESPONSE_FIELDS of a response are kept.
+    """
+
+    def __init__(self, size: int = UPLOAD_CACHE_SIZE):
+        self.size = size
+        self._results: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._keys: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+    def get(self, user_id: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        key = (user_id, fingerprint)
+        response = self._results.get(key)
+        if response is not None:
+            self._results.move_to_end(key)
+        return response
+
+    def put(self, user_id: str, fingerprint: str, response: Dict[str, Any],
+            idempotency_key: Optional[str] = None) -> None:
+        if self.size <= 0:
+            return
+        self._results[(user_id, fingerprint)] = {k: response.get(k) for k in CACHED_RESPONSE_FIELDS}
+        self._results.move_to_end((user_id, fingerprint))
+        if idempotency_key:
+            self.remember_key(user_id, idempotency_key, fingerprint)
+        while len(self._results) > self.size:
+            self._results.popitem(last=False)
+
+    def remember_key(self, user_id: str, idempotency_key: str, fingerprint: str) -> None:
+        self._keys[(user_id, idempotency_key)] = fingerprint
+        self._keys.move_to_end((user_id, idempotency_key))
+        while len(self._keys) > max(self.size, 1) * 4:
+            self._keys.popitem(last=False)
+
+    def fingerprint_for_key(self, user_id: str, idempotency_key: str) -> Optional[str]:
+        return self._keys.get((user_id, idempotency_key))
+
+    def discard_upload(self, user_id: str, upload_id: str) -> None:
+        """Forget cached responses of a deleted upload."""
+        for key in [k for k, r in self._results.items() if k[0] == user_id and r.get("upload_id") == upload_id]:
+            del self._results[key]
+
+
+upload_cache = UploadResultCache()
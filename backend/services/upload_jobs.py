@@ -0,0 +1,194 @@
+"""
+Upload Job Service - In-process background queue for asynchronous upload processing
+No external broker: jobs live in this worker process and are processed by asyncio tasks
+"""
+
+import os
+import re
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+# Concurrent jobs processed by this worker process
+UPLOAD_JOB_WORKERS = int(os.environ.get("UPLOAD_JOB_WORKERS", "2"))
+
+# Jobs allowed to wait in the queue before new async uploads are rejected
+UPLOAD_JOB_MAX_PENDING = int(os.environ.get("UPLOAD_JOB_MAX_PENDING", "100"))
+
+# Finished jobs kept in memory for status polling
+UPLOAD_JOB_RETAIN = int(os.environ.get("UPLOAD_JOB_RETAIN", "1000"))
+
+# Seconds after which an upload still pending / processing but not queued in this process
+# is taken to have been lost with the process that ran it (jobs are not persisted)
+UPLOAD_JOB_STALE_SECONDS = float(os.environ.get("UPLOAD_JOB_STALE_SECONDS", "3600"))
+
+IN_PROGRESS_STATUSES = ("pending", "processing")
+
+
+class UploadQueueFull(Exception):
+    """Raised when UPLOAD_JOB_MAX_PENDING jobs are already waiting."""
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def stale_cutoff() -> str:
+    """Creation time before which in-progress uploads count as lost."""
+    return (datetime.now(timezone.utc) - timedelta(seconds=UPLOAD_JOB_STALE_SECONDS)).isoformat()
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Timezone-aware datetime of a Postgres ISO timestamp, None when unreadable."""
+    try:
+        text = str(value).replace("Z", "+00:00")
+        # Python < 3.11 only reads 3 or 6 fractional digits
+        text = re.sub(r"\.(\d+)", lambda m: "." + m.group(1)[:6].ljust(6, "0"), text, count=1)
+        moment = datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+class UploadJob:
+    """State of one asynchronous upload. Status values match financial_uploads.processing_status."""
+
+    def __init__(self, job_id: str, user_id: str, filename: str, upload_type: str):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.filename = filename
+        self.upload_type = upload_type
+        self.status = "pending"
+        self.rows_parsed: Optional[int] = None
+        self.result: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.created_at = utc_now()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "type": self.upload_type,
+            "status": self.status,
+            "rows_parsed": self.rows_parsed,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+JobHandler = Callable[[UploadJob], Awaitable[Dict[str, Any]]]
+
+
+class UploadJobQueue:
+    """
+    asyncio.Queue drained by a fixed set of worker tasks.
+    Each job carries its own handler coroutine; whatever dict it returns becomes the
+    job result (a "rows_parsed" key is lifted onto the job). Exceptions mark the job failed.
+    """
+
+    def __init__(
+        self,
+        workers: int = UPLOAD_JOB_WORKERS,
+        max_pending: int = UPLOAD_JOB_MAX_PENDING,
+        retain: int = UPLOAD_JOB_RETAIN
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retain = retain
+        self._jobs: "OrderedDict[str, UploadJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    def _ensure_workers(self) -> None:
+        # Created lazily so they bind to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(max(1, self.workers))]
+            logger.info(f"Started {len(self._tasks)} upload job workers")
+
+    def submit(self, job: UploadJob, handler: JobHandler) -> UploadJob:
+        """Enqueue a job. Raises UploadQueueFull when too many jobs are waiting."""
+        self._ensure_workers()
+        if self._queue.qsize() >= self.max_pending:
+            raise UploadQueueFull(f"Upload queue is full ({self.max_pending} jobs waiting)")
+
+        self._jobs[job.job_id] = job
+        self._queue.put_nowait((job, handler))
+        self._evict_finished()
+        logger.info(f"Queued upload job {job.job_id} ({job.filename})")
+        return job
+
+    def get(self, job_id: str) -> Optional[UploadJob]:
+        return self._jobs.get(job_id)
+
+    def _evict_finished(self) -> None:
+        excess = len(self._jobs) - self.retain
+        if excess <= 0:
+            return
+        for job_id in [j for j, job in self._jobs.items() if job.finished][:excess]:
+            del self._jobs[job_id]
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            job, handler = await self._queue.get()
+            job.status = "processing"
+            job.started_at = utc_now()
+            try:
+                job.result = await handler(job) or {}
+                job.rows_parsed = job.result.get("rows_parsed")
+                job.status = "completed"
+                logger.info(f"✅ Upload job {job.job_id} completed")
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "Job cancelled during shutdown"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                logger.error(f"❌ Upload job {job.job_id} failed: {e}")
+            finally:
+                job.finished_at = utc_now()
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "waiting": self._queue.qsize() if self._queue else 0,
+            "tracked_jobs": len(self._jobs)
+        }
+
+    def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._queue = None
+
+
+upload_job_queue = UploadJobQueue()
+
+
+def is_stale_upload(row: Dict[str, Any]) -> bool:
+    """
+    Whether a financial_uploads row is stuck in progress: pending or processing, not a
+    job of this process, and created more than UPLOAD_JOB_STALE_SECONDS ago.
+    """
+    if row.get("processing_status") not in IN_PROGRESS_STATUSES:
+        return False
+    job = upload_job_queue.get(str(row.get("id")))
+    if job is not None and not job.finished:
+        return False
+    created = parse_timestamp(row.get("created_at"))
+    return created is not None and datetime.now(timezone.utc) - created > timedelta(seconds=UPLOAD_JOB_STALE_SECONDS)
@@ -0,0 +1,185 @@
+"""
+Upload Spool Service - Stream uploaded files to disk so parsers can memory-map them
+Keeps raw upload bytes out of the Python heap during parsing
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import logging
+import tempfile
+import zipfile
+from typing import Optional, Any, Dict, List, Tuple, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Bytes copied per read from the request body
+SPOOL_CHUNK_BYTES = int(os.environ.get("UPLOAD_SPOOL_CHUNK_BYTES", str(1024 * 1024)))
+
+# Directory for spooled uploads (system temp dir when unset)
+SPOOL_DIR = os.environ.get("UPLOAD_SPOOL_DIR") or None
+
+
+class SpooledUpload:
+    """An upload written to a temporary file on disk. Call remove() when done."""
+
+    def __init__(self, path: str, filename: str, size: int, sha256: Optional[str] = None):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256  # hex digest of the content, computed while spooling
+
+    def remove(self) -> None:
+        for path in (self.path, row_spool_path(self.path)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove spooled upload {path}: {e}")
+
+
+def row_spool_path(upload_path: str) -> str:
+    """Where a streamed parse of the spooled upload at upload_path writes its rows."""
+    return upload_path + ".rows"
+
+
+class RowSpool:
+    """
+    Parsed rows appended to a temp file one chunk at a time, so a streamed parse can hand
+    its rows from the parse worker to the request without holding them all in memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def append(self, rows: List[Dict[str, Any]]) -> None:
+        with open(self.path, "ab") as out:
+            pickle.dump(rows, out, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def chunks(self) -> Iterator[List[Dict[str, Any]]]:
+        """The appended chunks in order, reading one at a time."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as src:
+            while True:
+                try:
+                    yield pickle.load(src)
+                except EOFError:
+                    return
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def spool_suffix(filename: Optional[str]) -> str:
+    """Keep the original extension so format detection still works on the spooled path."""
+    _, ext = os.path.splitext(filename or "")
+    return ext.lower()
+
+
+async def spool_upload(upload: Any, filename: Optional[str] = None) -> SpooledUpload:
+    """
+    Copy an UploadFile to a temporary file in SPOOL_CHUNK_BYTES pieces,
+    hashing the content on the way. Only one piece is held in memory at a time.
+    """
+    filename = filename or upload.filename or "uploaded_file.csv"
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=spool_suffix(filename), dir=SPOOL_DIR)
+    size = 0
+    digest = hashlib.sha256()
+
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                piece = await upload.read(SPOOL_CHUNK_BYTES)
+                if not piece:
+                    break
+                out.write(piece)
+                digest.update(piece)
+                size += len(piece)
+    except Exception:
+        SpooledUpload(path, filename, size).remove()
+        raise
+
+    logger.info(f"Spooled {filename} ({size} bytes) to {path}")
+    return SpooledUpload(path, filename, size, digest.hexdigest())
+
+
+# Limits for archives in bulk uploads (zip-bomb guard)
+ZIP_MAX_MEMBERS = int(os.environ.get("UPLOAD_ZIP_MAX_MEMBERS", "100"))
+ZIP_MAX_UNCOMPRESSED_BYTES = int(os.environ.get("UPLOAD_ZIP_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def is_zip_upload(spooled: SpooledUpload) -> bool:
+    return spool_suffix(spooled.filename) == ".zip" and zipfile.is_zipfile(spooled.path)
+
+
+def parse_manifest(text: str) -> Dict[str, str]:
+    """
+    Parse a bulk-upload manifest mapping file names to upload types.
+    Accepts {"jan.csv": "bank", ...} or [{"filename": "jan.csv", "type": "bank"}, ...].
+    """
+    data = json.loads(text) if text and text.strip() else {}
+    if isinstance(data, list):
+        data = {str(item.get("filename")): item.get("type") for item in data if isinstance(item, dict)}
+    if not isinstance(data, dict):
+        raise ValueError("Manifest must be a JSON object or a list of {filename, type}")
+    return {str(name): str(file_type) for name, file_type in data.items()}
+
+
+def extract_zip(spooled: SpooledUpload) -> Tuple[List[SpooledUpload], Dict[str, str]]:
+    """
+    Stream every file in a ZIP upload to its own spooled temp file.
+    Returns (members, manifest) where manifest comes from a manifest.json in the archive, if any.
+    """
+    members: List[SpooledUpload] = []
+    manifest: Dict[str, str] = {}
+
+    try:
+        with zipfile.ZipFile(spooled.path) as archive:
+            entries = [
+                info for info in archive.infolist()
+                if not info.is_dir()
+                and not info.filename.startswith("__MACOSX/")
+                and not os.path.basename(info.filename).startswith(".")
+            ]
+
+            total = sum(info.file_size for info in entries)
+            if total > ZIP_MAX_UNCOMPRESSED_BYTES:
+                raise ValueError(f"Archive expands to {total} bytes (limit {ZIP_MAX_UNCOMPRESSED_BYTES})")
+
+            for info in entries:
+                name = os.path.basename(info.filename)
+                if name.lower() == MANIFEST_FILENAME:
+                    with archive.open(info) as f:
+                        manifest.update(parse_manifest(f.read().decode("utf-8")))
+                    continue
+
+                if len(members) >= ZIP_MAX_MEMBERS:
+                    raise ValueError(f"Archive has more than {ZIP_MAX_MEMBERS} files")
+
+                fd, path = tempfile.mkstemp(prefix="upload_", suffix=spool_suffix(name), dir=SPOOL_DIR)
+                member = SpooledUpload(path, name, info.file_size)
+                members.append(member)
+                digest = hashlib.sha256()
+                with os.fdopen(fd, "wb") as out, archive.open(info) as src:
+                    while True:
+                        piece = src.read(SPOOL_CHUNK_BYTES)
+                        if not piece:
+                            break
+                        out.write(piece)
+                        digest.update(piece)
+                member.sha256 = digest.hexdigest()
+    except Exception:
+        for member in members:
+            member.remove()
+        raise
+
+    logger.info(f"Extracted {len(members)} files from {spooled.filename}")
+    return members, manifest
@@ -4,42 +4,74 @@ All calculations are deterministic based on parsed data
 """
 
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
+
+import numpy as np
+
+from backend.services.transaction_frame import TransactionFrame, as_transaction_frame, first_nonzero
+from backend.services.aging_engine import (
+    age_open_items, trailing_total, days_outstanding, TURNOVER_PERIOD_DAYS
+)
 
 logger = logging.getLogger(__name__)
 
 
 def calculate_working_capital(
-    uploads_data: List[Dict[str, Any]],
-    metrics: Dict[str, Any]
+    uploads_data: Union[List[Dict[str, Any]], TransactionFrame],
+    metrics: Dict[str, Any],
+    as_of: Optional[np.datetime64] = None
 ) -> Dict[str, Any]:
     """
     Calculate working capital health metrics.
     
     Args:
-        uploads_data: List of upload records with parsed_data and file_type
+        uploads_data: List of upload records with parsed_data and file_type,
+            or a TransactionFrame built from them
         metrics: Current aggregated financial metrics
+        as_of: Date invoices are aged against (default: latest sales / purchase date)
     
     Returns:
-        Working capital health assessment
+        Working capital health assessment with receivables / payables aging, DSO, DPO
+        and cash conversion cycle
     """
-
+    frame = as_transaction_frame(uploads_data)
+    
     total_receivables = metrics.get('total_receivables', 0) or 0
     total_payables = metrics.get('total_payables', 0) or 0
     monthly_revenue = (metrics.get('total_revenue', 0) or 0) / 3  # Assume 3 months average
     
 
     if total_receivables == 0 or total_payables == 0:
-        calc_receivables, calc_payables = calculate_from_parsed_data(uploads_data)
+        calc_receivables, calc_payables = calculate_from_parsed_data(frame)
         if total_receivables == 0:
             total_receivables = calc_receivables
         if total_payables == 0:
             total_payables = calc_payables
     
+    working_capital_gap = total_receivables - total_payables
+    
+    sales = frame.type_mask('sales')
+    purchase = frame.type_mask('purchase')
+    sale_amounts = first_nonzero(frame.amount, frame.credit)
+    purchase_amounts = first_nonzero(frame.amount, frame.debit)
+    
+    if as_of is None:
+        invoice_dates = frame.date[(sales | purchase) & ~np.isnat(frame.date)]
+        as_of = invoice_dates.max() if len(invoice_dates) else np.datetime64('today', 'D')
+    
+    unpaid = frame.status_mask(UNPAID_STATUSES)
+    receivables_aging = age_open_items(frame.date[unpaid & sales], sale_amounts[unpaid & sales], as_of)
+    payables_aging = age_open_items(frame.date[unpaid & purchase], purchase_amounts[unpaid & purchase], as_of)
+    
+    dso = days_outstanding(total_receivables, trailing_total(frame.date[sales], sale_amounts[sales], as_of))
+    dpo = days_outstanding(total_payables, trailing_total(frame.date[purchase], purchase_amounts[purchase], as_of))
+    cash_conversion_cycle = round(dso - dpo, 1) if dso is not None and dpo is not None else None
+    
     risk_level = classify_risk(working_capital_gap, monthly_revenue)
     
     observations = generate_observations(
-        total_receivables, total_payables, working_capital_gap, risk_level, monthly_revenue
+        total_receivables, total_payables, working_capital_gap, risk_level, monthly_revenue,
+        dso, receivables_aging
     )
     
     # Check if we have sufficient data
@@ -52,42 +84,32 @@ def calculate_working_capital(
         'working_capital_gap': round(working_capital_gap, 2),
         'risk_level': risk_level,
         'key_observations': observations,
-        'has_sufficient_data': has_sufficient_data
+        'has_sufficient_data': has_sufficient_data,
+        'as_of': str(as_of),
+        'receivables_aging': receivables_aging,
+        'payables_aging': payables_aging,
+        'dso': dso,
+        'dpo': dpo,
+        'cash_conversion_cycle': cash_conversion_cycle,
+        'turnover_period_days': TURNOVER_PERIOD_DAYS
     }
 
 
-def calculate_from_parsed_data(uploads_data: List[Dict[str, Any]]) -> tuple:
+UNPAID_STATUSES = ('pending', 'unpaid', 'outstanding', 'due', '')
+
+
+def calculate_from_parsed_data(uploads_data: Union[List[Dict[str, Any]], TransactionFrame]) -> tuple:
     """
     Calculate receivables and payables from parsed transaction data.
     """
-    receivables = 0.0
-    payables = 0.0
-    
-    for upload in uploads_data:
-        upload_type = upload.get('file_type', '')
-        parsed_data = upload.get('parsed_data', [])
-        
-        if not parsed_data or not isinstance(parsed_data, list):
-            continue
-        
-        for transaction in parsed_data:
-            if not isinstance(transaction, dict):
-                continue
-            
-            status = str(transaction.get('status', '')).lower()
-            amount = float(transaction.get('amount', 0) or 0)
-            credit = float(transaction.get('credit', 0) or 0)
-            debit = float(transaction.get('debit', 0) or 0)
-            
-            debit = float(transaction.get('debit', 0) or 0)
-            
-            if upload_type == 'sales':
-                if status in ['pending', 'unpaid', 'outstanding', 'due', '']:
-                    receivables += amount or credit
-            
-            elif upload_type == 'purchase':
-                if status in ['pending', 'unpaid', 'outstanding', 'due', '']:
-                    payables += amount or debit
+    frame = as_transaction_frame(uploads_data)
+    unpaid = frame.status_mask(UNPAID_STATUSES)
+    
+    sales = unpaid & frame.type_mask('sales')
+    purchase = unpaid & frame.type_mask('purchase')
+    
+    receivables = float(first_nonzero(frame.amount, frame.credit)[sales].sum())
+    payables = float(first_nonzero(frame.amount, frame.debit)[purchase].sum())
     
     return receivables, payables
 
@@ -122,7 +144,9 @@ def generate_observations(
     payables: float,
     gap: float,
     risk_level: str,
-    monthly_revenue: float
+    monthly_revenue: float,
+    dso: Optional[float] = None,
+    receivables_aging: Optional[Dict[str, Any]] = None
 ) -> List[str]:
     """
     Generate key observations about working capital health.
@@ -147,11 +171,15 @@ def generate_observations(
     else:
         observations.append("Balanced working capital: receivables equal payables")
     
-    if receivables > 0 and monthly_revenue > 0:
-        receivable_days = (receivables / monthly_revenue) * 30
-        if receivable_days > 45:
-            observations.append(f"Average receivable period: ~{receivable_days:.0f} days (consider faster collection)")
-        elif receivable_days > 0:
-            observations.append(f"Average receivable period: ~{receivable_days:.0f} days")
+    if receivables > 0 and dso is not None:
+        if dso > 45:
+            observations.append(f"Days sales outstanding: ~{dso:.0f} days (consider faster collection)")
+        elif dso > 0:
+            observations.append(f"Days sales outstanding: ~{dso:.0f} days")
+    
+    if receivables_aging:
+        overdue = receivables_aging['buckets'][-1]['amount']
+        if overdue > 0:
+            observations.append(f"₹{overdue:,.0f} of receivables are more than 90 days old")
     
     return observations
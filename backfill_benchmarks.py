@@ -0,0 +1,35 @@
+"""
+One-off script to add every existing user to their industry's benchmark sketches
+Run once after creating benchmark_sketches / benchmark_members; safe to re-run, since a
+user's previous contribution is retracted before the current one is added
+"""
+from pathlib import Path
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from backend.db_client import supabase
+from backend.main import fetch_user_metrics, load_user_rollups
+from backend.services.forecasting_service import monthly_series_from_rollups
+from backend.services.benchmarking_service import benchmark_values, fetch_user_industry, update_user_benchmark
+
+
+def backfill_all():
+    users = supabase.table("financial_metrics").select("user_id").execute()
+    user_ids = sorted({row["user_id"] for row in users.data or [] if row.get("user_id")})
+    print(f"Adding {len(user_ids)} users to the benchmark sketches")
+
+    for user_id in user_ids:
+        try:
+            revenue = monthly_series_from_rollups(load_user_rollups(user_id))['revenue']
+            values = benchmark_values(fetch_user_metrics(user_id), revenue)
+            industry = fetch_user_industry(user_id)
+            update_user_benchmark(user_id, industry, values)
+            print(f"✅ {user_id}: {industry}")
+        except Exception as e:
+            print(f"❌ {user_id}: {e}")
+
+
+if __name__ == "__main__":
+    backfill_all()
@@ -0,0 +1,40 @@
+"""
+One-off script to rebuild every user's transaction_hashes dedupe index
+Run after upgrading to hashes keyed by upload type, so new uploads keep matching old ones
+"""
+from pathlib import Path
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from backend.db_client import supabase
+from backend.services.columnar_store import hydrate_uploads
+from backend.services.transaction_frame import is_aux_upload
+from backend.services.transaction_dedupe import rebuild_hash_index
+
+
+def rebuild_all():
+    users = supabase.table("financial_uploads").select("user_id").eq("processing_status", "completed").execute()
+    user_ids = sorted({row["user_id"] for row in users.data or [] if row.get("user_id")})
+    print(f"Rebuilding dedupe index of {len(user_ids)} users")
+
+    for user_id in user_ids:
+        try:
+            res = supabase.table("financial_uploads") \
+                .select("id, filename, file_type, parsed_data, parsed_data_ref") \
+                .eq("user_id", user_id) \
+                .eq("processing_status", "completed") \
+                .order("created_at") \
+                .execute()
+            uploads = [u for u in hydrate_uploads(res.data or []) if not is_aux_upload(u)]
+            count = rebuild_hash_index(
+                user_id, [(u["id"], u.get("file_type", "bank"), u.get("parsed_data") or []) for u in uploads]
+            )
+            print(f"✅ {user_id}: {count} hashes from {len(uploads)} uploads")
+        except Exception as e:
+            print(f"❌ {user_id}: {e}")
+
+
+if __name__ == "__main__":
+    rebuild_all()
@@ -0,0 +1,249 @@
+"""
+Shared fixtures: an in-memory stand-in for the Supabase client and an API test client
+
+The backend talks to the database only through backend.db_client.supabase, so the tests
+register a replacement module before anything imports it. Tables are lists of dicts;
+RPCs are looked up in FakeSupabase.functions and fail the way PostgREST reports a
+function that is not installed.
+"""
+
+import os
+import sys
+import copy
+import types
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Parse uploads in a thread of the test process
+os.environ.setdefault("PARSE_WORKERS", "0")
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeSupabase", name: str):
+        self.db = db
+        self.name = name
+        self.op = "select"
+        self.payload = None
+        self.filters = []
+        self.on_conflict = None
+        self.ignore_duplicates = False
+        self._limit = None
+        self._order = []
+
+    def select(self, columns: str = "*", count=None):
+        self.op = "select"
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def upsert(self, payload, on_conflict: str = "id", ignore_duplicates: bool = False):
+        self.op, self.payload = "upsert", payload
+        self.on_conflict, self.ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) >= value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) <= value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) < value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def order(self, column, desc: bool = False):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    def matches(self, row) -> bool:
+        return all(f(row) for f in self.filters)
+
+    def execute(self) -> FakeResult:
+        self.db.calls.append((self.name, self.op))
+        if self.name in self.db.failing:
+            raise Exception(f"{self.name} is unavailable")
+        table = self.db.tables.setdefault(self.name, [])
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+
+        if self.op == "insert":
+            # All rows or none, like one INSERT statement
+            added = []
+            for row in copy.deepcopy(rows):
+                row.setdefault("id", str(uuid.uuid4()))
+                row.setdefault("created_at", self.db.now())
+                self.db.check_unique(self.name, row, table + added)
+                added.append(row)
+            table.extend(added)
+            return FakeResult(copy.deepcopy(added))
+
+        if self.op == "upsert":
+            keys = self.on_conflict.split(",")
+            for row in copy.deepcopy(rows):
+                existing = [r for r in table if all(r.get(k) == row.get(k) for k in keys)]
+                if existing and not self.ignore_duplicates:
+                    existing[0].update(row)
+                elif not existing:
+                    table.append(row)
+            return FakeResult(copy.deepcopy(rows))
+
+        if self.op == "update":
+            out = []
+            for row in table:
+                if self.matches(row):
+                    row.update(copy.deepcopy(self.payload))
+                    out.append(copy.deepcopy(row))
+            return FakeResult(out)
+
+        if self.op == "delete":
+            removed = [r for r in table if self.matches(r)]
+            self.db.tables[self.name] = [r for r in table if not self.matches(r)]
+            for row in removed:
+                self.db.cascade(self.name, row)
+            return FakeResult(removed)
+
+        out = [copy.deepcopy(r) for r in table if self.matches(r)]
+        for column, desc in reversed(self._order):
+            out.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        if self._limit is not None:
+            out = out[:self._limit]
+        return FakeResult(out)
+
+
+class FakeRpc:
+    def __init__(self, db: "FakeSupabase", name: str, params):
+        self.db = db
+        self.name = name
+        self.params = params
+
+    def execute(self) -> FakeResult:
+        self.db.calls.append((self.name, "rpc"))
+        if self.name not in self.db.functions:
+            raise Exception(f"Could not find the function public.{self.name} in the schema cache")
+        return FakeResult(self.db.functions[self.name](self.db, self.params))
+
+
+class FakeAuth:
+    def get_user(self, token: str):
+        """Any non-empty token is the id of the user it authenticates."""
+        return types.SimpleNamespace(user=types.SimpleNamespace(id=token) if token else None)
+
+
+class FakeSupabase:
+    # Rows removed along with a financial_uploads row (ON DELETE CASCADE)
+    CASCADES = {"financial_uploads": ("transactions", "transaction_hashes")}
+
+    def __init__(self):
+        self.auth = FakeAuth()
+        self.reset()
+
+    def reset(self) -> None:
+        self.tables = {}
+        self.functions = {}
+        self.unique = {}
+        self.failing = set()
+        self.calls = []
+        self.ticks = 0
+
+    def now(self) -> str:
+        """Strictly increasing creation times, so ordering by created_at is deterministic."""
+        self.ticks += 1
+        return (datetime.now(timezone.utc) + timedelta(microseconds=self.ticks)).isoformat()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params) -> FakeRpc:
+        return FakeRpc(self, name, params)
+
+    def rows(self, name: str):
+        return self.tables.get(name, [])
+
+    def check_unique(self, name: str, row, table) -> None:
+        """unique[name] lists column lists, or (columns, predicate) pairs for partial indexes."""
+        for index in self.unique.get(name, []):
+            columns, where = index if isinstance(index, tuple) else (index, lambda r: True)
+            if not where(row) or any(row.get(c) is None for c in columns):
+                continue
+            if any(where(r) and all(r.get(c) == row.get(c) for c in columns) for r in table):
+                raise Exception(
+                    f'duplicate key value violates unique constraint "{name}_{"_".join(columns)}_key"'
+                )
+
+    def cascade(self, name: str, row) -> None:
+        for child in self.CASCADES.get(name, ()):
+            self.tables[child] = [r for r in self.tables.get(child, []) if r.get("upload_id") != row.get("id")]
+
+
+fake_supabase = FakeSupabase()
+_db_client = types.ModuleType("backend.db_client")
+_db_client.supabase = fake_supabase
+sys.modules["backend.db_client"] = _db_client
+
+
+@pytest.fixture
+def db() -> FakeSupabase:
+    fake_supabase.reset()
+    # idx_financial_uploads_user_content_hash_live
+    fake_supabase.unique["financial_uploads"] = [
+        (["user_id", "content_hash"], lambda row: row.get("processing_status") != "failed")
+    ]
+    fake_supabase.functions["existing_transaction_hashes"] = lambda db, p: [
+        {"row_hash": r["row_hash"]} for r in db.rows("transaction_hashes")
+        if r["user_id"] == p["p_user_id"] and r["row_hash"] in set(p["p_hashes"])
+    ]
+    return fake_supabase
+
+
+@pytest.fixture
+def user_id() -> str:
+    return f"user-{uuid.uuid4().hex[:12]}"
+
+
+@pytest.fixture
+def client(db, user_id):
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    test_client = TestClient(app)
+    test_client.headers["Authorization"] = f"Bearer {user_id}"
+    return test_client
@@ -0,0 +1,89 @@
+"""
+Receivables / payables aging, DSO, DPO and the cash conversion cycle
+"""
+
+import numpy as np
+import pytest
+
+from backend.services.aging_engine import age_open_items, trailing_total, days_outstanding, AGING_BUCKETS
+from backend.services.working_capital_service import calculate_working_capital
+
+
+AS_OF = np.datetime64("2024-06-30", "D")
+
+
+def reference_buckets(dates, amounts, as_of):
+    """Age every item on its own."""
+    totals = dict.fromkeys(AGING_BUCKETS, 0.0)
+    for date, amount in zip(dates, amounts):
+        if np.isnat(date):
+            continue
+        age = max(int((as_of - date).astype(np.int64)), 0)
+        label = '0-30' if age <= 30 else '31-60' if age <= 60 else '61-90' if age <= 90 else '90+'
+        totals[label] += amount
+    return totals
+
+
+def test_bucket_edges_are_inclusive_upper_bounds():
+    ages = [0, 30, 31, 60, 61, 90, 91, -5]
+    dates = np.array([AS_OF - np.timedelta64(a, "D") for a in ages] + [np.datetime64("NaT")], dtype="datetime64[D]")
+    amounts = np.arange(1.0, len(dates) + 1)
+    aging = age_open_items(dates, amounts, AS_OF)
+
+    assert {b["bucket"]: b["count"] for b in aging["buckets"]} == {"0-30": 3, "31-60": 2, "61-90": 2, "90+": 1}
+    assert {b["bucket"]: b["amount"] for b in aging["buckets"]} == reference_buckets(dates, amounts, AS_OF)
+    assert aging["undated_count"] == 1 and aging["undated_amount"] == 9.0
+    assert aging["total"] == amounts.sum()
+
+
+def test_random_invoices_match_item_by_item_aging():
+    rng = np.random.default_rng(5)
+    dates = AS_OF - rng.integers(-10, 400, size=5000).astype("timedelta64[D]")
+    amounts = rng.integers(1, 10_000, size=5000).astype(float)
+    aging = age_open_items(dates, amounts, AS_OF)
+
+    expected = reference_buckets(dates, amounts, AS_OF)
+    assert {b["bucket"]: b["amount"] for b in aging["buckets"]} == pytest.approx(expected)
+    ages = np.maximum((AS_OF - dates).astype(np.int64), 0)
+    assert aging["weighted_average_age_days"] == round(float((ages * amounts).sum() / amounts.sum()), 1)
+
+
+def test_trailing_total_and_days_outstanding():
+    dates = np.array(["2024-04-01", "2024-04-02", "2024-06-30", "2024-07-01"], dtype="datetime64[D]")
+    amounts = np.array([1.0, 10.0, 100.0, 1000.0])
+    # 90 days ending 2024-06-30 start on 2024-04-02
+    assert trailing_total(dates, amounts, AS_OF) == 110.0
+    assert days_outstanding(55.0, 110.0) == 45.0
+    assert days_outstanding(55.0, 0.0) is None
+
+
+def test_working_capital_reports_aging_dso_dpo_and_cycle():
+    uploads = [
+        {"file_type": "sales", "parsed_data": [
+            {"date": "2024-06-20", "amount": 900.0, "status": "unpaid"},
+            {"date": "2024-03-01", "amount": 300.0, "status": "unpaid"},
+            {"date": "2024-05-15", "amount": 600.0, "status": "paid"},
+        ]},
+        {"file_type": "purchase", "parsed_data": [
+            {"date": "2024-06-25", "amount": 400.0, "status": "pending"},
+            {"date": "2024-06-01", "amount": 200.0, "status": "paid"},
+        ]},
+    ]
+    result = calculate_working_capital(uploads, {})
+
+    assert result["as_of"] == "2024-06-25"
+    assert result["receivables"] == 1200.0 and result["payables"] == 400.0
+    assert result["working_capital_gap"] == 800.0
+    receivables = {b["bucket"]: b["amount"] for b in result["receivables_aging"]["buckets"]}
+    assert receivables == {"0-30": 900.0, "31-60": 0.0, "61-90": 0.0, "90+": 300.0}
+    # Trailing 90 days of sales: 900 + 600 (the March invoice is older)
+    assert result["dso"] == round(1200.0 / 1500.0 * 90, 1)
+    assert result["dpo"] == round(400.0 / 600.0 * 90, 1)
+    assert result["cash_conversion_cycle"] == round(result["dso"] - result["dpo"], 1)
+
+
+def test_explicit_as_of_date():
+    uploads = [{"file_type": "sales", "parsed_data": [{"date": "2024-06-20", "amount": 900.0, "status": "unpaid"}]}]
+    result = calculate_working_capital(uploads, {}, np.datetime64("2024-09-10", "D"))
+    assert [b["amount"] for b in result["receivables_aging"]["buckets"]] == [0.0, 0.0, 900.0, 0.0]
+    assert result["dpo"] is None and result["cash_conversion_cycle"] is None
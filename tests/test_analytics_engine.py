@@ -0,0 +1,88 @@
+"""
+Analytics engine: all dashboard sections from one scan, cached per user
+"""
+
+from unittest import mock
+
+import backend.services.analytics_engine as analytics_engine
+from backend.services.analytics_engine import build_dashboard, AnalyticsCache, DASHBOARD_SECTIONS
+from backend.services.transaction_frame import TransactionFrame
+
+
+UPLOADS = [
+    {"id": "b", "file_type": "bank", "filename": "bank.csv", "parsed_data": [
+        {"date": "2024-01-05", "amount": 1000.0, "direction": "credit", "description": "Client"},
+        {"date": "2024-01-10", "amount": 400.0, "direction": "debit", "description": "Office rent"},
+    ]},
+    {"id": "s", "file_type": "sales", "filename": "sales.csv", "parsed_data": [
+        {"date": "2024-01-03", "amount": 700.0, "direction": "credit", "status": "Pending", "description": "Invoice"},
+    ]},
+    {"id": "i", "file_type": "bank", "filename": "[INVENTORY] stock.csv", "parsed_data": [
+        {"item_name": "Widget", "quantity": 3, "unit_price": 10.0},
+    ]},
+]
+METRICS = {"total_revenue": 700.0, "total_receivables": 700.0, "cash_inflow": 1000.0, "cash_outflow": 400.0}
+
+
+def test_every_section_is_built_from_one_frame():
+    with mock.patch.object(analytics_engine.TransactionFrame, "from_uploads", wraps=TransactionFrame.from_uploads) as build:
+        dashboard = build_dashboard(UPLOADS, METRICS)
+
+    assert build.call_count == 1
+    assert dashboard["errors"] == {}
+    assert all(dashboard[name] is not None for name in DASHBOARD_SECTIONS)
+    assert dashboard["transactions_scanned"] == 3
+    assert dashboard["inventory"]["total_items"] == 1
+    assert dashboard["working_capital"]["receivables"] == 700.0
+
+
+def test_a_failing_section_does_not_take_the_others_down(monkeypatch):
+    def broken(frame):
+        raise RuntimeError("bad loan file")
+
+    monkeypatch.setattr(analytics_engine, "get_loan_summary", broken)
+    dashboard = build_dashboard(UPLOADS, METRICS)
+
+    assert dashboard["loans"] is None
+    assert dashboard["errors"] == {"loans": "bad loan file"}
+    assert dashboard["bookkeeping"] is not None
+
+
+def test_rollups_replace_the_scan_for_bookkeeping_and_forecast(monkeypatch):
+    monkeypatch.setattr(analytics_engine, "generate_bookkeeping_summary", lambda *a: 1 / 0)
+    monkeypatch.setattr(analytics_engine, "generate_forecast", lambda *a: 1 / 0)
+    dashboard = build_dashboard(UPLOADS, METRICS, rollups=[])
+    assert "bookkeeping" not in dashboard["errors"] and "forecast" not in dashboard["errors"]
+
+
+def test_cache_expires_evicts_and_invalidates(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(analytics_engine.time, "monotonic", lambda: clock[0])
+    cache = AnalyticsCache(ttl=10, max_users=2)
+
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    cache.put("c", {"n": 3})
+    assert cache.get("a") is None and cache.get("b") == {"n": 2}
+
+    cache.invalidate("b")
+    assert cache.get("b") is None
+    clock[0] += 10
+    assert cache.get("c") is None
+
+    disabled = AnalyticsCache(ttl=0)
+    disabled.put("a", {"n": 1})
+    assert disabled.get("a") is None
+
+
+def test_dashboard_is_cached_until_the_user_uploads(client, db):
+    statement = "Date,Description,Credit,Debit\n2024-01-05,Client,1000,\n"
+    client.post("/upload/financials", files={"file": ("a.csv", statement, "text/csv")}, data={"type": "bank"})
+
+    first = client.get("/api/analytics/dashboard").json()
+    scans = [c for c in db.calls if c == ("financial_uploads", "select")]
+    assert client.get("/api/analytics/dashboard").json() == first
+    assert [c for c in db.calls if c == ("financial_uploads", "select")] == scans
+
+    client.post("/upload/financials", files={"file": ("b.csv", statement + "2024-02-05,Client,5,\n", "text/csv")}, data={"type": "bank"})
+    assert client.get("/api/analytics/dashboard").json()["transactions_scanned"] == first["transactions_scanned"] + 1
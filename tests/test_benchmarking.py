@@ -0,0 +1,83 @@
+"""
+Industry benchmarks: quantile sketches, moving a user's contribution, and the one-off backfill
+"""
+
+import numpy as np
+import pytest
+
+from backend.services.benchmarking_service import (
+    QuantileSketch, sketch_delta, apply_sketch_delta, update_user_benchmark, fetch_sketches,
+    BENCHMARK_RELATIVE_ACCURACY
+)
+from backfill_benchmarks import backfill_all
+
+
+def test_quantiles_within_the_relative_accuracy():
+    values = np.random.default_rng(4).lognormal(3, 1, size=2000) * np.where(np.arange(2000) % 5, 1, -1)
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(float(value))
+
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+        exact = np.quantile(values, q, method="lower")
+        assert sketch.quantile(q) == pytest.approx(exact, rel=2 * BENCHMARK_RELATIVE_ACCURACY)
+
+    for value in values[:1000]:
+        sketch.add(float(value), -1)
+    assert sketch.count == 1000
+
+
+def test_delta_retracts_the_old_contribution():
+    old = {"industry": "Retail", "profit_margin": 10.0, "expense_ratio": 90.0, "growth_rate": None}
+    new = {"profit_margin": 10.0, "expense_ratio": 80.0, "growth_rate": 5.0}
+
+    moved = sketch_delta(old, "Retail", new)
+    assert sorted((row["metric"], row["count"]) for row in moved) == [
+        ("expense_ratio", -1), ("expense_ratio", 1), ("growth_rate", 1)
+    ]
+    assert {row["industry"] for row in sketch_delta(old, "Food", new)} == {"Food", "Retail"}
+
+
+def test_fallback_only_when_the_function_is_missing(db):
+    rows = sketch_delta(None, "Retail", {"profit_margin": 10.0, "expense_ratio": 90.0, "growth_rate": None})
+    apply_sketch_delta(rows)
+    assert sorted(row["count"] for row in db.rows("benchmark_sketches")) == [1, 1]
+
+    def lost_response(db, p):
+        raise Exception("Server disconnected without sending a response")
+
+    db.functions["apply_benchmark_sketch_delta"] = lost_response
+    with pytest.raises(Exception):
+        apply_sketch_delta(rows)
+    assert sorted(row["count"] for row in db.rows("benchmark_sketches")) == [1, 1]
+
+
+def test_member_is_not_recorded_when_the_sketches_fail(db, user_id):
+    def timeout(db, p):
+        raise Exception("canceling statement due to statement timeout")
+
+    db.functions["apply_benchmark_sketch_delta"] = timeout
+    update_user_benchmark(user_id, "Retail", {"profit_margin": 10.0, "expense_ratio": 90.0, "growth_rate": None})
+    assert db.rows("benchmark_members") == []
+
+
+def test_backfill_counts_existing_users_once(db, client):
+    for i in range(6):
+        user = f"user-{i}"
+        db.tables.setdefault("financial_metrics", []).append({
+            "id": f"m-{i}", "user_id": user, "total_revenue": 1000.0, "total_expenses": 100.0 * (i + 1)
+        })
+        db.tables.setdefault("profiles", []).append({"id": user, "industry_type": "Retail" if i < 5 else None})
+
+    backfill_all()
+    backfill_all()
+
+    assert fetch_sketches("Retail")["profit_margin"].count == 5
+    assert fetch_sketches("Other")["expense_ratio"].count == 1
+    assert fetch_sketches("Retail")["growth_rate"].count == 0
+    assert len(db.rows("benchmark_members")) == 6
+
+    client.headers["Authorization"] = "Bearer user-0"
+    body = client.get("/api/benchmarks").json()
+    assert body["metrics"]["profit_margin"]["peer_count"] == 5
+    assert body["metrics"]["profit_margin"]["percentile_rank"] == 90.0
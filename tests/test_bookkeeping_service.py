@@ -0,0 +1,98 @@
+"""
+Bookkeeping summary: groupby over classified transactions, from raw uploads or monthly rollups
+"""
+
+from collections import defaultdict
+
+from backend.services.bookkeeping_service import (
+    generate_bookkeeping_summary, bookkeeping_from_rollups, classify_transaction, parse_date_month
+)
+from backend.services.monthly_rollups import rollup_delta
+
+
+UPLOADS = [
+    {"file_type": "sales", "parsed_data": [
+        {"date": "2024-01-09", "amount": 500.0, "description": "Invoice 1"},
+        {"date": "2024-02-11", "amount": 250.0, "description": "Invoice 2"},
+        {"date": "2024-02-12", "amount": 99.0, "description": "Invoice 2", "duplicate": True},
+    ]},
+    {"file_type": "purchase", "parsed_data": [
+        {"date": "2024-01-03", "amount": 100.0, "description": "Office rent"},
+        {"date": "2024-02-20", "amount": 40.0, "description": "Staff salary"},
+        {"date": None, "amount": 7.0, "description": "Misc"},
+    ]},
+    {"file_type": "bank", "parsed_data": [
+        {"date": "2024-01-15", "credit": 300.0, "debit": 0, "description": "Transfer in"},
+        {"date": "2024-01-16", "credit": 0, "debit": 20.0, "description": "Bank fee"},
+        {"date": "2024-01-17", "credit": 0, "debit": 0, "description": "Zero row"},
+    ]},
+]
+
+
+def reference_summary(uploads):
+    """The row-by-row summary the groupby version replaced."""
+    totals, monthly = defaultdict(float), {"Income": defaultdict(float), "Expense": defaultdict(float)}
+    categories, cash, count = defaultdict(float), 0, 0
+    for upload in uploads:
+        for row in upload["parsed_data"]:
+            if row.get("duplicate"):
+                continue
+            t = classify_transaction(row, upload["file_type"])
+            count += 1
+            cash += bool(t.get("is_cash"))
+            totals[t["category"]] += t["amount"]
+            month = parse_date_month(t["date"])
+            if month and t["category"] in monthly:
+                monthly[t["category"]][month] += t["amount"]
+            if t["category"] == "Expense":
+                categories[t["subcategory"]] += t["amount"]
+    return totals, monthly, categories, cash, count
+
+
+def test_summary_matches_row_by_row_classification():
+    summary = generate_bookkeeping_summary(UPLOADS)
+    totals, monthly, categories, cash, count = reference_summary(UPLOADS)
+
+    assert summary["total_income"] == totals["Income"] == 1050.0
+    assert summary["total_expenses"] == totals["Expense"] == 167.0
+    assert summary["net_balance"] == 883.0
+    assert {m["month"]: m["amount"] for m in summary["monthly_income"]} == dict(monthly["Income"])
+    assert {m["month"]: m["amount"] for m in summary["monthly_expenses"]} == dict(monthly["Expense"])
+    assert {c["category"]: c["amount"] for c in summary["expense_categories"]} == dict(categories)
+    assert summary["cash_transactions"] == cash == 2
+    assert summary["total_transactions"] == count == 8
+    assert summary["non_cash_transactions"] == 6 and summary["has_sufficient_data"]
+
+
+def test_months_are_in_calendar_order_and_categories_by_amount():
+    summary = generate_bookkeeping_summary(UPLOADS)
+    assert [m["month"] for m in summary["monthly_income"]] == ["Jan 2024", "Feb 2024"]
+    amounts = [c["amount"] for c in summary["expense_categories"]]
+    assert amounts == sorted(amounts, reverse=True)
+
+
+def test_top_ten_expense_categories():
+    uploads = [{"file_type": "purchase", "parsed_data": [
+        {"date": "2024-01-01", "amount": float(i + 1), "description": f"payee {i}"} for i in range(3)
+    ]}]
+    rules = [(0, f"Cat {i}", f"payee {i}") for i in range(3)]
+    summary = generate_bookkeeping_summary(uploads * 5, rules)
+    assert [c["category"] for c in summary["expense_categories"]] == ["Cat 2", "Cat 1", "Cat 0"]
+
+    many = [{"file_type": "purchase", "parsed_data": [
+        {"date": "2024-01-01", "amount": float(i + 1), "description": f"payee {i:02d}"} for i in range(15)
+    ]}]
+    rules = [(0, f"Cat {i}", f"payee {i:02d}") for i in range(15)]
+    categories = generate_bookkeeping_summary(many, rules)["expense_categories"]
+    assert len(categories) == 10 and categories[0] == {"category": "Cat 14", "amount": 15.0}
+
+
+def test_rollups_give_the_same_summary():
+    assert bookkeeping_from_rollups(rollup_delta(UPLOADS)) == generate_bookkeeping_summary(UPLOADS)
+
+
+def test_empty_ledger():
+    summary = generate_bookkeeping_summary([])
+    assert summary["total_transactions"] == 0 and not summary["has_sufficient_data"]
+    assert summary["monthly_income"] == [] and summary["expense_categories"] == []
+    assert bookkeeping_from_rollups([]) == summary
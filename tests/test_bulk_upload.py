@@ -0,0 +1,89 @@
+"""
+Bulk uploads: several files or a ZIP parsed in one request with one metrics delta
+"""
+
+import io
+import json
+import zipfile
+
+
+BANK = b"Date,Description,Credit,Debit\n2024-01-05,Client,1000,\n2024-01-10,Rent,,400\n"
+SALES = b"Date,Description,Amount,Status\n2024-01-03,Invoice 1,700,Paid\n2024-01-04,Invoice 2,300,Pending\n"
+
+
+def post_bulk(client, files, manifest=None, **data):
+    if manifest is not None:
+        data["manifest"] = json.dumps(manifest)
+    return client.post(
+        "/upload/financials/bulk",
+        files=[("files", (name, content, "application/octet-stream")) for name, content in files],
+        data=data
+    )
+
+
+def test_files_are_saved_with_one_combined_metrics_delta(client, db):
+    response = post_bulk(client, [("bank.csv", BANK), ("sales.csv", SALES)], {"bank.csv": "bank", "sales.csv": "sales"})
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["metrics"] == {"cash_inflow": 1000.0, "cash_outflow": 400.0, "total_revenue": 1000.0, "total_receivables": 300.0}
+    assert [(f["filename"], f["rows_parsed"]) for f in body["files"]] == [("bank.csv", 2), ("sales.csv", 2)]
+    assert sum(1 for name, op in db.calls if name == "financial_uploads" and op == "insert") == 1
+    metrics = db.rows("financial_metrics")[0]
+    assert (metrics["total_revenue"], metrics["cash_inflow"]) == (1000.0, 1000.0)
+
+
+def test_zip_members_are_typed_by_the_archive_manifest(client, db):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("jan/bank.csv", BANK)
+        z.writestr("manifest.json", json.dumps({"bank.csv": "bank"}))
+
+    body = post_bulk(client, [("upload.zip", archive.getvalue())]).json()
+
+    assert [(f["filename"], f["type"]) for f in body["files"]] == [("bank.csv", "bank")]
+
+
+def test_untyped_files_are_rejected(client):
+    response = post_bulk(client, [("bank.csv", BANK)], {})
+    assert response.status_code == 400
+    assert "bank.csv" in response.json()["detail"]
+
+
+def test_bad_files_are_reported_and_the_rest_saved(client, db):
+    body = post_bulk(
+        client, [("bank.csv", BANK), ("broken.csv", b"foo\n1\n")], {"bank.csv": "bank", "broken.csv": "bank"}
+    ).json()
+
+    assert [f["filename"] for f in body["files"]] == ["bank.csv"]
+    assert [e["filename"] for e in body["errors"]] == ["broken.csv"]
+
+
+def test_repeated_and_overlapping_files_are_not_counted_twice(client, db):
+    overlap = BANK + b"2024-02-05,Client,1000,\n"
+    body = post_bulk(
+        client,
+        [("a.csv", BANK), ("copy.csv", BANK), ("b.csv", overlap)],
+        {"a.csv": "bank", "copy.csv": "bank", "b.csv": "bank"}
+    ).json()
+
+    assert body["duplicates"] == [{"filename": "copy.csv", "type": "bank", "duplicate_of": "a.csv"}]
+    assert [(f["filename"], f["rows_parsed"], f["duplicate_rows"]) for f in body["files"]] == [
+        ("a.csv", 2, 0), ("b.csv", 1, 2)
+    ]
+    assert body["metrics"] == {"cash_inflow": 2000.0, "cash_outflow": 400.0}
+
+    again = post_bulk(client, [("a.csv", BANK)], {"a.csv": "bank"}).json()
+    assert again["files"] == [] and again["duplicates"][0]["filename"] == "a.csv"
+
+
+def test_streamed_files_in_a_bulk_upload_are_stored_per_chunk(client, db):
+    body = post_bulk(
+        client, [("bank.csv", BANK), ("sales.csv", SALES)], {"bank.csv": "bank", "sales.csv": "sales"},
+        stream="true", chunk_rows="1"
+    ).json()
+
+    assert [f["rows_parsed"] for f in body["files"]] == [2, 2]
+    assert {r["processing_status"] for r in db.rows("financial_uploads")} == {"completed"}
+    assert len(db.rows("transactions")) == 4
+    assert body["metrics"]["total_revenue"] == 1000.0
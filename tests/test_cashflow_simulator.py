@@ -0,0 +1,97 @@
+"""
+Monte Carlo cash-flow scenarios: vectorized paths, percentile bands and shortfall probability
+"""
+
+import numpy as np
+import pytest
+
+from backend.services.cashflow_simulator import (
+    simulate_cash_flow, simulate_net_flows, bank_flows_from_rollups, SIMULATION_MAX_PATHS
+)
+from backend.services.transaction_frame import month_index
+
+
+JAN = month_index("2024-01")
+CASH_IN = {JAN: 1000.0, JAN + 1: 1200.0, JAN + 2: 800.0}
+CASH_OUT = {JAN: 900.0, JAN + 1: 1500.0, JAN + 3: 100.0}
+
+
+def test_bank_flows_split_on_direction():
+    rollups = [
+        {"month": "2024-01", "file_type": "bank", "direction": "credit", "amount": 700.0},
+        {"month": "2024-01", "file_type": "bank", "direction": "credit", "amount": 300.0},
+        {"month": "2024-01", "file_type": "bank", "direction": "debit", "amount": 250.0},
+        {"month": "2024-02", "file_type": "sales", "direction": "credit", "amount": 999.0},
+        {"month": "", "file_type": "bank", "direction": "debit", "amount": 5.0},
+    ]
+    assert bank_flows_from_rollups(rollups) == ({JAN: 1000.0}, {JAN: 250.0})
+
+
+def test_bootstrap_resamples_whole_months():
+    inflows, outflows = np.array([10.0, 20.0]), np.array([1.0, 5.0])
+    net = simulate_net_flows(inflows, outflows, 6, 500, "bootstrap", np.random.default_rng(1))
+    assert net.shape == (500, 6)
+    # An inflow is never paired with another month's outflow
+    assert set(np.unique(net)) == {9.0, 15.0}
+
+
+def test_parametric_draws_are_floored_at_zero():
+    # No outflows at all, inflows often drawn below zero
+    inflows, outflows = np.array([0.0, 1.0, 0.0]), np.zeros(3)
+    net = simulate_net_flows(inflows, outflows, 12, 2000, "parametric", np.random.default_rng(2))
+    assert net.shape == (2000, 12)
+    assert net.min() == 0.0 and (net == 0).mean() > 0.1
+
+
+def test_same_seed_same_result():
+    first = simulate_cash_flow(CASH_IN, CASH_OUT, 500.0, months=6, paths=2000, seed=7)
+    again = simulate_cash_flow(CASH_IN, CASH_OUT, 500.0, months=6, paths=2000, seed=7)
+    assert first == again
+    assert first["months_of_history"] == 4 and len(first["bands"]) == 6
+    assert first["bands"][0]["month"] == "May 2024"
+
+
+def test_bands_are_ordered_and_shortfall_only_grows():
+    result = simulate_cash_flow(CASH_IN, CASH_OUT, 200.0, months=12, paths=5000, seed=3)
+    for band in result["bands"]:
+        assert band["p5"] <= band["p25"] <= band["p50"] <= band["p75"] <= band["p95"]
+    shortfall = [band["shortfall_probability"] for band in result["bands"]]
+    assert shortfall == sorted(shortfall)
+    assert result["shortfall_probability"] == shortfall[-1]
+    assert result["shortfall_probability_90d"] == shortfall[2]
+
+
+def test_constant_history_is_deterministic():
+    result = simulate_cash_flow({JAN: 100.0, JAN + 1: 100.0}, {JAN: 150.0, JAN + 1: 150.0}, 120.0,
+                                months=4, paths=100, method="bootstrap", seed=0)
+    assert [band["p50"] for band in result["bands"]] == [70.0, 20.0, -30.0, -80.0]
+    assert result["shortfall_probability_90d"] == 1.0
+    assert result["expected_ending_cash"] == -80.0
+    assert result["avg_monthly_net_flow"] == -50.0
+
+
+def test_too_little_history():
+    result = simulate_cash_flow({JAN: 100.0}, {}, 0.0)
+    assert result["has_sufficient_data"] is False and result["bands"] == []
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"method": "garch"}, {"months": 0}, {"months": 1000}, {"paths": 0}, {"paths": SIMULATION_MAX_PATHS + 1}
+])
+def test_invalid_requests(kwargs):
+    with pytest.raises(ValueError):
+        simulate_cash_flow(CASH_IN, CASH_OUT, **kwargs)
+
+
+def test_scenarios_endpoint(client):
+    content = (
+        "Date,Description,Credit,Debit\n"
+        "2024-01-05,Client,1000,\n2024-01-20,Rent,,400\n"
+        "2024-02-05,Client,900,\n2024-02-20,Rent,,1200\n"
+    )
+    client.post("/upload/financials", files={"file": ("b.csv", content, "text/csv")}, data={"type": "bank"})
+
+    body = client.get("/api/forecast/scenarios", params={"months": 3, "paths": 1000, "seed": 1}).json()
+    assert body["has_sufficient_data"] and body["months_of_history"] == 2
+    assert body["starting_cash"] == 300.0
+    assert client.get("/api/forecast/scenarios", params={"paths": 0}).status_code == 400
@@ -0,0 +1,91 @@
+"""
+Columnar store: parsed rows kept as Parquet / Arrow files and read back into frames
+"""
+
+import numpy as np
+import pytest
+
+import backend.services.columnar_store as columnar_store
+from backend.services.columnar_store import write_parsed_data, read_parsed_data, hydrate_uploads
+from backend.services.transaction_frame import TransactionFrame
+
+
+ROWS = [
+    {"date": "2024-01-05", "amount": 1000.0, "direction": "credit", "status": "Paid", "description": "Client", "duplicate": False},
+    {"date": "2024-01-10", "amount": 400.0, "direction": "debit", "status": None, "description": "Rent", "duplicate": True},
+    {"date": None, "amount": None, "direction": "debit", "status": "PENDING", "description": None, "duplicate": False},
+    {"date": "05/02/2024", "amount": 25.5, "direction": None, "status": "paid", "description": "Fee", "duplicate": None},
+]
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(columnar_store, "PARSED_DATA_STORE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def frame_fields(frame):
+    return {
+        "amount": frame.amount.tolist(),
+        "date": [str(d) for d in frame.date],
+        "direction": frame.direction.tolist(),
+        "status": [frame.status_labels[s] for s in frame.status],
+        "row": frame.row.tolist(),
+        "upload": frame.upload.tolist(),
+        "description": frame.description.tolist(),
+    }
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_round_trip(fmt):
+    ref = write_parsed_data("user-1", ROWS, fmt)
+    assert ref.startswith(f"{fmt}:user-1/")
+    assert read_parsed_data(ref) == ROWS
+    assert read_parsed_data(ref, ["date", "amount"]) == [{"date": r["date"], "amount": r["amount"]} for r in ROWS]
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_frame_from_arrow_columns_matches_frame_from_rows(fmt):
+    inline = {"id": "a", "file_type": "bank", "filename": "a.csv", "parsed_data": ROWS}
+    stored = {"id": "b", "file_type": "sales", "filename": "b.csv", "parsed_data": [],
+              "parsed_data_ref": write_parsed_data("user-1", ROWS, fmt)}
+
+    hydrate_uploads([stored], as_table=True)
+    assert stored["parsed_data"] == [] and stored["parsed_table"].num_rows == 4
+
+    from_rows = TransactionFrame.from_uploads([inline, {**inline, "id": "b", "file_type": "sales"}])
+    from_table = TransactionFrame.from_uploads([inline, stored])
+    assert frame_fields(from_table) == frame_fields(from_rows)
+    assert from_table.file_type.tolist() == [0, 0, 0, 1, 1, 1]
+    # The duplicate-flagged rent row is left out and row positions still point into the upload
+    assert from_table.row.tolist() == [0, 2, 3, 0, 2, 3]
+    assert np.isnat(from_table.date[1])
+    assert str(from_table.date[2]) == "2024-02-05"
+
+
+def test_unreadable_file_falls_back_to_inline_rows(store, caplog):
+    ref = write_parsed_data("user-1", ROWS, "parquet")
+    columnar_store.ref_path(ref).unlink()
+    uploads = [
+        {"id": "a", "parsed_data_ref": ref, "parsed_data": None},
+        {"id": "b", "parsed_data_ref": "parquet:user-1/missing.parquet", "parsed_data": ROWS},
+    ]
+
+    hydrate_uploads(uploads, as_table=True)
+
+    assert uploads[0]["parsed_data"] == [] and "parsed_table" not in uploads[0]
+    assert uploads[1]["parsed_data"] == ROWS
+    assert f"Failed to load parsed data {ref} of upload a" in caplog.text
+
+
+def test_uploads_stored_columnar_feed_the_transaction_index(client, db, monkeypatch):
+    monkeypatch.setattr(columnar_store, "PARSED_DATA_FORMAT", "arrow")
+    csv = "Date,Description,Credit,Debit\n2024-01-05,Client,1000,\n2024-01-10,Rent,,400\n"
+    assert client.post("/upload/financials", files={"file": ("a.csv", csv, "text/csv")}, data={"type": "bank"}).status_code == 200
+
+    upload = db.rows("financial_uploads")[0]
+    assert upload["parsed_data"] == [] and upload["parsed_data_ref"].startswith("arrow:")
+    page = client.get("/api/transactions").json()
+    assert [(t["date"], t["amount"], t["direction"]) for t in page["transactions"]] == [
+        ("2024-01-10", 400.0, "debit"), ("2024-01-05", 1000.0, "credit")
+    ]
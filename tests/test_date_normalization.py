@@ -0,0 +1,57 @@
+"""
+Upload-level date format detection and ISO date storage
+"""
+
+import numpy as np
+import pandas as pd
+
+from backend.services.financial_analysis import (
+    detect_date_format, normalize_dates, parse_financial_file, process_financial_stream
+)
+from backend.services.transaction_frame import parse_date, parse_dates
+
+
+def dates_of(text, upload_type="sales", **kwargs):
+    if kwargs:
+        result = process_financial_stream(text.encode(), "ledger.csv", upload_type, **kwargs)
+    else:
+        result = parse_financial_file(text.encode(), "ledger.csv", upload_type)
+    return [row["date"] for row in result["parsed_data"]]
+
+
+def test_one_day_above_twelve_settles_month_first_for_the_column():
+    column = pd.Series(["03/04/2024", "05/06/2024", "01/13/2024"])
+    assert detect_date_format(column) == "%m/%d/%Y"
+    assert normalize_dates(column, "%m/%d/%Y").tolist() == ["2024-03-04", "2024-05-06", "2024-01-13"]
+
+
+def test_ambiguous_column_keeps_day_first():
+    column = pd.Series(["03/04/2024", "05/06/2024", None])
+    assert detect_date_format(column) == "%d/%m/%Y"
+    assert normalize_dates(column, "%d/%m/%Y").tolist() == ["2024-04-03", "2024-06-05", None]
+
+
+def test_ingest_stores_iso_dates():
+    text = "Date,Amount\n03/04/2024,10\n01/13/2024,20\n2024-02-01 10:30,5\nnot a date,1\n"
+    assert dates_of(text) == ["2024-03-04", "2024-01-13", "2024-02-01", "not a date"]
+
+
+def test_streaming_detects_the_format_from_the_first_chunk():
+    text = "Date,Amount\n13/01/2024,10\n02/03/2024,20\n04/05/2024,30\n"
+    assert dates_of(text, chunk_rows=1) == ["2024-01-13", "2024-03-02", "2024-05-04"]
+    assert dates_of(text, chunk_rows=1) == dates_of(text)
+
+
+def test_excel_datetimes_are_formatted_directly():
+    column = pd.Series(pd.to_datetime(["2024-01-05", None]))
+    assert detect_date_format(column) is None
+    assert normalize_dates(column, None).tolist() == ["2024-01-05", None]
+
+
+def test_stored_iso_and_legacy_dates_parse_the_same():
+    values = ["2024-01-13", "13/01/2024", "2024/01/13", None, "garbage", "2024-02-30"]
+    parsed = parse_dates(values)
+    assert (parsed[:3] == np.datetime64("2024-01-13", "D")).all()
+    assert np.isnat(parsed[3:]).all()
+    assert [parse_date(v) for v in values[:3]] == [np.datetime64("2024-01-13", "D")] * 3
+    assert parse_date("2024-02-30") is None
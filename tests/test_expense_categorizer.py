@@ -0,0 +1,73 @@
+"""
+Expense categorization: compiled keyword rules with per-user, prioritized overrides
+"""
+
+from backend.services.bookkeeping_service import categorize_expense
+from backend.services.expense_categorizer import (
+    ExpenseCategorizer, get_categorizer, rules_from_rows, DEFAULT_CATEGORY, DEFAULT_CATEGORY_KEYWORDS
+)
+
+
+def reference_category(description):
+    """The keyword scan the compiled matcher replaces: first category with any keyword in the text."""
+    text = (description or '').lower()
+    for category, keywords in DEFAULT_CATEGORY_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            return category
+    return DEFAULT_CATEGORY
+
+
+DESCRIPTIONS = [
+    "Monthly office rent", "Staff salary March", "Bank charges and GST", "Diesel for van",
+    "Printer paper", "Legal advisory fee", "Unknown payee", "", None, "SERVICE TAX", "gasket repair",
+]
+
+
+def test_builtin_rules_match_the_keyword_scan():
+    for description in DESCRIPTIONS:
+        assert categorize_expense(description) == reference_category(description), description
+
+
+def test_batch_matches_one_by_one():
+    categorizer = get_categorizer()
+    batch = categorizer.categorize_many(DESCRIPTIONS)
+    assert list(batch) == [categorizer.categorize(d) for d in DESCRIPTIONS]
+    assert len(categorizer.categorize_many([])) == 0
+
+
+def test_user_rules_override_builtins_by_priority():
+    rules = rules_from_rows([
+        {"keyword": " Rent ", "category": "Premises"},
+        {"keyword": "office", "category": "Workspace", "priority": 5},
+        {"keyword": "", "category": "Ignored"},
+    ])
+    assert rules == ((0, "Premises", "rent"), (5, "Workspace", "office"))
+
+    categorizer = get_categorizer(rules)
+    assert categorizer.categorize("Office rent") == "Premises"
+    assert categorizer.categorize("Office chairs") == "Workspace"
+    assert categorizer.categorize("Payroll") == "Salary & Wages"
+
+
+def test_lower_priority_wins_wherever_the_keyword_is():
+    categorizer = ExpenseCategorizer([(2, "Late", "abc"), (1, "Early", "bcd")])
+    assert categorizer.categorize("xabcd") == "Early"
+    assert categorizer.categorize("xabc") == "Late"
+
+
+def test_compiled_once_per_rule_set():
+    rules = ((0, "Premises", "rent"),)
+    assert get_categorizer(rules) is get_categorizer(list(rules))
+    assert get_categorizer(rules) is not get_categorizer()
+
+
+def test_new_rule_recategorizes_stored_rollups(client, db):
+    content = "Date,Description,Amount\n2024-01-05,Office rent,500\n"
+    client.post("/upload/financials", files={"file": ("p.csv", content, "text/csv")}, data={"type": "purchase"})
+    assert {r["subcategory"] for r in db.rows("monthly_rollups")} == {"Rent & Utilities"}
+
+    rule = client.post("/api/expense-rules", json={"keyword": "office", "category": "Workspace"}).json()
+    assert {r["subcategory"] for r in db.rows("monthly_rollups")} == {"Workspace"}
+
+    client.delete(f"/api/expense-rules/{rule['id']}")
+    assert {r["subcategory"] for r in db.rows("monthly_rollups")} == {"Rent & Utilities"}
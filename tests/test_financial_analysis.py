@@ -0,0 +1,162 @@
+"""
+Columnar parsing of uploads: column mapping, amount signs and Dr/Cr suffixes per layout
+"""
+
+import pandas as pd
+import pytest
+
+from backend.services.financial_analysis import (
+    analyze_column_mapping,
+    normalize_amounts,
+    parse_financial_file,
+    parse_with_mapping,
+    process_financial_stream,
+)
+
+
+def parse_csv(text: str, upload_type: str = "bank"):
+    return parse_financial_file(text.encode(), "statement.csv", upload_type)
+
+
+def test_normalize_amounts_formats():
+    amounts, failed = normalize_amounts(pd.Series(
+        ["1,00,000", "500.00 Dr", "(200)", "300 Cr", "1200-", "Rs. 2.5L", "abc", "", "-"], dtype=object
+    ))
+    assert amounts.tolist() == [100000.0, -500.0, -200.0, 300.0, -1200.0, 250000.0, 0.0, 0.0, 0.0]
+    assert failed.tolist() == [False] * 6 + [True, False, False]
+
+
+def test_credit_debit_columns_use_magnitudes():
+    result = parse_csv(
+        "Date,Description,Credit,Debit\n"
+        "2024-01-01,Client,1000,\n"
+        "2024-01-02,Rent,,500.00 Dr\n"
+        "2024-01-03,Fees,,(200)\n"
+        "2024-01-04,Refund,(50),\n"
+    )
+    rows = result["parsed_data"]
+    assert [(r["amount"], r["direction"]) for r in rows] == [
+        (1000.0, "credit"), (500.0, "debit"), (200.0, "debit"), (50.0, "credit")
+    ]
+    assert result["metrics"] == {"cash_inflow": 1050.0, "cash_outflow": 700.0}
+    assert result["amount_parse_errors"]["count"] == 0
+
+
+def test_credit_debit_columns_report_rejected_values():
+    result = parse_csv(
+        "Date,Credit,Debit\n"
+        "2024-01-01,1000,250\n"
+        "2024-01-02,,oops\n"
+        "2024-01-03,,100\n"
+    )
+    assert [(r["amount"], r["direction"]) for r in result["parsed_data"]] == [
+        (1000.0, "credit"), (100.0, "debit")
+    ]
+    errors = result["amount_parse_errors"]
+    assert errors["count"] == 2
+    assert [row["row"] for row in errors["rows"]] == [1, 2]
+
+
+def test_debit_only_column_is_never_negative():
+    result = parse_csv(
+        "Date,Description,Debit\n"
+        "2024-01-01,Rent,500.00 Dr\n"
+        "2024-01-02,Fees,(200)\n"
+        "2024-01-03,Salary,-300\n",
+        upload_type="purchase"
+    )
+    assert [(r["amount"], r["direction"]) for r in result["parsed_data"]] == [
+        (500.0, "debit"), (200.0, "debit"), (300.0, "debit")
+    ]
+    assert result["metrics"]["total_expenses"] == 1000.0
+
+
+def test_amount_with_type_column_uses_type_for_direction():
+    result = parse_csv(
+        "Date,Amount,Type\n"
+        "2024-01-01,500 Dr,Debit\n"
+        "2024-01-02,(200),DR\n"
+        "2024-01-03,1000 Cr,Credit\n"
+        "2024-01-04,(75),Credit\n"
+    )
+    assert [(r["amount"], r["direction"]) for r in result["parsed_data"]] == [
+        (500.0, "debit"), (200.0, "debit"), (1000.0, "credit"), (75.0, "credit")
+    ]
+    assert result["metrics"] == {"cash_inflow": 1075.0, "cash_outflow": 700.0}
+
+
+def test_signed_amount_column_gives_direction():
+    result = parse_csv(
+        "Date,Amount\n"
+        "2024-01-01,500 Dr\n"
+        "2024-01-02,(200)\n"
+        "2024-01-03,1000 Cr\n"
+        "2024-01-04,0\n"
+    )
+    assert [(r["amount"], r["direction"]) for r in result["parsed_data"]] == [
+        (500.0, "debit"), (200.0, "debit"), (1000.0, "credit")
+    ]
+    assert result["metrics"] == {"cash_inflow": 1000.0, "cash_outflow": 700.0}
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 100])
+def test_stream_matches_whole_file_parse(chunk_rows):
+    text = (
+        "Date,Credit,Debit\n"
+        "2024-01-01,1000,\n"
+        "2024-01-02,,500.00 Dr\n"
+        "2024-01-03,,(200)\n"
+        "2024-01-04,x,\n"
+    )
+    whole = parse_csv(text)
+    streamed = process_financial_stream(text.encode(), "statement.csv", "bank", chunk_rows=chunk_rows)
+    assert streamed["parsed_data"] == whole["parsed_data"]
+    assert streamed["metrics"] == whole["metrics"]
+    assert streamed["amount_parse_errors"]["count"] == whole["amount_parse_errors"]["count"] == 1
+
+
+def test_parse_with_mapping_resolves_every_field_per_row():
+    df = pd.DataFrame({
+        "Txn Date": ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"],
+        "Narration": ["Invoice 1", None, "Invoice 3", "Zero"],
+        "Amount": ["1,200", "300", "450.50", "0"],
+        "Type": ["Credit", "Debit", "Cr", "Credit"],
+        "Status": ["Paid", "Pending", "OVERDUE", "paid"],
+    })
+    mapping = analyze_column_mapping(df)["mapping"]
+
+    rows = parse_with_mapping(df, mapping, "sales")
+
+    assert rows == [
+        {"date": "2024-01-01", "amount": 1200.0, "direction": "credit", "status": "paid", "description": "Invoice 1"},
+        {"date": "2024-01-02", "amount": 300.0, "direction": "debit", "status": "unpaid", "description": ""},
+        {"date": "2024-01-03", "amount": 450.5, "direction": "credit", "status": "unpaid", "description": "Invoice 3"},
+    ]
+
+
+def test_credit_debit_columns_take_precedence_over_amount():
+    df = pd.DataFrame({
+        "Date": ["2024-01-01", "2024-01-02"],
+        "Amount": [999, 999],
+        "Credit": [100, None],
+        "Debit": [None, 40],
+    })
+    rows = parse_with_mapping(df, analyze_column_mapping(df)["mapping"], "bank")
+    assert [(r["amount"], r["direction"]) for r in rows] == [(100.0, "credit"), (40.0, "debit")]
+
+
+@pytest.mark.parametrize("column, directions", [
+    ("Status", ["credit", "debit"]),
+    # A blank type is not a debit, as with the per-row parse
+    ("Type", ["credit", "credit"]),
+])
+def test_blank_status_and_type_columns(column, directions):
+    result = parse_csv(f"Date,Amount,{column},Narration\n2024-01-05,100,,rent\n2024-01-06,-50,,salary\n")
+    rows = result["parsed_data"]
+    assert [(r["direction"], r["status"]) for r in rows] == [(d, "paid") for d in directions]
+    assert [r["description"] for r in rows] == ["rent", "salary"]
+
+
+def test_missing_required_columns_are_rejected():
+    with pytest.raises(ValueError, match="Missing required fields for bank"):
+        parse_csv("Description,Notes\nx,y\n")
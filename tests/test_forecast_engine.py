@@ -0,0 +1,98 @@
+"""
+Forecast engine: deterministic models over many users' series in one batch call
+"""
+
+import pytest
+
+from backend.services.forecast_engine import forecast_batch, period_label, stack_series
+from backend.services.forecasting_service import project_forecast
+from backend.services.transaction_frame import month_index
+
+
+JAN = month_index("2024-01")
+
+# Jan-Apr 2024, with nothing in February
+ALICE = {
+    "revenue": {JAN: 100.0, JAN + 2: 200.0, JAN + 3: 400.0},
+    "expenses": {JAN: 50.0, JAN + 3: 80.0},
+}
+BOB = {"revenue": {JAN + i: float(10 * (i + 1)) for i in range(14)}}
+
+
+def test_batch_equals_one_call_per_user():
+    for model in ("moving_average", "exponential_smoothing", "seasonal_naive"):
+        batch = forecast_batch({"alice": ALICE, "bob": BOB}, model, horizon=4)
+        assert batch["alice"] == forecast_batch({"alice": ALICE}, model, horizon=4)["alice"]
+        assert batch["bob"] == forecast_batch({"bob": BOB}, model, horizon=4)["bob"]
+
+
+def test_missing_periods_are_skipped_and_shared_across_metrics():
+    result = forecast_batch({"alice": ALICE}, "moving_average", horizon=2)["alice"]
+    assert result["start_period"] == JAN + 4
+    # Last three periods with data: Jan, Mar, Apr; expenses count Mar as an observed 0
+    assert result["forecast"]["revenue"] == [700.0 / 3] * 2
+    assert result["forecast"]["expenses"] == pytest.approx([130.0 / 3] * 2)
+
+
+def test_exponential_smoothing_level():
+    result = forecast_batch({"alice": ALICE}, "exponential_smoothing", horizon=1, alpha=0.5)["alice"]
+    level = 100.0
+    for x in (200.0, 400.0):
+        level = 0.5 * x + 0.5 * level
+    assert result["forecast"]["revenue"] == [level]
+
+
+def test_seasonal_naive_repeats_last_year_and_falls_back_to_the_average():
+    result = forecast_batch({"bob": BOB}, "seasonal_naive", horizon=3)["bob"]
+    # Data ends Feb 2025: Mar and Apr 2025 repeat Mar and Apr 2024 (30, 40)
+    assert result["forecast"]["revenue"][:2] == [30.0, 40.0]
+
+    short = forecast_batch({"alice": ALICE}, "seasonal_naive", horizon=1)["alice"]
+    assert short["forecast"]["revenue"] == [700.0 / 3]
+
+
+def test_backtest_holds_out_the_latest_periods():
+    result = forecast_batch({"bob": BOB}, "moving_average", horizon=2, evaluate=True)["bob"]
+    # Trained through Dec 2024 (100, 110, 120 -> 110), tested on 130 and 140
+    assert result["backtest_mae"]["revenue"] == pytest.approx(25.0)
+
+    alone = forecast_batch({"carol": {"revenue": {JAN: 1.0}}}, evaluate=True)["carol"]
+    assert alone["backtest_mae"]["revenue"] is None
+
+
+def test_users_without_data():
+    result = forecast_batch({"dave": {"revenue": {}}}, horizon=2)["dave"]
+    assert result == {"start_period": None, "forecast": {"revenue": [None, None]}}
+    assert stack_series([])[1].shape == (0, 0)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"model": "arima"}, {"granularity": "day"}, {"horizon": 0}, {"horizon": 10_000}
+])
+def test_invalid_requests(kwargs):
+    with pytest.raises(ValueError):
+        forecast_batch({"alice": ALICE}, **kwargs)
+
+
+def test_week_labels_are_mondays():
+    assert period_label(0, "week") == "1969-12-29"
+    assert period_label(JAN, "month") == "Jan 2024"
+
+
+def test_three_month_forecast_averages_the_latest_months():
+    series = {"revenue": ALICE["revenue"], "expenses": ALICE["expenses"], "cash_in": {}, "cash_out": {}}
+    forecast = project_forecast(series, {})
+    assert forecast["data_months_used"] == 3 and len(forecast["monthly_projections"]) == 3
+    assert forecast["summary"]["avg_monthly_revenue"] == round(700.0 / 3, 2)
+    assert forecast["summary"]["avg_monthly_expenses"] == round(130.0 / 3, 2)
+
+
+def test_forecast_endpoint(client):
+    content = "Date,Amount\n2024-01-05,100\n2024-02-05,200\n2024-03-05,300\n"
+    client.post("/upload/financials", files={"file": ("s.csv", content, "text/csv")}, data={"type": "sales"})
+
+    body = client.get("/api/forecast", params={"horizon": 2}).json()
+    assert [p["period"] for p in body["projections"]] == ["Apr 2024", "May 2024"]
+    assert body["projections"][0]["projected_revenue"] == 200.0
+    assert client.get("/api/forecast", params={"horizon": 0}).status_code == 400
+    assert client.get("/api/forecast/3month").json()["has_sufficient_data"]
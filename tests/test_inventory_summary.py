@@ -0,0 +1,77 @@
+"""
+Inventory summary: uploads combined per SKU, latest stock count or summed, with top items by value
+"""
+
+import pytest
+
+from backend.services.inventory_loan_service import (
+    aggregate_inventory, get_inventory_summary, process_inventory_data
+)
+
+
+JANUARY = [
+    {"SKU": "A-1", "Item Name": "Bolts", "Quantity": 100, "Unit Value": 2},
+    {"SKU": "B-2", "Item Name": "Nuts", "Quantity": 50, "Unit Value": 1},
+    {"SKU": "C-3", "Item Name": "Gears", "Quantity": 4, "Unit Value": 300},
+]
+FEBRUARY = [
+    {"sku": "a-1", "item_name": "Bolts (zinc)", "quantity": 60, "unit_value": 2},
+    {"sku": "A-1", "item_name": "Bolts (zinc)", "quantity": 20, "unit_value": 2},
+    {"sku": "B-2", "item_name": "Nuts", "quantity": 10, "unit_value": 1},
+]
+
+
+def uploads(*snapshots):
+    return [{"file_type": "inventory", "filename": f"stock-{i}.csv", "parsed_data": rows}
+            for i, rows in enumerate(snapshots)]
+
+
+def test_latest_reports_only_the_newest_stock_count():
+    items = aggregate_inventory([JANUARY, FEBRUARY], "latest")
+    # C-3 is missing from February's count, so it is no longer in stock
+    assert items == {"a-1": ["Bolts (zinc)", 80.0, 160.0], "b-2": ["Nuts", 10.0, 10.0]}
+
+    summary = get_inventory_summary(uploads(JANUARY, FEBRUARY))
+    assert summary["total_items"] == 2 and summary["total_value"] == 170.0
+    assert summary["aggregation"] == "latest" and summary["snapshots"] == 2
+
+
+def test_empty_uploads_do_not_replace_the_stock_count():
+    assert aggregate_inventory([JANUARY, [], None], "latest") == aggregate_inventory([JANUARY], "latest")
+
+
+def test_sum_adds_every_upload_per_sku():
+    items = aggregate_inventory([JANUARY, FEBRUARY], "sum")
+    assert items["a-1"] == ["Bolts (zinc)", 180.0, 360.0]
+    assert items["c-3"] == ["Gears", 4.0, 1200.0]
+
+
+def test_items_without_sku_match_on_name():
+    first = [{"item_name": "Copper  Wire", "quantity": 3, "price": 10}]
+    second = [{"Item Name": "copper wire", "qty": 2, "price": 10}]
+    assert aggregate_inventory([first, second], "sum") == {"copper wire": ["copper wire", 5.0, 50.0]}
+
+
+def test_top_items_by_value_over_every_item():
+    rows = [{"sku": f"S{i}", "quantity": 1, "unit_value": i} for i in range(1, 31)]
+    summary = get_inventory_summary(uploads(rows))
+    assert [item["total_value"] for item in summary["top_items"]] == [float(v) for v in range(30, 20, -1)]
+    assert summary["total_items"] == 30 and summary["total_value"] == 465.0
+    assert len(process_inventory_data(rows)["items"]) == 30
+
+
+def test_unknown_aggregation():
+    with pytest.raises(ValueError):
+        aggregate_inventory([JANUARY], "max")
+
+
+def test_inventory_endpoint_overrides_the_aggregation(client, db, user_id):
+    for i, rows in enumerate((JANUARY, FEBRUARY)):
+        db.tables.setdefault("financial_uploads", []).append({
+            "id": f"inv-{i}", "user_id": user_id, "file_type": "inventory", "filename": f"stock-{i}.csv",
+            "processing_status": "completed", "parsed_data": rows, "created_at": db.now()
+        })
+
+    assert client.get("/api/inventory/summary").json()["total_value"] == 170.0
+    summed = client.get("/api/inventory/summary", params={"aggregation": "sum"}).json()
+    assert summed["total_value"] == 1620.0 and summed["aggregation"] == "sum"
@@ -0,0 +1,100 @@
+"""
+Loan amortization: closed-form schedules for every loan at once and the EMI burden
+"""
+
+import pytest
+
+from backend.services.loan_engine import build_loan_schedules, loan_arrays, LOAN_MAX_MONTHS
+from backend.services.transaction_frame import month_index
+
+
+JAN = month_index("2025-01")
+
+
+def step_schedule(principal, annual_rate, emi):
+    """Amortize one loan a month at a time."""
+    rate, balance, rows = annual_rate / 1200, principal, []
+    while balance > 0.005 and len(rows) < LOAN_MAX_MONTHS:
+        interest = balance * rate
+        payment = min(emi, balance + interest)
+        balance = balance + interest - payment
+        rows.append((payment, interest, payment - interest, max(balance, 0.0)))
+    return rows
+
+
+def test_schedule_matches_month_by_month_amortization():
+    loan = {"lender": "Bank A", "outstanding_amount": 100000, "monthly_emi": 8000, "interest_rate": 12}
+    result = build_loan_schedules([loan], start_month=JAN)
+    expected = step_schedule(100000, 12, 8000)
+
+    [schedule] = result["loans"]
+    assert schedule["payoff_months"] == len(expected) == 14
+    assert schedule["payoff_month"] == "Feb 2026"
+    for row, (payment, interest, principal, balance) in zip(schedule["schedule"], expected):
+        assert row["payment"] == pytest.approx(payment, abs=0.01)
+        assert row["interest"] == pytest.approx(interest, abs=0.01)
+        assert row["principal"] == pytest.approx(principal, abs=0.01)
+        assert row["balance"] == pytest.approx(balance, abs=0.01)
+    assert schedule["schedule"][-1]["balance"] == 0.0
+    assert schedule["total_interest"] == pytest.approx(sum(r[1] for r in expected), abs=0.01)
+
+
+def test_emi_and_tenure_derive_each_other():
+    terms = loan_arrays([
+        {"outstanding_amount": 120000, "interest_rate": 0, "tenure_months": 12},
+        {"outstanding_amount": 100000, "interest_rate": 12, "tenure_months": 24},
+        {"outstanding_amount": 50000, "interest_rate": 0, "monthly_emi": 7000},
+    ])
+    assert terms["emi"][0] == 10000.0
+    # Standard EMI formula: P r (1+r)^n / ((1+r)^n - 1)
+    assert terms["emi"][1] == pytest.approx(4707.35, abs=0.01)
+    assert list(terms["payoff"]) == [12.0, 24.0, 8.0]
+
+
+def test_loans_that_never_amortize():
+    loans = [
+        {"lender": "Interest only", "outstanding_amount": 100000, "monthly_emi": 1000, "interest_rate": 12},
+        {"lender": "No terms", "outstanding_amount": 5000},
+        {"lender": "Short", "outstanding_amount": 2000, "monthly_emi": 1000},
+    ]
+    result = build_loan_schedules(loans, months=6, start_month=JAN)
+    interest_only, no_terms, short = result["loans"]
+
+    assert not interest_only["amortizes"] and interest_only["payoff_months"] is None
+    assert len(interest_only["schedule"]) == 6
+    assert all(row["balance"] == 100000.0 for row in interest_only["schedule"])
+    assert not no_terms["scheduled"] and no_terms["schedule"] == []
+    assert len(short["schedule"]) == 2
+    assert [row["outstanding"] for row in result["combined"]][:3] == [101000.0, 100000.0, 100000.0]
+
+
+def test_combined_schedule_and_emi_burden():
+    loans = [
+        {"outstanding_amount": 3000, "monthly_emi": 1000},
+        {"outstanding_amount": 1000, "monthly_emi": 500},
+    ]
+    result = build_loan_schedules(loans, avg_monthly_outflow=5000, start_month=JAN)
+    assert result["months"] == 3 and result["total_monthly_emi"] == 1500.0
+    assert result["emi_burden_pct"] == 30.0
+    assert [row["payment"] for row in result["combined"]] == [1500.0, 1500.0, 1000.0]
+    assert [row["emi_burden_pct"] for row in result["combined"]] == [30.0, 30.0, 20.0]
+    assert [row["month"] for row in result["combined"]] == ["Jan 2025", "Feb 2025", "Mar 2025"]
+
+
+def test_no_loans_and_invalid_months():
+    assert build_loan_schedules([])["has_data"] is False
+    with pytest.raises(ValueError):
+        build_loan_schedules([{"outstanding_amount": 1, "monthly_emi": 1}], months=0)
+
+
+def test_loan_schedule_endpoint(client, db, user_id):
+    db.tables.setdefault("financial_uploads", []).append({
+        "id": "loans", "user_id": user_id, "file_type": "loan", "filename": "loans.csv",
+        "processing_status": "completed", "created_at": db.now(),
+        "parsed_data": [{"Lender": "Bank A", "Outstanding Amount": 3000, "EMI": 1000}]
+    })
+
+    body = client.get("/api/loans/schedule").json()
+    assert body["loan_count"] == 1 and body["months"] == 3
+    assert [row["outstanding"] for row in body["combined"]] == [2000.0, 1000.0, 0.0]
+    assert client.get("/api/loans/schedule", params={"months": 0}).status_code == 400
@@ -0,0 +1,81 @@
+"""
+financial_metrics: one running row per user, moved by each upload's delta
+"""
+
+import pytest
+
+import backend.main as main
+
+
+DELTA = {"total_revenue": 1000.0, "total_expenses": 400.0, "cash_inflow": 0.0,
+         "cash_outflow": 0.0, "total_receivables": 0.0, "total_payables": 0.0}
+
+
+def test_rpc_applies_the_delta_without_touching_the_table(db, user_id):
+    calls = []
+
+    def apply(db, p):
+        calls.append(p)
+        return [{"user_id": p["p_user_id"], **p["p_delta"]}]
+
+    db.functions["apply_metrics_delta"] = apply
+    result = main.apply_metrics_delta(user_id, "upload-1", DELTA)
+
+    assert len(calls) == 1 and calls[0]["p_upload_id"] == "upload-1"
+    assert result["total_revenue"] == 1000.0
+    assert not [call for call in db.calls if call[0] == "financial_metrics"]
+
+
+def test_fallback_adds_deltas_when_the_function_is_missing(db, user_id):
+    main.apply_metrics_delta(user_id, "upload-1", DELTA)
+    main.apply_metrics_delta(user_id, "upload-2", {**DELTA, "total_expenses": 100.0})
+    main.apply_metrics_delta(user_id, "upload-2", {k: -v for k, v in DELTA.items()})
+
+    [row] = db.rows("financial_metrics")
+    assert row["upload_id"] == "upload-2"
+    assert row["total_revenue"] == 1000.0 and row["total_expenses"] == 100.0
+    assert row["net_profit"] == 900.0 and row["profit_margin"] == 90.0
+
+
+def test_no_fallback_when_the_rpc_fails_otherwise(db, user_id):
+    def lost_response(db, p):
+        raise Exception("Server disconnected without sending a response")
+
+    db.functions["apply_metrics_delta"] = lost_response
+    with pytest.raises(Exception, match="Server disconnected"):
+        main.apply_metrics_delta(user_id, "upload-1", DELTA)
+    assert db.rows("financial_metrics") == []
+    assert not [call for call in db.calls if call[0] == "financial_metrics"]
+
+
+def test_uploads_fail_when_their_metrics_are_not_applied(client, db):
+    statement = "Date,Description,Credit,Debit\n2024-01-05,Client,1000,\n"
+    first = client.post("/upload/financials", files={"file": ("a.csv", statement, "text/csv")}, data={"type": "bank"})
+    rollups = [dict(r) for r in db.rows("monthly_rollups")]
+
+    def timeout(db, p):
+        raise Exception("canceling statement due to statement timeout")
+
+    db.functions["apply_metrics_delta"] = timeout
+    other = "Date,Description,Credit,Debit\n2024-02-05,Client,250,\n"
+    response = client.post("/upload/financials", files={"file": ("b.csv", other, "text/csv")}, data={"type": "bank"})
+    assert response.status_code == 500 and "statement timeout" in response.json()["detail"]
+
+    # Deleting retracts nothing until the metrics can be moved too
+    assert client.delete(f"/upload/{first.json()['upload_id']}").status_code == 500
+    assert first.json()["upload_id"] in {u["id"] for u in db.rows("financial_uploads")}
+    assert db.rows("monthly_rollups") == rollups
+
+
+def test_deleting_an_upload_retracts_its_metrics(client, db):
+    statement = "Date,Description,Credit,Debit\n2024-01-05,Client,1000,\n2024-01-10,Rent,,400\n"
+    other = "Date,Description,Credit,Debit\n2024-02-05,Client,250,\n"
+    first = client.post(
+        "/upload/financials", files={"file": ("a.csv", statement, "text/csv")}, data={"type": "bank"}
+    ).json()
+    client.post("/upload/financials", files={"file": ("b.csv", other, "text/csv")}, data={"type": "bank"})
+    assert db.rows("financial_metrics")[0]["cash_inflow"] == 1250.0
+
+    assert client.delete(f"/upload/{first['upload_id']}").status_code == 200
+    [row] = db.rows("financial_metrics")
+    assert row["cash_inflow"] == 250.0 and row["cash_outflow"] == 0.0
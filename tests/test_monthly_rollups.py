@@ -0,0 +1,93 @@
+"""
+Monthly rollups: per-user monthly totals added at ingest and retracted on delete
+"""
+
+from backend.services.monthly_rollups import (
+    rollup_delta, merge_rollups, apply_rollup_delta, fetch_rollups, ROLLUP_KEYS
+)
+
+
+UPLOADS = [
+    {"file_type": "purchase", "parsed_data": [
+        {"date": "2024-01-03", "amount": 100.0, "direction": "debit", "description": "Office rent"},
+        {"date": "2024-01-20", "amount": 50.0, "direction": "debit", "description": "Office rent"},
+        {"date": "2024-02-01", "amount": 30.0, "direction": "debit", "description": "Office rent", "duplicate": True},
+        {"date": None, "amount": 7.0, "direction": "debit", "description": "Office rent"},
+    ]},
+    {"file_type": "sales", "parsed_data": [
+        {"date": "2024-01-09", "amount": 500.0, "direction": "credit", "description": "Invoice"},
+    ]},
+]
+
+
+def by_key(rows):
+    return {tuple(r[k] for k in ("month", "file_type")): (r["amount"], r["transaction_count"]) for r in rows}
+
+
+def test_delta_groups_by_month_and_skips_duplicates():
+    delta = rollup_delta(UPLOADS)
+    assert by_key(delta) == {
+        ("2024-01", "purchase"): (150.0, 2),
+        ("", "purchase"): (7.0, 1),
+        ("2024-01", "sales"): (500.0, 1),
+    }
+    assert {r["direction"] for r in delta} == {"debit", "credit"}
+
+
+def test_merge_sums_rows_with_the_same_key():
+    first, second = rollup_delta(UPLOADS[:1]), rollup_delta(UPLOADS)
+    merged = by_key(merge_rollups(first, second))
+    assert merged[("2024-01", "purchase")] == (300.0, 4)
+    assert merged[("2024-01", "sales")] == (500.0, 1)
+
+
+def test_rpc_applies_the_delta_in_one_call(db, user_id):
+    calls = []
+    db.functions["apply_monthly_rollup_delta"] = lambda db, p: calls.append(p)
+    apply_rollup_delta(user_id, rollup_delta(UPLOADS), sign=-1)
+    assert len(calls) == 1 and calls[0]["p_sign"] == -1
+    assert ("monthly_rollups", "upsert") not in db.calls
+
+
+def test_fallback_only_when_the_function_is_missing(db, user_id):
+    def lost_response(db, p):
+        raise Exception("Server disconnected without sending a response")
+
+    db.functions["apply_monthly_rollup_delta"] = lost_response
+    apply_rollup_delta(user_id, rollup_delta(UPLOADS))
+    assert db.rows("monthly_rollups") == []
+
+    del db.functions["apply_monthly_rollup_delta"]
+    apply_rollup_delta(user_id, rollup_delta(UPLOADS))
+    apply_rollup_delta(user_id, rollup_delta(UPLOADS[:1]))
+    assert by_key(fetch_rollups(user_id))[("2024-01", "purchase")] == (300.0, 4)
+
+    apply_rollup_delta(user_id, rollup_delta(UPLOADS), sign=-1)
+    apply_rollup_delta(user_id, rollup_delta(UPLOADS[:1]), sign=-1)
+    assert fetch_rollups(user_id) == []
+
+
+def test_upload_adds_and_delete_retracts_rollups(client, db, user_id):
+    statement = "Date,Description,Credit,Debit\n2024-01-05,Client,1000,\n2024-02-10,Rent,,400\n"
+    body = client.post("/upload/financials", files={"file": ("a.csv", statement, "text/csv")}, data={"type": "bank"}).json()
+
+    rollups = fetch_rollups(user_id)
+    assert sorted((r["month"], r["direction"], r["amount"]) for r in rollups) == [
+        ("2024-01", "credit", 1000.0), ("2024-02", "debit", 400.0)
+    ]
+    assert all(set(ROLLUP_KEYS) <= set(r) for r in rollups)
+
+    client.delete(f"/upload/{body['upload_id']}")
+    assert fetch_rollups(user_id) == []
+
+
+def test_users_without_rollups_are_rebuilt_from_their_uploads(client, db, user_id):
+    db.tables["financial_uploads"] = [{
+        "id": "old", "user_id": user_id, "file_type": "sales", "filename": "s.csv",
+        "processing_status": "completed", "created_at": db.now(), "parsed_data": UPLOADS[1]["parsed_data"]
+    }]
+
+    summary = client.get("/api/bookkeeping/summary")
+
+    assert summary.status_code == 200
+    assert by_key(fetch_rollups(user_id)) == {("2024-01", "sales"): (500.0, 1)}
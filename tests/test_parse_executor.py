@@ -0,0 +1,76 @@
+"""
+Parse pool: bounded queue, timeouts that reclaim their worker, and interpreter support
+"""
+
+import asyncio
+
+import pytest
+
+import backend.services.parse_executor as parse_executor_module
+from backend.services.parse_executor import ParseExecutor, ParseQueueFull, ParseTimeout
+
+
+CSV = "Date,Description,Amount\n" + "".join(f"2024-01-{d % 28 + 1:02d},Row {d},{d}\n" for d in range(1, 2001))
+
+
+@pytest.fixture
+def statement(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text(CSV)
+    return str(path)
+
+
+def test_thread_mode_parses_inline(statement):
+    executor = ParseExecutor(workers=0)
+    result = asyncio.run(executor.parse(statement, "statement.csv", "bank"))
+    assert result["rows_parsed"] == 2000
+    assert executor.stats()["pending"] == 0
+
+
+def test_full_queue_rejects_new_jobs(statement):
+    executor = ParseExecutor(workers=0, max_queue=0)
+    with pytest.raises(ParseQueueFull):
+        asyncio.run(executor.parse(statement, "statement.csv", "bank"))
+
+
+@pytest.mark.parametrize("version, expected", [((3, 10, 13), {}), ((3, 11, 0), {"max_tasks_per_child": 5})])
+def test_max_tasks_per_child_only_on_supported_interpreters(monkeypatch, version, expected):
+    created = []
+
+    class RecordingPool:
+        def __init__(self, max_workers, mp_context, **options):
+            created.append(options)
+
+    monkeypatch.setattr(parse_executor_module, "ProcessPoolExecutor", RecordingPool)
+    monkeypatch.setattr(parse_executor_module.sys, "version_info", version)
+    ParseExecutor(workers=1, max_tasks_per_child=5)._get_pool()
+    assert created == [expected]
+
+
+def test_timeout_kills_the_worker_and_next_parse_gets_a_fresh_pool(statement):
+    executor = ParseExecutor(workers=1, timeout=60)
+
+    async def run():
+        with pytest.raises(ParseTimeout):
+            await executor.parse(statement, "statement.csv", "bank", timeout=0.01)
+        return await executor.parse(statement, "statement.csv", "bank")
+
+    try:
+        first_pool = executor._get_pool()
+        processes = []
+        original_adjust = first_pool._adjust_process_count
+
+        def record_processes():
+            original_adjust()
+            processes.extend(first_pool._processes.values())
+
+        first_pool._adjust_process_count = record_processes
+        result = asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+    assert result["rows_parsed"] == 2000
+    assert processes
+    for process in processes:
+        process.join(timeout=10)
+        assert not process.is_alive()
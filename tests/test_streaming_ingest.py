@@ -0,0 +1,125 @@
+"""
+Streamed uploads: rows go from the parse worker to the database one chunk at a time
+"""
+
+from backend.services.parse_executor import parse_upload_file
+from backend.services.upload_spool import RowSpool
+from backend.services.transaction_dedupe import HashOccurrences, transaction_hashes
+
+
+STATEMENT = (
+    "Date,Description,Credit,Debit\n"
+    + "".join(f"2024-{m:02d}-05,Client {m},{1000 + m},\n" for m in range(1, 13))
+    + "".join(f"2024-{m:02d}-10,Rent,,500\n" for m in range(1, 13))
+)
+
+
+def test_stream_parse_spools_rows_instead_of_returning_them(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text(STATEMENT)
+
+    result = parse_upload_file(str(path), "statement.csv", "bank", stream=True, chunk_rows=5)
+
+    assert "parsed_data" not in result
+    assert result["rows_parsed"] == 24
+    chunks = list(RowSpool(result["row_spool"]).chunks())
+    assert [len(c) for c in chunks] == [5, 5, 5, 5, 4]
+    whole = parse_upload_file(str(path), "statement.csv", "bank")
+    assert [row for chunk in chunks for row in chunk] == whole["parsed_data"]
+
+
+def test_hash_occurrences_number_repeats_across_chunks():
+    rows = [{"date": "2024-01-01", "amount": 10.0, "direction": "debit", "description": "fee"}] * 3 \
+        + [{"date": "2024-01-02", "amount": 5.0, "direction": "credit", "description": "x"}]
+    occurrences = HashOccurrences()
+    chunked = [h for start in (0, 2) for h in transaction_hashes(rows[start:start + 2], "bank", occurrences)]
+    assert chunked == transaction_hashes(rows, "bank").tolist()
+    assert len(set(chunked)) == 4
+
+
+def test_streamed_upload_matches_whole_file_upload(client, db, user_id):
+    streamed = client.post(
+        "/upload/financials",
+        files={"file": ("a.csv", STATEMENT, "text/csv")},
+        data={"type": "bank", "stream": "true", "chunk_rows": "5"}
+    )
+    assert streamed.status_code == 200, streamed.text
+    body = streamed.json()
+    assert body["rows_parsed"] == 24
+    assert body["metrics"] == {"cash_inflow": sum(1000 + m for m in range(1, 13)), "cash_outflow": 6000.0}
+
+    upload = next(r for r in db.rows("financial_uploads") if r["id"] == body["upload_id"])
+    assert upload["processing_status"] == "completed"
+    assert len(upload["parsed_data"]) == 24
+    assert len([t for t in db.rows("transactions") if t["upload_id"] == body["upload_id"]]) == 24
+    assert len(db.rows("transaction_hashes")) == 24
+    # One write per chunk, not one per upload
+    assert sum(1 for name, op in db.calls if name == "transactions" and op == "insert") == 5
+
+    metrics = db.rows("financial_metrics")[0]
+    assert metrics["cash_inflow"] == body["metrics"]["cash_inflow"]
+    rollups = [r for r in db.rows("monthly_rollups") if r["user_id"] == user_id]
+    assert sum(r["transaction_count"] for r in rollups) == 24
+
+
+def test_streamed_upload_dedupes_against_earlier_uploads(client, db):
+    first = "Date,Description,Credit,Debit\n2024-01-05,Client,1000,\n2024-01-10,Rent,,500\n"
+    assert client.post(
+        "/upload/financials", files={"file": ("a.csv", first, "text/csv")}, data={"type": "bank"}
+    ).status_code == 200
+
+    overlap = first + "2024-01-10,Rent,,500\n2024-02-05,Client,1000,\n"
+    body = client.post(
+        "/upload/financials",
+        files={"file": ("b.csv", overlap, "text/csv")},
+        data={"type": "bank", "stream": "true", "chunk_rows": "1"}
+    ).json()
+
+    # The second rent row is a genuine repeat within b.csv, so only the first two match a.csv
+    assert body["duplicate_rows"] == 2
+    assert body["rows_parsed"] == 2
+    assert body["metrics"] == {"cash_inflow": 1000.0, "cash_outflow": 500.0}
+
+
+def test_failed_streamed_ingest_leaves_nothing_behind(client, db, monkeypatch):
+    import backend.main as main
+
+    calls = {"n": 0}
+    original = main.write_transactions
+
+    def fail_second_chunk(*args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise RuntimeError("disk full")
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(main, "write_transactions", fail_second_chunk)
+    response = client.post(
+        "/upload/financials",
+        files={"file": ("a.csv", STATEMENT, "text/csv")},
+        data={"type": "bank", "stream": "true", "chunk_rows": "5"}
+    )
+    assert response.status_code == 500
+    upload = db.rows("financial_uploads")[0]
+    assert upload["processing_status"] == "failed"
+    assert db.rows("transactions") == []
+    assert db.rows("transaction_hashes") == []
+    assert db.rows("financial_metrics") == []
+
+
+def test_streamed_upload_writes_columnar_store_per_chunk(client, db, monkeypatch, tmp_path):
+    import backend.services.columnar_store as columnar_store
+
+    monkeypatch.setattr(columnar_store, "PARSED_DATA_FORMAT", "parquet")
+    monkeypatch.setattr(columnar_store, "PARSED_DATA_STORE_DIR", str(tmp_path))
+    body = client.post(
+        "/upload/financials",
+        files={"file": ("a.csv", STATEMENT, "text/csv")},
+        data={"type": "bank", "stream": "true", "chunk_rows": "7"}
+    ).json()
+
+    upload = db.rows("financial_uploads")[0]
+    assert upload["parsed_data"] == []
+    rows = columnar_store.read_parsed_data(upload["parsed_data_ref"])
+    assert len(rows) == body["rows_parsed"] == 24
+    assert columnar_store.pq.ParquetFile(columnar_store.ref_path(upload["parsed_data_ref"])).metadata.num_row_groups == 4
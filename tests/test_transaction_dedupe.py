@@ -0,0 +1,125 @@
+"""
+Dedupe of overlapping uploads: row hashes, flagged rows and readmission on delete
+"""
+
+import pytest
+
+import backend.services.columnar_store as columnar_store
+import backend.services.transaction_dedupe as transaction_dedupe
+from backend.services.columnar_store import read_parsed_data
+from backend.services.transaction_dedupe import transaction_hashes, rebuild_hash_index
+from backend.services.transaction_frame import TransactionFrame
+
+
+JAN = "Date,Description,Credit,Debit\n2024-01-05,Client,1000,\n2024-01-10,Rent,,400\n2024-01-10,Rent,,400\n"
+JAN_FEB = "Date,Description,Credit,Debit\n2024-01-10,Rent,,400\n2024-02-05,Client,700,\n"
+FEB_JAN = "Date,Description,Credit,Debit\n2024-02-05,Client,700,\n2024-01-10,Rent,,400\n"
+
+
+def upload(client, content, name, upload_type="bank"):
+    response = client.post("/upload/financials", files={"file": (name, content, "text/csv")}, data={"type": upload_type})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def stored(db, upload_id):
+    return next(r for r in db.rows("financial_uploads") if r["id"] == upload_id)
+
+
+def metrics(db):
+    row = db.rows("financial_metrics")[0]
+    return row["cash_inflow"], row["cash_outflow"]
+
+
+def test_hash_key_includes_the_upload_type_and_repeat_number():
+    rows = [{"date": "2024-01-05", "amount": 100.0, "direction": "credit", "description": ""}] * 2
+    bank, sales = transaction_hashes(rows, "bank"), transaction_hashes(rows, "sales")
+    assert len(set(bank.tolist())) == 2
+    assert not set(bank.tolist()) & set(sales.tolist())
+    # Dates and descriptions are normalized before hashing
+    same = [{"date": "05/01/2024", "amount": "100.001", "direction": "Credit", "description": "  "}]
+    assert transaction_hashes(same, "bank")[0] == bank[0]
+
+
+def test_sales_and_bank_rows_for_the_same_receipt_are_both_counted(client, db):
+    upload(client, "Date,Description,Credit,Debit\n2024-01-05,,1000,\n", "bank.csv")
+    body = upload(client, "Date,Description,Amount,Status\n2024-01-05,,1000,Paid\n", "sales.csv", "sales")
+    assert body["duplicate_rows"] == 0 and body["metrics"]["total_revenue"] == 1000.0
+
+
+def test_overlapping_rows_are_stored_flagged_and_hidden_in_drop_mode(client, db):
+    upload(client, JAN, "jan.csv")
+    body = upload(client, JAN_FEB, "jan_feb.csv")
+
+    # Only one of the two identical rent rows is in the second statement
+    assert (body["rows_parsed"], body["duplicate_rows"]) == (1, 1)
+    assert [row["description"] for row in body["parsed_data"]] == ["Client"]
+    assert [row.get("duplicate", False) for row in stored(db, body["upload_id"])["parsed_data"]] == [True, False]
+    assert metrics(db) == (1700.0, 800.0)
+
+
+def test_deleting_the_first_upload_readmits_the_rows_later_uploads_skipped(client, db, user_id):
+    jan = upload(client, JAN, "jan.csv")
+    jan_feb = upload(client, JAN_FEB, "jan_feb.csv")
+    also = upload(client, "Date,Description,Credit,Debit\n2024-01-10,Rent,,400\n", "rent.csv")
+    assert also["duplicate_rows"] == 1
+
+    response = client.delete(f"/upload/{jan['upload_id']}").json()
+
+    assert response["rows_readmitted"] == 1
+    # The oldest remaining upload takes the rent row back; the newest keeps it flagged
+    assert [row.get("duplicate", False) for row in stored(db, jan_feb["upload_id"])["parsed_data"]] == [False, False]
+    assert stored(db, also["upload_id"])["parsed_data"][0]["duplicate"] is True
+    assert metrics(db) == (700.0, 400.0)
+    assert sorted(t["amount"] for t in db.rows("transactions")) == [400.0, 700.0]
+    assert {h["upload_id"] for h in db.rows("transaction_hashes")} == {jan_feb["upload_id"]}
+    rollups = [r for r in db.rows("monthly_rollups") if r["user_id"] == user_id]
+    assert sum(r["transaction_count"] for r in rollups) == 2
+
+    # The readmitted row now blocks the same row arriving again
+    assert upload(client, "Date,Description,Credit,Debit\n2024-01-10,Rent,,400\n", "again.csv")["duplicate_rows"] == 1
+
+
+@pytest.mark.parametrize("stream", ["false", "true"])
+def test_columnar_uploads_keep_the_flag_when_the_first_row_is_new(client, db, monkeypatch, tmp_path, stream):
+    monkeypatch.setattr(columnar_store, "PARSED_DATA_FORMAT", "parquet")
+    monkeypatch.setattr(columnar_store, "PARSED_DATA_STORE_DIR", str(tmp_path))
+    jan = upload(client, JAN, "jan.csv")
+    response = client.post(
+        "/upload/financials",
+        files={"file": ("feb_jan.csv", FEB_JAN, "text/csv")},
+        data={"type": "bank", "stream": stream, "chunk_rows": "1"}
+    )
+    assert response.status_code == 200, response.text
+    feb = response.json()
+
+    ref = stored(db, feb["upload_id"])["parsed_data_ref"]
+    assert [row["duplicate"] for row in read_parsed_data(ref)] == [False, True]
+    frame = TransactionFrame.from_uploads(columnar_store.hydrate_uploads([stored(db, feb["upload_id"])], as_table=True))
+    assert frame.amount.tolist() == [700.0]
+
+    assert client.delete(f"/upload/{jan['upload_id']}").json()["rows_readmitted"] == 1
+    assert [row["duplicate"] for row in read_parsed_data(stored(db, feb["upload_id"])["parsed_data_ref"])] == [False, False]
+
+
+def test_flag_mode_returns_flagged_rows(client, db, monkeypatch):
+    monkeypatch.setattr(transaction_dedupe, "DEDUPE_MODE", "flag")
+    upload(client, JAN, "jan.csv")
+    body = upload(client, JAN_FEB, "jan_feb.csv")
+    assert body["rows_parsed"] == 2
+    assert [row["duplicate"] for row in body["parsed_data"]] == [True, False]
+
+
+def test_rebuild_hash_index_registers_counted_rows_only(db, user_id):
+    rows = [
+        {"date": "2024-01-05", "amount": 10.0, "direction": "credit", "description": "a"},
+        {"date": "2024-01-06", "amount": 20.0, "direction": "debit", "description": "b", "duplicate": True},
+    ]
+    db.tables["transaction_hashes"] = [{"user_id": user_id, "row_hash": 1, "upload_id": "old"}]
+
+    count = rebuild_hash_index(user_id, [("u1", "bank", rows), ("u2", "inventory", [{"sku": "x"}])])
+
+    assert count == 1
+    assert db.rows("transaction_hashes") == [
+        {"user_id": user_id, "row_hash": int(transaction_hashes(rows, "bank")[0]), "upload_id": "u1"}
+    ]
@@ -0,0 +1,76 @@
+"""
+TransactionFrame: the array-backed view of a user's uploads shared by analytics services
+"""
+
+import numpy as np
+
+from backend.services.transaction_frame import (
+    TransactionFrame, parse_dates, sum_by_month, first_nonzero, month_index, month_key, month_label
+)
+
+
+UPLOADS = [
+    {"id": "u1", "file_type": "bank", "filename": "jan.csv", "parsed_data": [
+        {"date": "2024-01-01", "amount": 100, "direction": "credit", "status": "", "description": "a"},
+        {"date": "2024-01-08", "amount": "50.5", "direction": "debit", "description": None},
+        "not a row",
+        {"date": "2024-01-09", "amount": 50.5, "direction": "debit", "duplicate": True},
+    ]},
+    {"id": "u2", "file_type": "sales", "filename": "sales.csv", "parsed_data": [
+        {"date": "31/01/2024", "amount": 300, "status": "Paid", "description": "inv 1"},
+        {"date": "garbage", "amount": "n/a", "status": "PENDING", "description": "inv 2"},
+    ]},
+    {"id": "u3", "file_type": "bank", "filename": "[INVENTORY] stock.csv", "parsed_data": [{"sku": "A", "quantity": 1}]},
+    {"id": "u4", "file_type": "purchase", "filename": "empty.csv", "parsed_data": []},
+]
+
+
+def test_rows_are_columns_with_their_upload_and_position():
+    frame = TransactionFrame.from_uploads(UPLOADS)
+
+    assert len(frame) == 4
+    assert frame.upload_ids == ["u1", "u2"] and frame.filenames == ["jan.csv", "sales.csv"]
+    assert frame.amount.tolist() == [100.0, 50.5, 300.0, 0.0]
+    assert frame.direction.tolist() == [1, -1, 0, 0]
+    assert frame.upload.tolist() == [0, 0, 1, 1]
+    assert frame.row.tolist() == [0, 1, 0, 1]
+    assert frame.description.tolist() == ["a", "", "inv 1", "inv 2"]
+    assert [str(d) for d in frame.date] == ["2024-01-01", "2024-01-08", "2024-01-31", "NaT"]
+    assert [u["id"] for u in frame.aux_uploads] == ["u3"]
+
+
+def test_masks_by_type_and_lower_cased_status():
+    frame = TransactionFrame.from_uploads(UPLOADS)
+
+    assert frame.type_mask("sales").tolist() == [False, False, True, True]
+    assert not frame.type_mask("inventory").any()
+    assert frame.status_mask({"paid"}).tolist() == [False, False, True, False]
+    assert frame.status_mask({"pending", ""}).tolist() == [True, True, False, True]
+
+
+def test_months_and_weeks_leave_undated_rows_at_minus_one():
+    frame = TransactionFrame.from_uploads(UPLOADS)
+
+    jan = month_index("2024-01")
+    assert frame.months().tolist() == [jan, jan, jan, -1]
+    weeks = frame.weeks()
+    # 2024-01-01 is a Monday, so the 8th starts the next week
+    assert weeks[1] - weeks[0] == 1 and weeks[3] == -1
+    assert np.array_equal(frame.periods("week"), weeks)
+    assert month_key(jan) == "2024-01" and month_label(jan) == "Jan 2024"
+
+
+def test_empty_input_gives_an_empty_frame():
+    frame = TransactionFrame.from_uploads([])
+    assert len(frame) == 0 and frame.date.dtype == np.dtype("datetime64[D]") and frame.status_labels == []
+
+
+def test_parse_dates_accepts_legacy_formats():
+    dates = parse_dates(["2024-03-05", "05-03-2024", "2024/03/05", "03/25/2024", None, "2024-03-05T10:00:00"])
+    assert [str(d) for d in dates] == ["2024-03-05", "2024-03-05", "2024-03-05", "2024-03-25", "NaT", "2024-03-05"]
+
+
+def test_sum_by_month_and_first_nonzero():
+    assert sum_by_month(np.array([5, 3, 5]), np.array([1.0, 2.0, 3.0])) == {3: 2.0, 5: 4.0}
+    assert sum_by_month(np.array([], dtype=np.int64), np.array([])) == {}
+    assert first_nonzero(np.array([0.0, 1.0, 0.0]), np.array([2.0, 5.0, 0.0]), np.array([3.0, 3.0, 3.0])).tolist() == [2.0, 1.0, 3.0]
@@ -0,0 +1,157 @@
+"""
+Paged transactions: keyset pages of the transactions table and the in-memory sorted index
+"""
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+import backend.main as main
+import backend.services.transaction_store as transaction_store
+from backend.services.transaction_frame import TransactionFrame
+from backend.services.transaction_index import (
+    TransactionIndex, page_stored_transactions, encode_cursor, transaction_index_cache, MAX_DAY
+)
+from backend.services.transaction_store import write_transactions, transaction_rows
+
+
+UPLOADS = [
+    {"id": "upload-b", "file_type": "bank", "parsed_data": [
+        {"date": "2024-01-05", "amount": 1000.0, "direction": "credit", "description": "Client"},
+        {"date": "2024-01-10", "amount": 400.0, "direction": "debit", "description": "Office rent"},
+        {"date": None, "amount": 3.0, "direction": "debit", "description": "Undated"},
+        {"date": "2024-01-10", "amount": 50.0, "direction": "debit", "description": "Bank fee"},
+        {"date": "2024-01-12", "amount": 9.0, "direction": "debit", "description": "Dup", "duplicate": True},
+    ]},
+    {"id": "upload-a", "file_type": "purchase", "parsed_data": [
+        {"date": "2024-01-10", "amount": 70.0, "direction": "debit", "description": "Printer paper"},
+        {"date": "2024-02-01", "amount": 30.0, "direction": "debit", "description": "Diesel"},
+    ]},
+]
+
+
+@pytest.fixture
+def sqlite_engine(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    transaction_store.transactions_table().metadata.create_all(engine)
+    monkeypatch.setattr(transaction_store, "_engine", engine)
+    return engine
+
+
+@pytest.fixture
+def stored(sqlite_engine, user_id):
+    for upload in UPLOADS:
+        write_transactions(user_id, upload["id"], upload["file_type"], upload["parsed_data"])
+    return TransactionIndex(TransactionFrame.from_uploads(UPLOADS))
+
+
+def all_pages(page, **kwargs):
+    """Follow next_cursor to the end; returns every page."""
+    pages = [page(limit=2, **kwargs)]
+    while pages[-1]["next_cursor"]:
+        pages.append(page(limit=2, cursor=pages[-1]["next_cursor"], **kwargs))
+    return pages
+
+
+def ids(pages):
+    return [t["id"] for p in pages for t in p["transactions"]]
+
+
+def test_index_orders_by_date_upload_and_row():
+    index = TransactionIndex(TransactionFrame.from_uploads(UPLOADS))
+    assert ids(all_pages(index.page, descending=False)) == [
+        "upload-b:0", "upload-a:0", "upload-b:1", "upload-b:3", "upload-a:1"
+    ]
+    assert ids(all_pages(index.page)) == ids(all_pages(index.page, descending=False))[::-1]
+
+
+def test_dates_beyond_the_key_range_are_left_out_without_overflow():
+    far = [{"id": "far", "file_type": "sales", "parsed_data": [
+        {"date": "9999-12-31", "amount": 1.0, "description": "far future"},
+        {"date": "0001-01-01", "amount": 2.0, "description": "far past"},
+        {"date": "2024-01-01", "amount": 3.0, "description": "today"},
+    ]}]
+    index = TransactionIndex(TransactionFrame.from_uploads(far))
+    assert len(index) == 1 and (np.diff(index.keys) >= 0).all()
+
+    assert index.page(date_to=np.datetime64("9999-12-31"))["transactions"][0]["amount"] == 3.0
+    assert index.page(date_from=np.datetime64("9999-01-01"))["transactions"] == []
+    assert index.page(cursor=encode_cursor("9999-12-31", "far", 0))["transactions"][0]["amount"] == 3.0
+    assert str(np.datetime64(MAX_DAY, "D")) > "2600-01-01"
+
+
+def test_stored_rows_keep_their_position_in_the_upload():
+    rows = transaction_rows("u", "upload-b", "bank", UPLOADS[0]["parsed_data"], first_row=100)
+    assert [r["row_index"] for r in rows] == [100, 101, 103]
+
+
+@pytest.mark.parametrize("descending", [True, False])
+def test_table_pages_match_the_index(stored, user_id, descending):
+    def from_table(**kwargs):
+        return page_stored_transactions(user_id, **kwargs)
+
+    table_pages = all_pages(from_table, descending=descending)
+    index_pages = all_pages(stored.page, descending=descending)
+    assert [p["transactions"] for p in table_pages] == [p["transactions"] for p in index_pages]
+    assert [p["next_cursor"] for p in table_pages] == [p["next_cursor"] for p in index_pages]
+
+
+@pytest.mark.parametrize("filters", [
+    {"category": "Expense"},
+    {"category": "rent & utilities"},
+    {"direction": "debit", "file_type": "bank"},
+    {"upload_id": "upload-a"},
+    {"date_from": np.datetime64("2024-01-10"), "date_to": np.datetime64("2024-01-31")},
+])
+def test_filtered_table_pages_match_the_index(stored, user_id, filters):
+    def from_table(**kwargs):
+        return page_stored_transactions(user_id, **kwargs)
+
+    assert ids(all_pages(from_table, **filters)) == ids(all_pages(stored.page, **filters))
+
+
+def test_cursor_of_a_deleted_upload_still_pages(stored, user_id):
+    cursor = encode_cursor("2024-01-10", "upload-aa", 0)
+    page = page_stored_transactions(user_id, cursor=cursor, limit=10)
+    assert [t["id"] for t in page["transactions"]] == ["upload-a:0", "upload-b:0"]
+    assert page["transactions"] == stored.page(cursor=cursor, limit=10)["transactions"]
+
+
+def test_rpc_receives_the_keyset(db, user_id):
+    calls = []
+
+    def transaction_page(db, p):
+        calls.append(p)
+        return [{"transaction_date": "2024-01-05", "upload_id": "upload-b", "row_index": 0, "description": "Client",
+                 "amount": 1000.0, "type": "credit", "file_type": "bank", "status": None}]
+
+    db.functions["transaction_page"] = transaction_page
+    page = page_stored_transactions(user_id, cursor=encode_cursor("2024-01-10", "upload-b", 1), limit=5)
+
+    assert calls[0]["p_after_date"] == "2024-01-10" and calls[0]["p_after_upload"] == "upload-b"
+    assert calls[0]["p_after_row"] == 1 and calls[0]["p_limit"] == 6 and calls[0]["p_descending"] is True
+    assert [t["id"] for t in page["transactions"]] == ["upload-b:0"] and not page["has_more"]
+
+
+def test_endpoint_pages_the_table_without_building_an_index(client, sqlite_engine, user_id):
+    statement = "Date,Description,Credit,Debit\n2024-01-05,Client,1000,\n2024-01-10,Rent,,400\n2024-01-11,Fee,,5\n"
+    client.post("/upload/financials", files={"file": ("a.csv", statement, "text/csv")}, data={"type": "bank"})
+
+    first = client.get("/api/transactions", params={"limit": 2}).json()
+    assert [t["date"] for t in first["transactions"]] == ["2024-01-11", "2024-01-10"]
+    rest = client.get("/api/transactions", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [t["amount"] for t in rest["transactions"]] == [1000.0] and not rest["has_more"]
+    assert transaction_index_cache.get(user_id) is None
+
+    assert client.get("/api/transactions", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_endpoint_uses_the_index_when_transactions_are_not_stored(client, db, user_id, monkeypatch):
+    monkeypatch.setattr(main, "STORE_TRANSACTIONS", False)
+    statement = "Date,Description,Credit,Debit\n2024-01-05,Client,1000,\n"
+    client.post("/upload/financials", files={"file": ("a.csv", statement, "text/csv")}, data={"type": "bank"})
+
+    page = client.get("/api/transactions").json()
+    assert page["total_indexed"] == 1
+    assert ("transaction_page", "rpc") not in db.calls
@@ -0,0 +1,124 @@
+"""
+Transactions table: one transactional write per upload, repair of failed writes, SQL aggregates
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+import backend.services.transaction_store as transaction_store
+from backend.services.transaction_store import (
+    store_transactions, write_transactions, repair_transactions, period_totals, monthly_totals
+)
+from backend.services.forecasting_service import series_from_period_totals, monthly_series
+from backend.services.transaction_frame import TransactionFrame, month_index
+
+
+ROWS = [
+    {"date": "2024-01-01", "amount": 100.0, "direction": "credit", "description": "a"},
+    {"date": "2024-01-03", "amount": 40.0, "direction": "debit", "description": "b"},
+    {"date": "2024-01-08", "amount": 60.0, "direction": "debit", "description": "c"},
+    {"date": None, "amount": 5.0, "direction": "debit", "description": "undated"},
+    {"date": "2024-02-01", "amount": 7.0, "direction": "debit", "description": "dup", "duplicate": True},
+]
+
+
+@pytest.fixture
+def sqlite_engine(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    transaction_store.transactions_table().metadata.create_all(engine)
+    monkeypatch.setattr(transaction_store, "_engine", engine)
+    return engine
+
+
+def upload_row(db, user_id, **fields):
+    row = {"id": "upload-1", "user_id": user_id, "file_type": "bank", "filename": "a.csv",
+           "processing_status": "completed", "parsed_data": ROWS, **fields}
+    db.tables.setdefault("financial_uploads", []).append(row)
+    return row
+
+
+def test_rows_are_written_in_one_rpc_call(db, user_id):
+    calls = []
+    db.functions["store_upload_transactions"] = lambda db, p: calls.append(p)
+
+    assert store_transactions(user_id, "upload-1", "bank", ROWS) == 3
+
+    assert len(calls) == 1 and calls[0]["p_upload_id"] == "upload-1" and not calls[0]["p_replace"]
+    assert [r["description"] for r in calls[0]["p_rows"]] == ["a", "b", "c"]
+    assert ("transactions", "insert") not in db.calls
+
+
+def test_rpc_errors_other_than_a_missing_function_are_not_retried(db, user_id):
+    def timeout(db, p):
+        raise Exception("canceling statement due to statement timeout")
+
+    db.functions["store_upload_transactions"] = timeout
+    upload = upload_row(db, user_id)
+
+    assert store_transactions(user_id, "upload-1", "bank", ROWS) == 0
+    assert ("transactions", "insert") not in db.calls
+    assert upload["transactions_status"] == "failed"
+
+
+def test_failed_batch_leaves_no_rows_and_marks_the_upload(db, user_id, monkeypatch):
+    monkeypatch.setattr(transaction_store, "TRANSACTION_INSERT_BATCH", 1)
+    db.unique["transactions"] = [["user_id", "amount"]]
+    upload = upload_row(db, user_id, parsed_data=ROWS + [{"date": "2024-01-09", "amount": 60.0, "description": "again"}])
+
+    assert store_transactions(user_id, "upload-1", "bank", upload["parsed_data"]) == 0
+    assert db.rows("transactions") == []
+    assert upload["transactions_status"] == "failed"
+
+    db.unique = {}
+    assert repair_transactions(user_id) == 1
+    assert [t["description"] for t in db.rows("transactions")] == ["a", "b", "c", "again"]
+    assert upload["transactions_status"] == "stored"
+    assert repair_transactions(user_id) == 0
+
+
+def test_sql_writes_replace_an_uploads_rows(sqlite_engine, user_id):
+    assert write_transactions(user_id, "upload-1", "bank", ROWS) == 3
+    assert write_transactions(user_id, "upload-1", "bank", ROWS[:2], replace=True) == 2
+
+    totals = {(t["month"], t["type"]): (t["amount"], t["count"]) for t in monthly_totals(user_id)}
+    assert totals == {("2024-01", "credit"): (100.0, 1), ("2024-01", "debit"): (40.0, 1)}
+
+
+def test_period_totals_by_week_and_month(sqlite_engine, user_id):
+    write_transactions(user_id, "upload-1", "bank", ROWS)
+    write_transactions(user_id, "upload-2", "sales", [{"date": "2024-01-07", "amount": 30.0, "description": "s"}])
+
+    weeks = period_totals(user_id, "week")
+    assert [(t["period"], t["file_type"], t["type"], t["amount"]) for t in weeks] == [
+        ("2024-01-01", "bank", "credit", 100.0),
+        ("2024-01-01", "bank", "debit", 40.0),
+        ("2024-01-01", "sales", "credit", 30.0),
+        ("2024-01-08", "bank", "debit", 60.0),
+    ]
+    series = series_from_period_totals(period_totals(user_id, "month"), "month")
+    jan = month_index("2024-01")
+    assert series == {"revenue": {jan: 30.0}, "expenses": {}, "cash_in": {jan: 100.0}, "cash_out": {jan: 100.0}}
+
+    # Week indexes line up with the ones the frame computes
+    frame = TransactionFrame.from_uploads([{"file_type": "sales", "parsed_data": [{"date": "2024-01-07", "amount": 30.0}]}])
+    assert series_from_period_totals(weeks, "week")["revenue"] == monthly_series(frame, "week")["revenue"]
+
+    with pytest.raises(ValueError):
+        period_totals(user_id, "day")
+
+
+def test_weekly_forecast_reads_database_aggregates(client, db, sqlite_engine, user_id, monkeypatch):
+    import backend.main as main
+
+    statement = "Date,Description,Credit,Debit\n" + "".join(
+        f"2024-01-{d:02d},Client,{100 + d},\n2024-01-{d:02d},Rent,,{50 + d}\n" for d in range(1, 29, 3)
+    )
+    assert client.post("/upload/financials", files={"file": ("a.csv", statement, "text/csv")}, data={"type": "bank"}).status_code == 200
+
+    monkeypatch.setattr(main, "fetch_user_uploads", lambda user_id: pytest.fail("parsed_data was scanned"))
+    body = client.get("/api/forecast", params={"granularity": "week", "horizon": 2}).json()
+
+    assert body["has_sufficient_data"] is True
+    assert body["granularity"] == "week" and len(body["projections"]) == 2
+    assert body["projections"][0]["projected_cash_inflow"] > body["projections"][0]["projected_cash_outflow"] > 0
@@ -0,0 +1,136 @@
+"""
+Repeated uploads: content fingerprints, Idempotency-Key and concurrent uploads of one file
+"""
+
+import hashlib
+
+import pytest
+
+import backend.main as main
+import backend.services.transaction_dedupe as transaction_dedupe
+from backend.services.upload_cache import upload_cache, upload_fingerprint
+
+
+STATEMENT = "Date,Description,Credit,Debit\n2024-01-05,Client,1000,\n2024-01-10,Rent,,400\n"
+
+
+def upload(client, content=STATEMENT, name="a.csv", upload_type="bank", **headers):
+    return client.post(
+        "/upload/financials", files={"file": (name, content, "text/csv")}, data={"type": upload_type}, headers=headers
+    )
+
+
+def live_uploads(db):
+    return [r for r in db.rows("financial_uploads") if r["processing_status"] != "failed"]
+
+
+def test_repeat_upload_returns_the_stored_result_once(client, db, user_id):
+    first = upload(client).json()
+    calls = len(db.calls)
+    again = upload(client, name="renamed.csv").json()
+
+    assert again["duplicate"] is True and again["upload_id"] == first["upload_id"]
+    assert again["metrics"] == first["metrics"] and again["rows_parsed"] == 2
+    assert again["parsed_data"] == []
+    assert len(db.rows("financial_uploads")) == 1
+    assert not [call for call in db.calls[calls:] if call[1] != "select"]
+    assert db.rows("financial_metrics")[0]["cash_inflow"] == 1000.0
+
+
+def test_cache_keeps_ids_and_metrics_but_not_rows(client, user_id):
+    body = upload(client).json()
+    assert body["parsed_data"]
+
+    fingerprint = upload_fingerprint(hashlib.sha256(STATEMENT.encode()).hexdigest(), "bank")
+    cached = upload_cache.get(user_id, fingerprint)
+    assert cached["upload_id"] == body["upload_id"] and cached["metrics"] == body["metrics"]
+    assert "parsed_data" not in cached
+
+
+def test_same_file_as_another_type_is_a_new_upload(client, db):
+    upload(client)
+    assert "duplicate" not in upload(client, upload_type="sales").json()
+    assert len(db.rows("financial_uploads")) == 2
+
+
+def test_idempotency_key_replays_and_rejects_other_files(client, db):
+    first = upload(client, **{"Idempotency-Key": "k1"}).json()
+    assert upload(client, **{"Idempotency-Key": "k1"}).json()["upload_id"] == first["upload_id"]
+
+    other = upload(client, STATEMENT + "2024-01-11,Fee,,5\n", **{"Idempotency-Key": "k1"})
+    assert other.status_code == 409
+
+
+def test_duplicate_response_leaves_out_rows_flagged_as_duplicates(client, db, user_id, monkeypatch):
+    monkeypatch.setattr(transaction_dedupe, "DEDUPE_MODE", "flag")
+    upload(client)
+    overlap = STATEMENT + "2024-02-05,Client,700,\n"
+    first = upload(client, overlap, name="b.csv").json()
+    assert first["duplicate_rows"] == 2 and first["metrics"] == {"cash_inflow": 700.0, "cash_outflow": 0.0}
+
+    upload_cache.discard_upload(user_id, first["upload_id"])
+    again = upload(client, overlap, name="b.csv").json()
+
+    assert again["duplicate"] is True
+    assert again["metrics"] == first["metrics"]
+    assert (again["rows_parsed"], again["duplicate_rows"]) == (3, 2)
+
+
+def test_failed_upload_can_be_retried(client, db, user_id):
+    fingerprint = upload_fingerprint(hashlib.sha256(STATEMENT.encode()).hexdigest(), "bank")
+    db.tables["financial_uploads"] = [{
+        "id": "failed-1", "user_id": user_id, "content_hash": fingerprint, "file_type": "bank",
+        "filename": "a.csv", "processing_status": "failed", "parsed_data": [], "created_at": db.now()
+    }]
+
+    body = upload(client).json()
+
+    assert "duplicate" not in body and body["upload_id"] != "failed-1"
+    assert len(live_uploads(db)) == 1
+
+
+@pytest.fixture
+def racing_upload(db, user_id, monkeypatch):
+    """Store a competing upload of the same file while this request is parsing."""
+    original = main.parse_spooled_upload
+
+    async def parse_then_lose_race(spooled, upload_type, *args):
+        result = await original(spooled, upload_type, *args)
+        db.tables["financial_uploads"].append({
+            "id": f"winner-{upload_type}", "user_id": user_id, "file_type": upload_type, "filename": spooled.filename,
+            "content_hash": upload_fingerprint(spooled.sha256, upload_type), "processing_status": "completed",
+            "parsed_data": result.get("parsed_data", []), "created_at": db.now()
+        })
+        return result
+
+    db.tables.setdefault("financial_uploads", [])
+    monkeypatch.setattr(main, "parse_spooled_upload", parse_then_lose_race)
+
+
+def test_concurrent_upload_of_the_same_file_is_counted_once(client, db, racing_upload, monkeypatch, tmp_path):
+    import backend.services.columnar_store as columnar_store
+    monkeypatch.setattr(columnar_store, "PARSED_DATA_FORMAT", "parquet")
+    monkeypatch.setattr(columnar_store, "PARSED_DATA_STORE_DIR", str(tmp_path))
+
+    body = upload(client).json()
+
+    assert body["duplicate"] is True and body["upload_id"] == "winner-bank"
+    assert body["metrics"] == {"cash_inflow": 1000.0, "cash_outflow": 400.0}
+    assert [r["id"] for r in db.rows("financial_uploads")] == ["winner-bank"]
+    assert db.rows("financial_metrics") == [] and db.rows("transactions") == []
+    # The losing request's columnar file is removed
+    assert not list(tmp_path.rglob("*.parquet"))
+
+
+def test_concurrent_bulk_file_is_listed_as_a_duplicate(client, db, racing_upload):
+    sales = "Date,Description,Amount,Status\n2024-01-03,Invoice 1,700,Paid\n"
+    body = client.post(
+        "/upload/financials/bulk",
+        files=[("files", ("bank.csv", STATEMENT, "text/csv")), ("files", ("sales.csv", sales, "text/csv"))],
+        data={"manifest": '{"bank.csv": "bank", "sales.csv": "sales"}'}
+    ).json()
+
+    # Both files lost the race here, since the fixture stores a winner for every parse
+    assert body["files"] == []
+    assert sorted(d["upload_id"] for d in body["duplicates"]) == ["winner-bank", "winner-sales"]
+    assert len(live_uploads(db)) == 2
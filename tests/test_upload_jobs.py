@@ -0,0 +1,118 @@
+"""
+Asynchronous uploads: 202 + polling, and uploads orphaned by a process restart
+"""
+
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+
+from backend.main import fail_interrupted_uploads
+from backend.services.upload_cache import upload_fingerprint
+from backend.services.upload_jobs import parse_timestamp
+
+
+CSV = b"Date,Description,Amount\n2024-01-01,Sale,100\n2024-01-02,Fee,-20\n"
+
+
+def wait_for_job(client, job_id: str) -> dict:
+    for _ in range(200):
+        job = client.get(f"/upload/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish: {job}")
+
+
+def orphan(db, user_id: str, status: str, age: timedelta, content: bytes = CSV) -> str:
+    """An upload row left in progress by a process that no longer exists."""
+    row = {
+        "user_id": user_id,
+        "filename": "lost.csv",
+        "file_type": "bank",
+        "processing_status": status,
+        "content_hash": upload_fingerprint(hashlib.sha256(content).hexdigest(), "bank"),
+        "parsed_data": [],
+        "created_at": (datetime.now(timezone.utc) - age).isoformat(),
+    }
+    return db.table("financial_uploads").insert(row).execute().data[0]["id"]
+
+
+def test_async_upload_is_accepted_then_completes(client, db):
+    with client:
+        response = client.post(
+            "/upload/financials",
+            files={"file": ("a.csv", CSV, "text/csv")},
+            data={"type": "bank", "async_processing": "true"}
+        )
+        assert response.status_code == 202
+        job = wait_for_job(client, response.json()["job_id"])
+
+    assert job["status"] == "completed"
+    assert job["rows_parsed"] == 2
+    assert job["result"]["metrics"] == {"cash_inflow": 100.0, "cash_outflow": 20.0}
+    assert db.rows("financial_uploads")[0]["processing_status"] == "completed"
+
+
+def test_async_upload_failure_is_reported(client, db):
+    with client:
+        response = client.post(
+            "/upload/financials",
+            files={"file": ("a.csv", b"foo\n1\n", "text/csv")},
+            data={"type": "bank", "async_processing": "true"}
+        )
+        job = wait_for_job(client, response.json()["job_id"])
+
+    assert job["status"] == "failed"
+    assert "Missing required fields" in job["error"]
+    assert db.rows("financial_uploads")[0]["processing_status"] == "failed"
+
+
+def test_reupload_replaces_an_orphaned_in_progress_upload(client, db, user_id):
+    lost = orphan(db, user_id, "processing", timedelta(hours=2))
+    db.table("transactions").insert({"user_id": user_id, "upload_id": lost, "amount": 1}).execute()
+
+    response = client.post("/upload/financials", files={"file": ("a.csv", CSV, "text/csv")}, data={"type": "bank"})
+
+    assert response.status_code == 200
+    assert not response.json().get("duplicate")
+    statuses = {r["id"]: r["processing_status"] for r in db.rows("financial_uploads")}
+    assert statuses[lost] == "failed"
+    assert [t for t in db.rows("transactions") if t["upload_id"] == lost] == []
+
+
+def test_recent_in_progress_upload_is_still_reported_as_running(client, db, user_id):
+    running = orphan(db, user_id, "pending", timedelta(minutes=1))
+
+    response = client.post("/upload/financials", files={"file": ("a.csv", CSV, "text/csv")}, data={"type": "bank"})
+
+    assert response.status_code == 202
+    assert response.json()["job_id"] == running
+    assert client.delete(f"/upload/{running}").status_code == 409
+
+
+def test_orphaned_upload_can_be_polled_and_deleted(client, db, user_id):
+    lost = orphan(db, user_id, "pending", timedelta(hours=2))
+
+    job = client.get(f"/upload/jobs/{lost}").json()
+    assert job["status"] == "failed"
+    assert "interrupted" in job["error"]
+
+    lost = orphan(db, user_id, "processing", timedelta(hours=2), content=b"other")
+    assert client.delete(f"/upload/{lost}").status_code == 200
+
+
+def test_startup_fails_only_stale_in_progress_uploads(db, user_id):
+    stale = orphan(db, user_id, "processing", timedelta(hours=2))
+    recent = orphan(db, user_id, "pending", timedelta(minutes=5), content=b"other")
+
+    fail_interrupted_uploads()
+
+    statuses = {r["id"]: r["processing_status"] for r in db.rows("financial_uploads")}
+    assert statuses == {stale: "failed", recent: "pending"}
+
+
+def test_parse_timestamp_reads_postgres_timestamps():
+    assert parse_timestamp("2024-05-01T10:00:00.12345+00:00") == \
+        datetime(2024, 5, 1, 10, 0, 0, 123450, tzinfo=timezone.utc)
+    assert parse_timestamp("2024-05-01T10:00:00Z") == datetime(2024, 5, 1, 10, tzinfo=timezone.utc)
+    assert parse_timestamp(None) is None
@@ -0,0 +1,95 @@
+"""
+Spooling uploads to disk: hashing while copying, ZIP extraction limits and manifests
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import zipfile
+
+import pytest
+
+import backend.services.upload_spool as upload_spool
+from backend.services.upload_spool import (
+    RowSpool, SpooledUpload, extract_zip, parse_manifest, row_spool_path, spool_upload
+)
+from backend.services.financial_analysis import parse_financial_file
+
+
+class FakeUpload:
+    def __init__(self, content: bytes, filename: str):
+        self.file = io.BytesIO(content)
+        self.filename = filename
+
+    async def read(self, size: int = -1) -> bytes:
+        return self.file.read(size)
+
+
+CSV = b"Date,Description,Amount\n2024-01-01,Sale,100\n2024-01-02,Fee,-20\n"
+
+
+def test_spool_upload_copies_and_hashes_in_pieces(monkeypatch):
+    monkeypatch.setattr(upload_spool, "SPOOL_CHUNK_BYTES", 7)
+    spooled = asyncio.run(spool_upload(FakeUpload(CSV, "Jan.CSV")))
+    try:
+        assert spooled.path.endswith(".csv")
+        assert spooled.size == len(CSV)
+        assert spooled.sha256 == hashlib.sha256(CSV).hexdigest()
+        with open(spooled.path, "rb") as f:
+            assert f.read() == CSV
+        assert parse_financial_file(spooled.path, spooled.filename, "bank")["parsed_data"] == \
+            parse_financial_file(CSV, spooled.filename, "bank")["parsed_data"]
+    finally:
+        spooled.remove()
+    assert not os.path.exists(spooled.path)
+
+
+def test_remove_also_drops_the_row_spool(tmp_path):
+    path = tmp_path / "upload.csv"
+    path.write_bytes(CSV)
+    RowSpool(row_spool_path(str(path))).append([{"amount": 1.0}])
+    SpooledUpload(str(path), "upload.csv", len(CSV)).remove()
+    assert list(tmp_path.iterdir()) == []
+
+
+def zip_upload(tmp_path, members) -> SpooledUpload:
+    path = tmp_path / "bundle.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return SpooledUpload(str(path), "bundle.zip", path.stat().st_size)
+
+
+def test_extract_zip_spools_members_and_reads_manifest(tmp_path):
+    spooled = zip_upload(tmp_path, {
+        "statements/jan.csv": CSV,
+        "__MACOSX/._jan.csv": b"junk",
+        "manifest.json": b'{"jan.csv": "bank"}',
+    })
+    members, manifest = extract_zip(spooled)
+    try:
+        assert [m.filename for m in members] == ["jan.csv"]
+        assert members[0].sha256 == hashlib.sha256(CSV).hexdigest()
+        assert manifest == {"jan.csv": "bank"}
+    finally:
+        for member in members:
+            member.remove()
+
+
+def test_extract_zip_enforces_limits(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_spool, "ZIP_MAX_MEMBERS", 1)
+    with pytest.raises(ValueError, match="more than 1 files"):
+        extract_zip(zip_upload(tmp_path, {"a.csv": CSV, "b.csv": CSV}))
+
+    monkeypatch.setattr(upload_spool, "ZIP_MAX_UNCOMPRESSED_BYTES", 10)
+    with pytest.raises(ValueError, match="expands to"):
+        extract_zip(zip_upload(tmp_path, {"a.csv": CSV}))
+
+
+def test_parse_manifest_accepts_object_or_list():
+    assert parse_manifest('{"a.csv": "bank"}') == {"a.csv": "bank"}
+    assert parse_manifest('[{"filename": "b.csv", "type": "sales"}]') == {"b.csv": "sales"}
+    assert parse_manifest("") == {}
+    with pytest.raises(ValueError):
+        parse_manifest('"bank"')